@@ -0,0 +1,249 @@
+"""
+Administrative endpoints.
+
+Protected by a bearer token (ADMIN_API_TOKEN). When no token is
+configured the whole router answers 404.
+"""
+import hmac
+import importlib.util
+from datetime import date, datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.logging_config import get_logger
+from app.profiling import ProfilerBusy, profiler, tracer
+from app.services.analytics import RegistrationRollups, RollupDimension, default_date_range
+from app.services.export_service import EXPORT_FORMATS, ExportFilter, ExportFormat, RegistryExporter
+from app.sharding import shard_router
+
+logger = get_logger(__name__)
+
+
+async def require_admin_token(authorization: Optional[str] = Header(None)) -> None:
+    """
+    Dependency rejecting requests without the admin bearer token.
+
+    Raises:
+        HTTPException: 404 if the admin API is disabled, 401 on a bad token
+    """
+    if not settings.admin_api_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.encode("utf-8"), settings.admin_api_token.encode("utf-8")
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin_token)]
+)
+
+exporter = RegistryExporter()
+rollups = RegistrationRollups(shard_router)
+
+
+@router.get("/export")
+async def export_registry(
+    format: ExportFormat = "csv",
+    since_id: int = 0,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    city_code: Optional[str] = None,
+    include_phone: bool = False
+) -> StreamingResponse:
+    """
+    Stream a registry extract.
+
+    The ``X-Export-Watermark`` response header holds the highest id
+    included; pass it as ``since_id`` for the next incremental export.
+    Ids, and so watermarks, are per database: a sharded registry is
+    refused, export each shard with scripts/export_registry.py instead.
+    Rows moved to the cold archive are not included.
+
+    Args:
+        format: csv, jsonl or parquet
+        since_id: Only export records with a greater id
+        created_from: Only export records created at or after this time
+        created_to: Only export records created before this time
+        city_code: Only export records with this city code
+        include_phone: Include the WhatsApp phone number column
+
+    Returns:
+        Chunked response with the extract
+    """
+    if shard_router is not None:
+        raise HTTPException(
+            status_code=409,
+            detail="Registry is sharded: export each shard with scripts/export_registry.py --database-url"
+        )
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    export_filter = ExportFilter(
+        since_id=since_id,
+        created_from=created_from,
+        created_to=created_to,
+        city_code=city_code,
+        include_phone=include_phone
+    )
+
+    async with AsyncSessionLocal() as db:
+        watermark = await exporter.get_watermark(db)
+
+    async def body():
+        # The response outlives the endpoint, so it owns its own session
+        async with AsyncSessionLocal() as db:
+            async for chunk in exporter.stream(db, format, export_filter, watermark):
+                yield chunk
+
+    logger.info(
+        "Registry export started",
+        format=format,
+        since_id=since_id,
+        watermark=watermark,
+        city_code=city_code,
+        include_phone=include_phone
+    )
+
+    filename = f"uic_records_{since_id}_{watermark}.{format}"
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "X-Export-Watermark": str(watermark),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+    )
+
+
+@router.get("/analytics/registrations")
+async def registration_analytics(
+    group_by: List[RollupDimension] = Query(["day"]),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    city_code: Optional[str] = None,
+    gender_code: Optional[str] = None
+) -> dict:
+    """
+    New versus returning requests, from the registration rollups.
+
+    Reads one row per (day, city, gender) in range, never uic_records.
+
+    Args:
+        group_by: Any of day, city_code, gender_code (repeatable)
+        date_from: First day included (default: 29 days before date_to)
+        date_to: Last day included (default: today, UTC)
+        city_code: Only this city code
+        gender_code: Only this gender code
+
+    Returns:
+        Buckets with registrations, returning_requests and returning_share,
+        and their totals
+    """
+    date_from, date_to = default_date_range(date_from, date_to)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from is after date_to")
+
+    group_by = list(dict.fromkeys(group_by))
+    async with AsyncSessionLocal() as db:
+        buckets = await rollups.report(
+            db,
+            group_by=group_by,
+            date_from=date_from,
+            date_to=date_to,
+            city_code=city_code,
+            gender_code=gender_code
+        )
+        [total] = await rollups.report(
+            db,
+            group_by=(),
+            date_from=date_from,
+            date_to=date_to,
+            city_code=city_code,
+            gender_code=gender_code
+        )
+
+    return {
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "group_by": group_by,
+        "buckets": [bucket.as_dict() for bucket in buckets],
+        "totals": {
+            "registrations": total.registrations,
+            "returning_requests": total.returning_requests,
+            "returning_share": total.returning_share,
+        },
+    }
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def sampling_profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000)
+) -> PlainTextResponse:
+    """
+    Sample this worker's threads and return collapsed stacks.
+
+    The output feeds flamegraph.pl or speedscope directly. Only the
+    worker that receives the request is profiled.
+
+    Args:
+        seconds: Sampling duration (capped at PROFILE_MAX_SECONDS)
+        interval_ms: Time between samples
+
+    Returns:
+        One "frame;frame;... count" line per distinct stack
+    """
+    try:
+        stacks = await profiler.profile(seconds, interval_ms / 1000.0)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    return PlainTextResponse(
+        stacks,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
+
+
+@router.get("/traces")
+async def request_traces() -> dict:
+    """
+    Slowest traced webhook requests of this worker, slowest first.
+
+    Returns:
+        Whether tracing is on, and the buffered traces with their spans
+    """
+    return {
+        "enabled": tracer.enabled,
+        "traces": [request_trace.as_dict() for request_trace in tracer.slowest()],
+    }
+
+
+@router.put("/traces")
+async def set_request_tracing(enabled: bool, clear: bool = False) -> dict:
+    """
+    Switch request tracing on or off at runtime (this worker).
+
+    Args:
+        enabled: Trace requests starting from now
+        clear: Also forget the buffered traces
+
+    Returns:
+        The new tracing state
+    """
+    tracer.set_enabled(enabled)
+    if clear:
+        tracer.clear()
+    return {"enabled": tracer.enabled}
@@ -0,0 +1,249 @@
+"""
+Partner verification endpoints.
+
+Clinic EMRs and other partner systems check that a UIC exists and is
+active. Requests carry an ``X-API-Key`` from PARTNER_API_KEYS; when no
+key is configured the whole router answers 404.
+
+Responses carry an ``ETag`` and ``Cache-Control: private, max-age``, so
+a partner re-checking the same codes sends ``If-None-Match`` and gets an
+empty 304 while nothing changed.
+"""
+import hashlib
+import hmac
+import json
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.api.webhook import verifier
+from app.config import settings
+from app.database import AsyncSessionLocal, LazySession, get_db
+from app.logging_config import get_logger
+from app.metrics import metrics
+from app.services.uic_verifier import UICStatus
+
+logger = get_logger(__name__)
+
+NDJSON = "application/x-ndjson"
+
+# Longest stream line accepted: a code, or a small JSON object holding one
+MAX_LINE_BYTES = 1024
+
+
+async def require_partner_key(x_api_key: Optional[str] = Header(None)) -> str:
+    """
+    Dependency identifying the partner from its API key.
+
+    Every configured key is compared, in constant time, so the response
+    time does not reveal which partner a guessed key is close to.
+
+    Returns:
+        Partner name
+
+    Raises:
+        HTTPException: 404 if the API is disabled, 401 on a missing or bad key
+    """
+    if not settings.partner_api_keys or verifier is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    presented = (x_api_key or "").encode("utf-8")
+    partner = None
+    for name, key in settings.partner_api_keys.items():
+        if hmac.compare_digest(presented, key.encode("utf-8")):
+            partner = name
+    if partner is None:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return partner
+
+
+router = APIRouter(
+    prefix="/api/v1/uic",
+    tags=["partner"],
+)
+
+
+class VerifyRequest(BaseModel):
+    """Batch verify request body."""
+
+    codes: List[str]
+
+
+def _etag(body: bytes) -> str:
+    """Strong validator for a response body."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against the current ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
+def _cacheable(payload: object, if_none_match: Optional[str]) -> Response:
+    """Serialize a result with validators, or answer 304 if the partner has it."""
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    etag = _etag(body)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={settings.verify_max_age_seconds}",
+    }
+    if _matches(if_none_match, etag):
+        metrics.increment("verify.not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _summary(statuses: List[UICStatus]) -> dict:
+    return {
+        "count": len(statuses),
+        "active": sum(1 for s in statuses if s.active),
+        "results": [s.as_dict() for s in statuses],
+    }
+
+
+@router.get("/verify/{uic_code}")
+async def verify_code(
+    uic_code: str,
+    partner: str = Depends(require_partner_key),
+    if_none_match: Optional[str] = Header(None),
+    db: LazySession = Depends(get_db)
+) -> Response:
+    """
+    Verify one code.
+
+    Args:
+        uic_code: Code to check (case-insensitive)
+
+    Returns:
+        uic_code, exists, active and issued_on (registration date)
+    """
+    [status] = await verifier.verify(db, [uic_code])
+    await db.release()
+    metrics.increment("verify.codes", 1)
+    return _cacheable(status.as_dict(), if_none_match)
+
+
+@router.post("/verify")
+async def verify_codes(
+    request: VerifyRequest,
+    partner: str = Depends(require_partner_key),
+    if_none_match: Optional[str] = Header(None),
+    db: LazySession = Depends(get_db)
+) -> Response:
+    """
+    Verify a batch of codes with one query for those not cached.
+
+    Args:
+        request: ``{"codes": [...]}``, at most VERIFY_BATCH_MAX codes
+
+    Returns:
+        count, active (how many are active) and one result per code, in
+        request order
+    """
+    if len(request.codes) > settings.verify_batch_max:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.verify_batch_max} codes per call; use /verify/stream"
+        )
+
+    statuses = await verifier.verify(db, request.codes)
+    await db.release()
+    metrics.increment("verify.codes", len(statuses))
+    logger.info("Codes verified", partner=partner, count=len(statuses))
+    return _cacheable(_summary(statuses), if_none_match)
+
+
+def _parse_line(line: str) -> str:
+    """A stream line is a code, a JSON string or ``{"uic_code": ...}``."""
+    if line[:1] in ('"', "{"):
+        value = json.loads(line)
+        return value["uic_code"] if isinstance(value, dict) else value
+    return line
+
+
+def _add_codes(codes: List[str], lines: List[bytes]) -> None:
+    """Parse complete stream lines into codes, enforcing the per-stream limit."""
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            code = _parse_line(line.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Expected one code per line")
+        if not isinstance(code, str):
+            raise HTTPException(status_code=400, detail="Expected one code per line")
+        codes.append(code)
+        if len(codes) > settings.verify_stream_max_codes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {settings.verify_stream_max_codes} codes per stream"
+            )
+
+
+async def _read_codes(request: Request) -> List[str]:
+    """
+    Parse a stream body chunk by chunk as it arrives.
+
+    Only the parsed codes are kept, never the whole body; a line split
+    across chunks is carried over to the next one.
+
+    Raises:
+        HTTPException: 400 on a malformed or overlong line, 413 past VERIFY_STREAM_MAX_CODES
+    """
+    codes: List[str] = []
+    pending = b""
+    async for chunk in request.stream():
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > MAX_LINE_BYTES:
+            raise HTTPException(status_code=400, detail="Expected one code per line")
+        _add_codes(codes, lines)
+    _add_codes(codes, [pending])
+    return codes
+
+
+@router.post("/verify/stream")
+async def verify_stream(
+    request: Request,
+    partner: str = Depends(require_partner_key)
+) -> StreamingResponse:
+    """
+    Verify a large batch, streaming one NDJSON result line per code.
+
+    The request body holds one code per line (plain, JSON string or
+    ``{"uic_code": ...}``) and is parsed as it arrives. It is read in
+    full before responding, since the response shares the connection's
+    receive channel with Starlette's disconnect listener. Results are
+    looked up and written VERIFY_BATCH_MAX codes at a time, in request
+    order.
+
+    Returns:
+        Chunked ``application/x-ndjson`` response
+    """
+    codes = await _read_codes(request)
+
+    logger.info("Verify stream started", partner=partner, count=len(codes))
+    batch_size = settings.verify_batch_max
+
+    async def body() -> AsyncIterator[bytes]:
+        # The response outlives the endpoint, so it owns its own session
+        db = LazySession(AsyncSessionLocal)
+        try:
+            for start in range(0, len(codes), batch_size):
+                statuses = await verifier.verify(db, codes[start:start + batch_size])
+                metrics.increment("verify.codes", len(statuses))
+                yield "".join(
+                    json.dumps(s.as_dict(), separators=(",", ":")) + "\n" for s in statuses
+                ).encode("utf-8")
+        finally:
+            await db.discard()
+
+    return StreamingResponse(body(), media_type=NDJSON, headers={"Cache-Control": "no-store"})
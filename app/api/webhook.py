@@ -1,25 +1,182 @@
 """
 WhatsApp webhook endpoints for Twilio integration.
 """
+import asyncio
+import time
+from typing import Optional, Tuple
+
 from fastapi import APIRouter, Form, Depends, Response, HTTPException, Request
-from sqlalchemy.ext.asyncio import AsyncSession
 from twilio.twiml.messaging_response import MessagingResponse
 
 from app.config import settings
-from app.database import get_db
+from app.database import LazySession, get_db, read_router
+from app.deadline import Deadline
 from app.logging_config import get_logger
+from app.profiling import tracer
+from app.services.admission import AdmissionController
+from app.services.cold_storage import build_cold_archive
 from app.services.flow_manager import FlowManager
+from app.services.i18n import get_catalog, note_language, noted_language
+from app.services.message_journal import (
+    OUTCOME_DEADLINE,
+    OUTCOME_ERROR,
+    OUTCOME_OK,
+    OUTCOME_SHED,
+    STEP_UNKNOWN,
+    build_message_journal,
+    note_step,
+    noted_step,
+)
+from app.services.returning_users import ReturningUserIndex
+from app.services.shared_cache import open_shared_table
+from app.services.session_store import SESSION_COOKIE, bind_session_token, issued_session_token
 from app.services.uic_service import UICService
+from app.services.uic_verifier import UICVerifier
 from app.services.qr_service import QRCodeService
+from app.sharding import shard_router
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/whatsapp", tags=["webhook"])
 
 # Initialize services
-flow_manager = FlowManager()
-uic_service = UICService()
+archive = build_cold_archive()
+uic_service = UICService(
+    shard_router=shard_router,
+    read_router=read_router,
+    archive=archive,
+    hot_set=open_shared_table("uic_hot_set")
+)
+returning_users = (
+    ReturningUserIndex(uic_service.codes_for_phone, shared=open_shared_table("returning_users"))
+    if settings.returning_user_shortcut else None
+)
+flow_manager = FlowManager(returning_users=returning_users)
+verifier = (
+    UICVerifier(shard_router=shard_router, read_router=read_router, archive=archive)
+    if settings.partner_api_keys else None
+)
 qr_service = QRCodeService() if settings.enable_qr_code else None
+admission = AdmissionController() if settings.admission_enabled else None
+journal = build_message_journal()
+
+
+def _on_issued(phone_number: str, uic_code: str) -> None:
+    """Drop cached answers a newly committed code makes stale."""
+    if returning_users is not None:
+        returning_users.invalidate(phone_number)
+    if verifier is not None:
+        verifier.invalidate(uic_code)
+
+
+uic_service.issue_listeners.append(_on_issued)
+
+
+def _with_session_cookie(response: Response) -> Response:
+    """Attach the conversation token issued while handling this request (token sessions)."""
+    token = issued_session_token()
+    if token:
+        response.set_cookie(SESSION_COOKIE, token, max_age=settings.session_timeout_minutes * 60)
+    elif token == "":
+        response.delete_cookie(SESSION_COOKIE)
+    return response
+
+
+def _render_twiml(key: str) -> dict:
+    """Build a fixed reply as TwiML once per language."""
+    catalog = get_catalog()
+    rendered = {}
+    for language in catalog.languages:
+        response = MessagingResponse()
+        response.message(catalog.text(language, key))
+        rendered[language] = str(response)
+    return rendered
+
+
+# Sent when a message is shed, could not be processed in time, or failed
+SHED_TWIML = _render_twiml("service.busy")
+DEADLINE_TWIML = _render_twiml("service.deadline")
+ERROR_TWIML = _render_twiml("service.error")
+
+
+def _localized(twiml: dict) -> str:
+    """Pick a fixed reply in the language noted for this request (default if unknown)."""
+    return twiml.get(noted_language()) or twiml[get_catalog().default_language]
+
+
+async def _reply_for(
+    db: LazySession,
+    phone_number: str,
+    body: str,
+    deadline: Deadline
+) -> Tuple[str, Optional[str]]:
+    """
+    Process a message and compose the reply text.
+
+    Args:
+        db: Lazily opened database session
+        phone_number: Sender's phone number (E.164)
+        body: Message text
+        deadline: Request budget, passed to the services
+
+    Returns:
+        Tuple of (response_text, qr_uic_code); qr_uic_code is the UIC
+        whose QR code to attach, or None
+    """
+    # Process the message through flow manager
+    result = await flow_manager.process_message(
+        db=db,
+        phone_number=phone_number,
+        message=body,
+        deadline=deadline
+    )
+
+    response_text = result["response"]
+    language = result["language"]
+    uic_code = result.get("resend_uic")
+    attach_qr = False
+    catalog = get_catalog()
+
+    if uic_code is not None:
+        # Returning user asked for their existing code
+        attach_qr = qr_service is not None and qr_service.should_attach(uic_code, deadline)
+        response_text = catalog.with_code(language, "uic.resend.reply.qr" if attach_qr else "uic.resend.reply", uic_code)
+
+    # If conversation is complete, generate UIC
+    elif result["is_complete"] and result["collected_data"]:
+        collected_data = result["collected_data"]
+
+        logger.info(
+            "Generating UIC",
+            phone_number=phone_number,
+            data_keys=list(collected_data.keys())
+        )
+
+        # Generate UIC
+        uic_code, is_new = await uic_service.create_uic(
+            db=db,
+            phone_number=phone_number,
+            last_name_code=collected_data["last_name_code"],
+            first_name_code=collected_data["first_name_code"],
+            birth_year_digit=collected_data["birth_year_digit"],
+            city_code=collected_data["city_code"],
+            gender_code=collected_data["gender_code"],
+            deadline=deadline
+        )
+        attach_qr = qr_service is not None and qr_service.should_attach(uic_code, deadline)
+
+        # Prepare final message
+        key = "uic.new.reply" if is_new else "uic.existing.reply"
+        response_text = catalog.with_code(language, key + ".qr" if attach_qr else key, uic_code)
+
+        logger.info(
+            "UIC delivered",
+            phone_number=phone_number,
+            uic_code=uic_code,
+            is_new=is_new
+        )
+
+    return response_text, uic_code if attach_qr else None
 
 
 @router.post("/webhook")
@@ -28,7 +185,7 @@ async def whatsapp_webhook(
     From: str = Form(...),
     Body: str = Form(...),
     MessageSid: str = Form(None),
-    db: AsyncSession = Depends(get_db)
+    db: LazySession = Depends(get_db)
 ) -> Response:
     """
     Main webhook endpoint for incoming WhatsApp messages from Twilio.
@@ -39,15 +196,27 @@ async def whatsapp_webhook(
     3. Generates UIC when conversation is complete
     4. Returns TwiML response to send message back to user
 
+    The reply must be sent within WEBHOOK_DEADLINE_SECONDS: optional work
+    is skipped when time runs short, and processing that would overrun
+    the deadline is abandoned (rolled back) with a "please resend" reply.
+
     Args:
         From: WhatsApp phone number (E.164 format, e.g., whatsapp:+1234567890)
         Body: Message text from user
         MessageSid: Twilio message identifier
-        db: Database session (injected)
+        db: Lazily opened database session (injected)
 
     Returns:
         TwiML XML response for Twilio
     """
+    # Time spent waiting for admission counts against the budget
+    deadline = Deadline()
+    received_at, started = time.time(), time.perf_counter()
+    outcome = OUTCOME_OK
+    note_step(STEP_UNKNOWN)
+    note_language(None)
+    request_trace = tracer.start("webhook")
+
     # Clean phone number (remove whatsapp: prefix)
     phone_number = From.replace("whatsapp:", "")
 
@@ -58,127 +227,101 @@ async def whatsapp_webhook(
         message_sid=MessageSid
     )
 
-    try:
-        # Process the message through flow manager
-        result = await flow_manager.process_message(
-            db=db,
-            phone_number=phone_number,
-            message=Body
-        )
-
-        response_text = result["response"]
-
-        # If conversation is complete, generate UIC
-        if result["is_complete"] and result["collected_data"]:
-            collected_data = result["collected_data"]
-
-            logger.info(
-                "Generating UIC",
-                phone_number=phone_number,
-                data_keys=list(collected_data.keys())
+    # Shed load before touching the database
+    if admission is not None and await admission.acquire(phone_number) is not None:
+        tracer.finish(request_trace)
+        if journal is not None:
+            journal.record(
+                phone_number, MessageSid, len(Body), noted_step(),
+                received_at, time.perf_counter() - started, OUTCOME_SHED
             )
+        return Response(content=_localized(SHED_TWIML), media_type="application/xml")
 
-            # Generate UIC
-            uic_code, is_new = await uic_service.create_uic(
-                db=db,
-                phone_number=phone_number,
-                last_name_code=collected_data["last_name_code"],
-                first_name_code=collected_data["first_name_code"],
-                birth_year_digit=collected_data["birth_year_digit"],
-                city_code=collected_data["city_code"],
-                gender_code=collected_data["gender_code"]
-            )
-
-            # Prepare final message
-            if is_new:
-                response_text = (
-                    f"🎉 Votre Code d'Identification Unique a été généré!\n\n"
-                    f"📋 Votre CIU:\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"  {uic_code}\n"
-                    f"━━━━━━━━━━━━━━\n\n"
-                    f"✅ Ce code est maintenant enregistré à votre nom.\n\n"
-                    f"💡 Sauvegardez ce code! Vous pouvez le redemander en commençant une nouvelle conversation.\n\n"
-                )
-                if settings.enable_qr_code:
-                    response_text += "📱 Vous recevrez également un code QR pour un accès facile.\n\n"
-                response_text += "Tapez RESTART pour générer un nouveau CIU ou mettre à jour vos informations."
-            else:
-                response_text = (
-                    f"📋 Votre CIU existant:\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"  {uic_code}\n"
-                    f"━━━━━━━━━━━━━━\n\n"
-                    f"ℹ️ Ce code a été généré précédemment avec les mêmes informations.\n\n"
-                )
-                if settings.enable_qr_code:
-                    response_text += "📱 Vous recevrez également un code QR.\n\n"
-                response_text += "Tapez RESTART si vous devez mettre à jour vos informations."
+    # Signed conversation state echoed back by Twilio (token sessions)
+    bind_session_token(request.cookies.get(SESSION_COOKIE))
 
-            logger.info(
-                "UIC delivered",
+    try:
+        try:
+            async with asyncio.timeout(deadline.remaining()):
+                response_text, qr_uic_code = await _reply_for(db, phone_number, Body, deadline)
+
+                # Last statement has run: return the connection before building the reply
+                await db.release()
+        except TimeoutError:
+            outcome = OUTCOME_DEADLINE
+            logger.error(
+                "Webhook deadline exceeded, changes rolled back",
                 phone_number=phone_number,
-                uic_code=uic_code,
-                is_new=is_new
+                budget_seconds=deadline.budget_seconds
             )
+            await db.discard()
+            return Response(content=_localized(DEADLINE_TWIML), media_type="application/xml")
 
         # Create Twilio TwiML response
         twiml_response = MessagingResponse()
         message = twiml_response.message(response_text)
 
-        # Add QR code if feature is enabled and conversation is complete
-        if settings.enable_qr_code and result["is_complete"] and qr_service:
+        # Add QR code if one was announced in the reply
+        if qr_uic_code is not None:
             try:
-                # Generate QR code
-                qr_path, qr_bytes = qr_service.generate_qr_code(uic_code)
-                
+                # Render (or reuse) the QR code image
+                qr_service.ensure_qr_code(qr_uic_code)
+
                 # Build public URL for QR code
                 # Get the request's base URL
                 base_url = str(request.base_url).rstrip('/')
-                qr_url = f"{base_url}/static/qr_codes/{uic_code}.png"
-                
+                qr_url = f"{base_url}/static/qr_codes/{qr_uic_code}.png"
+
                 # Add media URL to Twilio message
                 message.media(qr_url)
-                
+
                 logger.info(
                     "QR code attached to message",
-                    uic_code=uic_code,
+                    uic_code=qr_uic_code,
                     qr_url=qr_url
                 )
             except Exception as qr_error:
                 logger.error(
                     "Failed to generate/attach QR code",
-                    uic_code=uic_code,
+                    uic_code=qr_uic_code,
                     error=str(qr_error),
                     exc_info=True
                 )
                 # Don't fail the whole request, just log the error
 
         # Return as XML
-        return Response(
+        return _with_session_cookie(Response(
             content=str(twiml_response),
             media_type="application/xml"
-        )
+        ))
 
     except Exception as e:
+        outcome = OUTCOME_ERROR
         logger.error(
             "Error processing webhook",
             phone_number=phone_number,
             error=str(e),
             exc_info=True
         )
+        await db.discard()
 
         # Send error message to user
-        error_response = MessagingResponse()
-        error_response.message(
-            "❌ Désolé, une erreur s'est produite. Veuillez taper RESTART pour réessayer ou contacter le support."
-        )
-
         return Response(
-            content=str(error_response),
+            content=_localized(ERROR_TWIML),
             media_type="application/xml"
         )
 
+    finally:
+        deadline.finish()
+        tracer.finish(request_trace)
+        if admission is not None:
+            admission.release()
+        if journal is not None:
+            journal.record(
+                phone_number, MessageSid, len(Body), noted_step(),
+                received_at, time.perf_counter() - started, outcome
+            )
+
 
 @router.get("/health")
 async def health_check() -> dict:
@@ -196,7 +339,7 @@ async def health_check() -> dict:
 
 
 @router.post("/cleanup")
-async def cleanup_sessions(db: AsyncSession = Depends(get_db)) -> dict:
+async def cleanup_sessions(db: LazySession = Depends(get_db)) -> dict:
     """
     Manual endpoint to cleanup expired sessions.
 
@@ -3,7 +3,7 @@ Application configuration management using Pydantic Settings.
 Loads configuration from environment variables with validation.
 """
 from functools import lru_cache
-from typing import Literal
+from typing import Literal, Optional
 
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -31,6 +31,25 @@ class Settings(BaseSettings):
         description="Secret salt for UIC hashing. Must be kept secure.",
         min_length=16
     )
+    uic_salt_version: int = Field(
+        default=1,
+        ge=1,
+        description="Key version of UIC_SALT, stored with every input hash"
+    )
+    uic_previous_salts: dict[int, str] = Field(
+        default_factory=dict,
+        description=(
+            "Earlier salts by key version, still accepted for lookups until "
+            "scripts/rehash_inputs.py has rewritten every row"
+        )
+    )
+    uic_accept_unkeyed_hashes: bool = Field(
+        default=True,
+        description=(
+            "Also match input hashes from before keyed hashing (version 0). "
+            "Disable once the re-hash job has finished"
+        )
+    )
 
     # Database
     database_url: str = Field(
@@ -38,6 +57,40 @@ class Settings(BaseSettings):
         description="SQLAlchemy database URL"
     )
 
+    # Read replicas (empty list = all reads go to the primary)
+    read_replica_urls: list[str] = Field(
+        default_factory=list,
+        description="Database URLs of read replicas used for UIC lookups"
+    )
+    replica_staleness_seconds: float = Field(
+        default=5.0,
+        ge=0,
+        description=(
+            "Maximum expected replica lag. Keys written within this window are "
+            "read from the primary, and replica misses are rechecked on the primary"
+        )
+    )
+    replica_health_check_seconds: float = Field(
+        default=10.0,
+        gt=0,
+        description="Interval between replica health checks"
+    )
+
+    # Sharding (empty list = single database)
+    shard_database_urls: list[str] = Field(
+        default_factory=list,
+        description=(
+            "Database URLs for UIC registry shards. Order matters: append new "
+            "shards at the end and run scripts/rebalance_shards.py"
+        )
+    )
+    shard_virtual_nodes: int = Field(
+        default=64,
+        ge=1,
+        le=1024,
+        description="Virtual nodes per shard on the consistent hash ring"
+    )
+
     # Twilio Configuration
     twilio_account_sid: str = Field(
         ...,
@@ -57,6 +110,155 @@ class Settings(BaseSettings):
         default="/whatsapp/webhook",
         description="Path for Twilio webhook"
     )
+    twilio_validate_signature: bool = Field(
+        default=False,
+        description=(
+            "Reject webhook requests without a valid X-Twilio-Signature. Off by "
+            "default so upgrades don't start rejecting traffic; enable once "
+            "PUBLIC_BASE_URL (or the proxy headers) match the Twilio console URL"
+        )
+    )
+    public_base_url: Optional[str] = Field(
+        default=None,
+        description=(
+            "Public base URL Twilio calls (e.g. https://bot.example.org), used to "
+            "verify signatures behind proxies. Derived from the request if unset"
+        )
+    )
+
+    # Admin API (disabled when no token is set)
+    admin_api_token: Optional[str] = Field(
+        default=None,
+        min_length=16,
+        description="Bearer token for /admin endpoints. Admin API is disabled if unset"
+    )
+
+    # Partner verification API (disabled when no key is set)
+    partner_api_keys: dict[str, str] = Field(
+        default_factory=dict,
+        description="Partner name -> API key for /api/v1/uic/verify, e.g. {\"clinic-emr\": \"...\"}. API is disabled if empty"
+    )
+    verify_batch_max: int = Field(
+        default=1000,
+        ge=1,
+        le=5000,
+        description="Codes accepted per verify call, and per IN query in the NDJSON stream"
+    )
+    verify_stream_max_codes: int = Field(
+        default=100000,
+        ge=1,
+        description="Codes accepted in one NDJSON verify stream"
+    )
+    verify_cache_size: int = Field(
+        default=100000,
+        description="Verified codes cached per process"
+    )
+    verify_cache_ttl_seconds: float = Field(
+        default=300.0,
+        description="Seconds a cached code status is trusted (bounds staleness across workers)"
+    )
+    verify_max_age_seconds: int = Field(
+        default=60,
+        ge=0,
+        description="Cache-Control max-age on verify responses; partners revalidate with If-None-Match after it"
+    )
+
+    # Admission control
+    admission_enabled: bool = Field(
+        default=True,
+        description="Rate limit senders and shed load when the webhook is overloaded"
+    )
+    rate_limit_per_phone_per_minute: float = Field(
+        default=20.0,
+        gt=0,
+        description="Sustained messages per minute accepted from one phone number"
+    )
+    rate_limit_burst: int = Field(
+        default=10,
+        ge=1,
+        description="Messages one phone number may send back-to-back"
+    )
+    max_concurrent_messages: int = Field(
+        default=32,
+        ge=1,
+        description="Messages processed at the same time per worker"
+    )
+    max_queued_messages: int = Field(
+        default=64,
+        ge=0,
+        description="Messages allowed to wait for a processing slot before new ones are shed"
+    )
+    admission_queue_timeout_seconds: float = Field(
+        default=2.0,
+        gt=0,
+        description="Longest a message waits for a processing slot before it is shed"
+    )
+    rate_limit_backend: Literal["memory", "redis"] = Field(
+        default="memory",
+        description="Where per-phone buckets live. Use redis to share limits across workers"
+    )
+    redis_url: Optional[str] = Field(
+        default=None,
+        description="Redis URL, e.g. redis://localhost:6379/0"
+    )
+
+    # Response deadline
+    webhook_deadline_seconds: float = Field(
+        default=10.0,
+        gt=0,
+        le=15,
+        description="Time budget for answering a webhook request (Twilio gives up after 15 seconds)"
+    )
+    deadline_reserve_seconds: float = Field(
+        default=2.0,
+        ge=0,
+        description="Skip optional work (QR code, analytics counters) when less budget than this remains"
+    )
+
+    # Serving
+    workers: int = Field(
+        default=1,
+        ge=1,
+        description="Worker processes (one per core in production). >1 runs the supervisor"
+    )
+    worker_ready_timeout_seconds: float = Field(
+        default=30.0,
+        gt=0,
+        description="Time a new worker has to start and reach the database"
+    )
+    worker_shutdown_timeout_seconds: float = Field(
+        default=30.0,
+        gt=0,
+        description="Time a worker has to finish in-flight requests before it is killed"
+    )
+    worker_start_attempts: int = Field(
+        default=3,
+        ge=1,
+        description="Times a worker slot is respawned at startup before the supervisor gives up"
+    )
+    init_schema_on_startup: bool = Field(
+        default=True,
+        description=(
+            "Create or upgrade the database schema when the app starts. The supervisor "
+            "does it once before spawning workers and turns this off for them"
+        )
+    )
+
+    # Shared-memory caches (one copy of the hot sets per host instead of per worker)
+    shared_cache_path: Optional[str] = Field(
+        default=None,
+        description="Directory for shared cache segments, e.g. /dev/shm/uic. Caches are per process if unset"
+    )
+    shared_cache_slots: int = Field(
+        default=65536,
+        ge=8,
+        description="Slots per shared cache segment (256 bytes each)"
+    )
+    uic_hot_set_ttl_seconds: float = Field(
+        default=300.0,
+        gt=0,
+        description="Seconds a shared input_hash -> UIC record entry is trusted"
+    )
 
     # Session Management
     session_timeout_minutes: int = Field(
@@ -65,6 +267,105 @@ class Settings(BaseSettings):
         le=60,
         description="Minutes before user session expires"
     )
+    session_backend: Literal["database", "memory", "token"] = Field(
+        default="database",
+        description=(
+            "Where conversation state lives. memory skips the database for "
+            "mid-flow answers but is per-process and lost on restart; token "
+            "keeps it in a signed cookie echoed back by Twilio"
+        )
+    )
+    session_token_secret: Optional[str] = Field(
+        default=None,
+        description="Signing key for SESSION_BACKEND=token. If unset, derived from UIC_SALT"
+    )
+    session_token_cache_size: int = Field(
+        default=10000,
+        description="Token sessions kept decoded in memory per process"
+    )
+
+    # Returning users
+    returning_user_shortcut: bool = Field(
+        default=False,
+        description="Offer to resend the UIC to numbers that already have one instead of asking the questions"
+    )
+    returning_user_cache_size: int = Field(
+        default=50000,
+        description="Phone numbers whose registered codes are cached per process"
+    )
+    returning_user_cache_ttl_seconds: float = Field(
+        default=300.0,
+        description="Seconds a cached phone -> codes entry is trusted (bounds staleness across workers)"
+    )
+
+    # City codes
+    city_gazetteer_path: Optional[str] = Field(
+        default=None,
+        description="JSON gazetteer of city codes, names and aliases. Uses the bundled DRC list if unset"
+    )
+    city_code_strict: bool = Field(
+        default=False,
+        description="Only accept city codes present in the gazetteer"
+    )
+
+    # Near-duplicate Detection
+    duplicate_check_enabled: bool = Field(
+        default=True,
+        description="Flag new UICs that look like an existing person's (notes column)"
+    )
+
+    # Cold storage
+    archive_path: Optional[str] = Field(
+        default=None,
+        description="SQLite file holding archived registry rows; looked up when uic_records misses. Disabled if unset"
+    )
+    archive_after_days: int = Field(
+        default=730,
+        ge=1,
+        description="Rows not requested for this many days (and inactive rows) are moved to the archive"
+    )
+
+    # Message journal
+    message_journal_enabled: bool = Field(
+        default=False,
+        description="Append inbound message metadata (no text) to a binary journal for replay"
+    )
+    message_journal_path: str = Field(
+        default="./journal/messages.bin",
+        description="Journal file; rotated copies get .1, .2, ... suffixes"
+    )
+    message_journal_max_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        ge=4096,
+        description="Rotate the journal when it reaches this size"
+    )
+    message_journal_backup_count: int = Field(
+        default=10,
+        ge=0,
+        description="Rotated journal files kept"
+    )
+
+    # Profiling (both can also be switched at runtime through /admin)
+    request_tracing_enabled: bool = Field(
+        default=False,
+        description="Record per-request spans from startup and keep the slowest requests"
+    )
+    trace_slowest_count: int = Field(
+        default=20,
+        ge=1,
+        description="Slowest traced requests kept per worker"
+    )
+    profile_max_seconds: float = Field(
+        default=60.0,
+        gt=0,
+        description="Longest sampling profile /admin/profile will take"
+    )
+
+    # Analytics
+    analytics_rollups_enabled: bool = Field(
+        default=True,
+        description="Count registrations per day, city and gender at write time for /admin/analytics"
+    )
 
     # QR Code Feature
     enable_qr_code: bool = Field(
@@ -75,6 +376,23 @@ class Settings(BaseSettings):
     # Logging
     log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
     log_json: bool = False
+    log_async: bool = Field(
+        default=False,
+        description="Render and write logs on a background thread instead of the event loop"
+    )
+    log_queue_size: int = Field(
+        default=10000,
+        ge=100,
+        description="Pending log records kept in async mode before new ones are dropped"
+    )
+    log_sample_rates: dict[str, float] = Field(
+        default_factory=dict,
+        description="Event message -> fraction of debug/info events kept, e.g. {\"Answer stored\": 0.1}"
+    )
+    log_rate_limits: dict[str, float] = Field(
+        default_factory=dict,
+        description="Event message -> maximum debug/info events per second"
+    )
 
     @field_validator("uic_salt")
     @classmethod
@@ -86,6 +404,15 @@ class Settings(BaseSettings):
             raise ValueError("UIC salt should contain mixed character types")
         return v
 
+    @field_validator("partner_api_keys")
+    @classmethod
+    def validate_partner_keys(cls, v: dict[str, str]) -> dict[str, str]:
+        """Ensure partner API keys are long enough to resist guessing."""
+        for partner, key in v.items():
+            if len(key) < 16:
+                raise ValueError(f"API key for partner {partner!r} must be at least 16 characters long")
+        return v
+
     @property
     def is_production(self) -> bool:
         """Check if running in production environment."""
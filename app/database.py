@@ -2,13 +2,25 @@
 Database configuration and session management.
 Uses SQLAlchemy 2.0 with async support.
 """
-from typing import AsyncGenerator
+import asyncio
+import contextvars
+import itertools
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, ORMExecuteState, Session, SessionTransaction, sessionmaker
+from sqlalchemy.pool import Pool
 
 from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import metrics
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
 
 
 class Base(DeclarativeBase):
@@ -18,10 +30,16 @@ class Base(DeclarativeBase):
 
 # For SQLite in POC, we need to handle sync vs async carefully
 # SQLite doesn't support true async, but we use aiosqlite for compatibility
-def get_database_url() -> str:
-    """Get the appropriate database URL based on the database type."""
-    url = settings.database_url
+def to_async_url(url: str) -> str:
+    """
+    Convert a configured database URL to its async driver form.
 
+    Args:
+        url: SQLAlchemy database URL as written in settings
+
+    Returns:
+        URL usable with create_async_engine
+    """
     # For SQLite, convert to async URL if needed
     if url.startswith("sqlite:///"):
         # Use aiosqlite for async operations
@@ -30,23 +48,248 @@ def get_database_url() -> str:
     return url
 
 
+def get_database_url() -> str:
+    """Get the appropriate database URL based on the database type."""
+    return to_async_url(settings.database_url)
+
+
+def enable_sqlite_transactions(async_engine: AsyncEngine) -> AsyncEngine:
+    """
+    Let SQLAlchemy control SQLite transactions.
+
+    The sqlite3 driver only emits BEGIN before DML, so a SAVEPOINT opens
+    its own transaction and its RELEASE commits everything so far. Turning
+    off the driver's handling and emitting BEGIN ourselves keeps savepoints
+    nested inside a single transaction per unit of work.
+
+    Args:
+        async_engine: Engine to configure (no-op for other databases)
+
+    Returns:
+        The same engine
+    """
+    if async_engine.dialect.name != "sqlite":
+        return async_engine
+
+    sync_engine = async_engine.sync_engine
+
+    @event.listens_for(sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection: Any, connection_record: Any) -> None:
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sync_engine, "begin")
+    def _emit_begin(conn: Any) -> None:
+        conn.exec_driver_sql("BEGIN")
+
+    return async_engine
+
+
 # Create async engine
-engine = create_async_engine(
+engine = enable_sqlite_transactions(create_async_engine(
     get_database_url(),
     echo=settings.debug,
     future=True,
-)
+))
+
+class WriteTrackingSession(Session):
+    """
+    Session that records whether its unit of work wrote anything.
+
+    ``info["writes"]`` is set by flushes and ORM/Core DML statements and
+    cleared when the outermost transaction commits or rolls back. Raw ``text()`` writes are not
+    detected; set the flag yourself when issuing them.
+    """
+
+
+@event.listens_for(WriteTrackingSession, "do_orm_execute")
+def _flag_dml(orm_execute_state: ORMExecuteState) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["writes"] = True
+
+
+@event.listens_for(WriteTrackingSession, "after_flush")
+def _flag_flush(session: Session, flush_context: Any) -> None:
+    session.info["writes"] = True
+
+
+@event.listens_for(WriteTrackingSession, "after_transaction_end")
+def _clear_writes(session: Session, transaction: SessionTransaction) -> None:
+    # Savepoints ending do not settle the outer transaction's writes
+    if transaction.parent is None:
+        session.info.pop("writes", None)
+
+
+def after_commit(session: Any, callback: Callable[[], None]) -> None:
+    """
+    Run a callback once the session's current transaction commits.
+
+    For in-memory state that must only reflect committed rows (caches,
+    indexes). Dropped if the transaction rolls back instead.
+
+    Args:
+        session: AsyncSession, LazySession or Session
+        callback: Called with no arguments after the outermost commit
+            (or, for a LazySession, once it is released without error)
+    """
+    _callback_info(session).setdefault("after_commit", []).append(callback)
+
+
+def after_rollback(session: Any, callback: Callable[[], None]) -> None:
+    """
+    Run a callback if the session's current transaction ends without committing.
+
+    Args:
+        session: AsyncSession, LazySession or Session
+        callback: Called with no arguments after the outermost rollback or close
+    """
+    _callback_info(session).setdefault("after_rollback", []).append(callback)
+
+
+def _callback_info(session: Any) -> Dict[str, Any]:
+    # An unopened LazySession keeps callbacks itself rather than opening a session
+    if isinstance(session, LazySession) and not session.opened:
+        return session.info
+    return (session if isinstance(session, Session) else session.sync_session).info
+
+
+def _run_callbacks(info: Dict[str, Any], name: str) -> None:
+    info.pop("after_commit" if name == "after_rollback" else "after_rollback", None)
+    for callback in info.pop(name, ()):
+        try:
+            callback()
+        except Exception as e:
+            logger.error("Transaction callback failed", hook=name, error=str(e), exc_info=True)
+
+
+# Registered on Session itself so shard and test sessions get them too
+@event.listens_for(Session, "after_commit")
+def _run_commit_callbacks(session: Session) -> None:
+    # Also dispatched when a savepoint is released
+    if not session.in_nested_transaction():
+        _run_callbacks(session.info, "after_commit")
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _run_rollback_callbacks(session: Session, transaction: SessionTransaction) -> None:
+    # A commit has already run (and cleared) its callbacks by now
+    if transaction.parent is None:
+        _run_callbacks(session.info, "after_rollback")
+
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=WriteTrackingSession,
     expire_on_commit=False,
     autocommit=False,
     autoflush=False,
 )
 
 
+# Connections checked out from any pool while handling the current request
+_checkouts: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "db_checkouts", default=None
+)
+
+
+@event.listens_for(Pool, "checkout")
+def _count_checkout(dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+    counter = _checkouts.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _has_writes(session: AsyncSession) -> bool:
+    """Whether a session has flushed or pending writes."""
+    return bool(
+        session.sync_session.info.get("writes")
+        or session.new or session.dirty or session.deleted
+    )
+
+
+class LazySession:
+    """
+    AsyncSession proxy that is only created on first use.
+
+    Messages that never query (HELP, or every step with the in-memory
+    session store) cost no session and no connection. :meth:`release`
+    commits only if the unit of work wrote something, otherwise rolls
+    back, and returns the connection to the pool; using the proxy again
+    afterwards opens a new session.
+
+    A unit of work released without error counts as committed for
+    after_commit callbacks, even when nothing was written (in-memory
+    state such as sessions staged on a read-only request); discard runs
+    the after_rollback ones instead.
+    """
+
+    def __init__(self, factory: async_sessionmaker = AsyncSessionLocal):
+        """
+        Initialize proxy.
+
+        Args:
+            factory: Session factory used on first use
+        """
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+        # Transaction callbacks registered before the session is opened
+        self.info: Dict[str, Any] = {}
+
+    @property
+    def opened(self) -> bool:
+        """Whether a session currently exists."""
+        return self._session is not None
+
+    @property
+    def is_dirty(self) -> bool:
+        """Whether the open session has writes to commit."""
+        return self._session is not None and _has_writes(self._session)
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+            metrics.increment("db.sessions_opened")
+            for name, callbacks in self.info.items():
+                self._session.sync_session.info.setdefault(name, []).extend(callbacks)
+            self.info.clear()
+        return self._session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get(), name)
+
+    async def release(self) -> None:
+        """Commit if dirty, otherwise roll back, and close the session."""
+        session, self._session = self._session, None
+        if session is None:
+            _run_callbacks(self.info, "after_commit")
+            return
+
+        try:
+            if _has_writes(session):
+                await session.commit()
+            else:
+                # Nothing to commit, but the unit of work succeeded
+                _run_callbacks(session.sync_session.info, "after_commit")
+                await session.rollback()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def discard(self) -> None:
+        """Roll back and close the session, if any."""
+        session, self._session = self._session, None
+        if session is None:
+            _run_callbacks(self.info, "after_rollback")
+        else:
+            try:
+                await session.rollback()
+            finally:
+                await session.close()
+
+
 # For migrations and initial setup, we also need a sync engine
 sync_engine = create_engine(
     settings.database_url,
@@ -60,30 +303,268 @@ SyncSessionLocal = sessionmaker(
 )
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+class ReadReplicaRouter:
+    """
+    Read/write split for lookup traffic.
+
+    Reads are spread round-robin over healthy replicas. Writes always go
+    to the primary session supplied by the caller. To give callers
+    read-your-own-writes, keys written within the staleness window are
+    read from the primary, and a replica miss shortly after any write is
+    rechecked on the primary because the replica may simply be behind.
+    """
+
+    def __init__(
+        self,
+        replica_urls: Sequence[str],
+        staleness_seconds: Optional[float] = None,
+        health_check_seconds: Optional[float] = None
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            replica_urls: Replica database URLs
+            staleness_seconds: Expected maximum replica lag. If None, uses config value.
+            health_check_seconds: Health check interval. If None, uses config value.
+        """
+        if not replica_urls:
+            raise ValueError("ReadReplicaRouter requires at least one replica URL")
+
+        self.staleness_seconds = (
+            settings.replica_staleness_seconds if staleness_seconds is None else staleness_seconds
+        )
+        self.health_check_seconds = health_check_seconds or settings.replica_health_check_seconds
+
+        self.engines = [
+            create_async_engine(to_async_url(url), echo=settings.debug, future=True)
+            for url in replica_urls
+        ]
+        self._session_factories = [
+            async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+            for engine in self.engines
+        ]
+        self._round_robin = itertools.count()
+        self._unhealthy_until: Dict[int, float] = {}
+        self._recent_writes: Dict[str, float] = {}
+        self._last_write_at = float("-inf")
+        self._health_task: Optional[asyncio.Task] = None
+
+        logger.info("ReadReplicaRouter initialized", replica_count=len(self.engines))
+
+    def record_write(self, key: Optional[str] = None) -> None:
+        """
+        Note a committed write on the primary.
+
+        Args:
+            key: Lookup key that was written (e.g. an input_hash)
+        """
+        now = time.monotonic()
+        self._last_write_at = now
+        if key is not None:
+            self._recent_writes[key] = now
+            if len(self._recent_writes) > 10_000:
+                self._forget_old_writes(now)
+
+    def _forget_old_writes(self, now: float) -> None:
+        """Drop write markers older than the staleness window."""
+        cutoff = now - self.staleness_seconds
+        self._recent_writes = {k: t for k, t in self._recent_writes.items() if t >= cutoff}
+
+    def _written_recently(self, key: Optional[str]) -> bool:
+        """Check whether a key was written within the staleness window."""
+        if key is None:
+            return False
+        written_at = self._recent_writes.get(key)
+        return written_at is not None and time.monotonic() - written_at < self.staleness_seconds
+
+    def _pick_replica(self) -> Optional[int]:
+        """Pick the next healthy replica, round-robin."""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            index = next(self._round_robin) % len(self.engines)
+            if self._unhealthy_until.get(index, 0.0) <= now:
+                return index
+        return None
+
+    def _mark_unhealthy(self, index: int, error: Exception) -> None:
+        """Take a replica out of rotation until the next health check."""
+        self._unhealthy_until[index] = time.monotonic() + self.health_check_seconds
+        logger.warning("Replica marked unhealthy", replica=index, error=str(error))
+
+    @property
+    def healthy_replicas(self) -> int:
+        """Number of replicas currently in rotation."""
+        now = time.monotonic()
+        return sum(1 for i in range(len(self.engines)) if self._unhealthy_until.get(i, 0.0) <= now)
+
+    async def read(
+        self,
+        primary: AsyncSession,
+        query: Callable[[AsyncSession], Awaitable[Optional[T]]],
+        key: Optional[str] = None
+    ) -> Optional[T]:
+        """
+        Run a read-only query on a replica, falling back to the primary.
+
+        Args:
+            primary: Session on the primary database
+            query: Coroutine function running the read against a session
+            key: Lookup key, used for read-your-own-writes
+
+        Returns:
+            The query result
+        """
+        if self._written_recently(key):
+            return await query(primary)
+
+        index = self._pick_replica()
+        if index is None:
+            return await query(primary)
+
+        try:
+            async with self._session_factories[index]() as replica:
+                result = await query(replica)
+        except (OperationalError, DBAPIError, OSError) as e:
+            self._mark_unhealthy(index, e)
+            return await query(primary)
+
+        if result is None and time.monotonic() - self._last_write_at < self.staleness_seconds:
+            # The replica may not have caught up with a recent write
+            return await query(primary)
+
+        return result
+
+    async def check_health(self) -> int:
+        """
+        Probe every replica and update the rotation.
+
+        Returns:
+            Number of healthy replicas
+        """
+        for index, engine in enumerate(self.engines):
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            except (OperationalError, DBAPIError, OSError) as e:
+                self._mark_unhealthy(index, e)
+            else:
+                self._unhealthy_until.pop(index, None)
+
+        self._forget_old_writes(time.monotonic())
+        return self.healthy_replicas
+
+    async def _health_loop(self) -> None:
+        """Periodically probe replicas."""
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_check_seconds)
+
+    def start_health_checks(self) -> None:
+        """Start the background health check task."""
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def dispose(self) -> None:
+        """Stop health checks and close replica connection pools."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for engine in self.engines:
+            await engine.dispose()
+
+
+# Replica routing for lookups, only when replicas are configured
+read_router: Optional[ReadReplicaRouter] = (
+    ReadReplicaRouter(settings.read_replica_urls) if settings.read_replica_urls else None
+)
+
+
+async def get_db() -> AsyncGenerator[LazySession, None]:
     """
     Dependency for FastAPI routes to get database session.
 
+    The session is opened on first use. Routes may call
+    ``await db.release()`` as soon as their last statement has run;
+    otherwise it is released when the request finishes. Connection
+    checkouts per request are recorded in the ``db.checkouts_per_request``
+    summary.
+
     Yields:
-        AsyncSession: Database session
+        LazySession: Lazily opened database session
     """
-    async with AsyncSessionLocal() as session:
-        try:
-            yield session
-            await session.commit()
-        except Exception:
-            await session.rollback()
-            raise
-        finally:
-            await session.close()
+    counter = [0]
+    _checkouts.set(counter)
+    session = LazySession()
+    try:
+        yield session
+        await session.release()
+    except Exception:
+        await session.discard()
+        raise
+    finally:
+        _checkouts.set(None)
+        metrics.observe("db.checkouts_per_request", counter[0])
+
+
+async def check_database() -> bool:
+    """
+    Check that the primary database accepts connections.
+
+    Used for readiness: a worker only takes traffic once this passes.
+
+    Returns:
+        True if a trivial query succeeded
+    """
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except (OperationalError, DBAPIError, OSError) as e:
+        logger.warning("Database not reachable", error=str(e))
+        return False
+    return True
+
+
+# Columns added to existing tables after their first release:
+# (table, column, DDL type and default for ALTER TABLE ... ADD COLUMN)
+_ADDED_COLUMNS = [
+    ("uic_records", "hash_key_version", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def create_schema(sync_conn: Any) -> List[str]:
+    """
+    Create missing tables and add columns missing from older databases.
+
+    create_all never alters an existing table, and every prebuilt
+    statement names the newer columns, so a database created by an
+    older release is upgraded here before the app serves from it.
+
+    Args:
+        sync_conn: Synchronous connection (run via ``conn.run_sync``)
+
+    Returns:
+        "table.column" for every column added
+    """
+    Base.metadata.create_all(sync_conn)
+    inspector = inspect(sync_conn)
+    added = []
+    for table, column, ddl in _ADDED_COLUMNS:
+        if column not in {existing["name"] for existing in inspector.get_columns(table)}:
+            sync_conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            added.append(f"{table}.{column}")
+    if added:
+        logger.info("Database schema upgraded", added_columns=added)
+    return added
 
 
 async def init_db() -> None:
     """Initialize database tables."""
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_schema)
 
 
 def init_db_sync() -> None:
     """Initialize database tables synchronously (for scripts)."""
-    Base.metadata.create_all(bind=sync_engine)
+    with sync_engine.begin() as conn:
+        create_schema(conn)
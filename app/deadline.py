@@ -0,0 +1,87 @@
+"""
+Per-request response deadlines.
+
+Twilio abandons a webhook call after 15 seconds, and the user then gets
+no reply at all. Each webhook request gets a Deadline budget that is
+passed down to the services, so that:
+1. Optional work (QR rendering, analytics counters, the returning-user
+   lookup) is skipped or deferred once less than a reserve remains
+2. The request itself is cut off at the deadline and answered with a
+   "please resend" reply instead of timing out silently
+
+Degradations and misses are counted in metrics:
+``deadline.degraded``, ``deadline.degraded.<step>`` and ``deadline.missed``.
+"""
+import time
+from typing import Callable, List, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import metrics
+
+logger = get_logger(__name__)
+
+
+class Deadline:
+    """Time budget of one request."""
+
+    def __init__(
+        self,
+        budget_seconds: Optional[float] = None,
+        reserve_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Start the budget now.
+
+        Args:
+            budget_seconds: Time until the reply must be sent. If None, uses config value.
+            reserve_seconds: Optional work is skipped when less than this
+                remains. If None, uses config value.
+            clock: Monotonic clock (tests)
+        """
+        self.budget_seconds = budget_seconds or settings.webhook_deadline_seconds
+        self.reserve_seconds = (
+            settings.deadline_reserve_seconds if reserve_seconds is None else reserve_seconds
+        )
+        self._clock = clock
+        self._expires_at = clock() + self.budget_seconds
+        self.degraded: List[str] = []
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self._expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        """Whether the budget is used up."""
+        return self._clock() >= self._expires_at
+
+    def allows(self, step: str) -> bool:
+        """
+        Check whether an optional step may run.
+
+        A refused step is recorded as a degradation.
+
+        Args:
+            step: Name of the optional step, used in metrics (e.g. "qr_code")
+
+        Returns:
+            True if more than the reserve remains
+        """
+        remaining = self.remaining()
+        if remaining > self.reserve_seconds:
+            return True
+
+        self.degraded.append(step)
+        metrics.increment("deadline.degraded")
+        metrics.increment(f"deadline.degraded.{step}")
+        logger.warning("Skipping optional work, deadline close", step=step, remaining_seconds=round(remaining, 3))
+        return False
+
+    def finish(self) -> None:
+        """Record the headroom left when the reply is sent, and a miss if there was none."""
+        remaining = self._expires_at - self._clock()
+        metrics.observe("deadline.headroom_seconds", max(0.0, remaining))
+        if remaining <= 0:
+            metrics.increment("deadline.missed")
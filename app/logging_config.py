@@ -1,62 +1,249 @@
 """
 Structured logging configuration using structlog.
 Provides consistent, queryable logs for production use.
+
+Two pipelines are available:
+
+- Synchronous (default): events are rendered and written to stdout on
+  the calling thread, i.e. on the event loop.
+- Asynchronous (LOG_ASYNC=true): the calling thread only runs the cheap
+  dict processors and enqueues the event; rendering and the stdout write
+  happen on a QueueListener thread, so a slow disk or container log
+  driver no longer stalls request handling.
+
+Both pipelines support per-event sampling and rate limits for
+high-volume info events, and render JSON with orjson when installed.
 """
 import logging
+import logging.handlers
+import queue
+import random
 import sys
-from typing import Any
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
 
 import structlog
 from structlog.types import EventDict, Processor
 
 from app.config import settings
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+# Computed once: these never change during the life of the process
+STATIC_CONTEXT: Dict[str, str] = {
+    "app": settings.app_name,
+    "version": settings.app_version,
+    "environment": settings.environment,
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
 
 def add_app_context(logger: Any, method_name: str, event_dict: EventDict) -> EventDict:
     """Add application context to all log entries."""
-    event_dict["app"] = settings.app_name
-    event_dict["version"] = settings.app_version
-    event_dict["environment"] = settings.environment
+    event_dict.update(STATIC_CONTEXT)
+    return event_dict
+
+
+class EventSampler:
+    """
+    Processor that thins out high-volume debug/info events.
+
+    Events are matched by their message. Warnings and errors are never
+    dropped.
+    """
+
+    _SAMPLED_LEVELS = frozenset({"debug", "info"})
+
+    def __init__(
+        self,
+        sample_rates: Optional[Mapping[str, float]] = None,
+        rate_limits: Optional[Mapping[str, float]] = None
+    ):
+        """
+        Initialize sampler.
+
+        Args:
+            sample_rates: Event message -> fraction of events kept (0..1)
+            rate_limits: Event message -> maximum events per second
+        """
+        self.sample_rates = dict(sample_rates or {})
+        self.rate_limits = dict(rate_limits or {})
+        # Per-event token buckets: message -> [tokens, last refill time]
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.dropped: Dict[str, int] = {}
+
+    def _drop(self, event: str) -> None:
+        self.dropped[event] = self.dropped.get(event, 0) + 1
+        raise structlog.DropEvent
+
+    def _take_token(self, event: str, per_second: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(event)
+            if bucket is None:
+                bucket = self._buckets[event] = [per_second, now]
+            tokens = min(per_second, bucket[0] + (now - bucket[1]) * per_second)
+            bucket[1] = now
+            if tokens < 1.0:
+                bucket[0] = tokens
+                return False
+            bucket[0] = tokens - 1.0
+            return True
+
+    def __call__(self, logger: Any, method_name: str, event_dict: EventDict) -> EventDict:
+        if method_name not in self._SAMPLED_LEVELS:
+            return event_dict
+
+        event = event_dict.get("event")
+        rate = self.sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            self._drop(event)
+
+        per_second = self.rate_limits.get(event)
+        if per_second is not None and not self._take_token(event, per_second):
+            self._drop(event)
+
+        return event_dict
+
+
+def _capture_exc_info(logger: Any, method_name: str, event_dict: EventDict) -> EventDict:
+    """
+    Resolve ``exc_info=True`` on the calling thread.
+
+    The listener thread renders the event later, when ``sys.exc_info()``
+    no longer refers to the exception being logged.
+    """
+    if event_dict.get("exc_info") is True:
+        event_dict["exc_info"] = sys.exc_info()
     return event_dict
 
 
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller.
+
+    Records are enqueued unformatted (rendering happens on the listener
+    thread) and dropped, not waited on, when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not isinstance(record.msg, dict):
+            # Foreign (stdlib) records: merge args now, while they are current
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _orjson_dumps(obj: Any, **kwargs: Any) -> str:
+    """Serialize an event dict with orjson."""
+    return orjson.dumps(obj, default=kwargs.get("default", str)).decode("utf-8")
+
+
+def _renderer(use_json: bool) -> Processor:
+    """Final processor turning an event dict into a line of text."""
+    if not use_json:
+        return structlog.dev.ConsoleRenderer(colors=True)
+    if orjson is not None:
+        return structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+    return structlog.processors.JSONRenderer()
+
+
+sampler = EventSampler()
+
+
 def configure_logging() -> None:
     """Configure structured logging for the application."""
+    global _listener
 
     # Determine if we should use JSON formatting
     use_json = settings.log_json or settings.is_production
 
+    sampler.sample_rates = dict(settings.log_sample_rates)
+    sampler.rate_limits = dict(settings.log_rate_limits)
+
     # Shared processors for all loggers
     shared_processors: list[Processor] = [
+        structlog.stdlib.filter_by_level,
         structlog.contextvars.merge_contextvars,
         structlog.stdlib.add_logger_name,
         structlog.stdlib.add_log_level,
+        sampler,
         structlog.stdlib.PositionalArgumentsFormatter(),
         structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
         add_app_context,
     ]
 
     if use_json:
-        # JSON formatting for production
+        exception_processor: Processor = structlog.processors.format_exc_info
+    else:
+        exception_processor = structlog.processors.ExceptionPrettyPrinter()
+
+    if settings.log_async:
+        # Hand the event dict to the listener thread; it renders and writes
         structlog.configure(
             processors=[
                 *shared_processors,
-                structlog.processors.format_exc_info,
-                structlog.processors.JSONRenderer()
+                _capture_exc_info,
+                structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
             ],
             wrapper_class=structlog.stdlib.BoundLogger,
             context_class=dict,
             logger_factory=structlog.stdlib.LoggerFactory(),
             cache_logger_on_first_use=True,
         )
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(structlog.stdlib.ProcessorFormatter(
+            processors=[
+                structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+                structlog.processors.StackInfoRenderer(),
+                exception_processor,
+                _renderer(use_json),
+            ],
+            foreign_pre_chain=[
+                structlog.stdlib.add_logger_name,
+                structlog.stdlib.add_log_level,
+                structlog.processors.TimeStamper(fmt="iso"),
+                add_app_context,
+            ],
+        ))
+
+        queue_handler = _NonBlockingQueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+
+        if _listener is not None:
+            _listener.stop()
+        _listener = logging.handlers.QueueListener(
+            queue_handler.queue, stream_handler, respect_handler_level=False
+        )
+        _listener.start()
+
+        root = logging.getLogger()
+        root.handlers = [queue_handler]
+        root.setLevel(getattr(logging, settings.log_level))
     else:
-        # Console formatting for development
         structlog.configure(
             processors=[
                 *shared_processors,
-                structlog.processors.ExceptionPrettyPrinter(),
-                structlog.dev.ConsoleRenderer(colors=True)
+                structlog.processors.StackInfoRenderer(),
+                exception_processor,
+                _renderer(use_json),
             ],
             wrapper_class=structlog.stdlib.BoundLogger,
             context_class=dict,
@@ -64,18 +251,45 @@ def configure_logging() -> None:
             cache_logger_on_first_use=True,
         )
 
-    # Configure standard library logging
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=getattr(logging, settings.log_level),
-    )
+        # Configure standard library logging
+        logging.basicConfig(
+            format="%(message)s",
+            stream=sys.stdout,
+            level=getattr(logging, settings.log_level),
+        )
 
     # Reduce noise from verbose libraries
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
+def shutdown_logging() -> None:
+    """Flush and stop the background log writer, if running."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """
+    Get counts of log events dropped by sampling or back-pressure.
+
+    Returns:
+        Dictionary with sampled-out counts per event and queue drops
+    """
+    queue_drops = sum(
+        handler.dropped
+        for handler in logging.getLogger().handlers
+        if isinstance(handler, _NonBlockingQueueHandler)
+    )
+    return {
+        "sampled_out": dict(sampler.dropped),
+        "queue_full_drops": queue_drops,
+    }
+
+
 def get_logger(name: str) -> structlog.stdlib.BoundLogger:
     """
     Get a configured logger instance.
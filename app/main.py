@@ -7,12 +7,25 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.api.webhook import router as webhook_router
+from app.api.admin import router as admin_router
+from app.api.partner import router as partner_router
+from app.api.webhook import archive, journal, router as webhook_router, uic_service
 from app.config import settings
-from app.database import init_db
-from app.logging_config import configure_logging, get_logger
+from app.database import AsyncSessionLocal, check_database, init_db, read_router
+from app.logging_config import (
+    configure_logging,
+    get_logger,
+    get_logging_stats,
+    shutdown_logging,
+)
+from app.metrics import metrics
+from app.middleware import TwilioSignatureMiddleware
+from app.services.city_codes import get_city_index
+from app.services.shared_cache import shared_cache_stats
+from app.sharding import shard_router
 
 # Configure logging first
 configure_logging()
@@ -34,14 +47,47 @@ async def lifespan(app: FastAPI):
         environment=settings.environment
     )
 
-    # Initialize database
-    await init_db()
-    logger.info("Database initialized")
+    # Initialize database (done once by the supervisor when running workers)
+    if settings.init_schema_on_startup:
+        await init_db()
+        logger.info("Database initialized")
+
+        if shard_router is not None:
+            await shard_router.init_shards()
+            logger.info("Registry shards initialized", shard_count=len(shard_router.shard_ids))
+
+        if archive is not None:
+            await archive.init()
+
+    if archive is not None:
+        logger.info("Cold archive enabled", path=archive.path)
+
+    # Load issued codes so new UICs are allocated without database retries,
+    # and skip lookup hashes for key versions no record uses
+    async with AsyncSessionLocal() as db:
+        await uic_service.load_occupancy(db)
+        await uic_service.load_key_versions(db)
+
+    # Build the city lookup before the first message needs it
+    get_city_index()
+
+    if read_router is not None:
+        read_router.start_health_checks()
+        logger.info("Read replica routing enabled", replica_count=len(read_router.engines))
 
     yield
 
     # Shutdown
     logger.info("Shutting down application")
+    if shard_router is not None:
+        await shard_router.dispose()
+    if read_router is not None:
+        await read_router.dispose()
+    if journal is not None:
+        journal.close()
+    if archive is not None:
+        await archive.dispose()
+    shutdown_logging()
 
 
 # Create FastAPI app
@@ -64,8 +110,21 @@ if settings.debug:
         allow_headers=["*"],
     )
 
+# Verify Twilio signatures before form parsing and database sessions
+if settings.twilio_validate_signature:
+    app.add_middleware(
+        TwilioSignatureMiddleware,
+        auth_token=settings.twilio_auth_token,
+        paths=[settings.webhook_path],
+        public_base_url=settings.public_base_url,
+    )
+else:
+    logger.warning("Twilio signature validation is disabled")
+
 # Include routers
 app.include_router(webhook_router)
+app.include_router(admin_router)
+app.include_router(partner_router)
 
 # Mount static files for QR codes (if feature enabled)
 if settings.enable_qr_code:
@@ -98,14 +157,42 @@ async def health():
     }
 
 
-def run() -> None:
-    """Start the application with uvicorn."""
+@app.get("/ready")
+async def ready():
+    """Readiness check: only take traffic when the database is reachable."""
+    if not await check_database():
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Process-local counters, including shed and dropped-log counts, and shared cache segments."""
+    snapshot = metrics.snapshot()
+    snapshot["logging"] = get_logging_stats()
+    snapshot["shared_cache"] = shared_cache_stats()
+    return snapshot
+
+
+def run(host: str = "0.0.0.0", port: int = 8000) -> None:
+    """
+    Start the application.
+
+    Runs a single uvicorn process, or the multi-process supervisor when
+    WORKERS > 1.
+    """
+    if settings.workers > 1:
+        from app.supervisor import Supervisor
+
+        Supervisor(host=host, port=port).run()
+        return
+
     import uvicorn
 
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
+        host=host,
+        port=port,
         reload=settings.debug,
         log_level=settings.log_level.lower(),
     )
@@ -0,0 +1,66 @@
+"""
+In-process metrics registry.
+
+Lightweight counters, gauges and summaries exposed as JSON on /metrics.
+Each worker process keeps its own registry.
+"""
+import threading
+from typing import Any, Dict
+
+
+class Metrics:
+    """Thread-safe registry of named counters, gauges and summaries."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Add to a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one observation in a count/sum/max summary."""
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {"count": 1, "sum": value, "max": value}
+            else:
+                summary["count"] += 1
+                summary["sum"] += value
+                if value > summary["max"]:
+                    summary["max"] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a copy of every metric.
+
+        Returns:
+            Dictionary with counters, gauges and summaries
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {name: dict(s) for name, s in self._summaries.items()},
+            }
+
+    def reset(self) -> None:
+        """Clear every metric."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+# Process-wide registry
+metrics = Metrics()
@@ -0,0 +1,199 @@
+"""
+ASGI middleware.
+
+TwilioSignatureMiddleware rejects webhook requests whose
+X-Twilio-Signature does not match, before FastAPI parses the form or
+opens a database session for the endpoint.
+"""
+import base64
+import hashlib
+import hmac
+from typing import Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+from app.logging_config import get_logger
+from app.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Twilio webhook payloads are a few hundred bytes; anything far larger is not Twilio
+MAX_BODY_BYTES = 64 * 1024
+
+
+class TwilioSignatureValidator:
+    """
+    Computes and checks Twilio request signatures.
+
+    Signature = base64(HMAC-SHA1(auth_token, url + concatenated sorted
+    POST parameters)). The HMAC key schedule is computed once and copied
+    for every request. Matches Twilio's RequestValidator: repeated
+    parameters are deduplicated, and the URL is checked both with and
+    without an explicit default port, since proxies add or strip it.
+    """
+
+    def __init__(self, auth_token: str):
+        """
+        Initialize validator.
+
+        Args:
+            auth_token: Twilio auth token
+        """
+        self._mac = hmac.new(auth_token.encode("utf-8"), digestmod=hashlib.sha1)
+
+    def compute(self, url: str, params: Iterable[Tuple[str, str]]) -> str:
+        """
+        Compute the signature Twilio would send.
+
+        Args:
+            url: Full public URL of the request, including query string
+            params: Decoded form parameters
+
+        Returns:
+            Base64-encoded signature
+        """
+        mac = self._mac.copy()
+        mac.update(url.encode("utf-8"))
+        for key, value in sorted(set(params)):
+            mac.update(key.encode("utf-8"))
+            mac.update(value.encode("utf-8"))
+        return base64.b64encode(mac.digest()).decode("ascii")
+
+    def validate(self, url: str, params: Iterable[Tuple[str, str]], signature: str) -> bool:
+        """
+        Check a signature in constant time.
+
+        Args:
+            url: Full public URL of the request
+            params: Decoded form parameters
+            signature: Value of the X-Twilio-Signature header
+
+        Returns:
+            True if the signature matches
+        """
+        params = list(params)
+        return any(
+            hmac.compare_digest(self.compute(variant, params), signature)
+            for variant in _port_variants(url)
+        )
+
+
+def _port_variants(url: str) -> Tuple[str, str]:
+    """Return the URL with its default port made explicit, and without any port."""
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    if parts.username is not None:
+        userinfo = parts.username + (f":{parts.password}" if parts.password is not None else "")
+        host = f"{userinfo}@{host}"
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    with_port = urlunsplit(parts._replace(netloc=f"{host}:{port}"))
+    without_port = urlunsplit(parts._replace(netloc=host))
+    return with_port, without_port
+
+
+class TwilioSignatureMiddleware:
+    """
+    Pure ASGI middleware guarding the Twilio webhook paths.
+
+    The body is read once, validated, and replayed to the application.
+    Unsigned or forged requests get a 403 without reaching FastAPI.
+    """
+
+    def __init__(
+        self,
+        app,
+        auth_token: str,
+        paths: Iterable[str],
+        public_base_url: Optional[str] = None
+    ):
+        """
+        Initialize middleware.
+
+        Args:
+            app: Downstream ASGI application
+            auth_token: Twilio auth token
+            paths: Request paths that must be signed
+            public_base_url: URL Twilio is configured to call, e.g.
+                https://bot.example.org. When unset the URL is rebuilt from
+                X-Forwarded-Proto/Host or the request itself.
+        """
+        self.app = app
+        self.validator = TwilioSignatureValidator(auth_token)
+        self.paths = frozenset(paths)
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+
+    def _public_url(self, scope: dict, headers: dict) -> str:
+        path = scope.get("root_path", "") + scope["path"]
+        query = scope.get("query_string", b"").decode("latin-1")
+        if query:
+            path = f"{path}?{query}"
+
+        if self.public_base_url:
+            return self.public_base_url + path
+
+        scheme = headers.get(b"x-forwarded-proto", scope.get("scheme", "http").encode()).decode("latin-1")
+        host = headers.get(b"x-forwarded-host") or headers.get(b"host", b"")
+        return f"{scheme.split(',')[0].strip()}://{host.decode('latin-1')}{path}"
+
+    async def _reject(self, send, status: int) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain")],
+        })
+        await send({"type": "http.response.body", "body": b"Forbidden" if status == 403 else b""})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        signature = headers.get(b"x-twilio-signature")
+        if signature is None:
+            metrics.increment("twilio_signature.missing")
+            logger.warning("Unsigned webhook request rejected", path=scope["path"])
+            await self._reject(send, 403)
+            return
+
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                await self._reject(send, 413)
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        content_type = headers.get(b"content-type", b"")
+        params = (
+            parse_qsl(body.decode("utf-8"), keep_blank_values=True)
+            if content_type.startswith(b"application/x-www-form-urlencoded")
+            else []
+        )
+
+        url = self._public_url(scope, headers)
+        if not self.validator.validate(url, params, signature.decode("latin-1")):
+            metrics.increment("twilio_signature.invalid")
+            logger.warning("Invalid Twilio signature", path=scope["path"], url=url)
+            await self._reject(send, 403)
+            return
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
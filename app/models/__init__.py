@@ -1,4 +1,5 @@
 """Database models package."""
 from app.models.uic import UICRecord, ConversationSession
+from app.models.analytics import RegistrationRollup
 
-__all__ = ["UICRecord", "ConversationSession"]
+__all__ = ["UICRecord", "ConversationSession", "RegistrationRollup"]
@@ -0,0 +1,57 @@
+"""
+Database models for registration analytics.
+Pre-aggregated counters read by dashboards instead of uic_records.
+"""
+from datetime import date
+
+from sqlalchemy import Date, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class RegistrationRollup(Base):
+    """
+    Daily registration counters per city and gender code.
+
+    One row per (day, city code, gender code), incremented in the same
+    transaction as the registration it counts, so dashboard queries read
+    a few hundred rows per month whatever the registry size.
+    """
+    __tablename__ = "registration_rollups"
+
+    day: Mapped[date] = mapped_column(
+        Date,
+        primary_key=True,
+        comment="UTC day of the requests"
+    )
+    city_code: Mapped[str] = mapped_column(
+        String(10),
+        primary_key=True,
+        comment="Normalized city code"
+    )
+    gender_code: Mapped[str] = mapped_column(
+        String(1),
+        primary_key=True,
+        comment="Gender code"
+    )
+
+    registrations: Mapped[int] = mapped_column(
+        default=0,
+        server_default="0",
+        nullable=False,
+        comment="New UICs issued"
+    )
+    returning_requests: Mapped[int] = mapped_column(
+        default=0,
+        server_default="0",
+        nullable=False,
+        comment="Requests that returned an existing UIC"
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<RegistrationRollup(day={self.day}, city='{self.city_code}', "
+            f"gender='{self.gender_code}', new={self.registrations}, "
+            f"returning={self.returning_requests})>"
+        )
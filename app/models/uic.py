@@ -73,7 +73,13 @@ class UICRecord(Base):
         String(64),
         index=True,
         nullable=False,
-        comment="SHA-256 hash of normalized inputs"
+        comment="HMAC-SHA256 of normalized inputs (unkeyed SHA-256 for key version 0)"
+    )
+    hash_key_version: Mapped[int] = mapped_column(
+        default=0,
+        server_default="0",
+        nullable=False,
+        comment="Salt version input_hash was computed with (0 = unkeyed)"
     )
 
     # Timestamps
@@ -183,10 +189,10 @@ class ConversationSession(Base):
         comment="When the session expires"
     )
 
-    # Language preference (for future French/Lingala support)
+    # Reply language (fr, en, ln or sw; see app/data/messages.json)
     language: Mapped[str] = mapped_column(
         String(10),
-        default="en",
+        default="fr",
         nullable=False,
         comment="User's preferred language"
     )
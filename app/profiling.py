@@ -0,0 +1,360 @@
+"""
+Profiling hooks for live workers.
+
+Two tools, both switched on at runtime through /admin (no restart):
+
+1. SamplingProfiler: samples the stacks of every thread at a fixed
+   interval for N seconds and returns them in the collapsed format read
+   by flamegraph.pl and speedscope ("frame;frame;frame count" lines).
+   Sampling runs in its own thread and costs nothing when not running.
+
+2. RequestTracer: records timed spans per webhook request (flow
+   processing, UIC creation, QR rendering and every SQL statement) and
+   keeps the slowest requests in a bounded buffer. When tracing is off a
+   span costs one context variable lookup.
+
+Like metrics, both are per worker process.
+"""
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import metrics
+
+logger = get_logger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_PROJECT_ROOT = str(Path(__file__).resolve().parent.parent) + "/"
+
+
+class ProfilerBusy(RuntimeError):
+    """A profile is already being taken in this process."""
+
+
+def _frame_label(code: Any) -> str:
+    """Frame name without spaces: path:qualified_name."""
+    filename = code.co_filename
+    if filename.startswith(_PROJECT_ROOT):
+        filename = filename[len(_PROJECT_ROOT):]
+    else:
+        # Library frames: keep the last two path parts (package/module.py)
+        filename = "/".join(filename.rsplit("/", 2)[-2:])
+    return f"{filename}:{getattr(code, 'co_qualname', code.co_name)}".replace(" ", "_")
+
+
+class SamplingProfiler:
+    """On-demand stack sampler producing collapsed stacks."""
+
+    def __init__(self, max_seconds: Optional[float] = None):
+        """
+        Initialize the profiler.
+
+        Args:
+            max_seconds: Longest profile accepted. If None, uses config value.
+        """
+        self.max_seconds = max_seconds or settings.profile_max_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """Whether a profile is being taken."""
+        return self._lock.locked()
+
+    def sample(self, seconds: float, interval_seconds: float = 0.005) -> str:
+        """
+        Sample all threads (blocking the calling thread).
+
+        Args:
+            seconds: Sampling duration, capped at max_seconds
+            interval_seconds: Time between samples
+
+        Returns:
+            Collapsed stacks, one "root;...;leaf count" line per distinct stack
+
+        Raises:
+            ProfilerBusy: If another profile is running
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            return self._sample(min(seconds, self.max_seconds), interval_seconds)
+        finally:
+            self._lock.release()
+
+    async def profile(self, seconds: float, interval_seconds: float = 0.005) -> str:
+        """
+        Sample all threads from a helper thread while the event loop keeps serving.
+
+        Args:
+            seconds: Sampling duration, capped at max_seconds
+            interval_seconds: Time between samples
+
+        Returns:
+            Collapsed stacks
+
+        Raises:
+            ProfilerBusy: If another profile is running
+        """
+        return await asyncio.to_thread(self.sample, seconds, interval_seconds)
+
+    def _sample(self, seconds: float, interval_seconds: float) -> str:
+        own_thread = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks: Counter = Counter()
+        labels: Dict[Any, str] = {}
+        samples = 0
+
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    parts.append(label)
+                    frame = frame.f_back
+                parts.append(names.get(thread_id, f"thread-{thread_id}").replace(" ", "_"))
+                stacks[";".join(reversed(parts))] += 1
+            samples += 1
+            time.sleep(interval_seconds)
+
+        metrics.increment("profiler.runs")
+        logger.info(
+            "Profile taken",
+            seconds=round(time.perf_counter() - started, 2),
+            samples=samples,
+            distinct_stacks=len(stacks)
+        )
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+@dataclass(slots=True)
+class Span:
+    """One timed operation inside a request."""
+
+    name: str
+    start_ms: float
+    duration_ms: float = 0.0
+    detail: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {"name": self.name, "start_ms": round(self.start_ms, 3), "duration_ms": round(self.duration_ms, 3)}
+        if self.detail is not None:
+            data["detail"] = self.detail
+        return data
+
+
+@dataclass(slots=True)
+class RequestTrace:
+    """Spans recorded for one request."""
+
+    name: str
+    started_at: float
+    _origin: float
+    duration_ms: float = 0.0
+    spans: List[Span] = field(default_factory=list)
+    _token: Any = None
+
+    def offset_ms(self) -> float:
+        return (time.perf_counter() - self._origin) * 1000.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "spans": [span.as_dict() for span in self.spans],
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "request_trace", default=None
+)
+
+
+class RequestTracer:
+    """Opt-in per-request spans with a buffer of the slowest requests."""
+
+    # Longest SQL text kept in a span
+    STATEMENT_CHARS = 200
+
+    def __init__(self, enabled: Optional[bool] = None, keep: Optional[int] = None):
+        """
+        Initialize the tracer.
+
+        Args:
+            enabled: Trace requests from startup. If None, uses config value.
+            keep: Slowest requests kept. If None, uses config value.
+        """
+        self.enabled = settings.request_tracing_enabled if enabled is None else enabled
+        self.keep = keep or settings.trace_slowest_count
+        self._slowest: List[tuple] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def set_enabled(self, enabled: bool) -> None:
+        """Turn tracing on or off for requests starting from now."""
+        self.enabled = enabled
+        logger.info("Request tracing " + ("enabled" if enabled else "disabled"))
+
+    def start(self, name: str) -> Optional[RequestTrace]:
+        """
+        Start tracing the current request, if tracing is on.
+
+        Args:
+            name: Request name (e.g. "webhook")
+
+        Returns:
+            The trace, to pass to finish(), or None when tracing is off
+        """
+        if not self.enabled:
+            return None
+        request_trace = RequestTrace(name=name, started_at=time.time(), _origin=time.perf_counter())
+        request_trace._token = _current_trace.set(request_trace)
+        return request_trace
+
+    def finish(self, request_trace: Optional[RequestTrace]) -> None:
+        """
+        Stop tracing the current request and keep it if it is among the slowest.
+
+        Args:
+            request_trace: Value returned by start()
+        """
+        if request_trace is None:
+            return
+        _current_trace.reset(request_trace._token)
+        request_trace.duration_ms = request_trace.offset_ms()
+        self._keep(request_trace)
+
+    @contextmanager
+    def trace(self, name: str) -> Iterator[Optional[RequestTrace]]:
+        """
+        Trace a block as one request (see start()).
+
+        Args:
+            name: Request name
+
+        Yields:
+            The trace, or None when tracing is off
+        """
+        request_trace = self.start(name)
+        try:
+            yield request_trace
+        finally:
+            self.finish(request_trace)
+
+    def _keep(self, request_trace: RequestTrace) -> None:
+        entry = (request_trace.duration_ms, next(self._sequence), request_trace)
+        with self._lock:
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+        metrics.increment("tracing.requests")
+
+    def slowest(self) -> List[RequestTrace]:
+        """Slowest traced requests, slowest first."""
+        with self._lock:
+            return [entry[2] for entry in sorted(self._slowest, reverse=True)]
+
+    def clear(self) -> None:
+        """Forget the buffered traces."""
+        with self._lock:
+            self._slowest.clear()
+
+
+@contextmanager
+def span(name: str, detail: Optional[str] = None) -> Iterator[None]:
+    """
+    Time a block as a span of the current request's trace (no-op when not tracing).
+
+    Args:
+        name: Span name
+        detail: Extra text, e.g. the SQL statement
+    """
+    request_trace = _current_trace.get()
+    if request_trace is None:
+        yield
+        return
+
+    current = Span(name=name, start_ms=request_trace.offset_ms(), detail=detail)
+    request_trace.spans.append(current)
+    try:
+        yield
+    finally:
+        current.duration_ms = request_trace.offset_ms() - current.start_ms
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """
+    Decorator recording each call of a function or coroutine function as a span.
+
+    Args:
+        name: Span name
+    """
+    def decorate(function: F) -> F:
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if _current_trace.get() is None:
+                    return await function(*args, **kwargs)
+                with span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_span(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    request_trace = _current_trace.get()
+    if request_trace is not None:
+        current = Span(
+            name="sql",
+            start_ms=request_trace.offset_ms(),
+            detail=" ".join(statement.split())[:RequestTracer.STATEMENT_CHARS]
+        )
+        request_trace.spans.append(current)
+        conn.info["trace_span"] = (request_trace, current)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement_span(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    started = conn.info.pop("trace_span", None)
+    if started is not None:
+        request_trace, current = started
+        current.duration_ms = request_trace.offset_ms() - current.start_ms
+
+
+# Process-wide instances
+profiler = SamplingProfiler()
+tracer = RequestTracer()
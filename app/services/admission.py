@@ -0,0 +1,234 @@
+"""
+Admission Control for the WhatsApp webhook.
+
+Protects the database from floods before any work is done:
+1. Per-phone token buckets stop one sender from looping messages
+2. A global concurrency limit with a bounded wait queue caps how many
+   messages are processed at once; overflow is shed immediately
+3. Shed requests get a pre-rendered "try again later" reply (the
+   webhook's localized service.busy message)
+
+Per-phone buckets live in memory by default, or in Redis so that every
+worker and host shares the same limits.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import metrics
+
+logger = get_logger(__name__)
+
+
+class RateLimitStore:
+    """Token bucket storage interface."""
+
+    async def take(self, key: str, rate: float, burst: int) -> bool:
+        """
+        Take one token from a bucket.
+
+        Args:
+            key: Bucket identifier (phone number)
+            rate: Refill rate in tokens per second
+            burst: Bucket capacity
+
+        Returns:
+            True if a token was available
+        """
+        raise NotImplementedError
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Process-local token buckets with LRU eviction."""
+
+    def __init__(self, max_keys: int = 100_000):
+        """
+        Initialize store.
+
+        Args:
+            max_keys: Buckets kept before the least recently used are evicted
+        """
+        self.max_keys = max_keys
+        # key -> (tokens, last refill time)
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> bool:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        return allowed
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """
+    Token buckets shared through Redis.
+
+    The refill-and-take step runs as one Lua script, so concurrent
+    workers cannot both spend the last token. Redis errors fail open.
+    """
+
+    _SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return allowed
+    """
+
+    def __init__(self, redis_url: str, key_prefix: str = "uic:ratelimit:"):
+        """
+        Initialize store.
+
+        Args:
+            redis_url: Redis connection URL
+            key_prefix: Prefix for bucket keys
+        """
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(
+                "Redis rate limiting requires redis: pip install 'whatsapp-uic-generator[redis]'"
+            ) from e
+
+        self._client = redis.from_url(redis_url)
+        self._script = self._client.register_script(self._SCRIPT)
+        self.key_prefix = key_prefix
+
+    async def take(self, key: str, rate: float, burst: int) -> bool:
+        try:
+            return bool(await self._script(keys=[self.key_prefix + key], args=[rate, burst]))
+        except Exception as e:
+            logger.warning("Rate limit store unavailable, admitting", error=str(e))
+            return True
+
+
+class AdmissionController:
+    """
+    Decides whether an incoming message is processed or shed.
+
+    Usage:
+        reason = await admission.acquire(phone_number)
+        if reason is not None:
+            return busy_reply
+        try:
+            ...
+        finally:
+            admission.release()
+    """
+
+    def __init__(
+        self,
+        store: Optional[RateLimitStore] = None,
+        per_phone_per_minute: Optional[float] = None,
+        per_phone_burst: Optional[int] = None,
+        max_concurrent: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        queue_timeout_seconds: Optional[float] = None
+    ):
+        """
+        Initialize admission controller.
+
+        Any argument left as None uses its config value.
+
+        Args:
+            store: Token bucket store
+            per_phone_per_minute: Sustained messages per minute per phone
+            per_phone_burst: Messages a phone may send back-to-back
+            max_concurrent: Messages processed at the same time
+            max_queued: Messages allowed to wait for a processing slot
+            queue_timeout_seconds: Longest wait for a slot before shedding
+        """
+        self.store = store or build_rate_limit_store()
+        self.rate = (per_phone_per_minute or settings.rate_limit_per_phone_per_minute) / 60.0
+        self.burst = per_phone_burst or settings.rate_limit_burst
+        self.max_concurrent = max_concurrent or settings.max_concurrent_messages
+        self.max_queued = settings.max_queued_messages if max_queued is None else max_queued
+        self.queue_timeout = queue_timeout_seconds or settings.admission_queue_timeout_seconds
+
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._waiting = 0
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Messages currently being processed."""
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        """Messages currently waiting for a slot."""
+        return self._waiting
+
+    def _shed(self, reason: str, phone_number: str) -> str:
+        metrics.increment(f"admission.shed.{reason}")
+        logger.warning("Message shed", reason=reason, phone_number=phone_number)
+        return reason
+
+    async def acquire(self, phone_number: str) -> Optional[str]:
+        """
+        Try to admit a message.
+
+        Args:
+            phone_number: Sender phone number
+
+        Returns:
+            None if admitted (call :meth:`release` when done), otherwise
+            the shed reason: "rate_limited", "queue_full" or "timeout"
+        """
+        if not await self.store.take(phone_number, self.rate, self.burst):
+            return self._shed("rate_limited", phone_number)
+
+        if self._slots.locked():
+            if self._waiting >= self.max_queued:
+                return self._shed("queue_full", phone_number)
+
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                return self._shed("timeout", phone_number)
+            finally:
+                self._waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self._in_flight += 1
+        metrics.increment("admission.admitted")
+        return None
+
+    def release(self) -> None:
+        """Free the processing slot of an admitted message."""
+        self._in_flight -= 1
+        self._slots.release()
+
+
+def build_rate_limit_store() -> RateLimitStore:
+    """Create the rate limit store selected in settings."""
+    if settings.rate_limit_backend == "redis":
+        if not settings.redis_url:
+            raise ValueError("RATE_LIMIT_BACKEND=redis requires REDIS_URL")
+        return RedisRateLimitStore(settings.redis_url)
+    return InMemoryRateLimitStore()
@@ -0,0 +1,324 @@
+"""
+Registration Analytics.
+
+Dashboards need registrations per day, city and gender, and how many
+requests came from people who already had a UIC. Grouping uic_records
+for that reads the whole registry on every refresh, so counts are kept
+in registration_rollups instead:
+
+1. UICService increments one rollup row per request, with an UPSERT in
+   the transaction that creates or touches the record, so the counters
+   can never disagree with the registry
+2. Reports sum rollup rows, so their cost depends on the number of
+   (day, city, gender) buckets in range, not on the number of records
+3. When a request is short on time (see app.deadline) its count is
+   deferred in memory and written with the next recorded request
+4. backfill() fills registrations for days before rollups existed
+   (returning requests were never recorded per day, so they start at 0)
+
+With a sharded registry every shard counts the requests it served and
+reports add the shards together (rebalancing records leaves the counts
+where they are, which keeps the sums right).
+"""
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.logging_config import get_logger
+from app.models.analytics import RegistrationRollup
+from app.models.uic import UICRecord
+from app.sharding import ShardRouter
+
+logger = get_logger(__name__)
+
+RollupDimension = Literal["day", "city_code", "gender_code"]
+
+ROLLUP_DIMENSIONS: Dict[str, Any] = {
+    "day": RegistrationRollup.day,
+    "city_code": RegistrationRollup.city_code,
+    "gender_code": RegistrationRollup.gender_code,
+}
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+_ROLLUP_KEY = ("day", "city_code", "gender_code")
+
+
+@dataclass(frozen=True, slots=True)
+class RollupBucket:
+    """Counts for one group of a report; dimensions not grouped on are None."""
+
+    day: Optional[date]
+    city_code: Optional[str]
+    gender_code: Optional[str]
+    registrations: int
+    returning_requests: int
+
+    @property
+    def returning_share(self) -> float:
+        """Share of requests that came from people who already had a UIC."""
+        total = self.registrations + self.returning_requests
+        return round(self.returning_requests / total, 4) if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "day": self.day.isoformat() if self.day else None,
+            "city_code": self.city_code,
+            "gender_code": self.gender_code,
+            "registrations": self.registrations,
+            "returning_requests": self.returning_requests,
+            "returning_share": self.returning_share,
+        }
+
+
+class RegistrationRollups:
+    """Write-time counters and O(buckets) reports over them."""
+
+    def __init__(self, shard_router: Optional[ShardRouter] = None):
+        """
+        Initialize the rollups.
+
+        Args:
+            shard_router: Router for a sharded registry. If None, reports
+                read the database of the session passed in.
+        """
+        self.shard_router = shard_router
+        # Counts deferred by requests short on time: (day, city, gender, column) -> n
+        self._pending: Counter = Counter()
+
+    def defer(
+        self,
+        city_code: str,
+        gender_code: str,
+        is_new: bool,
+        when: Optional[datetime] = None
+    ) -> None:
+        """
+        Count one request without writing now.
+
+        The count is added by the next record() call in this process. It
+        is lost if the process stops or that transaction rolls back first,
+        so deferred counts can undercount slightly.
+
+        Args:
+            city_code: Normalized city code
+            gender_code: Normalized gender code
+            is_new: True for a new UIC, False for a returning person
+            when: Request time (UTC). If None, now.
+        """
+        column = "registrations" if is_new else "returning_requests"
+        self._pending[((when or datetime.utcnow()).date(), city_code, gender_code, column)] += 1
+
+    async def record(
+        self,
+        db: AsyncSession,
+        city_code: str,
+        gender_code: str,
+        is_new: bool,
+        when: Optional[datetime] = None
+    ) -> None:
+        """
+        Count one request. Staged on ``db``; committed by the caller.
+
+        Args:
+            db: Session on the database holding the record
+            city_code: Normalized city code
+            gender_code: Normalized gender code
+            is_new: True for a new UIC, False for a returning person
+            when: Request time (UTC). If None, now.
+        """
+        key = {
+            "day": (when or datetime.utcnow()).date(),
+            "city_code": city_code,
+            "gender_code": gender_code,
+        }
+        column = "registrations" if is_new else "returning_requests"
+        await self._add(db, key, {column: 1})
+
+        if self._pending:
+            pending, self._pending = self._pending, Counter()
+            for (day, pending_city, pending_gender, pending_column), count in pending.items():
+                key = {"day": day, "city_code": pending_city, "gender_code": pending_gender}
+                await self._add(db, key, {pending_column: count})
+
+    async def _add(self, db: AsyncSession, key: Dict[str, Any], counts: Dict[str, int]) -> None:
+        """Add counts to a rollup row, creating it if needed."""
+        increments = {name: getattr(RegistrationRollup, name) + value for name, value in counts.items()}
+        insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+
+        if insert is not None:
+            stmt = insert(RegistrationRollup).values(**key, **counts)
+            await db.execute(stmt.on_conflict_do_update(index_elements=_ROLLUP_KEY, set_=increments))
+            return
+
+        # Other databases: update, and insert when the row does not exist yet
+        result = await db.execute(
+            update(RegistrationRollup)
+            .where(*(ROLLUP_DIMENSIONS[name] == value for name, value in key.items()))
+            .values(**increments)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.add(RegistrationRollup(**key, **counts))
+            await db.flush()
+
+    async def report(
+        self,
+        db: AsyncSession,
+        group_by: Sequence[RollupDimension] = ("day",),
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        city_code: Optional[str] = None,
+        gender_code: Optional[str] = None
+    ) -> List[RollupBucket]:
+        """
+        Sum the rollups over a date range.
+
+        Args:
+            db: Database session (used when not sharded)
+            group_by: Dimensions to group on; empty for a single total
+            date_from: First day included
+            date_to: Last day included
+            city_code: Only this city code
+            gender_code: Only this gender code
+
+        Returns:
+            Buckets ordered by the grouped dimensions
+        """
+        columns = [ROLLUP_DIMENSIONS[name] for name in group_by]
+        stmt = select(
+            *columns,
+            func.coalesce(func.sum(RegistrationRollup.registrations), 0).label("registrations"),
+            func.coalesce(func.sum(RegistrationRollup.returning_requests), 0).label("returning_requests"),
+        )
+        if columns:
+            stmt = stmt.group_by(*columns).order_by(*columns)
+        if date_from is not None:
+            stmt = stmt.where(RegistrationRollup.day >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(RegistrationRollup.day <= date_to)
+        if city_code:
+            stmt = stmt.where(RegistrationRollup.city_code == city_code.upper())
+        if gender_code:
+            stmt = stmt.where(RegistrationRollup.gender_code == gender_code.upper())
+
+        if self.shard_router is not None:
+            rows = await self.shard_router.fan_out(stmt)
+        else:
+            rows = (await db.execute(stmt)).all()
+
+        # Shards return one partial sum per group each
+        totals: Dict[Tuple[Any, ...], List[int]] = {}
+        for row in rows:
+            group = tuple(row[:len(columns)])
+            counts = totals.setdefault(group, [0, 0])
+            counts[0] += row.registrations
+            counts[1] += row.returning_requests
+
+        buckets = []
+        for group in sorted(totals):
+            values = dict(zip(group_by, group))
+            buckets.append(RollupBucket(
+                day=values.get("day"),
+                city_code=values.get("city_code"),
+                gender_code=values.get("gender_code"),
+                registrations=totals[group][0],
+                returning_requests=totals[group][1],
+            ))
+        return buckets
+
+
+async def backfill(
+    session_factory: async_sessionmaker,
+    before: date,
+    batch_size: int = 5000
+) -> int:
+    """
+    Set registration counts for days before ``before`` from the registry.
+
+    Reads uic_records once in id order (keyset pages, one short read
+    transaction each) and overwrites the registrations column of the
+    affected rollup rows, so rerunning gives the same result. Days from
+    ``before`` on are left to the write-time counters.
+
+    Args:
+        session_factory: Session factory for the database (one shard)
+        before: First day already counted at write time
+        batch_size: Records read per page
+
+    Returns:
+        Number of rollup rows written
+    """
+    counts: Counter = Counter()
+    cutoff = datetime.combine(before, datetime.min.time())
+    last_id = 0
+
+    while True:
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(
+                    UICRecord.id,
+                    UICRecord.created_at,
+                    UICRecord.normalized_city_code,
+                    UICRecord.normalized_gender_code,
+                )
+                .where(UICRecord.id > last_id, UICRecord.created_at < cutoff)
+                .order_by(UICRecord.id)
+                .limit(batch_size)
+            )).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        for row in rows:
+            counts[(row.created_at.date(), row.normalized_city_code, row.normalized_gender_code)] += 1
+
+    async with session_factory() as db:
+        # Days before the cutoff with no registrations must read 0 too
+        await db.execute(
+            update(RegistrationRollup)
+            .where(RegistrationRollup.day < before)
+            .values(registrations=0)
+            .execution_options(synchronize_session=False)
+        )
+        rollups = RegistrationRollups()
+        for (day, city_code, gender_code), registrations in counts.items():
+            key = {"day": day, "city_code": city_code, "gender_code": gender_code}
+            await rollups._add(db, key, {"registrations": registrations})
+        await db.commit()
+
+    logger.info(
+        "Registration rollups backfilled",
+        before=before.isoformat(),
+        rows=len(counts),
+        registrations=sum(counts.values())
+    )
+    return len(counts)
+
+
+def default_date_range(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    days: int = 30
+) -> Tuple[date, date]:
+    """
+    Fill in a report's missing range bounds.
+
+    Args:
+        date_from: First day. If None, ``days`` days up to date_to.
+        date_to: Last day. If None, today (UTC).
+        days: Default range length
+
+    Returns:
+        (date_from, date_to)
+    """
+    date_to = date_to or datetime.utcnow().date()
+    return date_from or date_to - timedelta(days=days - 1), date_to
@@ -0,0 +1,234 @@
+"""
+City Code Lookup.
+
+Resolves what users type for their city ("KI", "Kinshasa", "kinshasá",
+"Léopoldville", "Kinshsa") to the 2-letter city code used in UICs.
+
+The gazetteer is loaded once into:
+1. An exact-match dictionary over normalized codes, names and aliases (O(1))
+2. A trigram index over names and aliases for typos, queried only when
+   the exact match fails
+"""
+import json
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_GAZETTEER = Path(__file__).resolve().parent.parent / "data" / "drc_cities.json"
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+
+
+def normalize_key(text: str) -> str:
+    """
+    Normalize a city answer for lookup.
+
+    Same rules as UIC input normalization: accents and punctuation are
+    removed and letters uppercased, so "Mbuji-Mayi" and "mbujimayi" match.
+
+    Args:
+        text: Raw text
+
+    Returns:
+        Normalized key
+    """
+    text = unicodedata.normalize("NFD", str(text).strip().upper())
+    text = "".join(char for char in text if unicodedata.category(char) != "Mn")
+    return _NON_ALNUM.sub("", text)
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f" {key} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+@dataclass(frozen=True, slots=True)
+class City:
+    """A gazetteer entry."""
+
+    code: str
+    name: str
+    province: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class CityMatch:
+    """Result of resolving an answer."""
+
+    city: City
+    # "code", "name", "alias" or "fuzzy"
+    matched_by: str
+    score: float = 1.0
+
+    @property
+    def code(self) -> str:
+        return self.city.code
+
+
+class CityCodeIndex:
+    """Lookup structure over a city gazetteer."""
+
+    def __init__(self, cities: Iterable[Tuple[City, Iterable[str]]], min_similarity: float = 0.6):
+        """
+        Build the index.
+
+        Args:
+            cities: (city, aliases) pairs
+            min_similarity: Minimum trigram Dice similarity for a fuzzy match
+
+        Raises:
+            ValueError: If a code is not 2 letters, or a name/alias maps to two cities
+        """
+        self.min_similarity = min_similarity
+        self.cities: Dict[str, City] = {}
+        self._exact: Dict[str, Tuple[City, str]] = {}
+        # Fuzzy candidates: normalized names/aliases and the city each belongs to
+        self._keys: List[Tuple[str, City]] = []
+        self._postings: Dict[str, List[int]] = {}
+
+        for city, aliases in cities:
+            if len(city.code) != 2 or not city.code.isalpha() or not city.code.isupper():
+                raise ValueError(f"City code must be 2 uppercase letters: {city.code!r}")
+            if city.code in self.cities:
+                raise ValueError(f"Duplicate city code: {city.code}")
+            self.cities[city.code] = city
+
+            self._add_exact(city.code, city, "code")
+            for text, kind in [(city.name, "name"), *((alias, "alias") for alias in aliases)]:
+                key = normalize_key(text)
+                self._add_exact(key, city, kind)
+                self._add_fuzzy(key, city)
+
+    def _add_exact(self, key: str, city: City, kind: str) -> None:
+        existing = self._exact.get(key)
+        if existing is not None and existing[0] is not city:
+            raise ValueError(f"{key!r} maps to both {existing[0].code} and {city.code}")
+        if existing is None:
+            self._exact[key] = (city, kind)
+
+    def _add_fuzzy(self, key: str, city: City) -> None:
+        if len(key) < 3:
+            return
+        index = len(self._keys)
+        self._keys.append((key, city))
+        for gram in set(_trigrams(key)):
+            self._postings.setdefault(gram, []).append(index)
+
+    @classmethod
+    def from_file(cls, path: Path, **kwargs) -> "CityCodeIndex":
+        """
+        Load a gazetteer JSON file.
+
+        The file holds ``{"cities": [{"code", "name", "province", "aliases"}]}``.
+
+        Args:
+            path: Gazetteer path
+
+        Returns:
+            CityCodeIndex
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        entries = [
+            (City(code=entry["code"].upper(), name=entry["name"], province=entry.get("province")),
+             entry.get("aliases", []))
+            for entry in data["cities"]
+        ]
+        index = cls(entries, **kwargs)
+        logger.info("City gazetteer loaded", path=str(path), cities=len(index.cities))
+        return index
+
+    def is_code(self, code: str) -> bool:
+        """Check if a code is in the gazetteer."""
+        return code.upper() in self.cities
+
+    def _fuzzy(self, key: str) -> Optional[CityMatch]:
+        grams = _trigrams(key)
+        common: Counter = Counter()
+        for gram in set(grams):
+            for index in self._postings.get(gram, ()):
+                common[index] += 1
+
+        best: Dict[str, Tuple[float, City]] = {}
+        query_size = len(set(grams))
+        for index, shared in common.items():
+            candidate, city = self._keys[index]
+            score = 2.0 * shared / (query_size + len(set(_trigrams(candidate))))
+            if score > best.get(city.code, (0.0, city))[0]:
+                best[city.code] = (score, city)
+
+        if not best:
+            return None
+
+        ranked = sorted(best.values(), key=lambda item: item[0], reverse=True)
+        score, city = ranked[0]
+        if score < self.min_similarity:
+            return None
+        # Two different cities almost equally close: don't guess
+        if len(ranked) > 1 and ranked[1][0] >= score - 0.05:
+            return None
+        return CityMatch(city=city, matched_by="fuzzy", score=round(score, 3))
+
+    def resolve(self, answer: str) -> Optional[CityMatch]:
+        """
+        Resolve an answer to a city.
+
+        Args:
+            answer: Code, name or alias as typed by the user
+
+        Returns:
+            CityMatch, or None if nothing matches closely enough
+        """
+        key = normalize_key(answer)
+        if not key:
+            return None
+
+        exact = self._exact.get(key)
+        if exact is not None:
+            return CityMatch(city=exact[0], matched_by=exact[1])
+
+        if len(key) < 3:
+            return None
+        return self._fuzzy(key)
+
+    def resolve_many(self, answers: Iterable[str]) -> List[Optional[CityMatch]]:
+        """
+        Resolve many answers, e.g. for batch imports.
+
+        Repeated values are only resolved once.
+
+        Args:
+            answers: Raw answers
+
+        Returns:
+            One CityMatch (or None) per answer, in order
+        """
+        cache: Dict[str, Optional[CityMatch]] = {}
+        results = []
+        for answer in answers:
+            if answer not in cache:
+                cache[answer] = self.resolve(answer)
+            results.append(cache[answer])
+        return results
+
+
+@lru_cache()
+def get_city_index() -> CityCodeIndex:
+    """
+    Get the process-wide city index, loading the gazetteer on first use.
+
+    Returns:
+        CityCodeIndex built from CITY_GAZETTEER_PATH or the bundled DRC list
+    """
+    path = Path(settings.city_gazetteer_path) if settings.city_gazetteer_path else DEFAULT_GAZETTEER
+    return CityCodeIndex.from_file(path)
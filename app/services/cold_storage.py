@@ -0,0 +1,465 @@
+"""
+Cold Storage for Registry Rows.
+
+uic_records keeps every code ever issued, but most lookups are for people
+seen recently. Deactivated rows and rows nobody asked for in
+ARCHIVE_AFTER_DAYS are moved to a separate SQLite file so the hot table
+and its input_hash index only hold the working set:
+- The archive table has no rowid (keyed by uic_code) and stores the
+  columns only audits need as one zlib-compressed JSON blob; the columns
+  used to find a row (input_hash, is_active, created_at) stay plain
+- UICService looks in the archive only when the hot lookup misses, and
+  moves an active archived row back into uic_records (promotion); the
+  archive copy is deleted once the hot row is committed
+- rehash_archive keeps archived input hashes on the current key, like
+  rehash_registry does for uic_records
+- Archived codes stay issued: they are loaded into the occupancy index
+  so they are never allocated again
+
+archive_cold_records moves rows in small chunks like rehash_registry:
+rows are written to the archive first and then deleted from the hot
+table, each DELETE guarded on the row being unchanged, so a row touched
+in the meantime simply stays hot.
+"""
+import asyncio
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    bindparam,
+    delete,
+    false,
+    func,
+    insert,
+    or_,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import enable_sqlite_transactions
+from app.logging_config import get_logger
+from app.metrics import metrics
+from app.models.uic import UICRecord
+from app.services.input_hashing import InputHasher
+from app.sharding import NORMALIZED_COLUMNS
+
+logger = get_logger(__name__)
+
+# Columns kept compressed in the archive's record blob
+PACKED_COLUMNS = (
+    "phone_number",
+    "normalized_last_name_code",
+    "normalized_first_name_code",
+    "normalized_birth_year_digit",
+    "normalized_city_code",
+    "normalized_gender_code",
+    "hash_key_version",
+    "last_requested_at",
+    "request_count",
+    "notes",
+)
+_DATETIME_COLUMNS = frozenset({"last_requested_at"})
+
+archive_metadata = MetaData()
+
+archived_uic_records = Table(
+    "archived_uic_records",
+    archive_metadata,
+    Column("uic_code", String(50), primary_key=True),
+    Column("input_hash", String(64), nullable=False, index=True),
+    Column("is_active", Boolean, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("archived_at", DateTime, nullable=False),
+    Column("record", LargeBinary, nullable=False),
+    sqlite_with_rowid=False,
+)
+
+_uic_records = UICRecord.__table__
+
+_FIND_ACTIVE_BY_HASH = (
+    select(archived_uic_records)
+    .where(
+        archived_uic_records.c.input_hash.in_(bindparam("input_hashes", expanding=True)),
+        archived_uic_records.c.is_active == true()
+    )
+    .order_by(archived_uic_records.c.created_at)
+    .limit(1)
+)
+_FIND_BY_CODES = select(
+    archived_uic_records.c.uic_code,
+    archived_uic_records.c.is_active,
+    archived_uic_records.c.created_at,
+).where(archived_uic_records.c.uic_code.in_(bindparam("uic_codes", expanding=True)))
+# Re-archiving a row (promoted, then cold again) replaces the old copy
+_STORE = insert(archived_uic_records).prefix_with("OR REPLACE")
+_FORGET = delete(archived_uic_records).where(
+    archived_uic_records.c.uic_code.in_(bindparam("uic_codes", expanding=True)),
+    archived_uic_records.c.archived_at < bindparam("archived_before")
+)
+
+
+def _pack(row: Any) -> bytes:
+    """Compress the audit-only columns of a hot row."""
+    return _pack_columns({name: getattr(row, name) for name in PACKED_COLUMNS})
+
+
+def _pack_columns(columns: Dict[str, Any]) -> bytes:
+    """Compress PACKED_COLUMNS values given by name."""
+    values = [
+        columns[name].isoformat() if name in _DATETIME_COLUMNS else columns[name]
+        for name in PACKED_COLUMNS
+    ]
+    return zlib.compress(json.dumps(values, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(record: bytes) -> Dict[str, Any]:
+    """Inverse of _pack."""
+    values = json.loads(zlib.decompress(record))
+    columns = dict(zip(PACKED_COLUMNS, values))
+    for name in _DATETIME_COLUMNS:
+        columns[name] = datetime.fromisoformat(columns[name])
+    return columns
+
+
+@dataclass(frozen=True, slots=True)
+class ArchivedUIC:
+    """An archived registry row."""
+
+    uic_code: str
+    input_hash: str
+    is_active: bool
+    created_at: datetime
+    columns: Dict[str, Any]
+
+    def as_record(self, **overrides: Any) -> UICRecord:
+        """Build the hot row that promotes this one back into uic_records."""
+        values = dict(
+            self.columns,
+            uic_code=self.uic_code,
+            input_hash=self.input_hash,
+            is_active=self.is_active,
+            created_at=self.created_at,
+        )
+        values.update(overrides)
+        return UICRecord(**values)
+
+
+class ColdArchive:
+    """Archived registry rows in a separate SQLite file."""
+
+    def __init__(self, path: str):
+        """
+        Open an archive (created on init()).
+
+        Args:
+            path: SQLite file path
+        """
+        self.path = path
+        self.engine = enable_sqlite_transactions(create_async_engine(f"sqlite+aiosqlite:///{path}"))
+        self._session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        self._pending: Set[asyncio.Task] = set()
+
+    async def init(self) -> None:
+        """Create the archive table if missing."""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(archive_metadata.create_all)
+
+    async def dispose(self) -> None:
+        """Finish pending deletions and close the archive's connections."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        await self.engine.dispose()
+
+    async def store(self, rows: Sequence[Any]) -> None:
+        """
+        Write hot rows to the archive in one transaction.
+
+        Args:
+            rows: Rows with every uic_records column
+        """
+        now = datetime.utcnow()
+        async with self._session_factory() as db:
+            await db.execute(_STORE, [
+                dict(
+                    uic_code=row.uic_code,
+                    input_hash=row.input_hash,
+                    is_active=row.is_active,
+                    created_at=row.created_at,
+                    archived_at=now,
+                    record=_pack(row),
+                )
+                for row in rows
+            ])
+            await db.commit()
+
+    async def forget(self, uic_codes: List[str], archived_before: datetime) -> int:
+        """
+        Delete the archive copies of codes that are back in uic_records.
+
+        Args:
+            uic_codes: Codes to delete
+            archived_before: Only delete copies archived before this time, so
+                a row archived again in the meantime is kept
+
+        Returns:
+            Number of rows deleted
+        """
+        async with self._session_factory() as db:
+            result = await db.execute(_FORGET, {"uic_codes": uic_codes, "archived_before": archived_before})
+            await db.commit()
+        return result.rowcount
+
+    def forget_later(self, uic_codes: List[str], archived_before: datetime) -> None:
+        """Run forget() in the background (e.g. from an after-commit callback)."""
+        task = asyncio.get_running_loop().create_task(self._forget_logged(uic_codes, archived_before))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _forget_logged(self, uic_codes: List[str], archived_before: datetime) -> None:
+        try:
+            await self.forget(uic_codes, archived_before)
+        except Exception as e:
+            # The stale copy is skipped on lookup and replaced when re-archived
+            logger.warning("Archive copy not deleted", uic_codes=uic_codes, error=str(e))
+
+    async def find_active(self, input_hashes: List[str]) -> Optional[ArchivedUIC]:
+        """
+        Look up a person's active archived record.
+
+        Args:
+            input_hashes: The person's hash under every accepted key version
+
+        Returns:
+            The archived record, or None
+        """
+        async with self._session_factory() as db:
+            row = (await db.execute(_FIND_ACTIVE_BY_HASH, {"input_hashes": input_hashes})).first()
+        metrics.increment("archive.hit" if row is not None else "archive.miss")
+        if row is None:
+            return None
+        return ArchivedUIC(row.uic_code, row.input_hash, row.is_active, row.created_at, _unpack(row.record))
+
+    async def find_codes(self, uic_codes: List[str]) -> Dict[str, Any]:
+        """
+        Look up archived codes with one IN query.
+
+        Args:
+            uic_codes: Codes to look for
+
+        Returns:
+            uic_code -> row with is_active and created_at, for the codes found
+        """
+        async with self._session_factory() as db:
+            result = await db.execute(_FIND_BY_CODES, {"uic_codes": uic_codes})
+            return {row.uic_code: row for row in result}
+
+    async def iter_codes(self, batch_size: int = 10000) -> AsyncIterator[List[str]]:
+        """
+        Stream every archived code, batch by batch.
+
+        Args:
+            batch_size: Codes per batch
+
+        Yields:
+            Lists of codes
+        """
+        async with self._session_factory() as db:
+            stmt = select(archived_uic_records.c.uic_code).execution_options(yield_per=batch_size)
+            result = await db.stream(stmt)
+            async for partition in result.scalars().partitions():
+                yield list(partition)
+
+    async def key_versions(self, batch_size: int = 1000) -> Set[int]:
+        """
+        Input hash key versions used by archived rows.
+
+        The version is packed in the record blob, so every row is
+        decompressed; only worth running while older versions are configured.
+        """
+        versions: Set[int] = set()
+        async with self._session_factory() as db:
+            stmt = select(archived_uic_records.c.record).execution_options(yield_per=batch_size)
+            result = await db.stream(stmt)
+            async for partition in result.scalars().partitions():
+                versions.update(_unpack(record)["hash_key_version"] for record in partition)
+        return versions
+
+    async def count(self) -> int:
+        """Number of archived rows."""
+        async with self._session_factory() as db:
+            return (await db.execute(select(func.count()).select_from(archived_uic_records))).scalar_one()
+
+
+def build_cold_archive() -> Optional[ColdArchive]:
+    """
+    Open the configured archive, if any.
+
+    Returns:
+        ColdArchive, or None when ARCHIVE_PATH is unset
+    """
+    if not settings.archive_path:
+        return None
+    return ColdArchive(settings.archive_path)
+
+
+async def archive_cold_records(
+    session_factory: async_sessionmaker,
+    archive: ColdArchive,
+    older_than: datetime,
+    chunk_size: int = 500,
+    pause_seconds: float = 0.05,
+    max_chunks: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Move inactive and long-unused rows from uic_records to the archive.
+
+    Safe to run while the app serves traffic: one short transaction per
+    chunk with a pause between chunks. Interrupting and rerunning
+    continues with the rows still cold.
+
+    Args:
+        session_factory: Session factory for the hot database (one shard)
+        archive: Archive receiving the rows
+        older_than: Rows last requested before this are cold
+        chunk_size: Rows moved per transaction
+        pause_seconds: Sleep between chunks
+        max_chunks: Stop after this many chunks (None = until done)
+
+    Returns:
+        Counts: rows examined, archived (moved), skipped (changed concurrently)
+    """
+    counts = {"examined": 0, "archived": 0, "skipped": 0}
+    last_id = 0
+    chunks = 0
+
+    while max_chunks is None or chunks < max_chunks:
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(_uic_records)
+                .where(
+                    _uic_records.c.id > last_id,
+                    or_(_uic_records.c.is_active == false(), _uic_records.c.last_requested_at < older_than)
+                )
+                .order_by(_uic_records.c.id)
+                .limit(chunk_size)
+            )).all()
+            if not rows:
+                break
+
+            # Archive first: until the delete commits the row is in both
+            # places, and the hot copy wins
+            await archive.store(rows)
+            archived = 0
+            for row in rows:
+                result = await db.execute(
+                    delete(_uic_records).where(
+                        _uic_records.c.id == row.id,
+                        _uic_records.c.last_requested_at == row.last_requested_at,
+                        _uic_records.c.is_active == row.is_active
+                    )
+                )
+                archived += result.rowcount
+            await db.commit()
+
+        last_id = rows[-1].id
+        chunks += 1
+        counts["examined"] += len(rows)
+        counts["archived"] += archived
+        counts["skipped"] += len(rows) - archived
+        metrics.increment("archive.rows", archived)
+        logger.info("Archive chunk committed", last_id=last_id, rows=len(rows), archived=archived)
+
+        await asyncio.sleep(pause_seconds)
+
+    logger.info("Archiving finished", older_than=older_than.isoformat(), **counts)
+    return counts
+
+
+async def rehash_archive(
+    archive: ColdArchive,
+    hasher: InputHasher,
+    chunk_size: int = 500,
+    pause_seconds: float = 0.05,
+    max_chunks: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Rewrite the input_hash of every archived row not hashed with the current key.
+
+    The archive counterpart of rehash_registry: without it, archived
+    people stop matching once the old salt is retired and would be
+    issued a second code. The key version is inside the packed record,
+    so every row is read (by uic_code ranges); each UPDATE is guarded on
+    the record being unchanged.
+
+    Args:
+        archive: Archive to migrate
+        hasher: Hasher whose current version is the target
+        chunk_size: Rows read per transaction
+        pause_seconds: Sleep between chunks
+        max_chunks: Stop after this many chunks (None = until done)
+
+    Returns:
+        Counts: rows examined, rewritten, skipped (changed concurrently)
+    """
+    target = hasher.current_version
+    counts = {"examined": 0, "rewritten": 0, "skipped": 0}
+    last_code = ""
+    chunks = 0
+
+    while max_chunks is None or chunks < max_chunks:
+        async with archive._session_factory() as db:
+            rows = (await db.execute(
+                select(archived_uic_records.c.uic_code, archived_uic_records.c.record)
+                .where(archived_uic_records.c.uic_code > last_code)
+                .order_by(archived_uic_records.c.uic_code)
+                .limit(chunk_size)
+            )).all()
+            if not rows:
+                break
+
+            stale = 0
+            rewritten = 0
+            for row in rows:
+                columns = _unpack(row.record)
+                if columns["hash_key_version"] == target:
+                    continue
+                stale += 1
+                columns["hash_key_version"] = target
+                result = await db.execute(
+                    update(archived_uic_records)
+                    .where(
+                        archived_uic_records.c.uic_code == row.uic_code,
+                        archived_uic_records.c.record == row.record
+                    )
+                    .values(
+                        input_hash=hasher.hash([columns[name] for name in NORMALIZED_COLUMNS]),
+                        record=_pack_columns(columns)
+                    )
+                )
+                rewritten += result.rowcount
+            await db.commit()
+
+        last_code = rows[-1].uic_code
+        chunks += 1
+        counts["examined"] += stale
+        counts["rewritten"] += rewritten
+        counts["skipped"] += stale - rewritten
+        logger.info("Archive re-hash chunk committed", last_code=last_code, rows=len(rows), rewritten=rewritten)
+
+        await asyncio.sleep(pause_seconds)
+
+    logger.info("Archive re-hash finished", key_version=target, **counts)
+    return counts
@@ -0,0 +1,374 @@
+"""
+Near-Duplicate Detection.
+
+Flags registrations that are probably the same person as an existing
+record with one input typed differently. Two codes are near-duplicates
+when their base codes (LLLFFFYCG) are identical (the inputs differed
+only beyond the code, e.g. "MBE" / "MBENGUE") or:
+1. Differ in exactly one character (a typo, a wrong birth digit, ...)
+2. Have the first and last name codes swapped
+3. Have the letters of one name code transposed ("MBE" / "MEB")
+4. Sound the same once spelling variants common in Congolese names are
+   folded together ("TSHI" / "TCHI", "KA" / "CA", "LO" / "RO", ...)
+
+Every case is reduced to exact lookups on neighbour keys: case 1 uses
+one masked key per position ("MBE*BR7KI1"), so a query costs 13 hash
+table probes regardless of registry size. Candidates are always re-checked
+against the query, so key hash collisions cannot produce false matches.
+"""
+import re
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.logging_config import get_logger
+from app.models.uic import UICRecord
+
+logger = get_logger(__name__)
+
+BASE_CODE_LENGTH = 10
+# BASE_CODE_LENGTH masked keys plus the swapped, transposed and phonetic keys
+_KEYS_PER_CODE = BASE_CODE_LENGTH + 3
+
+# Spelling variants folded together by phonetic_key, applied in order.
+# The "sh" sound becomes a lowercase placeholder so that the later C -> K
+# rule cannot merge it with K.
+_PHONETIC_RULES: Tuple[Tuple[re.Pattern, str], ...] = tuple(
+    (re.compile(pattern), replacement)
+    for pattern, replacement in (
+        (r"TCH|TSH|CH|SH", "s"),
+        (r"PH", "F"),
+        (r"OU", "U"),
+        (r"[CQ]", "K"),
+        (r"Y", "I"),
+        (r"Z", "S"),
+        (r"R", "L"),
+        (r"NB", "MB"),
+        (r"(.)\1+", r"\1"),
+    )
+)
+
+
+def phonetic_key(name_code: str) -> str:
+    """
+    Fold spelling variants of a normalized name code.
+
+    Args:
+        name_code: Normalized (uppercase, unaccented) name or name code
+
+    Returns:
+        Phonetic key; "TSHIBANGU" and "TCHIBANGOU" give the same key
+    """
+    key = name_code
+    for pattern, replacement in _PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    return key
+
+
+def _split(base: str) -> Tuple[str, str, str]:
+    """Split a base code into (last name code, first name code, rest)."""
+    return base[:3], base[3:6], base[6:]
+
+
+def neighbour_keys(base: str) -> Iterator[str]:
+    """
+    Keys shared by a base code and its near-duplicates.
+
+    Args:
+        base: 10-character base code
+
+    Yields:
+        Lookup keys
+    """
+    for i in range(len(base)):
+        yield f"h{i}{base[:i]}{base[i + 1:]}"
+
+    last, first, rest = _split(base)
+    # Order-independent so that swapped name codes share the key
+    yield "s" + "".join(sorted((last, first))) + rest
+    yield "t" + "".join(sorted(last)) + "|" + "".join(sorted(first)) + rest
+    yield "p" + phonetic_key(last) + "|" + phonetic_key(first) + rest
+
+
+def match_reason(base: str, other: str) -> Optional[str]:
+    """
+    Explain why two base codes are near-duplicates.
+
+    Args:
+        base: Base code being registered
+        other: Existing base code
+
+    Returns:
+        "same_base", "one_char", "swapped_names", "transposed", "phonetic", or None
+    """
+    if len(base) != len(other):
+        return None
+    if base == other:
+        return "same_base"
+
+    if sum(a != b for a, b in zip(base, other)) == 1:
+        return "one_char"
+
+    last, first, rest = _split(base)
+    other_last, other_first, other_rest = _split(other)
+    if rest != other_rest:
+        return None
+    if (last, first) == (other_first, other_last):
+        return "swapped_names"
+    if sorted(last) == sorted(other_last) and sorted(first) == sorted(other_first):
+        return "transposed"
+    if (phonetic_key(last), phonetic_key(first)) == (phonetic_key(other_last), phonetic_key(other_first)):
+        return "phonetic"
+    return None
+
+
+class _IntMultiMap:
+    """
+    Open-addressing multimap from 32-bit keys to 32-bit positions.
+
+    Same layout idea as uic_allocator._IntHashSet: flat arrays (8 bytes
+    per slot) instead of a dict of Python ints and lists, which would
+    cost about five times the memory for the 13 keys stored per code. A
+    key may occupy several slots, one per position.
+    """
+
+    _EMPTY = 0
+    _MAX_LOAD = 0.75
+
+    def __init__(self, capacity: int = 0):
+        self._allocate(max(1024, int(capacity / self._MAX_LOAD) + 1))
+
+    def _allocate(self, size: int) -> None:
+        self._keys = array("I", bytes(4 * size))
+        self._values = array("I", bytes(4 * size))
+        self._size = size
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the slot tables."""
+        return self._size * (self._keys.itemsize + self._values.itemsize)
+
+    def add(self, key: int, value: int) -> None:
+        keys = self._keys
+        size = self._size
+        index = key % size
+        while keys[index] != self._EMPTY:
+            index = index + 1 if index + 1 < size else 0
+        keys[index] = key
+        self._values[index] = value
+        self._count += 1
+        if self._count > size * self._MAX_LOAD:
+            self._grow()
+
+    def collect(self, key: int, into: Set[int]) -> None:
+        """Add every value stored under a key to a set."""
+        keys = self._keys
+        size = self._size
+        index = key % size
+        while True:
+            current = keys[index]
+            if current == key:
+                into.add(self._values[index])
+            elif current == self._EMPTY:
+                return
+            index = index + 1 if index + 1 < size else 0
+
+    def _grow(self) -> None:
+        old_keys, old_values = self._keys, self._values
+        self._allocate(self._size * 2)
+        for key, value in zip(old_keys, old_values):
+            if key != self._EMPTY:
+                self.add(key, value)
+
+
+def _key_hash(key: str) -> int:
+    """
+    Map a neighbour key to a non-zero 32-bit integer.
+
+    Python's string hash is enough: the index lives in one process, and a
+    collision only adds a candidate that match_reason then rejects.
+    """
+    return (hash(key) & 0xFFFFFFFF) or 1
+
+
+class NearDuplicateIndex:
+    """In-memory index from neighbour keys to issued UIC codes."""
+
+    def __init__(self, expected_codes: int = 0):
+        """
+        Initialize an empty index.
+
+        Args:
+            expected_codes: Presize for this many codes to avoid regrowth
+        """
+        self._codes: List[str] = []
+        self._keys = _IntMultiMap(expected_codes * _KEYS_PER_CODE)
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the key tables (codes themselves excluded)."""
+        return self._keys.nbytes
+
+    def add(self, uic_code: str) -> int:
+        """
+        Index an issued UIC code.
+
+        Args:
+            uic_code: Issued code (base code plus optional collision suffix)
+
+        Returns:
+            Position of the code in the index
+        """
+        position = len(self._codes)
+        self._codes.append(uic_code)
+        add = self._keys.add
+        for key in neighbour_keys(uic_code[:BASE_CODE_LENGTH]):
+            add(_key_hash(key), position)
+        return position
+
+    def update(self, uic_codes: Iterable[str]) -> None:
+        """Index many codes."""
+        for uic_code in uic_codes:
+            self.add(uic_code)
+
+    def candidate_positions(self, base: str) -> Set[int]:
+        """Positions sharing at least one neighbour key with a base code."""
+        found: Set[int] = set()
+        collect = self._keys.collect
+        for key in neighbour_keys(base):
+            collect(_key_hash(key), found)
+        return found
+
+    def find(self, base: str, limit: int = 5) -> List[Tuple[str, str]]:
+        """
+        Find existing codes that are probably the same person.
+
+        Args:
+            base: 10-character base code being registered
+            limit: Maximum matches returned
+
+        Returns:
+            List of (uic_code, reason)
+        """
+        matches = []
+        for position in sorted(self.candidate_positions(base)):
+            code = self._codes[position]
+            reason = match_reason(base, code[:BASE_CODE_LENGTH])
+            if reason is not None:
+                matches.append((code, reason))
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    async def load(self, db: AsyncSession, batch_size: int = 10000) -> int:
+        """
+        Fill the index from the registry.
+
+        Args:
+            db: Database session
+            batch_size: Rows fetched per cursor round trip
+
+        Returns:
+            Number of codes loaded
+        """
+        stmt = (
+            select(UICRecord.uic_code)
+            .order_by(UICRecord.id)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await db.stream(stmt)
+        loaded = 0
+        async for partition in result.scalars().partitions():
+            self.update(partition)
+            loaded += len(partition)
+
+        self.loaded = True
+        logger.info("Near-duplicate index loaded", codes=loaded, keys=len(self._keys))
+        return loaded
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 with path halving and union by size."""
+
+    def __init__(self):
+        """Initialize an empty structure; elements are added on first use."""
+        self._parent: List[int] = []
+        self._size: List[int] = []
+
+    def _ensure(self, x: int) -> None:
+        while len(self._parent) <= x:
+            self._parent.append(len(self._parent))
+            self._size.append(1)
+
+    def find(self, x: int) -> int:
+        """Representative of x's set."""
+        self._ensure(x)
+        parent = self._parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> int:
+        """Merge the sets of a and b, returning the new representative."""
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self._size[ra] < self._size[rb]:
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._size[ra] += self._size[rb]
+        return ra
+
+
+def cluster_codes(uic_codes: Iterable[str]) -> List[List[Tuple[str, str]]]:
+    """
+    Group a registry into clusters of probable duplicates.
+
+    Each code is compared only with codes sharing a neighbour key, so the
+    cost grows with the registry size times the (small) bucket sizes
+    rather than quadratically.
+
+    Args:
+        uic_codes: Every issued code
+
+    Returns:
+        Clusters of two or more codes, each a list of (uic_code, reason)
+        where reason explains the link that joined the code to the cluster
+        ("first" for the earliest code)
+    """
+    index = NearDuplicateIndex()
+    sets = UnionFind()
+    reasons: Dict[int, str] = {}
+
+    for uic_code in uic_codes:
+        base = uic_code[:BASE_CODE_LENGTH]
+        matches = [
+            (position, match_reason(base, index._codes[position][:BASE_CODE_LENGTH]))
+            for position in index.candidate_positions(base)
+        ]
+        position = index.add(uic_code)
+        for other, reason in matches:
+            if reason is not None:
+                sets.union(position, other)
+                reasons.setdefault(position, reason)
+
+    clusters: Dict[int, List[int]] = {}
+    for position in range(len(index)):
+        clusters.setdefault(sets.find(position), []).append(position)
+
+    return [
+        [(index._codes[p], reasons.get(p, "first")) for p in members]
+        for members in clusters.values()
+        if len(members) > 1
+    ]
@@ -0,0 +1,299 @@
+"""
+Registry Export Service.
+
+Streams ``uic_records`` out as CSV, JSONL or Parquet for program
+reporting (e.g. DHIS2 imports) without loading ORM objects:
+
+1. Keyset pagination on ``id`` so every page is an index range scan
+2. Server-side cursors with ``yield_per`` inside each page
+3. A fixed upper ``id`` captured up front, returned as the watermark
+   for the next incremental export
+
+Memory use is bounded by the batch size, whatever the registry size.
+
+An export covers one database: ids and watermarks are per shard, and
+rows moved to the cold archive (see cold_storage) are not exported.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.logging_config import get_logger
+from app.models.uic import UICRecord
+
+logger = get_logger(__name__)
+
+ExportFormat = Literal["csv", "jsonl", "parquet"]
+
+EXPORT_FORMATS: Dict[str, str] = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Columns exported for reporting. input_hash and notes stay internal.
+EXPORT_COLUMNS = [
+    UICRecord.id,
+    UICRecord.uic_code,
+    UICRecord.normalized_last_name_code,
+    UICRecord.normalized_first_name_code,
+    UICRecord.normalized_birth_year_digit,
+    UICRecord.normalized_city_code,
+    UICRecord.normalized_gender_code,
+    UICRecord.created_at,
+    UICRecord.last_requested_at,
+    UICRecord.is_active,
+    UICRecord.request_count,
+]
+
+
+@dataclass(frozen=True)
+class ExportFilter:
+    """Row selection for an export."""
+
+    since_id: int = 0
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    city_code: Optional[str] = None
+    include_phone: bool = False
+
+
+class RegistryExporter:
+    """Streams registry rows in constant memory."""
+
+    def __init__(self, batch_size: int = 5000):
+        """
+        Initialize exporter.
+
+        Args:
+            batch_size: Rows per keyset page and per cursor fetch
+        """
+        self.batch_size = batch_size
+
+    def _columns(self, export_filter: ExportFilter) -> List[Any]:
+        """Columns selected for a filter."""
+        if export_filter.include_phone:
+            return [*EXPORT_COLUMNS, UICRecord.phone_number]
+        return list(EXPORT_COLUMNS)
+
+    def field_names(self, export_filter: ExportFilter) -> List[str]:
+        """Output field names for a filter, in column order."""
+        return [column.key for column in self._columns(export_filter)]
+
+    async def get_watermark(self, db: AsyncSession) -> int:
+        """
+        Get the highest record id at the start of an export.
+
+        Rows inserted while the export runs are left for the next one.
+
+        Args:
+            db: Database session
+
+        Returns:
+            Highest current id (0 for an empty registry)
+        """
+        result = await db.execute(select(func.max(UICRecord.id)))
+        return result.scalar_one() or 0
+
+    async def iter_batches(
+        self,
+        db: AsyncSession,
+        export_filter: ExportFilter,
+        until_id: int
+    ) -> AsyncIterator[List[tuple]]:
+        """
+        Yield rows in ``id`` order, one page at a time.
+
+        Args:
+            db: Database session
+            export_filter: Row selection
+            until_id: Inclusive upper id bound (the watermark)
+
+        Yields:
+            Lists of row tuples in ``field_names`` order
+        """
+        columns = self._columns(export_filter)
+        last_id = export_filter.since_id
+        exported = 0
+
+        while last_id < until_id:
+            stmt = (
+                select(*columns)
+                .where(UICRecord.id > last_id, UICRecord.id <= until_id)
+                .order_by(UICRecord.id)
+                .limit(self.batch_size)
+                .execution_options(yield_per=self.batch_size)
+            )
+            if export_filter.created_from is not None:
+                stmt = stmt.where(UICRecord.created_at >= export_filter.created_from)
+            if export_filter.created_to is not None:
+                stmt = stmt.where(UICRecord.created_at < export_filter.created_to)
+            if export_filter.city_code:
+                stmt = stmt.where(UICRecord.normalized_city_code == export_filter.city_code.upper())
+
+            result = await db.stream(stmt)
+            page_rows = 0
+            async for partition in result.partitions():
+                rows = [tuple(row) for row in partition]
+                page_rows += len(rows)
+                last_id = rows[-1][0]
+                yield rows
+
+            exported += page_rows
+            if page_rows < self.batch_size:
+                break
+
+        logger.info("Registry export streamed", until_id=until_id, rows=exported)
+
+    async def iter_csv(
+        self,
+        db: AsyncSession,
+        export_filter: ExportFilter,
+        until_id: int
+    ) -> AsyncIterator[str]:
+        """Yield CSV text chunks, header first."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.field_names(export_filter))
+        yield buffer.getvalue()
+
+        async for rows in self.iter_batches(db, export_filter, until_id):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(
+                [_format_value(value) for value in row] for row in rows
+            )
+            yield buffer.getvalue()
+
+    async def iter_jsonl(
+        self,
+        db: AsyncSession,
+        export_filter: ExportFilter,
+        until_id: int
+    ) -> AsyncIterator[str]:
+        """Yield JSON Lines text chunks, one object per record."""
+        names = self.field_names(export_filter)
+        async for rows in self.iter_batches(db, export_filter, until_id):
+            yield "".join(
+                json.dumps(dict(zip(names, row)), default=_format_value, ensure_ascii=False) + "\n"
+                for row in rows
+            )
+
+    async def iter_parquet(
+        self,
+        db: AsyncSession,
+        export_filter: ExportFilter,
+        until_id: int
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield Parquet file bytes, one row group per page.
+
+        Requires the optional ``pyarrow`` dependency.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError(
+                "Parquet export requires pyarrow: pip install 'whatsapp-uic-generator[export]'"
+            ) from e
+
+        arrow_types = _arrow_types(pa)
+        schema = pa.schema([
+            (name, arrow_types.get(name, pa.string())) for name in self.field_names(export_filter)
+        ])
+        sink = _DrainableSink()
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+        try:
+            async for rows in self.iter_batches(db, export_filter, until_id):
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema
+                ))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        finally:
+            writer.close()
+
+        yield sink.drain()
+
+    def stream(
+        self,
+        db: AsyncSession,
+        export_format: ExportFormat,
+        export_filter: ExportFilter,
+        until_id: int
+    ) -> AsyncIterator[Any]:
+        """
+        Get the chunk iterator for an export format.
+
+        Args:
+            db: Database session
+            export_format: One of ``EXPORT_FORMATS``
+            export_filter: Row selection
+            until_id: Inclusive upper id bound (the watermark)
+
+        Returns:
+            Async iterator of str (csv, jsonl) or bytes (parquet) chunks
+        """
+        if export_format == "csv":
+            return self.iter_csv(db, export_filter, until_id)
+        if export_format == "jsonl":
+            return self.iter_jsonl(db, export_filter, until_id)
+        if export_format == "parquet":
+            return self.iter_parquet(db, export_filter, until_id)
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+
+def _format_value(value: Any) -> Any:
+    """Render values that csv/json cannot serialize directly."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _arrow_types(pa: Any) -> Dict[str, Any]:
+    """Arrow types for non-string export columns."""
+    return {
+        "id": pa.int64(),
+        "created_at": pa.timestamp("us"),
+        "last_requested_at": pa.timestamp("us"),
+        "is_active": pa.bool_(),
+        "request_count": pa.int64(),
+    }
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be taken out as they arrive."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        """Return and forget everything written so far."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
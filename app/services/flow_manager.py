@@ -4,18 +4,26 @@ Conversation Flow Manager.
 Manages the state machine for multi-step conversations over WhatsApp.
 Handles question sequencing, answer collection, and session management.
 
-IMPORTANT: All bot messages are in French for DRC deployment.
+Bot messages come from the localized catalog (see i18n): French by
+default for DRC deployment, or English, Lingala or Swahili when detected
+from the first message or chosen with the LANG command.
 The questions ask for codes that users should provide (e.g., 3-letter name codes).
 """
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from datetime import datetime
+from typing import Optional, Dict, Any, Sequence
 
-from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
+from app.deadline import Deadline
 from app.logging_config import get_logger
-from app.models.uic import ConversationSession
+from app.metrics import metrics
+from app.profiling import traced
+from app.services.city_codes import get_city_index
+from app.services.i18n import MessageCatalog, get_catalog, note_language
+from app.services.message_journal import STEP_COMMAND, note_step
+from app.services.returning_users import ReturningUserIndex
+from app.services.session_store import SessionState, SessionStore, build_session_store
 
 logger = get_logger(__name__)
 
@@ -26,39 +34,43 @@ class ConversationStep:
     def __init__(
         self,
         key: str,
-        question_en: str,
-        question_fr: str,
         field_name: str,
-        validator: Optional[callable] = None
+        validator: Optional[callable] = None,
+        normalizer: Optional[callable] = None
     ):
         """
         Initialize conversation step.
 
         Args:
-            key: Unique identifier for this step
-            question_en: Question text in English
-            question_fr: Question text in French
+            key: Unique identifier for this step; its question is the
+                catalog message ``question.<key>``
             field_name: Database field name to store the answer
             validator: Optional validation function
+            normalizer: Optional function mapping the raw answer to its
+                canonical form before validation
         """
         self.key = key
-        self.question_en = question_en
-        self.question_fr = question_fr
         self.field_name = field_name
         self.validator = validator
+        self.normalizer = normalizer
 
-    def get_question(self, language: str = "en") -> str:
+    def get_question(self, language: str = "fr") -> str:
         """Get question text in specified language."""
-        if language == "fr":
-            return self.question_fr
-        return self.question_en
+        return get_catalog().text(language, f"question.{self.key}")
+
+    def normalize(self, answer: str) -> str:
+        """Map the answer to its canonical form, if the step has a normalizer."""
+        if self.normalizer:
+            return self.normalizer(answer)
+        return answer
 
     def validate(self, answer: str) -> tuple[bool, Optional[str]]:
         """
         Validate the answer.
 
         Returns:
-            Tuple of (is_valid, error_message)
+            Tuple of (is_valid, error_key); error_key is an ``error.*``
+            catalog message
         """
         if self.validator:
             return self.validator(answer)
@@ -70,10 +82,10 @@ def validate_digits_only(answer: str) -> tuple[bool, Optional[str]]:
     answer = answer.strip()
 
     if not answer.isdigit():
-        return False, "Veuillez entrer uniquement des chiffres (pas de lettres ou d'espaces)"
+        return False, "error.digits_only"
 
     if len(answer) < 1:
-        return False, "Veuillez entrer au moins 1 chiffre"
+        return False, "error.digits_min"
 
     return True, None
 
@@ -83,10 +95,10 @@ def validate_letters_only(answer: str) -> tuple[bool, Optional[str]]:
     answer = answer.strip()
 
     if not answer.isalpha():
-        return False, "Veuillez entrer uniquement des lettres (pas de chiffres ou de caractères spéciaux)"
+        return False, "error.letters_only"
 
     if len(answer) < 2:
-        return False, "Veuillez entrer au moins 2 lettres"
+        return False, "error.letters_min"
 
     return True, None
 
@@ -96,23 +108,42 @@ def validate_gender_code(answer: str) -> tuple[bool, Optional[str]]:
     answer = answer.strip()
 
     if not answer.isdigit():
-        return False, "Veuillez entrer un chiffre (1, 2, 3 ou 4)"
+        return False, "error.gender_digit"
 
     if answer not in ['1', '2', '3', '4']:
-        return False, "Le code de genre doit être 1, 2, 3 ou 4"
+        return False, "error.gender_range"
 
     return True, None
 
 
+def normalize_city_answer(answer: str) -> str:
+    """Resolve a city name, alias or misspelling to its 2-letter code."""
+    match = get_city_index().resolve(answer)
+    if match is None:
+        return answer
+
+    if match.matched_by != "code":
+        logger.info(
+            "City answer resolved",
+            city_code=match.code,
+            matched_by=match.matched_by,
+            score=match.score
+        )
+    return match.code
+
+
 def validate_city_code(answer: str) -> tuple[bool, Optional[str]]:
-    """Validate that answer is exactly 2 letters."""
+    """Validate that answer is exactly 2 letters (and a known city in strict mode)."""
     answer = answer.strip().upper()
 
     if not answer.isalpha():
-        return False, "Le code de ville doit contenir uniquement des lettres"
+        return False, "error.city_letters"
 
     if len(answer) != 2:
-        return False, "Le code de ville doit contenir exactement 2 lettres"
+        return False, "error.city_format"
+
+    if settings.city_code_strict and not get_city_index().is_code(answer):
+        return False, "error.city_unknown"
 
     return True, None
 
@@ -120,10 +151,10 @@ def validate_city_code(answer: str) -> tuple[bool, Optional[str]]:
 def validate_not_empty(answer: str) -> tuple[bool, Optional[str]]:
     """Validate that answer is not empty."""
     if not answer or not answer.strip():
-        return False, "Veuillez fournir une réponse"
+        return False, "error.empty"
 
     if len(answer.strip()) < 1:
-        return False, "La réponse est trop courte"
+        return False, "error.empty"
 
     return True, None
 
@@ -149,276 +180,350 @@ class FlowManager:
     STEPS = [
         ConversationStep(
             key="last_name_code",
-            question_en=(
-                "Question 1 of 5:\n\n"
-                "What are the first 3 letters of your last name?\n\n"
-                "Example: MBE"
-            ),
-            question_fr=(
-                "Question 1 sur 5:\n\n"
-                "Quelles sont les 3 premières lettres de votre nom de famille?\n\n"
-                "Exemple: MBE"
-            ),
             field_name="last_name_code",
             validator=validate_letters_only
         ),
         ConversationStep(
             key="first_name_code",
-            question_en=(
-                "Question 2 of 5:\n\n"
-                "What are the first 3 letters of your first name?\n\n"
-                "Example: IBR"
-            ),
-            question_fr=(
-                "Question 2 sur 5:\n\n"
-                "Quelles sont les 3 premières lettres de votre prénom?\n\n"
-                "Exemple: IBR"
-            ),
             field_name="first_name_code",
             validator=validate_letters_only
         ),
         ConversationStep(
             key="birth_year_digit",
-            question_en=(
-                "Question 3 of 5:\n\n"
-                "What is the last digit of your birth year?\n\n"
-                "Example: 7"
-            ),
-            question_fr=(
-                "Question 3 sur 5:\n\n"
-                "Quel est le dernier chiffre de votre année de naissance?\n\n"
-                "Exemple: 7 (pour 1997)"
-            ),
             field_name="birth_year_digit",
             validator=validate_digits_only
         ),
         ConversationStep(
             key="city_code",
-            question_en=(
-                "Question 4 of 5:\n\n"
-                "What is your city code?\n\n"
-                "Example: DA"
-            ),
-            question_fr=(
-                "Question 4 sur 5:\n\n"
-                "Quel est le code de votre ville de naissance?\n"
-                "(2 lettres)\n\n"
-                "Exemple: DA (pour Dakar)"
-            ),
             field_name="city_code",
-            validator=validate_city_code
+            validator=validate_city_code,
+            normalizer=normalize_city_answer
         ),
         ConversationStep(
             key="gender_code",
-            question_en=(
-                "Question 5 of 5:\n\n"
-                "What is your gender code?\n\n"
-                "Enter 1, 2, 3, or 4"
-            ),
-            question_fr=(
-                "Question 5 sur 5:\n\n"
-                "Quel est votre code de genre?\n\n"
-                "1 = Homme\n"
-                "2 = Femme\n"
-                "3 = Trans\n"
-                "4 = Autre"
-            ),
             field_name="gender_code",
             validator=validate_gender_code
         ),
     ]
 
-    WELCOME_MESSAGE_EN = (
-        "👋 Welcome to the UIC Generator!\n\n"
-        "I will ask you 5 questions to generate your Unique Identifier Code (UIC).\n\n"
-        "📋 Your UIC is:\n"
-        "• Unique to you\n"
-        "• Private and secure\n"
-        "• Can be regenerated if needed\n\n"
-        "Type RESTART anytime to start over.\n"
-        "Type HELP for assistance.\n\n"
-        "Let's begin! 🚀"
-    )
-
-    WELCOME_MESSAGE_FR = (
-        "👋 Bienvenue au Générateur CIU!\n\n"
-        "Je vais vous poser 5 questions pour générer votre Code d'Identification Unique (CIU).\n\n"
-        "📋 Votre CIU est:\n"
-        "• Unique pour vous\n"
-        "• Privé et sécurisé\n"
-        "• Peut être régénéré si nécessaire\n\n"
-        "Tapez RESTART pour recommencer.\n"
-        "Tapez HELP pour de l'aide.\n\n"
-        "Commençons! 🚀"
-    )
-
-    COMPLETION_MESSAGE_EN = (
-        "✅ Thank you! I have all the information.\n\n"
-        "Generating your secure UIC...\n"
-        "⏳ Please wait..."
-    )
-
-    COMPLETION_MESSAGE_FR = (
-        "✅ Merci! J'ai toutes les informations.\n\n"
-        "Génération de votre CIU sécurisé...\n"
-        "⏳ Veuillez patienter..."
-    )
-
-    def __init__(self):
-        """Initialize FlowManager."""
-        logger.info("FlowManager initialized", total_steps=len(self.STEPS))
+    NEW_REGISTRATION_REPLIES = ("0", "NOUVEAU")
+
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        returning_users: Optional[ReturningUserIndex] = None,
+        catalog: Optional[MessageCatalog] = None
+    ):
+        """
+        Initialize FlowManager.
+
+        Args:
+            store: Conversation session store. If None, uses the configured backend.
+            returning_users: Phone -> UIC index. If set, numbers that already
+                have a UIC are offered a resend instead of the questions.
+            catalog: Localized messages. If None, uses the bundled catalog.
+        """
+        self.store = store or build_session_store()
+        self.returning_users = returning_users
+        self.catalog = catalog or get_catalog()
+        logger.info(
+            "FlowManager initialized",
+            total_steps=len(self.STEPS),
+            languages=list(self.catalog.languages),
+            returning_user_shortcut=returning_users is not None
+        )
+
+    def returning_user_offer(self, codes: Sequence[str], language: Optional[str] = None) -> str:
+        """
+        Build the resend offer for a number with registered codes.
+
+        Codes are partly masked: on a shared phone the name codes are
+        enough to tell people apart.
+
+        Args:
+            codes: Codes registered from the number, oldest first
+            language: Reply language. If None, uses the catalog default.
+
+        Returns:
+            Message text
+        """
+        return self.catalog.returning_offer(language, [f"{code[:6]}••••" for code in codes])
+
+    def _reply(self, response: Optional[str], language: str, **extra: Any) -> Dict[str, Any]:
+        """Build a response dictionary for a message that does not complete the conversation."""
+        return {
+            "response": response,
+            "is_complete": False,
+            "collected_data": None,
+            "language": language,
+            **extra
+        }
 
     async def get_or_create_session(
         self,
         db: AsyncSession,
         phone_number: str,
-        language: str = "fr"
-    ) -> ConversationSession:
+        language: Optional[str] = None
+    ) -> SessionState:
         """
         Get existing session or create new one.
 
+        New and reset sessions are not stored here; process_message saves
+        the session once, after the answer has been applied.
+
         Args:
             db: Database session
             phone_number: User's WhatsApp phone number
-            language: Preferred language (en or fr)
+            language: Language of a new session. If None, uses the catalog default.
 
         Returns:
-            ConversationSession instance
+            SessionState instance
         """
-        # Try to find existing session
-        stmt = select(ConversationSession).where(
-            ConversationSession.phone_number == phone_number
-        )
-        result = await db.execute(stmt)
-        session = result.scalar_one_or_none()
+        session = await self.store.get(db, phone_number)
+        return self._resume_or_start(session, phone_number, language or self.catalog.default_language)
 
+    def _resume_or_start(
+        self,
+        session: Optional[SessionState],
+        phone_number: str,
+        language: str = "fr"
+    ) -> SessionState:
+        """Continue a stored session, resetting it if expired, or start a new one."""
         if session:
-            # Check if expired
+            # Check if expired: start over in place rather than delete + insert
             if session.is_expired:
-                logger.info("Session expired, creating new one", phone_number=phone_number)
-                await db.delete(session)
-                await db.commit()
-                session = None
+                logger.info("Session expired, resetting", phone_number=phone_number)
+                session.reset()
             else:
                 logger.info(
                     "Found existing session",
                     phone_number=phone_number,
                     step=session.current_step
                 )
-                return session
+            return session
 
         # Create new session
-        expires_at = datetime.utcnow() + timedelta(minutes=settings.session_timeout_minutes)
+        logger.info("Created new session", phone_number=phone_number)
 
-        session = ConversationSession(
-            phone_number=phone_number,
-            current_step=0,
-            language=language,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
-            expires_at=expires_at
-        )
+        return SessionState(phone_number=phone_number, language=language)
 
-        db.add(session)
-        await db.commit()
-        await db.refresh(session)
+    async def restart_session(self, db: AsyncSession, phone_number: str) -> str:
+        """
+        Restart conversation from the first question.
 
-        logger.info("Created new session", phone_number=phone_number)
+        With the returning-user shortcut, or when the user chose a language
+        other than the default, a fresh session is stored instead of
+        deleting it: its presence is what tells the next message apart
+        from a returning user's first one, and it keeps the language.
+
+        Args:
+            db: Database session
+            phone_number: User's WhatsApp phone number
+
+        Returns:
+            The user's language
+        """
+        stored = await self.store.get(db, phone_number)
+        language = stored.language if stored else self.catalog.default_language
+
+        if self.returning_users is None and language == self.catalog.default_language:
+            await self.store.delete(db, phone_number)
+        else:
+            await self._start_questions(db, phone_number, stored, language)
+
+        logger.info("Session restarted", phone_number=phone_number)
+        return language
 
-        return session
+    async def _start_questions(
+        self,
+        db: AsyncSession,
+        phone_number: str,
+        stored: Optional[SessionState],
+        language: str
+    ) -> None:
+        """Store a session at the first question, reusing the stored row if any."""
+        session = stored or SessionState(phone_number=phone_number)
+        session.reset()
+        session.language = language
+        await self.store.save(db, session)
+
+    async def _change_language(
+        self,
+        db: AsyncSession,
+        phone_number: str,
+        stored: Optional[SessionState],
+        language: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Handle the LANG command: store the chosen language and repeat the current question in it.
+
+        Args:
+            db: Database session
+            phone_number: User's WhatsApp phone number
+            stored: Stored session, if any
+            language: Chosen language, or None to show the language menu
 
-    async def restart_session(self, db: AsyncSession, phone_number: str) -> None:
+        Returns:
+            Response dictionary
+        """
+        if language is None:
+            current = stored.language if stored else self.catalog.default_language
+            note_language(current)
+            return self._reply(self.catalog.text(current, "language.menu"), current)
+
+        session = self._resume_or_start(stored, phone_number, language)
+        session.language = language
+        session.updated_at = datetime.utcnow()
+        await self.store.save(db, session)
+        note_language(language)
+        metrics.increment(f"flow.language_set.{language}")
+        logger.info("Language changed", phone_number=phone_number, language=language)
+
+        if session.current_step == 0:
+            return self._reply(self.catalog.text(language, "language.set.start"), language)
+        step_key = self.STEPS[session.current_step].key
+        return self._reply(self.catalog.text(language, f"language.set.{step_key}"), language)
+
+    async def _returning_user_reply(
+        self,
+        db: AsyncSession,
+        phone_number: str,
+        message: str,
+        stored: Optional[SessionState],
+        language: str
+    ) -> Optional[Dict[str, Any]]:
         """
-        Restart conversation by deleting existing session.
+        Answer a number with registered codes and no conversation in progress.
 
         Args:
             db: Database session
             phone_number: User's WhatsApp phone number
+            message: User's message
+            stored: Stored (expired) session, if any
+            language: Reply language
+
+        Returns:
+            Response dictionary, or None if the number has no codes
         """
-        stmt = delete(ConversationSession).where(
-            ConversationSession.phone_number == phone_number
-        )
-        await db.execute(stmt)
-        await db.commit()
+        codes = await self.returning_users.codes_for(db, phone_number)
+        if not codes:
+            return None
 
-        logger.info("Session restarted", phone_number=phone_number)
+        reply = message.upper()
+        if reply in self.NEW_REGISTRATION_REPLIES:
+            await self._start_questions(db, phone_number, stored, language)
+            return self._reply(self.catalog.text(language, "start"), language)
+
+        if reply.isdigit() and 1 <= int(reply) <= len(codes):
+            metrics.increment("returning_users.resent")
+            logger.info("Resending UIC to returning user", phone_number=phone_number)
+            return self._reply(None, language, resend_uic=codes[int(reply) - 1])
+
+        metrics.increment("returning_users.offered")
+        return self._reply(self.returning_user_offer(codes, language), language)
 
+    @traced("process_message")
     async def process_message(
         self,
         db: AsyncSession,
         phone_number: str,
-        message: str
+        message: str,
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         """
         Process incoming message and return appropriate response.
 
+        Session changes are staged on ``db`` without committing, so the
+        caller can commit them together with the UIC in one transaction.
+
         Args:
             db: Database session
             phone_number: User's WhatsApp phone number
             message: User's message
+            deadline: Request budget; the returning-user lookup is skipped
+                when it runs low (the questions start instead)
 
         Returns:
             Dictionary with:
             - response: Text to send back to user
             - is_complete: Whether conversation is complete
             - collected_data: Dictionary of collected answers (if complete)
+            - language: The user's language, for any further reply text
+            - resend_uic: Existing code to send again (returning users only)
         """
         message = message.strip()
+        command = message.upper()
+        catalog = self.catalog
 
         # Handle special commands
-        if message.upper() == "RESTART":
-            await self.restart_session(db, phone_number)
-            return {
-                "response": self.WELCOME_MESSAGE_FR + "\n\n" + self.STEPS[0].get_question("fr"),
-                "is_complete": False,
-                "collected_data": None
-            }
-
-        if message.upper() == "HELP":
-            help_text = (
-                "📖 Aide:\n\n"
-                "Commandes:\n"
-                "• RESTART - Recommencer depuis le début\n"
-                "• HELP - Afficher ce message\n\n"
-                "Je vais vous poser 5 questions pour générer votre CIU.\n"
-                "Répondez à chaque question et appuyez sur envoyer."
-            )
-            return {
-                "response": help_text,
-                "is_complete": False,
-                "collected_data": None
-            }
+        if command in ("RESTART", "HELP"):
+            note_step(STEP_COMMAND)
+
+        if command == "RESTART":
+            language = await self.restart_session(db, phone_number)
+            note_language(language)
+            return self._reply(catalog.text(language, "start"), language)
+
+        stored = await self.store.get(db, phone_number)
+
+        if command == "HELP":
+            language = stored.language if stored else catalog.default_language
+            note_language(language)
+            return self._reply(catalog.text(language, "help"), language)
+
+        is_language_command, chosen = catalog.parse_language_command(message)
+        if is_language_command:
+            note_step(STEP_COMMAND)
+            return await self._change_language(db, phone_number, stored, chosen)
+
+        # A first message may say which language the user speaks
+        new_conversation = stored is None or stored.is_expired
+        detected = catalog.detect(message) if new_conversation else None
+        language = detected or (stored.language if stored else catalog.default_language)
+        note_language(language)
+
+        # Known number and no conversation in progress: offer a resend
+        if (
+            self.returning_users is not None
+            and new_conversation
+            and (deadline is None or deadline.allows("returning_user_lookup"))
+        ):
+            reply = await self._returning_user_reply(db, phone_number, message, stored, language)
+            if reply is not None:
+                note_step(STEP_COMMAND)
+                return reply
 
         # Get or create session
-        session = await self.get_or_create_session(db, phone_number)
+        session = self._resume_or_start(stored, phone_number, language)
+        note_step(session.current_step)
 
         # If step is 0, this is a welcome message
-        if session.current_step == 0 and not message:
-            response = self.WELCOME_MESSAGE_FR + "\n\n" + self.STEPS[0].get_question("fr")
-            return {
-                "response": response,
-                "is_complete": False,
-                "collected_data": None
-            }
+        if session.current_step == 0 and (not message or detected):
+            if detected:
+                # A greeting, not an answer: keep the language for the questions
+                session.language = detected
+                await self.store.save(db, session)
+                metrics.increment(f"flow.language_detected.{detected}")
+            return self._reply(catalog.text(session.language, "start"), session.language)
 
         # Get current step
         current_step = self.STEPS[session.current_step]
 
-        # Validate answer
-        is_valid, error_message = current_step.validate(message)
+        # Canonicalize (e.g. city name -> code), then validate
+        message = current_step.normalize(message)
+        is_valid, error_key = current_step.validate(message)
 
         if not is_valid:
             logger.warning(
                 "Validation failed",
                 phone_number=phone_number,
                 step=current_step.key,
-                error=error_message
+                error=error_key
+            )
+            return self._reply(
+                catalog.text(session.language, f"invalid.{current_step.key}.{error_key}"),
+                session.language
             )
-            return {
-                "response": f"❌ {error_message}\n\n{current_step.get_question(session.language)}",
-                "is_complete": False,
-                "collected_data": None
-            }
 
         # Store answer
         setattr(session, current_step.field_name, message)
@@ -437,17 +542,10 @@ class FlowManager:
         # Check if conversation is complete
         if session.current_step >= len(self.STEPS):
             # Collect all data
-            collected_data = {
-                "last_name_code": session.last_name_code,
-                "first_name_code": session.first_name_code,
-                "birth_year_digit": session.birth_year_digit,
-                "city_code": session.city_code,
-                "gender_code": session.gender_code,
-            }
+            collected_data = session.collected_data()
 
             # Delete session (conversation complete)
-            await db.delete(session)
-            await db.commit()
+            await self.store.delete(db, phone_number)
 
             logger.info(
                 "Conversation complete",
@@ -456,22 +554,17 @@ class FlowManager:
             )
 
             return {
-                "response": self.COMPLETION_MESSAGE_FR,
+                "response": catalog.text(session.language, "completion"),
                 "is_complete": True,
-                "collected_data": collected_data
+                "collected_data": collected_data,
+                "language": session.language
             }
 
         # Continue to next question
-        await db.commit()
+        await self.store.save(db, session)
 
         next_step = self.STEPS[session.current_step]
-        response = f"✅ Compris!\n\n{next_step.get_question(session.language)}"
-
-        return {
-            "response": response,
-            "is_complete": False,
-            "collected_data": None
-        }
+        return self._reply(catalog.text(session.language, f"next.{next_step.key}"), session.language)
 
     async def cleanup_expired_sessions(self, db: AsyncSession) -> int:
         """
@@ -483,14 +576,7 @@ class FlowManager:
         Returns:
             Number of sessions deleted
         """
-        stmt = delete(ConversationSession).where(
-            ConversationSession.expires_at < datetime.utcnow()
-        )
-
-        result = await db.execute(stmt)
-        await db.commit()
-
-        count = result.rowcount
+        count = await self.store.cleanup_expired(db)
         logger.info("Cleaned up expired sessions", count=count)
 
         return count
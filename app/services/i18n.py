@@ -0,0 +1,264 @@
+"""
+Localized Bot Messages.
+
+Every message the bot sends comes from a catalog (app/data/messages.json)
+in French, English, Lingala and Swahili. The catalog is loaded once and
+compiled into final strings:
+1. Missing translations are filled from French
+2. Replies built from several messages (welcome + first question,
+   "Got it!" + next question, error + current question, the UIC
+   messages with and without the QR notice) are joined in advance
+3. Messages with a {uic} placeholder are split around it
+
+so sending a reply is a dictionary lookup (plus inserting the code).
+
+A user's language is detected from their first message (greetings such
+as "Mbote" or "Habari") or chosen with the LANG command, and stored with
+the conversation session. A first message may also be the answer to the
+first question, so detection words are limited to greetings and
+language names that are not plausible surnames (not "Sango", "Salama",
+"Hi" or "Good").
+"""
+import contextvars
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.logging_config import get_logger
+from app.services.city_codes import normalize_key
+
+logger = get_logger(__name__)
+
+DEFAULT_CATALOG = Path(__file__).resolve().parent.parent / "data" / "messages.json"
+
+# Command words opening a language change ("LANG SW", "LANGUE EN", ...)
+LANGUAGE_COMMANDS = frozenset({"LANG", "LANGUE", "LANGUAGE", "LOKOTA", "LUGHA"})
+
+_current_language: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "reply_language", default=None
+)
+
+
+def note_language(language: Optional[str]) -> None:
+    """Record the current request's reply language (called by FlowManager)."""
+    _current_language.set(language)
+
+
+def noted_language() -> Optional[str]:
+    """Reply language noted for the current request, if known yet."""
+    return _current_language.get()
+
+
+class MessageCatalog:
+    """Compiled bot messages for every supported language."""
+
+    def __init__(
+        self,
+        messages: Dict[str, Dict[str, str]],
+        languages: Dict[str, str],
+        default_language: str,
+        detection: Optional[Dict[str, Iterable[str]]] = None
+    ):
+        """
+        Compile a catalog.
+
+        Args:
+            messages: Message key -> language -> text
+            languages: Language code -> language name, in menu order
+            default_language: Language used when none is known, and for
+                missing translations
+            detection: Language code -> words identifying it in a first message
+        """
+        if default_language not in languages:
+            raise ValueError(f"Default language {default_language!r} is not in the catalog")
+
+        self.languages = tuple(languages)
+        self.language_names = dict(languages)
+        self.default_language = default_language
+        # Conversation steps, in question order ("question.<step key>" messages)
+        self.step_keys = tuple(key[len("question."):] for key in messages if key.startswith("question."))
+        self._error_keys = [key for key in messages if key.startswith("error.")]
+
+        self._texts: Dict[str, Dict[str, str]] = {}
+        self._templates: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        for language in self.languages:
+            texts = {
+                key: by_language.get(language) or by_language[default_language]
+                for key, by_language in messages.items()
+            }
+            self._add_composites(texts)
+            self._texts[language] = texts
+            self._templates[language] = {
+                key: tuple(text.split("{uic}", 1))
+                for key, text in texts.items()
+                if "{uic}" in text
+            }
+
+        # Words that name or greet in a language, and the names of the languages
+        self._detection: Dict[str, str] = {}
+        for language, words in (detection or {}).items():
+            for word in words:
+                self._detection[normalize_key(word)] = language
+        self._choices: Dict[str, str] = {}
+        for language, name in languages.items():
+            self._choices[normalize_key(language)] = language
+            self._choices[normalize_key(name)] = language
+        for number, language in enumerate(self.languages, start=1):
+            self._choices[str(number)] = language
+
+    def _add_composites(self, texts: Dict[str, str]) -> None:
+        """Join the multi-part replies of one language."""
+        if self.step_keys:
+            texts["start"] = texts["welcome"] + "\n\n" + texts[f"question.{self.step_keys[0]}"]
+            texts["language.set.start"] = texts["language.set"] + "\n\n" + texts["start"]
+        for step_key in self.step_keys:
+            question = texts[f"question.{step_key}"]
+            texts[f"next.{step_key}"] = texts["ack"] + "\n\n" + question
+            texts[f"language.set.{step_key}"] = texts["language.set"] + "\n\n" + question
+            for error_key in self._error_keys:
+                texts[f"invalid.{step_key}.{error_key}"] = f"❌ {texts[error_key]}\n\n{question}"
+
+        for kind in ("new", "existing", "resend"):
+            if f"uic.{kind}" not in texts:
+                continue
+            notice = texts["uic.new.qr"] if kind == "new" else texts["uic.qr"]
+            body, restart = texts[f"uic.{kind}"], texts[f"uic.{kind}.restart"]
+            texts[f"uic.{kind}.reply"] = f"{body}\n\n{restart}"
+            texts[f"uic.{kind}.reply.qr"] = f"{body}\n\n{notice}\n\n{restart}"
+
+    @classmethod
+    def from_file(cls, path: Path) -> "MessageCatalog":
+        """
+        Load a catalog JSON file.
+
+        The file holds ``{"default_language", "languages": {code: name},
+        "messages": {key: {code: text}}, "detection": {code: [words]}}``.
+
+        Args:
+            path: Catalog path
+
+        Returns:
+            MessageCatalog
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        catalog = cls(
+            messages=data["messages"],
+            languages=data["languages"],
+            default_language=data["default_language"],
+            detection=data.get("detection"),
+        )
+        logger.info(
+            "Message catalog loaded",
+            path=str(path),
+            languages=list(catalog.languages),
+            messages=len(data["messages"])
+        )
+        return catalog
+
+    def supports(self, language: Optional[str]) -> bool:
+        """Check if a language code is in the catalog."""
+        return language in self._texts
+
+    def text(self, language: Optional[str], key: str) -> str:
+        """
+        Get a compiled message.
+
+        Args:
+            language: Language code; unknown codes get the default language
+            key: Message key, or a compiled reply key: start, next.<step>,
+                invalid.<step>.<error key>, language.set.<step>, language.set.start,
+                uic.<kind>.reply[.qr]
+
+        Returns:
+            Message text
+        """
+        texts = self._texts.get(language) or self._texts[self.default_language]
+        return texts[key]
+
+    def with_code(self, language: Optional[str], key: str, uic_code: str) -> str:
+        """
+        Get a compiled message with its {uic} placeholder filled.
+
+        Args:
+            language: Language code
+            key: Message key containing {uic}
+            uic_code: Code to insert
+
+        Returns:
+            Message text
+        """
+        templates = self._templates.get(language) or self._templates[self.default_language]
+        before, after = templates[key]
+        return before + uic_code + after
+
+    def detect(self, message: str) -> Optional[str]:
+        """
+        Guess the language of a first message from greeting and language words.
+
+        Args:
+            message: Message text
+
+        Returns:
+            Language code, or None if no word identifies one
+        """
+        for word in message.split():
+            language = self._detection.get(normalize_key(word))
+            if language is not None:
+                return language
+        return None
+
+    def parse_language_command(self, message: str) -> Tuple[bool, Optional[str]]:
+        """
+        Recognize a LANG command.
+
+        Args:
+            message: Message text, e.g. "LANG SW", "langue français" or "LANG 2"
+
+        Returns:
+            Tuple of (is_command, language); language is None for a bare or
+            unrecognized choice (answer with the menu)
+        """
+        words = message.split()
+        if not words or normalize_key(words[0]) not in LANGUAGE_COMMANDS:
+            return False, None
+        choice = normalize_key("".join(words[1:]))
+        return True, self._choices.get(choice)
+
+    def returning_offer(self, language: Optional[str], masked_codes: List[str]) -> str:
+        """
+        Build the resend offer for a number with registered codes.
+
+        Args:
+            language: Language code
+            masked_codes: Partly masked codes, oldest first
+
+        Returns:
+            Message text
+        """
+        if len(masked_codes) == 1:
+            body = self.text(language, "returning.single")
+        else:
+            body = (
+                self.text(language, "returning.multiple") + "\n"
+                + "".join(f"{i} - {code}\n" for i, code in enumerate(masked_codes, start=1))
+                + "\n" + self.text(language, "returning.multiple_choice")
+            )
+        return (
+            self.text(language, "returning.greeting") + "\n\n"
+            + body + "\n"
+            + self.text(language, "returning.new_option")
+        )
+
+
+@lru_cache()
+def get_catalog() -> MessageCatalog:
+    """
+    Get the process-wide message catalog, compiling it on first use.
+
+    Returns:
+        MessageCatalog built from the bundled messages.json
+    """
+    return MessageCatalog.from_file(DEFAULT_CATALOG)
@@ -0,0 +1,248 @@
+"""
+Keyed input hashing.
+
+``input_hash`` identifies a person's normalized inputs. The input space
+(name codes, one digit, city, gender) is small enough to enumerate, so
+an unkeyed digest can be reversed offline; it is therefore an
+HMAC-SHA256 keyed by the UIC salt. Every record stores the version of
+the key that produced its hash:
+
+- Version 0: the original unkeyed SHA-256, accepted while
+  UIC_ACCEPT_UNKEYED_HASHES is set
+- Versions 1+: HMAC keyed by UIC_SALT (at UIC_SALT_VERSION) or by an
+  earlier salt listed in UIC_PREVIOUS_SALTS
+
+Lookups try the current version first, then the older ones, so a key
+rotation does not require downtime. rehash_registry rewrites old rows in
+small throttled transactions until every row is on the current version,
+after which the old salts can be dropped from the configuration. At
+startup the app drops older versions no stored row uses any more
+(InputHasher.retain_versions), so a finished re-hash stops costing an
+extra digest per lookup even before the configuration is cleaned up.
+
+Shards are placed by sharding.placement_key, which is the version 0
+digest computed in memory and never stored, so rotating keys never moves
+rows between shards.
+"""
+import asyncio
+import hashlib
+import hmac
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import metrics
+from app.models.uic import UICRecord
+from app.sharding import NORMALIZED_COLUMNS, hash_message, placement_key
+
+logger = get_logger(__name__)
+
+UNKEYED_VERSION = 0
+
+_SHA256 = hashlib.sha256()
+
+
+class InputHasher:
+    """
+    Versioned keyed hashing of normalized inputs.
+
+    The HMAC key schedule is computed once per version and copied for
+    every hash.
+    """
+
+    def __init__(
+        self,
+        keys: Mapping[int, str],
+        current_version: int,
+        accept_unkeyed: bool = False
+    ):
+        """
+        Initialize the hasher.
+
+        Args:
+            keys: Salt per key version (versions >= 1)
+            current_version: Version used for new hashes; must be in keys
+            accept_unkeyed: Also match version 0 (unkeyed) hashes on lookup
+
+        Raises:
+            ValueError: If the current version has no key or a version is < 1
+        """
+        if current_version not in keys:
+            raise ValueError(f"No salt configured for current key version {current_version}")
+        if any(version <= UNKEYED_VERSION for version in keys):
+            raise ValueError("Key versions start at 1; version 0 is the unkeyed digest")
+
+        self.keys = dict(keys)
+        self.current_version = current_version
+        self.accept_unkeyed = accept_unkeyed
+        self._macs = {
+            version: hmac.new(key.encode("utf-8"), digestmod=hashlib.sha256)
+            for version, key in keys.items()
+        }
+
+        # Lookup order: current key, then older keys newest first, then unkeyed
+        self.lookup_versions: List[int] = [current_version] + sorted(
+            (version for version in keys if version != current_version), reverse=True
+        )
+        if accept_unkeyed:
+            self.lookup_versions.append(UNKEYED_VERSION)
+
+    def __reduce__(self):
+        # Hash objects cannot be pickled; rebuild from the keys (process pools)
+        return (InputHasher, (self.keys, self.current_version, self.accept_unkeyed))
+
+    @classmethod
+    def from_settings(cls, salt: Optional[str] = None) -> "InputHasher":
+        """
+        Build the hasher from configuration.
+
+        Args:
+            salt: Current salt. If None, uses config value.
+
+        Returns:
+            InputHasher
+        """
+        keys = {int(version): key for version, key in settings.uic_previous_salts.items()}
+        keys[settings.uic_salt_version] = salt or settings.uic_salt
+        return cls(keys, settings.uic_salt_version, settings.uic_accept_unkeyed_hashes)
+
+    def hash(self, fields: Sequence[str], version: Optional[int] = None) -> str:
+        """
+        Hash normalized inputs.
+
+        Args:
+            fields: Normalized inputs, in question order
+            version: Key version. If None, the current one.
+
+        Returns:
+            Hexadecimal digest
+        """
+        if version is None:
+            version = self.current_version
+        if version == UNKEYED_VERSION:
+            return placement_key(fields)
+        mac = self._macs[version].copy()
+        mac.update(hash_message(fields))
+        return mac.hexdigest()
+
+    def retain_versions(self, stored_versions: Iterable[int]) -> None:
+        """
+        Stop looking up older key versions no stored record uses.
+
+        Called at startup with the versions found in the registry (and
+        archive). New records always get the current version, so a
+        version absent then never reappears.
+
+        Args:
+            stored_versions: hash_key_version values present in storage
+        """
+        stored = set(stored_versions)
+        dropped = [
+            version for version in self.lookup_versions
+            if version != self.current_version and version not in stored
+        ]
+        if dropped:
+            self.lookup_versions = [version for version in self.lookup_versions if version not in dropped]
+            logger.info("Unused key versions skipped on lookup", key_versions=dropped)
+
+    def candidates(self, fields: Sequence[str]) -> List[Tuple[int, str]]:
+        """
+        Hashes a stored record for these inputs may have, in lookup order.
+
+        Args:
+            fields: Normalized inputs, in question order
+
+        Returns:
+            List of (version, input_hash); the first is the current version
+        """
+        message = hash_message(fields)
+        found = []
+        for version in self.lookup_versions:
+            digest = _SHA256.copy() if version == UNKEYED_VERSION else self._macs[version].copy()
+            digest.update(message)
+            found.append((version, digest.hexdigest()))
+        return found
+
+
+async def rehash_registry(
+    session_factory: async_sessionmaker,
+    hasher: InputHasher,
+    chunk_size: int = 500,
+    pause_seconds: float = 0.05,
+    max_chunks: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Rewrite every row not hashed with the current key.
+
+    Safe to run while the app serves traffic: rows are read by primary
+    key ranges and rewritten in one short transaction per chunk, with a
+    pause between chunks so foreground writes are never blocked for
+    long. Each UPDATE is guarded on the old version, so a row the app
+    upgraded in the meantime is left alone. Interrupting and rerunning
+    continues where the previous run stopped.
+
+    Args:
+        session_factory: Session factory for the database to migrate (one shard)
+        hasher: Hasher whose current version is the target
+        chunk_size: Rows rewritten per transaction
+        pause_seconds: Sleep between chunks
+        max_chunks: Stop after this many chunks (None = until done)
+
+    Returns:
+        Counts: rows examined, rewritten, skipped (changed concurrently)
+    """
+    target = hasher.current_version
+    counts = {"examined": 0, "rewritten": 0, "skipped": 0}
+    columns = [getattr(UICRecord, name) for name in NORMALIZED_COLUMNS]
+    last_id = 0
+    chunks = 0
+
+    while max_chunks is None or chunks < max_chunks:
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(UICRecord.id, UICRecord.hash_key_version, *columns)
+                .where(UICRecord.id > last_id, UICRecord.hash_key_version != target)
+                .order_by(UICRecord.id)
+                .limit(chunk_size)
+            )).all()
+            if not rows:
+                break
+
+            rewritten = await _rewrite_chunk(db, hasher, rows)
+            await db.commit()
+
+        last_id = rows[-1].id
+        chunks += 1
+        counts["examined"] += len(rows)
+        counts["rewritten"] += rewritten
+        counts["skipped"] += len(rows) - rewritten
+        metrics.increment("rehash.rows", rewritten)
+        logger.info("Re-hash chunk committed", last_id=last_id, rows=len(rows), rewritten=rewritten)
+
+        await asyncio.sleep(pause_seconds)
+
+    logger.info("Re-hash finished", key_version=target, **counts)
+    return counts
+
+
+async def _rewrite_chunk(db: AsyncSession, hasher: InputHasher, rows: Sequence[Any]) -> int:
+    """Rewrite one chunk; returns rows actually updated."""
+    rewritten = 0
+    for row in rows:
+        fields = [getattr(row, name) for name in NORMALIZED_COLUMNS]
+        result = await db.execute(
+            update(UICRecord)
+            .where(UICRecord.id == row.id, UICRecord.hash_key_version == row.hash_key_version)
+            .values(
+                input_hash=hasher.hash(fields),
+                hash_key_version=hasher.current_version,
+                # Not a request: keep onupdate from touching it
+                last_requested_at=UICRecord.last_requested_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rewritten += result.rowcount
+    return rewritten
@@ -0,0 +1,461 @@
+"""
+Inbound Message Journal.
+
+An optional append-only record of webhook traffic, kept to reproduce
+incidents and to replay real traffic shapes against a test instance
+(scripts/replay_journal.py). Message text is never stored; a record is:
+
+    timestamp, phone hash, step, body length, MessageSid, latency, outcome
+
+Phone numbers are hashed with a key derived from UIC_SALT, so the
+journal cannot be matched against a list of numbers, while all messages
+from one number still share a hash.
+
+Writing never blocks the event loop:
+1. record() packs a fixed-size binary record (58 bytes) into an
+   in-memory batch
+2. Full batches go through a bounded queue to a writer thread, which
+   appends them to the current file and rotates it at a size limit
+   (messages.bin -> messages.bin.1 -> ...), like RotatingFileHandler.
+   The writer also picks up a partial batch once its first record is
+   older than the flush interval, so a quiet worker's records still
+   reach the file
+3. If the writer falls behind, batches are dropped and counted rather
+   than waited on
+
+With several workers each process writes messages-<pid>.bin (and its
+rotations); journal_files finds them all from the configured path.
+
+Every file starts with a small header (magic, format version, record
+size), so readers can reject files they do not understand.
+"""
+import contextvars
+import hashlib
+import heapq
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import metrics
+
+logger = get_logger(__name__)
+
+MAGIC = b"UICJ"
+FORMAT_VERSION = 1
+
+# Step values besides the question index (0-4)
+STEP_COMMAND = 254  # RESTART, HELP, returning-user replies
+STEP_UNKNOWN = 255  # Not processed (shed) or failed before the flow ran
+
+# Outcomes
+OUTCOME_OK = 0
+OUTCOME_SHED = 1
+OUTCOME_DEADLINE = 2
+OUTCOME_ERROR = 3
+
+_RECORD = struct.Struct("<d8sBH34sfB")
+_HEADER = struct.Struct("<4sBH")
+
+_current_step: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "journal_step", default=STEP_UNKNOWN
+)
+
+
+def note_step(step: int) -> None:
+    """Record which step the current request's message answered (called by FlowManager)."""
+    _current_step.set(step)
+
+
+def noted_step() -> int:
+    """Step noted for the current request, or STEP_UNKNOWN."""
+    return _current_step.get()
+
+
+@dataclass(frozen=True, slots=True)
+class JournalRecord:
+    """One inbound message."""
+
+    timestamp: float
+    phone_hash: bytes
+    step: int
+    body_length: int
+    message_sid: str
+    latency_ms: float
+    outcome: int
+
+    def pack(self) -> bytes:
+        return _RECORD.pack(
+            self.timestamp,
+            self.phone_hash,
+            self.step,
+            min(self.body_length, 0xFFFF),
+            self.message_sid.encode("ascii", "replace")[:34],
+            self.latency_ms,
+            self.outcome,
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "JournalRecord":
+        timestamp, phone_hash, step, body_length, sid, latency_ms, outcome = _RECORD.unpack(data)
+        return cls(
+            timestamp=timestamp,
+            phone_hash=phone_hash,
+            step=step,
+            body_length=body_length,
+            message_sid=sid.rstrip(b"\0").decode("ascii"),
+            latency_ms=latency_ms,
+            outcome=outcome,
+        )
+
+
+@lru_cache(maxsize=4)
+def _phone_key(secret: str) -> bytes:
+    """Journal-specific key derived from a secret (never the secret itself)."""
+    return hashlib.sha256(f"journal:{secret}".encode("utf-8")).digest()
+
+
+def hash_phone(phone_number: str, key: Optional[str] = None) -> bytes:
+    """
+    Keyed 8-byte hash of a phone number.
+
+    Args:
+        phone_number: E.164 phone number
+        key: Hash key. If None, derived from UIC_SALT.
+
+    Returns:
+        8 bytes
+    """
+    return hashlib.blake2b(
+        phone_number.encode("utf-8"), key=_phone_key(key or settings.uic_salt), digest_size=8
+    ).digest()
+
+
+class MessageJournal:
+    """Buffered, rotating binary journal written from a background thread."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        backup_count: Optional[int] = None,
+        batch_records: int = 256,
+        flush_interval_seconds: float = 1.0,
+        queue_batches: int = 64
+    ):
+        """
+        Open the journal and start the writer thread.
+
+        Args:
+            path: Journal file. If None, uses config value.
+            max_bytes: Rotate when the file would exceed this. If None, uses config value.
+            backup_count: Rotated files kept. If None, uses config value.
+            batch_records: Records buffered before a batch is handed to the writer
+            flush_interval_seconds: Hand over a partial batch when its first
+                record is older than this
+            queue_batches: Batches waiting for the writer before new ones are dropped
+        """
+        self.path = Path(path or settings.message_journal_path)
+        self.max_bytes = max_bytes or settings.message_journal_max_bytes
+        self.backup_count = settings.message_journal_backup_count if backup_count is None else backup_count
+        self.batch_records = batch_records
+        self.flush_interval_seconds = flush_interval_seconds
+        self.dropped = 0
+
+        # Shared with the writer thread, which flushes batches left too long
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._buffered = 0
+        self._buffer_started = 0.0
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=queue_batches)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: Optional[BinaryIO] = None
+        self._thread = threading.Thread(target=self._run, name="message-journal", daemon=True)
+        self._thread.start()
+        logger.info("Message journal opened", path=str(self.path), max_bytes=self.max_bytes)
+
+    def record(
+        self,
+        phone_number: str,
+        message_sid: Optional[str],
+        body_length: int,
+        step: int,
+        received_at: float,
+        latency_seconds: float,
+        outcome: int = OUTCOME_OK
+    ) -> None:
+        """
+        Append one message to the journal (buffered; never blocks).
+
+        Args:
+            phone_number: Sender's phone number
+            message_sid: Twilio MessageSid
+            body_length: Length of the message text
+            step: Question index answered, STEP_COMMAND or STEP_UNKNOWN
+            received_at: Arrival time (time.time())
+            latency_seconds: Time taken to build the reply
+            outcome: OUTCOME_* value
+        """
+        packed = JournalRecord(
+            timestamp=received_at,
+            phone_hash=hash_phone(phone_number),
+            step=step,
+            body_length=body_length,
+            message_sid=message_sid or "",
+            latency_ms=latency_seconds * 1000.0,
+            outcome=outcome,
+        ).pack()
+        with self._lock:
+            self._buffer += packed
+            if self._buffered == 0:
+                self._buffer_started = time.monotonic()
+            self._buffered += 1
+            full = self._buffered >= self.batch_records
+
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the buffered records to the writer thread."""
+        batch = self._take()
+        if batch is None:
+            return
+        try:
+            self._queue.put_nowait(batch)
+        except queue.Full:
+            count = len(batch) // _RECORD.size
+            self.dropped += count
+            metrics.increment("journal.dropped", count)
+
+    def _take(self, older_than: Optional[float] = None) -> Optional[bytes]:
+        """Remove and return the buffered records (only if buffered before older_than)."""
+        with self._lock:
+            if not self._buffered or (older_than is not None and self._buffer_started > older_than):
+                return None
+            batch = bytes(self._buffer)
+            self._buffer.clear()
+            self._buffered = 0
+        return batch
+
+    def close(self) -> None:
+        """Flush, stop the writer thread and close the file."""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        logger.info("Message journal closed", path=str(self.path), dropped=self.dropped)
+
+    # Writer thread
+
+    def _run(self) -> None:
+        try:
+            while True:
+                try:
+                    batch = self._queue.get(timeout=self.flush_interval_seconds)
+                except queue.Empty:
+                    batch = b""
+                if batch is None:
+                    break
+                if batch:
+                    self._write(batch)
+                # Partial batch waiting longer than the flush interval
+                stale = self._take(older_than=time.monotonic() - self.flush_interval_seconds)
+                if stale is not None:
+                    self._write(stale)
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self) -> BinaryIO:
+        handle = open(self.path, "ab")
+        if handle.tell() == 0:
+            handle.write(_HEADER.pack(MAGIC, FORMAT_VERSION, _RECORD.size))
+        return handle
+
+    def _write(self, batch: bytes) -> None:
+        try:
+            if self._file is None:
+                self._file = self._open()
+            if self._file.tell() + len(batch) > self.max_bytes and self._file.tell() > _HEADER.size:
+                self._rotate()
+            self._file.write(batch)
+            self._file.flush()
+            metrics.increment("journal.records", len(batch) // _RECORD.size)
+        except OSError as error:
+            self.dropped += len(batch) // _RECORD.size
+            logger.error("Message journal write failed", path=str(self.path), error=str(error))
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = self.path.with_name(f"{self.path.name}.{index}")
+                if source.exists():
+                    os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = self._open()
+
+
+def journal_files(path: Path) -> List[Path]:
+    """
+    Files of a journal, oldest first (rotated backups, then the current file).
+
+    Per-worker journals next to it (messages-<pid>.bin for messages.bin)
+    and their backups are included, including those of workers that have
+    since exited; read_journal merges them.
+
+    Args:
+        path: Configured journal file
+
+    Returns:
+        Existing files
+    """
+    worker_file = re.compile(rf"{re.escape(path.stem)}-\d+{re.escape(path.suffix)}")
+    currents = {path.name}
+    for candidate in path.parent.glob(f"{path.stem}-*"):
+        name = candidate.name
+        backup = name.rpartition(".")
+        if backup[2].isdigit() and worker_file.fullmatch(backup[0]):
+            name = backup[0]
+        if worker_file.fullmatch(name):
+            currents.add(name)
+
+    files = []
+    for name in sorted(currents):
+        files.extend(_rotated_files(path.with_name(name)))
+    return files
+
+
+def _rotated_files(path: Path) -> List[Path]:
+    """One journal's rotated backups, oldest first, then the current file."""
+    backups = sorted(
+        (p for p in path.parent.glob(f"{path.name}.*") if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]),
+        reverse=True,
+    )
+    return [*backups, *([path] if path.exists() else [])]
+
+
+def read_journal_file(path: Path) -> Iterator[JournalRecord]:
+    """
+    Read one journal file.
+
+    Args:
+        path: Journal file
+
+    Yields:
+        Records in file order
+
+    Raises:
+        ValueError: If the file is not a journal of a known format
+    """
+    with open(path, "rb") as handle:
+        header = handle.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        magic, version, record_size = _HEADER.unpack(header)
+        if magic != MAGIC or version != FORMAT_VERSION or record_size != _RECORD.size:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} message journal")
+
+        while True:
+            chunk = handle.read(_RECORD.size * 4096)
+            if not chunk:
+                return
+            # A partially written last record (crash) is ignored
+            usable = len(chunk) - len(chunk) % _RECORD.size
+            for offset in range(0, usable, _RECORD.size):
+                yield JournalRecord.unpack(chunk[offset:offset + _RECORD.size])
+
+
+def read_journal(paths: Iterable[Path], reorder_seconds: float = 30.0) -> Iterator[JournalRecord]:
+    """
+    Read several journals (e.g. one per worker) merged in arrival order.
+
+    Records are written when a reply is sent but stamped with the
+    arrival time, so a file is only sorted to within the longest request.
+    A heap holding ``reorder_seconds`` of records restores the order
+    without loading whole files.
+
+    Args:
+        paths: Journal files
+        reorder_seconds: Longest time a record can be out of order
+            (at least the webhook deadline)
+
+    Yields:
+        Records in timestamp order
+    """
+    merged = heapq.merge(*(read_journal_file(path) for path in paths), key=lambda record: record.timestamp)
+    pending: List[tuple] = []
+    for sequence, record in enumerate(merged):
+        heapq.heappush(pending, (record.timestamp, sequence, record))
+        while pending[0][0] < record.timestamp - reorder_seconds:
+            yield heapq.heappop(pending)[2]
+    while pending:
+        yield heapq.heappop(pending)[2]
+
+
+_REPLAY_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_REPLAY_CITY_CODES = ("KI", "LU", "MB", "KA", "KS", "BU", "GO", "TS")
+
+
+def synthetic_message(record: JournalRecord) -> Tuple[str, str]:
+    """
+    Stand-in sender and text for replaying a record.
+
+    The text is a valid answer to the recorded step, of the recorded
+    length where the step allows it, derived only from the record, so a
+    journal always replays as the same requests.
+
+    Args:
+        record: Journal record
+
+    Returns:
+        Tuple of (From value, Body)
+    """
+    phone = f"whatsapp:+999{int.from_bytes(record.phone_hash, 'big') % 10**11:011d}"
+    seed = hashlib.blake2b(record.phone_hash + bytes([record.step]), digest_size=32).digest()
+    length = max(record.body_length, 1)
+
+    if record.step in (0, 1):
+        # Name codes: letters only, at least 2
+        body = "".join(_REPLAY_LETTERS[seed[i % len(seed)] % 26] for i in range(max(length, 2)))
+    elif record.step == 2:
+        body = "".join(str(seed[i % len(seed)] % 10) for i in range(length))
+    elif record.step == 3:
+        body = _REPLAY_CITY_CODES[seed[0] % len(_REPLAY_CITY_CODES)]
+    elif record.step == 4:
+        body = str(1 + seed[0] % 4)
+    else:
+        # Commands and unprocessed messages: a reply that needs no database
+        body = "HELP"
+    return phone, body
+
+
+def build_message_journal() -> Optional[MessageJournal]:
+    """
+    Open the configured journal, if enabled.
+
+    With several workers each process writes its own file
+    (messages-<pid>.bin); read_journal merges them.
+
+    Returns:
+        MessageJournal, or None when MESSAGE_JOURNAL_ENABLED is off
+    """
+    if not settings.message_journal_enabled:
+        return None
+    path = Path(settings.message_journal_path)
+    if settings.workers > 1:
+        path = path.with_name(f"{path.stem}-{os.getpid()}{path.suffix}")
+    return MessageJournal(str(path))
@@ -12,7 +12,9 @@ import qrcode
 from qrcode.image.pil import PilImage
 
 from app.config import settings
+from app.deadline import Deadline
 from app.logging_config import get_logger
+from app.profiling import traced
 
 logger = get_logger(__name__)
 
@@ -36,6 +38,7 @@ class QRCodeService:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         logger.debug("QR code output directory ready", path=str(self.output_dir))
 
+    @traced("generate_qr_code")
     def generate_qr_code(
         self,
         uic_code: str,
@@ -81,6 +84,40 @@ class QRCodeService:
 
         return file_path, img_bytes
 
+    def should_attach(self, uic_code: str, deadline: Optional[Deadline] = None) -> bool:
+        """
+        Decide whether a reply gets a QR code.
+
+        A QR code rendered earlier is always attached. Rendering a new one
+        is optional work, skipped when the request is short on time.
+
+        Args:
+            uic_code: The UIC to encode
+            deadline: Request budget
+
+        Returns:
+            True if the reply should announce and attach the QR code
+        """
+        if self.get_qr_code_path(uic_code) is not None:
+            return True
+        return deadline is None or deadline.allows("qr_code")
+
+    def ensure_qr_code(self, uic_code: str) -> Path:
+        """
+        Get the QR code image for a UIC, rendering it only if missing.
+
+        Args:
+            uic_code: The UIC to encode
+
+        Returns:
+            Path to the image
+        """
+        existing = self.get_qr_code_path(uic_code)
+        if existing is not None:
+            return existing
+        file_path, _ = self.generate_qr_code(uic_code)
+        return file_path
+
     def get_qr_code_path(self, uic_code: str) -> Optional[Path]:
         """
         Get path to existing QR code file.
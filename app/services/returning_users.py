@@ -0,0 +1,122 @@
+"""
+Returning-User Lookup.
+
+Most messages come from people who already have a UIC. FlowManager asks
+this index which codes were registered from a phone number so it can
+offer to resend one instead of asking the five questions again.
+
+A phone number can be shared by several people (family phones), so the
+index maps a number to every active code registered from it. Entries are
+cached per process:
+- Registering a new code from a number invalidates that number's entry
+- Entries expire after a TTL, which bounds how stale another worker's
+  cache can be after a registration it did not see
+- Numbers with no codes are cached too, so first-time users cost one
+  lookup per TTL, not one per message
+
+With a shared cache segment (SHARED_CACHE_PATH) the entries live there
+instead, so all workers on a host share them and an invalidation is seen
+by every worker at once.
+"""
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import metrics
+from app.services.shared_cache import SharedHashTable
+
+logger = get_logger(__name__)
+
+# Choices are single digits in the reply ("1".."9")
+MAX_CODES_PER_PHONE = 9
+
+CodeLookup = Callable[[AsyncSession, str, int], Awaitable[List[str]]]
+
+
+class ReturningUserIndex:
+    """Per-process LRU + TTL cache of phone number -> registered UIC codes."""
+
+    def __init__(
+        self,
+        lookup: CodeLookup,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        shared: Optional[SharedHashTable] = None
+    ):
+        """
+        Initialize the index.
+
+        Args:
+            lookup: Async callable (db, phone_number, limit) returning the
+                active codes registered from a number, oldest first
+                (e.g. UICService.codes_for_phone)
+            max_entries: Numbers kept in memory. If None, uses config value.
+            ttl_seconds: Seconds an entry is trusted. If None, uses config value.
+            shared: Shared segment holding the entries instead of this
+                process (max_entries is then unused)
+        """
+        self.lookup = lookup
+        self.max_entries = max_entries or settings.returning_user_cache_size
+        self.ttl_seconds = ttl_seconds or settings.returning_user_cache_ttl_seconds
+        self.shared = shared
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[str, ...]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def codes_for(self, db: AsyncSession, phone_number: str) -> Tuple[str, ...]:
+        """
+        Get the codes registered from a phone number.
+
+        Args:
+            db: Database session (only used on a cache miss)
+            phone_number: User's WhatsApp phone number
+
+        Returns:
+            Codes, oldest registration first; empty for unknown numbers
+        """
+        if self.shared is not None:
+            return await self._shared_codes_for(db, phone_number)
+
+        now = time.monotonic()
+        entry = self._entries.get(phone_number)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(phone_number)
+            metrics.increment("returning_users.cache_hit")
+            return entry[1]
+
+        metrics.increment("returning_users.cache_miss")
+        codes = tuple(await self.lookup(db, phone_number, MAX_CODES_PER_PHONE))
+
+        self._entries[phone_number] = (now + self.ttl_seconds, codes)
+        self._entries.move_to_end(phone_number)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return codes
+
+    async def _shared_codes_for(self, db: AsyncSession, phone_number: str) -> Tuple[str, ...]:
+        """codes_for through the shared segment (codes stored comma-separated)."""
+        value = self.shared.get(phone_number)
+        if value is not None:
+            metrics.increment("returning_users.cache_hit")
+            return tuple(value.decode("ascii").split(",")) if value else ()
+
+        metrics.increment("returning_users.cache_miss")
+        codes = tuple(await self.lookup(db, phone_number, MAX_CODES_PER_PHONE))
+        self.shared.set(phone_number, ",".join(codes).encode("ascii"), self.ttl_seconds)
+        return codes
+
+    def invalidate(self, phone_number: str) -> None:
+        """
+        Forget a number's codes, e.g. after a new registration from it.
+
+        Args:
+            phone_number: User's WhatsApp phone number
+        """
+        if self.shared is not None:
+            self.shared.delete(phone_number)
+        self._entries.pop(phone_number, None)
@@ -0,0 +1,438 @@
+"""
+Conversation session storage.
+
+FlowManager keeps per-phone conversation state in a SessionStore:
+- DatabaseSessionStore: the conversation_sessions table (default)
+- InMemorySessionStore: a process-local dictionary. Mid-flow answers never
+  touch the database, but state is lost on restart and not shared
+  between workers.
+
+Stores that keep state in memory apply changes only once the request's
+unit of work commits (database.after_commit), so a request rolled back
+on error or deadline leaves the conversation as it was.
+- SignedTokenSessionStore: no server-side storage. State travels as an
+  HMAC-signed token in a cookie that Twilio echoes back with the next
+  message, so any worker can continue the conversation; a short-lived
+  in-memory map saves decoding it on the worker that issued it.
+"""
+import base64
+import contextvars
+import dataclasses
+import hashlib
+import hmac
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import after_commit
+from app.logging_config import get_logger
+from app.models.uic import ConversationSession
+
+logger = get_logger(__name__)
+
+# Answer fields collected by the conversation, in question order
+ANSWER_FIELDS = (
+    "last_name_code",
+    "first_name_code",
+    "birth_year_digit",
+    "city_code",
+    "gender_code",
+)
+
+
+def _new_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(minutes=settings.session_timeout_minutes)
+
+
+@dataclass(slots=True)
+class SessionState:
+    """Conversation state for one phone number."""
+
+    phone_number: str
+    current_step: int = 0
+    language: str = "fr"
+    last_name_code: Optional[str] = None
+    first_name_code: Optional[str] = None
+    birth_year_digit: Optional[str] = None
+    city_code: Optional[str] = None
+    gender_code: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+    expires_at: datetime = field(default_factory=_new_expiry)
+    # Primary key of the backing row, if stored in the database
+    id: Optional[int] = None
+
+    @property
+    def is_expired(self) -> bool:
+        """Check if session has expired."""
+        return datetime.utcnow() > self.expires_at
+
+    def reset(self) -> None:
+        """Start the conversation over, keeping the stored identity."""
+        now = datetime.utcnow()
+        self.current_step = 0
+        for name in ANSWER_FIELDS:
+            setattr(self, name, None)
+        self.created_at = now
+        self.updated_at = now
+        self.expires_at = _new_expiry()
+
+    def collected_data(self) -> Dict[str, Optional[str]]:
+        """Get the collected answers keyed by field name."""
+        return {name: getattr(self, name) for name in ANSWER_FIELDS}
+
+
+class SessionStore:
+    """
+    Storage interface for conversation sessions.
+
+    Database-backed stores only stage statements on the caller's session;
+    the caller commits once per message.
+    """
+
+    async def get(self, db: AsyncSession, phone_number: str) -> Optional[SessionState]:
+        """
+        Load the session for a phone number.
+
+        Args:
+            db: Database session
+            phone_number: User's WhatsApp phone number
+
+        Returns:
+            SessionState, or None if there is no session
+        """
+        raise NotImplementedError
+
+    async def save(self, db: AsyncSession, state: SessionState) -> None:
+        """
+        Persist a new or changed session.
+
+        Args:
+            db: Database session
+            state: Session to store
+        """
+        raise NotImplementedError
+
+    async def delete(self, db: AsyncSession, phone_number: str) -> None:
+        """
+        Remove the session for a phone number, if any.
+
+        Args:
+            db: Database session
+            phone_number: User's WhatsApp phone number
+        """
+        raise NotImplementedError
+
+    async def cleanup_expired(self, db: AsyncSession) -> int:
+        """
+        Remove expired sessions.
+
+        Args:
+            db: Database session
+
+        Returns:
+            Number of sessions removed
+        """
+        raise NotImplementedError
+
+
+_sessions = ConversationSession.__table__
+
+# Columns loaded into SessionState, in field order
+_STATE_COLUMNS = (
+    "phone_number", "current_step", "language", *ANSWER_FIELDS,
+    "created_at", "updated_at", "expires_at", "id",
+)
+
+# Hot statements, built once as Core statements of plain columns: no ORM
+# entity loading, identity map or bulk-delete session synchronization,
+# and each compiles once per engine (compiled cache)
+_GET_SESSION = select(*(_sessions.c[name] for name in _STATE_COLUMNS)).where(
+    _sessions.c.phone_number == bindparam("phone")
+)
+_DELETE_SESSION = delete(_sessions).where(_sessions.c.phone_number == bindparam("phone"))
+# SET columns come from the execution parameters
+_UPDATE_SESSION = update(_sessions).where(_sessions.c.id == bindparam("session_id"))
+_INSERT_SESSION = insert(_sessions)
+
+
+class DatabaseSessionStore(SessionStore):
+    """Sessions stored in the conversation_sessions table."""
+
+    async def get(self, db: AsyncSession, phone_number: str) -> Optional[SessionState]:
+        result = await db.execute(_GET_SESSION, {"phone": phone_number})
+        row = result.first()
+        if row is None:
+            return None
+
+        return SessionState(*row)
+
+    async def save(self, db: AsyncSession, state: SessionState) -> None:
+        values = dict(
+            current_step=state.current_step,
+            language=state.language,
+            last_name_code=state.last_name_code,
+            first_name_code=state.first_name_code,
+            birth_year_digit=state.birth_year_digit,
+            city_code=state.city_code,
+            gender_code=state.gender_code,
+            created_at=state.created_at,
+            updated_at=state.updated_at,
+            expires_at=state.expires_at,
+        )
+
+        if state.id is not None:
+            # Existing row (including a reset expired session): update in place
+            await db.execute(_UPDATE_SESSION, {"session_id": state.id, **values})
+            return
+
+        result = await db.execute(_INSERT_SESSION, {"phone_number": state.phone_number, **values})
+        state.id = result.inserted_primary_key[0]
+
+    async def delete(self, db: AsyncSession, phone_number: str) -> None:
+        await db.execute(_DELETE_SESSION, {"phone": phone_number})
+
+    async def cleanup_expired(self, db: AsyncSession) -> int:
+        stmt = delete(_sessions).where(_sessions.c.expires_at < datetime.utcnow())
+        result = await db.execute(stmt)
+        return result.rowcount
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local sessions. No statement is run on the database session.
+
+    get returns a copy and writes wait for the caller's commit, so a
+    rolled-back request never changes the stored conversation.
+    """
+
+    def __init__(self):
+        """Initialize an empty store."""
+        self._sessions: Dict[str, SessionState] = {}
+
+    async def get(self, db: AsyncSession, phone_number: str) -> Optional[SessionState]:
+        state = self._sessions.get(phone_number)
+        return dataclasses.replace(state) if state is not None else None
+
+    async def save(self, db: AsyncSession, state: SessionState) -> None:
+        after_commit(db, partial(self._sessions.__setitem__, state.phone_number, state))
+
+    async def delete(self, db: AsyncSession, phone_number: str) -> None:
+        after_commit(db, partial(self._sessions.pop, phone_number, None))
+
+    async def cleanup_expired(self, db: AsyncSession) -> int:
+        expired = [phone for phone, state in self._sessions.items() if state.is_expired]
+        for phone in expired:
+            del self._sessions[phone]
+        return len(expired)
+
+
+# Cookie carrying the signed state. Twilio stores cookies per conversation
+# (sender/recipient pair) for up to four hours, longer than any session.
+SESSION_COOKIE = "uic_session"
+
+# Token received with the current request, and token to send back with its
+# response: None = leave the cookie alone, "" = clear it
+_request_token: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "session_request_token", default=None
+)
+_response_token: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "session_response_token", default=None
+)
+
+
+def bind_session_token(token: Optional[str]) -> None:
+    """
+    Make the token received with the current request available to the store.
+
+    Args:
+        token: Cookie value, or None if the request had none
+    """
+    _request_token.set(token)
+    _response_token.set(None)
+
+
+def issued_session_token() -> Optional[str]:
+    """
+    Token the store issued while handling the current request.
+
+    Returns:
+        New token, "" if the cookie should be cleared, None if unchanged
+    """
+    return _response_token.get()
+
+
+# Timestamps are naive UTC throughout the app
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class SignedTokenSessionStore(SessionStore):
+    """
+    Sessions encoded into HMAC-signed tokens. The database session is never used.
+
+    Token = base64url(payload) "." base64url(HMAC-SHA256(phone + payload))[:16].
+    The payload is the step, language, answers, timestamps and the time
+    the token was issued, joined by "|" (answers are validated letters
+    and digits, so never contain it). Binding the MAC to the phone number
+    stops a token from being replayed for another number; tokens older
+    than the session timeout, or older than the last one this worker
+    issued for the number, are rejected so an old cookie cannot roll the
+    conversation back.
+    """
+
+    VERSION = "2"
+    MAC_BYTES = 16
+
+    def __init__(self, secret: Optional[str] = None, max_entries: Optional[int] = None):
+        """
+        Initialize the store.
+
+        Args:
+            secret: Signing key. If None, uses config value (or a key derived
+                from the UIC salt when unset).
+            max_entries: Sessions kept in the in-memory map. If None, uses config value.
+        """
+        secret = secret or settings.session_token_secret or hmac.new(
+            settings.uic_salt.encode("utf-8"), b"session-token", hashlib.sha256
+        ).hexdigest()
+        self._mac = hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256)
+        self.max_entries = max_entries or settings.session_token_cache_size
+        # phone -> (token, state) for sessions this worker issued or decoded
+        self._recent: "OrderedDict[str, Tuple[str, SessionState]]" = OrderedDict()
+
+    def encode(self, state: SessionState) -> str:
+        """
+        Serialize and sign a session.
+
+        Args:
+            state: Session to encode
+
+        Returns:
+            Token string
+        """
+        payload = "|".join((
+            self.VERSION,
+            str(state.current_step),
+            state.language,
+            *(getattr(state, name) or "" for name in ANSWER_FIELDS),
+            *(str(int((moment - _EPOCH).total_seconds()))
+              for moment in (state.created_at, state.updated_at, state.expires_at, datetime.utcnow())),
+        )).encode("utf-8")
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(state.phone_number, payload))}"
+
+    def decode(self, phone_number: str, token: str) -> Optional[SessionState]:
+        """
+        Verify and deserialize a token.
+
+        Args:
+            phone_number: Number the token must have been issued to
+            token: Token string
+
+        Returns:
+            SessionState, or None if the token is malformed, forged,
+            issued to another number or older than the session timeout
+        """
+        try:
+            encoded_payload, encoded_mac = token.split(".")
+            payload = _b64decode(encoded_payload)
+            mac = _b64decode(encoded_mac)
+        except (ValueError, TypeError):
+            return None
+
+        if not hmac.compare_digest(mac, self._sign(phone_number, payload)):
+            logger.warning("Rejected session token", phone_number=phone_number)
+            return None
+
+        fields = payload.decode("utf-8").split("|")
+        if fields[0] != self.VERSION or len(fields) != 7 + len(ANSWER_FIELDS):
+            return None
+
+        answers = fields[3:3 + len(ANSWER_FIELDS)]
+        created, updated, expires, issued = (
+            _EPOCH + timedelta(seconds=int(value)) for value in fields[-4:]
+        )
+        if datetime.utcnow() - issued > timedelta(minutes=settings.session_timeout_minutes):
+            logger.info("Expired session token", phone_number=phone_number)
+            return None
+        return SessionState(
+            phone_number=phone_number,
+            current_step=int(fields[1]),
+            language=fields[2],
+            **{name: value or None for name, value in zip(ANSWER_FIELDS, answers)},
+            created_at=created,
+            updated_at=updated,
+            expires_at=expires,
+        )
+
+    def _sign(self, phone_number: str, payload: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(phone_number.encode("utf-8"))
+        mac.update(b"\n")
+        mac.update(payload)
+        return mac.digest()[:self.MAC_BYTES]
+
+    def _remember(self, token: str, state: SessionState) -> None:
+        self._recent[state.phone_number] = (token, state)
+        self._recent.move_to_end(state.phone_number)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+
+    async def get(self, db: AsyncSession, phone_number: str) -> Optional[SessionState]:
+        token = _request_token.get()
+        entry = self._recent.get(phone_number)
+        # The map only saves decoding: a different token means another
+        # worker has advanced the conversation since this one saw it
+        if entry is not None and (token is None or token == entry[0]):
+            return dataclasses.replace(entry[1])
+        if not token:
+            return None
+
+        state = self.decode(phone_number, token)
+        if state is None:
+            return None
+        if entry is not None and state.updated_at < entry[1].updated_at.replace(microsecond=0):
+            logger.warning("Replayed session token", phone_number=phone_number)
+            return None
+        self._remember(token, state)
+        return dataclasses.replace(state)
+
+    async def save(self, db: AsyncSession, state: SessionState) -> None:
+        token = self.encode(state)
+        after_commit(db, partial(self._remember, token, state))
+        _response_token.set(token)
+
+    async def delete(self, db: AsyncSession, phone_number: str) -> None:
+        after_commit(db, partial(self._recent.pop, phone_number, None))
+        _request_token.set(None)
+        _response_token.set("")
+
+    async def cleanup_expired(self, db: AsyncSession) -> int:
+        expired = [phone for phone, (_, state) in self._recent.items() if state.is_expired]
+        for phone in expired:
+            del self._recent[phone]
+        return len(expired)
+
+
+def build_session_store() -> SessionStore:
+    """Create the session store selected in settings."""
+    if settings.session_backend == "memory":
+        logger.info("Using in-memory conversation sessions")
+        return InMemorySessionStore()
+    if settings.session_backend == "token":
+        logger.info("Using signed-token conversation sessions")
+        return SignedTokenSessionStore()
+    return DatabaseSessionStore()
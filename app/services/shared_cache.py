@@ -0,0 +1,294 @@
+"""
+Shared-Memory Cache Segments.
+
+With several workers (WORKERS > 1) every per-process cache warms
+separately and holds its own copy of the hot set. A shared segment is a
+fixed-size open-addressing hash table in a memory-mapped file (normally
+under /dev/shm) that every worker on the host maps, so the hot set is
+kept once per machine.
+
+Layout: a 64-byte header (magic, format version, slot count, slot size,
+occupied slots) followed by fixed-size slots:
+
+    seq (uint32), key digest (16 bytes), expires (float64), length (uint16), value
+
+- Keys are hashed to a 16-byte BLAKE2b digest; a key lives in one of
+  PROBE_WINDOW consecutive slots from its home slot. There are no
+  tombstones: lookups always scan the whole window
+- Readers take no lock. Each slot is a seqlock: a writer makes ``seq``
+  odd, writes the slot, then makes it even again; a reader that sees an
+  odd or changed ``seq`` reads again (and gives up as a miss after a few
+  tries)
+- Writers are serialized with flock() on the segment file, so only one
+  process writes at a time
+- A full window evicts the slot that expires first, so the table never
+  grows and never needs rehashing
+
+Values are opaque bytes (callers encode them); hits and misses are
+counted per process in the metrics registry, and the segment's size and
+occupancy are reported on /metrics.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import metrics
+
+logger = get_logger(__name__)
+
+MAGIC = b"UICS"
+FORMAT_VERSION = 1
+
+HEADER_BYTES = 64
+SLOT_BYTES = 256
+PROBE_WINDOW = 8
+READ_RETRIES = 8
+
+_HEADER = struct.Struct("<4sBIIQ")  # magic, version, slots, slot size, occupied
+_SLOT_HEAD = struct.Struct("<I16sdH")  # seq, key digest, expires, value length
+_SEQ = struct.Struct("<I")
+_OCCUPIED_OFFSET = 13
+_OCCUPIED = struct.Struct("<Q")
+_VALUE_OFFSET = 32
+MAX_VALUE_BYTES = SLOT_BYTES - _VALUE_OFFSET
+
+# Segments opened by this process, for /metrics
+_open_tables: Dict[str, "SharedHashTable"] = {}
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class SharedHashTable:
+    """Fixed-size hash table in a memory-mapped file, shared between processes."""
+
+    def __init__(self, path: str, slots: int, name: Optional[str] = None):
+        """
+        Map a segment, creating or resetting it when its layout differs.
+
+        Args:
+            path: Segment file (e.g. /dev/shm/uic/returning_users.bin)
+            slots: Number of slots; rounded up to a power of two
+            name: Name used in metrics. Defaults to the file stem.
+        """
+        self.path = path
+        self.name = name or Path(path).stem
+        self.slots = 1 << max(slots - 1, PROBE_WINDOW - 1).bit_length()
+        self._mask = self.slots - 1
+        self.nbytes = HEADER_BYTES + self.slots * SLOT_BYTES
+        self._thread_lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._fd = self._open_segment()
+        self._map = mmap.mmap(self._fd, self.nbytes)
+
+        _open_tables[self.name] = self
+        metrics.set_gauge(f"shared_cache.{self.name}.bytes", self.nbytes)
+
+    def _open_segment(self) -> int:
+        """
+        Open the segment file, creating it when missing or laid out differently.
+
+        A mismatched file is replaced rather than resized: workers still
+        running with the old layout keep their mapping of the old inode.
+        """
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                try:
+                    replaced = os.stat(self.path).st_ino != os.fstat(fd).st_ino
+                except FileNotFoundError:
+                    replaced = True
+                if replaced:
+                    # Another process swapped the file while we waited for the lock
+                    segment_fd = None
+                elif self._layout_matches(fd):
+                    segment_fd = fd
+                else:
+                    os.unlink(self.path)
+                    segment_fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+                    os.ftruncate(segment_fd, self.nbytes)
+                    os.pwrite(segment_fd, _HEADER.pack(MAGIC, FORMAT_VERSION, self.slots, SLOT_BYTES, 0), 0)
+                    logger.info(
+                        "Shared cache segment created", path=self.path, slots=self.slots, bytes=self.nbytes
+                    )
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+            if segment_fd != fd:
+                os.close(fd)
+            if segment_fd is not None:
+                return segment_fd
+
+    def _layout_matches(self, fd: int) -> bool:
+        """Check that a file holds a segment with this table's layout."""
+        if os.fstat(fd).st_size != self.nbytes:
+            return False
+        magic, version, slots, slot_bytes, _ = _HEADER.unpack(os.pread(fd, _HEADER.size, 0))
+        return (magic, version, slots, slot_bytes) == (MAGIC, FORMAT_VERSION, self.slots, SLOT_BYTES)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive write access, across threads and processes."""
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _offsets(self, digest: bytes) -> Iterator[int]:
+        """Slot offsets of a key's probe window."""
+        home = int.from_bytes(digest[:8], "little")
+        for probe in range(PROBE_WINDOW):
+            yield HEADER_BYTES + ((home + probe) & self._mask) * SLOT_BYTES
+
+    def _read_slot(self, offset: int):
+        """Consistent (key digest, expires, value) of one slot, or None if a writer kept changing it."""
+        mapping = self._map
+        for _ in range(READ_RETRIES):
+            seq, key, expires, length = _SLOT_HEAD.unpack_from(mapping, offset)
+            if seq & 1:
+                continue
+            value = mapping[offset + _VALUE_OFFSET:offset + _VALUE_OFFSET + length]
+            if _SEQ.unpack_from(mapping, offset)[0] == seq:
+                return key, expires, value
+        return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up a key without locking.
+
+        Args:
+            key: Cache key (e.g. an input_hash or phone number)
+
+        Returns:
+            The value, or None if absent or expired
+        """
+        digest = _digest(key)
+        now = time.time()
+        for offset in self._offsets(digest):
+            slot = self._read_slot(offset)
+            if slot is not None and slot[0] == digest and slot[1] > now:
+                metrics.increment(f"shared_cache.{self.name}.hit")
+                return slot[2]
+        metrics.increment(f"shared_cache.{self.name}.miss")
+        return None
+
+    def _write_slot(self, offset: int, digest: bytes, expires: float, value: bytes) -> None:
+        """Rewrite one slot under its seqlock (caller holds the write lock)."""
+        mapping = self._map
+        seq = _SEQ.unpack_from(mapping, offset)[0]
+        _SEQ.pack_into(mapping, offset, (seq + 1) & 0xFFFFFFFF)
+        mapping[offset + _VALUE_OFFSET:offset + _VALUE_OFFSET + len(value)] = value
+        _SLOT_HEAD.pack_into(mapping, offset, (seq + 1) & 0xFFFFFFFF, digest, expires, len(value))
+        _SEQ.pack_into(mapping, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _add_occupied(self, delta: int) -> None:
+        occupied = _OCCUPIED.unpack_from(self._map, _OCCUPIED_OFFSET)[0]
+        _OCCUPIED.pack_into(self._map, _OCCUPIED_OFFSET, occupied + delta)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> bool:
+        """
+        Store a value for every worker on the host.
+
+        Args:
+            key: Cache key
+            value: Encoded value, at most MAX_VALUE_BYTES
+            ttl_seconds: Seconds the value is trusted
+
+        Returns:
+            False if the value is too large to cache
+        """
+        if len(value) > MAX_VALUE_BYTES:
+            metrics.increment(f"shared_cache.{self.name}.oversized")
+            return False
+
+        digest = _digest(key)
+        now = time.time()
+        with self._locked():
+            target = None
+            target_expires = float("inf")
+            for offset in self._offsets(digest):
+                slot_key, expires = _SLOT_HEAD.unpack_from(self._map, offset)[1:3]
+                if slot_key == digest:
+                    target, target_expires = offset, expires
+                    break
+                # Prefer a free slot, then an expired one, then the soonest to expire
+                if expires < target_expires:
+                    target, target_expires = offset, expires
+            if target_expires == 0:
+                self._add_occupied(1)
+            elif target_expires > now and _SLOT_HEAD.unpack_from(self._map, target)[1] != digest:
+                metrics.increment(f"shared_cache.{self.name}.evicted")
+            self._write_slot(target, digest, now + ttl_seconds, value)
+        return True
+
+    def delete(self, key: str) -> None:
+        """
+        Remove a key for every worker on the host.
+
+        Args:
+            key: Cache key
+        """
+        digest = _digest(key)
+        with self._locked():
+            for offset in self._offsets(digest):
+                slot_key, expires = _SLOT_HEAD.unpack_from(self._map, offset)[1:3]
+                if slot_key == digest and expires != 0:
+                    self._write_slot(offset, bytes(16), 0.0, b"")
+                    self._add_occupied(-1)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Size and occupancy of the segment (shared by all workers).
+
+        Returns:
+            bytes, slots, occupied (slots ever filled and not deleted,
+            including expired ones awaiting reuse) and load_factor
+        """
+        occupied = _OCCUPIED.unpack_from(self._map, _OCCUPIED_OFFSET)[0]
+        return {
+            "bytes": self.nbytes,
+            "slots": self.slots,
+            "occupied": occupied,
+            "load_factor": round(occupied / self.slots, 4),
+        }
+
+    def close(self) -> None:
+        """Unmap the segment (the file stays for the other workers)."""
+        _open_tables.pop(self.name, None)
+        self._map.close()
+        os.close(self._fd)
+
+
+def open_shared_table(name: str) -> Optional[SharedHashTable]:
+    """
+    Map a named segment under SHARED_CACHE_PATH, if configured.
+
+    Args:
+        name: Segment name (file <name>.bin)
+
+    Returns:
+        SharedHashTable, or None when shared caches are disabled
+    """
+    if not settings.shared_cache_path:
+        return None
+    path = Path(settings.shared_cache_path) / f"{name}.bin"
+    return SharedHashTable(str(path), settings.shared_cache_slots, name=name)
+
+
+def shared_cache_stats() -> Dict[str, Dict[str, float]]:
+    """Stats of every segment this process has mapped, by name."""
+    return {name: table.stats() for name, table in _open_tables.items()}
@@ -0,0 +1,320 @@
+"""
+Collision-aware UIC allocation.
+
+The base code ``LLLFFFYCG`` is built from truncated inputs, so two
+different people can share it. The first registrant keeps the bare base
+code; later registrants get a one-character suffix (two characters once
+all 32 single suffixes are taken). The suffix probe order is derived from
+the person's ``input_hash``, and the allocated code is stored with the
+record, so a returning person always gets the same code back.
+
+Allocation is answered from an in-memory occupancy index of issued codes
+instead of retrying inserts against the database.
+"""
+import hashlib
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.logging_config import get_logger
+from app.models.uic import UICRecord
+
+logger = get_logger(__name__)
+
+# 32 characters, without the easily confused I, O, 0 and 1
+SUFFIX_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+
+class _IntHashSet:
+    """
+    Open-addressing hash set of positive 64-bit integers.
+
+    Stores keys in a flat ``array('Q')`` (8 bytes per slot) instead of
+    Python int objects in a ``set``, which keeps a multi-million-code
+    index in tens of megabytes.
+    """
+
+    _EMPTY = 0
+    _MAX_LOAD = 0.7
+
+    def __init__(self, capacity: int = 1024):
+        size = 1024
+        while size * self._MAX_LOAD < capacity:
+            size *= 2
+        self._slots = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the slot table."""
+        return len(self._slots) * self._slots.itemsize
+
+    def _probe(self, key: int) -> int:
+        """Index of the key's slot, or of the empty slot where it would go."""
+        slots = self._slots
+        mask = self._mask
+        # Keys are already uniformly distributed digests
+        index = key & mask
+        while True:
+            current = slots[index]
+            if current == key or current == self._EMPTY:
+                return index
+            index = (index + 1) & mask
+
+    def __contains__(self, key: int) -> bool:
+        return self._slots[self._probe(key)] == key
+
+    def add(self, key: int) -> None:
+        index = self._probe(key)
+        if self._slots[index] == key:
+            return
+        self._slots[index] = key
+        self._count += 1
+        if self._count > (self._mask + 1) * self._MAX_LOAD:
+            self._grow()
+
+    def discard(self, key: int) -> None:
+        index = self._probe(key)
+        slots = self._slots
+        if slots[index] != key:
+            return
+        self._count -= 1
+
+        # Backward-shift deletion: move later keys of the run into the hole
+        # when their home slot allows it, so no tombstones are needed
+        mask = self._mask
+        hole = index
+        index = (index + 1) & mask
+        while slots[index] != self._EMPTY:
+            distance_from_home = (index - (slots[index] & mask)) & mask
+            if distance_from_home >= (index - hole) & mask:
+                slots[hole] = slots[index]
+                hole = index
+            index = (index + 1) & mask
+        slots[hole] = self._EMPTY
+
+    def _grow(self) -> None:
+        old = self._slots
+        self._slots = array("Q", bytes(8 * len(old) * 2))
+        self._mask = len(self._slots) - 1
+        for key in old:
+            if key != self._EMPTY:
+                self._slots[self._probe(key)] = key
+
+
+def _code_key(code: str) -> int:
+    """
+    Map a code to a non-zero 64-bit key.
+
+    A digest collision can only make a free code look taken, which costs
+    an unneeded suffix but never a duplicate code.
+    """
+    key = int.from_bytes(hashlib.blake2b(code.encode("ascii"), digest_size=8).digest(), "big")
+    return key or 1
+
+
+def _suffix_candidates(input_hash: str) -> Iterator[str]:
+    """
+    Yield suffixes in the probe order for one input hash.
+
+    Single-character suffixes come first, then two-character ones, each
+    starting at a position taken from the hash and wrapping around.
+    """
+    alphabet = SUFFIX_ALPHABET
+    size = len(alphabet)
+
+    start = int(input_hash[:8], 16) % size
+    for offset in range(size):
+        yield alphabet[(start + offset) % size]
+
+    start = int(input_hash[8:16], 16) % (size * size)
+    for offset in range(size * size):
+        position = (start + offset) % (size * size)
+        yield alphabet[position // size] + alphabet[position % size]
+
+
+@dataclass(slots=True)
+class Reservation:
+    """A code picked for a registration whose row is not committed yet."""
+
+    uic_code: str
+    input_hash: str
+    # Open transactions inserting this code for the person
+    holders: int = 1
+    # The code is known to be in the registry
+    issued: bool = False
+
+
+class OccupancyIndex:
+    """In-memory index of every UIC code issued so far."""
+
+    def __init__(self, expected_codes: int = 0):
+        """
+        Initialize an empty index.
+
+        Args:
+            expected_codes: Presize for this many codes to avoid regrowth
+        """
+        self._codes = _IntHashSet(expected_codes)
+        self._pending: Dict[str, Reservation] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, uic_code: str) -> bool:
+        return _code_key(uic_code) in self._codes
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the index."""
+        return self._codes.nbytes
+
+    def add(self, uic_code: str) -> None:
+        """Mark a code as issued."""
+        self._codes.add(_code_key(uic_code))
+
+    def update(self, uic_codes: Iterable[str]) -> None:
+        """Mark several codes as issued."""
+        for uic_code in uic_codes:
+            self._codes.add(_code_key(uic_code))
+
+    def release(self, uic_code: str) -> None:
+        """
+        Unmark a code allocated for a registration that was rolled back.
+
+        Only call this for a code this index allocated and no row holds.
+        """
+        self._codes.discard(_code_key(uic_code))
+
+    def allocate(self, base_code: str, input_hash: str) -> str:
+        """
+        Pick a free code for a new registrant and mark it issued.
+
+        Args:
+            base_code: Unsuffixed LLLFFFYCG code
+            input_hash: Hash of the registrant's normalized inputs
+
+        Returns:
+            The base code if free, otherwise the first free suffixed code
+
+        Raises:
+            RuntimeError: If every one- and two-character suffix is taken
+        """
+        if base_code not in self:
+            self.add(base_code)
+            return base_code
+
+        for suffix in _suffix_candidates(input_hash):
+            candidate = base_code + suffix
+            if candidate not in self:
+                self.add(candidate)
+                logger.info(
+                    "UIC base code collision resolved",
+                    base_code=base_code,
+                    uic_code=candidate
+                )
+                return candidate
+
+        raise RuntimeError(f"No free UIC code left for base {base_code}")
+
+    def reserve(self, base_code: str, input_hash: str) -> Reservation:
+        """
+        Pick a code for a registration about to be inserted.
+
+        Concurrent registrations of the same person share one reservation,
+        so they insert the same code and the later one finds the earlier's
+        row instead of taking a suffix. Every reservation must be settled
+        once per call, when the inserting transaction ends.
+
+        Args:
+            base_code: Unsuffixed LLLFFFYCG code
+            input_hash: Hash of the registrant's normalized inputs
+
+        Returns:
+            The person's pending reservation, or a new one
+        """
+        reservation = self._pending.get(input_hash)
+        if reservation is not None:
+            reservation.holders += 1
+            return reservation
+
+        reservation = Reservation(self.allocate(base_code, input_hash), input_hash)
+        self._pending[input_hash] = reservation
+        return reservation
+
+    def mark_issued(self, reservation: Reservation) -> None:
+        """
+        Record that a reserved code is in the registry.
+
+        The code stays marked whatever the holders' transactions do, and
+        later registrations of the person no longer share it.
+        """
+        reservation.issued = True
+        if self._pending.get(reservation.input_hash) is reservation:
+            del self._pending[reservation.input_hash]
+
+    def settle(self, reservation: Reservation, committed: bool) -> None:
+        """
+        End one holder's claim on a reservation.
+
+        Once the last holder is done, a code that never reached the
+        registry is unmarked, so the person's retry gets it again.
+
+        Args:
+            reservation: Reservation returned by reserve
+            committed: Whether the holder's transaction committed
+        """
+        if committed:
+            self.mark_issued(reservation)
+        reservation.holders -= 1
+        if reservation.holders:
+            return
+        if self._pending.get(reservation.input_hash) is reservation:
+            del self._pending[reservation.input_hash]
+        if not reservation.issued:
+            self.release(reservation.uic_code)
+
+    async def load(self, db: AsyncSession, batch_size: int = 10000) -> int:
+        """
+        Fill the index from the registry.
+
+        Args:
+            db: Database session
+            batch_size: Rows fetched per cursor round trip
+
+        Returns:
+            Number of codes loaded
+        """
+        stmt = select(UICRecord.uic_code).execution_options(yield_per=batch_size)
+        result = await db.stream(stmt)
+        loaded = 0
+        async for partition in result.scalars().partitions():
+            self.update(partition)
+            loaded += len(partition)
+
+        self.loaded = True
+        logger.info("UIC occupancy index loaded", codes=loaded, index_bytes=self.nbytes)
+        return loaded
+
+    async def refresh_base(self, db: AsyncSession, base_code: str) -> None:
+        """
+        Re-read the codes issued for one base code.
+
+        Used when another worker issued a code this index has not seen.
+
+        Args:
+            db: Database session
+            base_code: Unsuffixed LLLFFFYCG code
+        """
+        stmt = select(UICRecord.uic_code).where(UICRecord.uic_code.startswith(base_code))
+        result = await db.execute(stmt)
+        self.update(result.scalars())
+
@@ -3,26 +3,228 @@ UIC (Unique Identifier Code) Service.
 
 Handles:
 1. Text normalization (French accents, casing, special characters)
-2. UIC generation using SHA-256 hashing with salt
-3. Duplicate detection and collision prevention
+2. UIC generation and keyed (HMAC) input hashing (see input_hashing)
+3. Duplicate detection and collision prevention (see uic_allocator)
+   and near-duplicate flagging (see duplicate_index)
 4. Database persistence of UIC records
 """
-import hashlib
+import itertools
+import multiprocessing
 import re
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, Tuple
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, func, select, true, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
+from app.database import ReadReplicaRouter, after_commit, after_rollback
+from app.deadline import Deadline
 from app.logging_config import get_logger
+from app.metrics import metrics
 from app.models.uic import UICRecord
+from app.profiling import traced
+from app.services.analytics import RegistrationRollups
+from app.services.cold_storage import ArchivedUIC, ColdArchive
+from app.services.duplicate_index import BASE_CODE_LENGTH, NearDuplicateIndex
+from app.services.input_hashing import InputHasher
+from app.services.shared_cache import SharedHashTable
+from app.services.uic_allocator import OccupancyIndex, Reservation
+from app.sharding import ShardRouter, placement_key
 
 logger = get_logger(__name__)
 
 
+def normalize_text(text: str) -> str:
+    """
+    Normalize one input value (see UICService._normalize_text).
+
+    Args:
+        text: Raw text input
+
+    Returns:
+        Normalized uppercase text
+    """
+    if not text:
+        return ""
+
+    # Convert to string if not already
+    text = str(text).strip()
+
+    # Normalize Unicode: decompose combined characters
+    # NFD separates base characters from combining marks (accents)
+    text = unicodedata.normalize('NFD', text)
+
+    # Remove combining marks (accents)
+    text = "".join([
+        char for char in text
+        if unicodedata.category(char) != 'Mn'  # Mn = Mark, Nonspacing
+    ])
+
+    # Remove all non-alphanumeric characters
+    text = re.sub(r'[^a-zA-Z0-9]', '', text)
+
+    # Convert to uppercase for consistency
+    return text.upper()
+
+
+# str.translate table deleting every ASCII character outside [a-zA-Z0-9]
+_ASCII_NON_ALNUM = {code: None for code in range(128) if not chr(code).isalnum()}
+
+def _as_list(column: Any) -> list:
+    """Materialize a list, tuple, NumPy array or Arrow (chunked) array as a list."""
+    if hasattr(column, "to_pylist"):
+        return column.to_pylist()
+    if hasattr(column, "tolist"):
+        return column.tolist()
+    return list(column)
+
+
+def normalize_column(values: Iterable[Any]) -> List[str]:
+    """
+    Normalize a column of input values, identically to normalize_text.
+
+    ASCII strings (nearly every value: inputs are short codes) take a
+    fast path: NFD leaves ASCII unchanged and it has no accents to strip,
+    so normalization is a deletion of non-alphanumerics plus upper().
+    Everything else goes through normalize_text, once per distinct value.
+
+    Args:
+        values: Raw input values
+
+    Returns:
+        Normalized values, in order
+    """
+    normalized = []
+    append = normalized.append
+    slow: Dict[Tuple[type, Any], str] = {}
+    for value in values:
+        if value.__class__ is str and value.isascii():
+            append(value.upper() if value.isalnum() else value.translate(_ASCII_NON_ALNUM).upper())
+        else:
+            # Keyed by type too: 1, 1.0 and True are equal but normalize differently
+            key = (value.__class__, value)
+            try:
+                append(slow[key])
+            except KeyError:
+                slow[key] = normalize_text(value)
+                append(slow[key])
+            except TypeError:
+                # Unhashable value: no memo
+                append(normalize_text(value))
+    return normalized
+
+
+@dataclass(slots=True)
+class UICBatch:
+    """Columnar result of UICService.generate_batch; one entry per input row."""
+
+    last_name_codes: List[str]
+    first_name_codes: List[str]
+    birth_year_digits: List[str]
+    city_codes: List[str]
+    gender_codes: List[str]
+    input_hashes: List[str]
+    # Base codes, before any collision suffix
+    uic_codes: List[str]
+
+    def __len__(self) -> int:
+        return len(self.input_hashes)
+
+    def extend(self, other: "UICBatch") -> None:
+        """Append another batch's rows."""
+        for name in self.__slots__:
+            getattr(self, name).extend(getattr(other, name))
+
+
+def _generate_rows(columns: Tuple[list, list, list, list, list], hasher: InputHasher) -> UICBatch:
+    """Normalize, hash and encode one chunk of rows (runs in pool workers too)."""
+    lnc, fnc, byd, cc, gc = (normalize_column(column) for column in columns)
+
+    input_hashes = []
+    uic_codes = []
+    hash_row = hasher.hash
+    for row in zip(lnc, fnc, byd, cc, gc):
+        # Same as _calculate_input_hash
+        input_hashes.append(hash_row(row))
+
+        # Same as _generate_uic_code; normalized values are already uppercase
+        last, first, year, city, gender = row
+        uic_codes.append(
+            f"{last[:3].ljust(3, 'X')}{first[:3].ljust(3, 'X')}{year[-1:]}"
+            f"{city[:2].ljust(2, 'X')}{gender[:1]}"
+        )
+
+    return UICBatch(lnc, fnc, byd, cc, gc, input_hashes, uic_codes)
+
+
+@dataclass(frozen=True, slots=True)
+class ActiveUIC:
+    """The columns of an active UICRecord that the message path needs."""
+
+    id: int
+    uic_code: str
+    hash_key_version: int
+    normalized_city_code: str
+    normalized_gender_code: str
+    request_count: int
+    created_at: datetime
+
+
+def _encode_active(record: ActiveUIC) -> bytes:
+    """Pack an ActiveUIC for the shared hot set ("|"-joined; codes never contain it)."""
+    return "|".join((
+        str(record.id), record.uic_code, str(record.hash_key_version), record.normalized_city_code,
+        record.normalized_gender_code, str(record.request_count), record.created_at.isoformat(),
+    )).encode("utf-8")
+
+
+def _decode_active(value: bytes) -> ActiveUIC:
+    """Inverse of _encode_active."""
+    record_id, uic_code, version, city, gender, count, created_at = value.decode("utf-8").split("|")
+    return ActiveUIC(
+        int(record_id), uic_code, int(version), city, gender, int(count), datetime.fromisoformat(created_at)
+    )
+
+
+_uic_records = UICRecord.__table__
+
+# Built once: a Core statement of plain columns skips ORM entity loading,
+# the identity map and attribute instrumentation, and its compiled form
+# is reused from the engine's cache on every call
+_FIND_ACTIVE_BY_HASH = (
+    select(*(_uic_records.c[name] for name in ActiveUIC.__slots__))
+    .where(
+        _uic_records.c.input_hash.in_(bindparam("input_hashes", expanding=True)),
+        _uic_records.c.is_active == true()
+    )
+    .order_by(_uic_records.c.id)
+    .limit(1)
+)
+# Guarded on uic_code too: ids from a shared hot set entry can outlive
+# their row (shard rebalancing copies rows without id, SQLite reuses the
+# ids of archived rows), and must then match nothing
+_TOUCH = (
+    update(_uic_records)
+    .where(
+        _uic_records.c.id == bindparam("record_id"),
+        _uic_records.c.uic_code == bindparam("record_code"),
+        _uic_records.c.is_active == true()
+    )
+    .values(last_requested_at=bindparam("now"), request_count=_uic_records.c.request_count + 1)
+)
+# Same, also moving the record to the current hash key
+_TOUCH_AND_REHASH = _TOUCH.values(
+    input_hash=bindparam("new_input_hash"), hash_key_version=bindparam("new_key_version")
+)
+_KEY_VERSIONS = select(_uic_records.c.hash_key_version).distinct()
+
+
 class UICService:
     """
     Service for generating and managing Unique Identifier Codes.
@@ -32,15 +234,49 @@ class UICService:
     cryptographic hashing.
     """
 
-    def __init__(self, salt: Optional[str] = None):
+    def __init__(
+        self,
+        salt: Optional[str] = None,
+        shard_router: Optional[ShardRouter] = None,
+        read_router: Optional[ReadReplicaRouter] = None,
+        archive: Optional[ColdArchive] = None,
+        hot_set: Optional[SharedHashTable] = None
+    ):
         """
         Initialize UIC service.
 
         Args:
-            salt: Cryptographic salt for hashing. If None, uses config value.
+            salt: Cryptographic salt (current key version) for hashing.
+                If None, uses config value.
+            shard_router: Router for a sharded registry. If None, records
+                live in the database of the session passed to each call.
+            read_router: Replica router for lookups. Ignored when sharded.
+            archive: Cold storage searched when uic_records has no match
+            hot_set: Shared segment of input_hash -> active record, letting
+                returning people skip the lookup on any worker of the host
+
+        Callables appended to ``issue_listeners`` are called with
+        (phone_number, uic_code) once a new code's row is committed, e.g.
+        to invalidate caches.
         """
         self.salt = salt or settings.uic_salt
-        logger.info("UICService initialized", salt_length=len(self.salt))
+        self.hasher = InputHasher.from_settings(self.salt)
+        self.shard_router = shard_router
+        self.read_router = read_router if shard_router is None else None
+        self.archive = archive
+        self.hot_set = hot_set
+        self.issue_listeners: List[Callable[[str, str], None]] = []
+        self.occupancy = OccupancyIndex()
+        self.duplicates = NearDuplicateIndex() if settings.duplicate_check_enabled else None
+        self.rollups = (
+            RegistrationRollups(shard_router) if settings.analytics_rollups_enabled else None
+        )
+        logger.info(
+            "UICService initialized",
+            salt_length=len(self.salt),
+            shards=len(shard_router.shard_ids) if shard_router else 0,
+            replicas=len(self.read_router.engines) if self.read_router else 0
+        )
 
     def _normalize_text(self, text: str) -> str:
         """
@@ -65,27 +301,7 @@ class UICService:
             >>> service._normalize_text("N'Djamena")
             'NDJAMENA'
         """
-        if not text:
-            return ""
-
-        # Convert to string if not already
-        text = str(text).strip()
-
-        # Normalize Unicode: decompose combined characters
-        # NFD separates base characters from combining marks (accents)
-        text = unicodedata.normalize('NFD', text)
-
-        # Remove combining marks (accents)
-        text = "".join([
-            char for char in text
-            if unicodedata.category(char) != 'Mn'  # Mn = Mark, Nonspacing
-        ])
-
-        # Remove all non-alphanumeric characters
-        text = re.sub(r'[^a-zA-Z0-9]', '', text)
-
-        # Convert to uppercase for consistency
-        return text.upper()
+        return normalize_text(text)
 
     def _calculate_input_hash(
         self,
@@ -96,10 +312,11 @@ class UICService:
         gender_code: str
     ) -> str:
         """
-        Calculate SHA-256 hash of normalized inputs.
+        Calculate the keyed hash of normalized inputs.
 
         This hash is used for duplicate detection without exposing
-        the raw input data.
+        the raw input data. It is an HMAC-SHA256 keyed by the salt of
+        the current key version, so it cannot be brute-forced without it.
 
         Args:
             last_name_code: Normalized last name code
@@ -109,13 +326,11 @@ class UICService:
             gender_code: Gender code (M or F)
 
         Returns:
-            Hexadecimal SHA-256 hash
+            Hexadecimal HMAC-SHA256
         """
-        # Create deterministic concatenation
-        raw_input = f"{last_name_code}|{first_name_code}|{birth_year_digit}|{city_code}|{gender_code}"
-
-        # Hash without salt (for duplicate detection)
-        return hashlib.sha256(raw_input.encode('utf-8')).hexdigest()
+        return self.hasher.hash(
+            (last_name_code, first_name_code, birth_year_digit, city_code, gender_code)
+        )
 
     def _generate_uic_code(
         self,
@@ -150,7 +365,8 @@ class UICService:
             gender_code: Gender code (1 digit: 1, 2, 3, or 4)
 
         Returns:
-            Formatted UIC code (10 characters)
+            Formatted base UIC code (10 characters). A collision suffix
+            may be added by the occupancy index at allocation time.
         """
         # Extract and normalize components
         lll = last_name_code[:3].upper().ljust(3, 'X')       # Ensure 3 letters
@@ -214,6 +430,87 @@ class UICService:
 
         return norm_lnc, norm_fnc, norm_byd, norm_cc, norm_gc
 
+    def normalize_batch(
+        self,
+        last_name_codes: Iterable[Any],
+        first_name_codes: Iterable[Any],
+        birth_year_digits: Iterable[Any],
+        city_codes: Iterable[Any],
+        gender_codes: Iterable[Any]
+    ) -> Tuple[List[str], List[str], List[str], List[str], List[str]]:
+        """
+        Normalize columns of inputs, e.g. for registry migrations.
+
+        Gives exactly what normalize_inputs gives for each row.
+
+        Args:
+            last_name_codes, first_name_codes, birth_year_digits, city_codes,
+            gender_codes: Equal-length columns (lists, tuples, NumPy or
+                Arrow string arrays)
+
+        Returns:
+            Tuple of normalized columns in same order
+        """
+        columns = [_as_list(column) for column in (
+            last_name_codes, first_name_codes, birth_year_digits, city_codes, gender_codes
+        )]
+        self._check_lengths(columns)
+        return tuple(normalize_column(column) for column in columns)
+
+    def generate_batch(
+        self,
+        last_name_codes: Iterable[Any],
+        first_name_codes: Iterable[Any],
+        birth_year_digits: Iterable[Any],
+        city_codes: Iterable[Any],
+        gender_codes: Iterable[Any],
+        processes: int = 1,
+        chunk_size: int = 100_000
+    ) -> UICBatch:
+        """
+        Normalize, hash and encode columns of inputs.
+
+        Row by row the output is identical to normalize_inputs,
+        _calculate_input_hash and _generate_uic_code. Nothing is written
+        to the database and no collision suffixes are allocated.
+
+        Args:
+            last_name_codes, first_name_codes, birth_year_digits, city_codes,
+            gender_codes: Equal-length columns (lists, tuples, NumPy or
+                Arrow string arrays)
+            processes: Worker processes; 1 computes in this process
+            chunk_size: Rows per task sent to a worker process
+
+        Returns:
+            UICBatch with normalized inputs, input hashes and base codes
+        """
+        columns = [_as_list(column) for column in (
+            last_name_codes, first_name_codes, birth_year_digits, city_codes, gender_codes
+        )]
+        rows = self._check_lengths(columns)
+
+        if processes <= 1 or rows <= chunk_size:
+            return _generate_rows(tuple(columns), self.hasher)
+
+        chunks = [
+            tuple(column[start:start + chunk_size] for column in columns)
+            for start in range(0, rows, chunk_size)
+        ]
+        result = UICBatch([], [], [], [], [], [], [])
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            for chunk in pool.map(_generate_rows, chunks, itertools.repeat(self.hasher)):
+                result.extend(chunk)
+        return result
+
+    @staticmethod
+    def _check_lengths(columns: List[list]) -> int:
+        """Return the common column length, or raise ValueError."""
+        lengths = {len(column) for column in columns}
+        if len(lengths) != 1:
+            raise ValueError(f"Input columns have different lengths: {sorted(lengths)}")
+        return lengths.pop()
+
     async def check_existing_uic(
         self,
         db: AsyncSession,
@@ -222,7 +519,7 @@ class UICService:
         birth_year_digit: str,
         city_code: str,
         gender_code: str
-    ) -> Optional[UICRecord]:
+    ) -> Optional[ActiveUIC]:
         """
         Check if a UIC already exists for these inputs.
 
@@ -235,29 +532,121 @@ class UICService:
             gender_code: Gender code
 
         Returns:
-            Existing UICRecord if found, None otherwise
+            The existing record's key columns if found, None otherwise
         """
-        input_hash = self._calculate_input_hash(
-            last_name_code, first_name_code, birth_year_digit, city_code, gender_code
-        )
+        fields = (last_name_code, first_name_code, birth_year_digit, city_code, gender_code)
+        input_hashes = [input_hash for _, input_hash in self.hasher.candidates(fields)]
+
+        if self.shard_router is not None:
+            async with self.shard_router.session_for(placement_key(fields)) as shard_db:
+                return await self._find_by_hash(shard_db, input_hashes)
+
+        if self.read_router is not None:
+            return await self.read_router.read(
+                db, lambda session: self._find_by_hash(session, input_hashes), key=input_hashes[0]
+            )
+
+        return await self._find_by_hash(db, input_hashes)
+
+    async def _find_by_hash(self, db: AsyncSession, input_hashes: List[str]) -> Optional[ActiveUIC]:
+        """
+        Look up the active record for a person in one database.
 
-        stmt = select(UICRecord).where(
-            UICRecord.input_hash == input_hash,
-            UICRecord.is_active == True
+        Args:
+            db: Database session
+            input_hashes: The person's hash under every accepted key version
+                (see InputHasher.candidates), current version first
+        """
+        result = await db.execute(_FIND_ACTIVE_BY_HASH, {"input_hashes": input_hashes})
+        row = result.first()
+        if row is None:
+            return None
+
+        existing_record = ActiveUIC(*row)
+        logger.info(
+            "Found existing UIC",
+            uic_code=existing_record.uic_code,
+            created_at=existing_record.created_at
         )
+        return existing_record
+
+    async def count_records(self, db: AsyncSession, active_only: bool = True) -> int:
+        """
+        Count UIC records across the registry.
+
+        Fans out to every shard when the registry is sharded.
+
+        Args:
+            db: Database session (used when not sharded)
+            active_only: Only count active records
+
+        Returns:
+            Number of records
+        """
+        stmt = select(func.count()).select_from(UICRecord)
+        if active_only:
+            stmt = stmt.where(UICRecord.is_active == True)
 
-        result = await db.execute(stmt)
-        existing_record = result.scalar_one_or_none()
+        if self.shard_router is not None:
+            rows = await self.shard_router.fan_out(stmt)
+            return sum(row[0] for row in rows)
 
-        if existing_record:
-            logger.info(
-                "Found existing UIC",
-                uic_code=existing_record.uic_code,
-                created_at=existing_record.created_at
+        async def run(session: AsyncSession) -> Optional[int]:
+            result = await session.execute(stmt)
+            # Zero is a miss: a replica behind a recent write is rechecked on the primary
+            return result.scalar_one() or None
+
+        if self.read_router is not None:
+            return await self.read_router.read(db, run) or 0
+
+        return await run(db) or 0
+
+    async def codes_for_phone(
+        self,
+        db: AsyncSession,
+        phone_number: str,
+        limit: int = 9
+    ) -> List[str]:
+        """
+        Get the active UIC codes registered from a phone number.
+
+        Fans out to every shard when the registry is sharded, since
+        records are placed by input hash, not by phone number.
+
+        Args:
+            db: Database session (used when not sharded)
+            phone_number: User's WhatsApp phone number
+            limit: Maximum codes returned
+
+        Returns:
+            Codes, oldest registration first
+        """
+        stmt = (
+            select(UICRecord.uic_code, UICRecord.created_at)
+            .where(
+                UICRecord.phone_number == phone_number,
+                UICRecord.is_active == True
             )
+            .order_by(UICRecord.created_at, UICRecord.id)
+            .limit(limit)
+        )
 
-        return existing_record
+        if self.shard_router is not None:
+            rows = await self.shard_router.fan_out(stmt)
+            rows = sorted(rows, key=lambda row: row.created_at)[:limit]
+            return [row.uic_code for row in rows]
+
+        async def run(session: AsyncSession) -> Optional[List[str]]:
+            result = await session.execute(stmt)
+            # No codes is a miss: a replica behind a recent write is rechecked on the primary
+            return [row.uic_code for row in result] or None
 
+        if self.read_router is not None:
+            return await self.read_router.read(db, run, key=phone_number) or []
+
+        return await run(db) or []
+
+    @traced("create_uic")
     async def create_uic(
         self,
         db: AsyncSession,
@@ -266,11 +655,16 @@ class UICService:
         first_name_code: str,
         birth_year_digit: str,
         city_code: str,
-        gender_code: str
+        gender_code: str,
+        deadline: Optional[Deadline] = None
     ) -> Tuple[str, bool]:
         """
         Create or retrieve a UIC for the given inputs.
 
+        Changes are staged on ``db`` and committed by the caller, together
+        with the conversation session. A sharded registry commits on the
+        owning shard instead.
+
         Args:
             db: Database session
             phone_number: User's WhatsApp phone number
@@ -279,6 +673,7 @@ class UICService:
             birth_year_digit: Last digit of birth year
             city_code: City code
             gender_code: Gender code
+            deadline: Request budget; the analytics count is deferred when it runs low
 
         Returns:
             Tuple of (uic_code, is_new)
@@ -290,53 +685,208 @@ class UICService:
             last_name_code, first_name_code, birth_year_digit, city_code, gender_code
         )
 
-        # Check for existing UIC
-        existing_record = await self.check_existing_uic(
-            db, norm_lnc, norm_fnc, norm_byd, norm_cc, norm_gc
-        )
+        fields = (norm_lnc, norm_fnc, norm_byd, norm_cc, norm_gc)
+        input_hashes = [input_hash for _, input_hash in self.hasher.candidates(fields)]
+        input_hash = input_hashes[0]
+
+        # The shared hot set is tried once, before any lookup path
+        if self.shard_router is not None:
+            async with self.shard_router.session_for(placement_key(fields)) as shard_db:
+                uic_code = await self._touch_hot(shard_db, input_hash, deadline)
+                if uic_code is not None:
+                    return uic_code, False
+                return await self._create_or_touch(
+                    shard_db, phone_number, input_hashes,
+                    norm_lnc, norm_fnc, norm_byd, norm_cc, norm_gc, deadline
+                )
 
-        if existing_record:
-            # Update last requested time and count
-            existing_record.last_requested_at = datetime.utcnow()
-            existing_record.request_count += 1
-            await db.commit()
+        uic_code = await self._touch_hot(db, input_hash, deadline)
+        if uic_code is not None:
+            return uic_code, False
 
-            logger.info(
-                "Returning existing UIC",
-                uic_code=existing_record.uic_code,
-                request_count=existing_record.request_count
+        if self.read_router is not None:
+            # Returning users are the common case: find them on a replica
+            # and only send the request counter update to the primary
+            existing_record = await self.read_router.read(
+                db, lambda session: self._find_by_hash(session, input_hashes), key=input_hash
             )
+            if existing_record and await self._touch(db, existing_record, input_hash, deadline):
+                self._remember_hot(existing_record, input_hash)
+                return existing_record.uic_code, False
 
-            return existing_record.uic_code, False
+        uic_code, is_new = await self._create_or_touch(
+            db, phone_number, input_hashes,
+            norm_lnc, norm_fnc, norm_byd, norm_cc, norm_gc, deadline
+        )
 
-        # Generate new UIC
-        uic_code = self._generate_uic_code(
-            norm_lnc, norm_fnc, norm_byd, norm_cc, norm_gc
+        if is_new and self.read_router is not None:
+            self.read_router.record_write(input_hash)
+            self.read_router.record_write(phone_number)
+
+        return uic_code, is_new
+
+    async def _touch(
+        self,
+        db: AsyncSession,
+        record: ActiveUIC,
+        input_hash: str,
+        deadline: Optional[Deadline] = None
+    ) -> bool:
+        """
+        Bump the request counter of an existing record with one UPDATE.
+
+        A record still hashed with an older key is moved to the current
+        one in the same UPDATE.
+
+        Returns:
+            False if the record is no longer active (or gone), e.g. a
+            stale hot set entry
+        """
+        params = {"record_id": record.id, "record_code": record.uic_code, "now": datetime.utcnow()}
+        if record.hash_key_version == self.hasher.current_version:
+            result = await db.execute(_TOUCH, params)
+        else:
+            params.update(new_input_hash=input_hash, new_key_version=self.hasher.current_version)
+            result = await db.execute(_TOUCH_AND_REHASH, params)
+        if result.rowcount == 0:
+            return False
+        await self._count_request(
+            db, record.normalized_city_code, record.normalized_gender_code, False, deadline
         )
 
-        input_hash = self._calculate_input_hash(
+        logger.info(
+            "Returning existing UIC",
+            uic_code=record.uic_code,
+            request_count=record.request_count + 1
+        )
+        return True
+
+    async def _touch_hot(
+        self,
+        db: AsyncSession,
+        input_hash: str,
+        deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        """
+        Touch the record the shared hot set holds for a person, skipping the lookup.
+
+        Returns:
+            The UIC code, or None when the person is not in the hot set or
+            the entry is stale (it is then dropped)
+        """
+        if self.hot_set is None:
+            return None
+        value = self.hot_set.get(input_hash)
+        if value is None:
+            return None
+
+        record = _decode_active(value)
+        if await self._touch(db, record, input_hash, deadline):
+            return record.uic_code
+        self.hot_set.delete(input_hash)
+        return None
+
+    def _remember_hot(self, record: ActiveUIC, input_hash: str) -> None:
+        """Share a just-touched record (now under the current key) with the host's workers."""
+        if self.hot_set is None:
+            return
+        touched = ActiveUIC(
+            record.id, record.uic_code, self.hasher.current_version, record.normalized_city_code,
+            record.normalized_gender_code, record.request_count + 1, record.created_at
+        )
+        self.hot_set.set(input_hash, _encode_active(touched), settings.uic_hot_set_ttl_seconds)
+
+    async def _create_or_touch(
+        self,
+        db: AsyncSession,
+        phone_number: str,
+        input_hashes: List[str],
+        norm_lnc: str,
+        norm_fnc: str,
+        norm_byd: str,
+        norm_cc: str,
+        norm_gc: str,
+        deadline: Optional[Deadline] = None
+    ) -> Tuple[str, bool]:
+        """
+        Return the existing UIC for a person or insert a new one.
+
+        The caller has already tried the shared hot set.
+
+        Args:
+            db: Session on the database that owns this person's record
+            phone_number: User's WhatsApp phone number
+            input_hashes: Hashes of the normalized inputs under every
+                accepted key version, current version first
+            norm_lnc, norm_fnc, norm_byd, norm_cc, norm_gc: Normalized inputs
+            deadline: Request budget (see create_uic)
+
+        Returns:
+            Tuple of (uic_code, is_new)
+        """
+        input_hash = input_hashes[0]
+
+        # Check for existing UIC
+        existing_record = await self._find_by_hash(db, input_hashes)
+
+        if existing_record and await self._touch(db, existing_record, input_hash, deadline):
+            self._remember_hot(existing_record, input_hash)
+            return existing_record.uic_code, False
+
+        if self.archive is not None:
+            archived = await self.archive.find_active(input_hashes)
+            if archived is not None:
+                uic_code = await self._promote(db, archived, input_hashes, deadline)
+                if uic_code is not None:
+                    return uic_code, False
+
+        # Generate new UIC, resolving base code collisions in memory
+        base_code = self._generate_uic_code(
             norm_lnc, norm_fnc, norm_byd, norm_cc, norm_gc
         )
+        if not self.occupancy.loaded:
+            await self.load_occupancy(db)
+        notes = self._duplicate_notes(base_code)
+
+        def new_record(code: str) -> UICRecord:
+            return UICRecord(
+                uic_code=code,
+                phone_number=phone_number,
+                normalized_last_name_code=norm_lnc,
+                normalized_first_name_code=norm_fnc,
+                normalized_birth_year_digit=norm_byd,
+                normalized_city_code=norm_cc,
+                normalized_gender_code=norm_gc,
+                input_hash=input_hash,
+                hash_key_version=self.hasher.current_version,
+                created_at=datetime.utcnow(),
+                last_requested_at=datetime.utcnow(),
+                is_active=True,
+                request_count=1,
+                notes=notes
+            )
 
         # Create database record
-        uic_record = UICRecord(
-            uic_code=uic_code,
-            phone_number=phone_number,
-            normalized_last_name_code=norm_lnc,
-            normalized_first_name_code=norm_fnc,
-            normalized_birth_year_digit=norm_byd,
-            normalized_city_code=norm_cc,
-            normalized_gender_code=norm_gc,
-            input_hash=input_hash,
-            created_at=datetime.utcnow(),
-            last_requested_at=datetime.utcnow(),
-            is_active=True,
-            request_count=1
-        )
+        reservation = self._reserve(db, base_code, input_hash)
+        uic_code = reservation.uic_code
+        try:
+            async with db.begin_nested():
+                db.add(new_record(uic_code))
+        except IntegrityError:
+            # Another worker issued this code since our index was loaded
+            logger.warning("UIC code taken by another worker", uic_code=uic_code)
+            self.occupancy.mark_issued(reservation)
+            existing_record = await self._find_by_hash(db, input_hashes)
+            if existing_record and await self._touch(db, existing_record, input_hash, deadline):
+                return existing_record.uic_code, False
 
-        db.add(uic_record)
-        await db.commit()
-        await db.refresh(uic_record)
+            await self.occupancy.refresh_base(db, base_code)
+            uic_code = self._reserve(db, base_code, input_hash).uic_code
+            db.add(new_record(uic_code))
+            await db.flush()
+
+        self._settle_allocation(db, phone_number, uic_code)
+        await self._count_request(db, norm_cc, norm_gc, True, deadline)
 
         logger.info(
             "Created new UIC",
@@ -345,3 +895,176 @@ class UICService:
         )
 
         return uic_code, True
+
+    def _reserve(self, db: AsyncSession, base_code: str, input_hash: str) -> Reservation:
+        """
+        Reserve a code in the occupancy index until the transaction ends.
+
+        The reservation is settled by the transaction's commit or rollback
+        whichever way the insert goes, so no exit path leaves a code marked
+        that no row holds.
+        """
+        reservation = self.occupancy.reserve(base_code, input_hash)
+        after_commit(db, partial(self.occupancy.settle, reservation, True))
+        after_rollback(db, partial(self.occupancy.settle, reservation, False))
+        return reservation
+
+    def _settle_allocation(self, db: AsyncSession, phone_number: str, uic_code: str) -> None:
+        """
+        Publish an allocated code once the transaction inserting it commits.
+
+        The near-duplicate index and the issue listeners only learn the
+        code once its row is committed.
+        """
+        if self.duplicates is not None:
+            after_commit(db, partial(self.duplicates.add, uic_code))
+        for listener in self.issue_listeners:
+            after_commit(db, partial(listener, phone_number, uic_code))
+
+    async def _promote(
+        self,
+        db: AsyncSession,
+        archived: ArchivedUIC,
+        input_hashes: List[str],
+        deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        """
+        Move an archived record back into uic_records, counting the request.
+
+        The archive copy is deleted once the hot row is committed, so a
+        rolled-back request loses nothing.
+
+        Returns:
+            The record's UIC code, or None if the archive copy was stale:
+            its code is back in uic_records but no longer active, so the
+            person needs a new code
+        """
+        now = datetime.utcnow()
+        columns = archived.columns
+        try:
+            async with db.begin_nested():
+                db.add(archived.as_record(
+                    input_hash=input_hashes[0],
+                    hash_key_version=self.hasher.current_version,
+                    last_requested_at=now,
+                    request_count=columns["request_count"] + 1
+                ))
+        except IntegrityError:
+            # Another worker promoted it first, or the copy outlived a promotion
+            existing_record = await self._find_by_hash(db, input_hashes)
+            if existing_record and await self._touch(db, existing_record, input_hashes[0], deadline):
+                return existing_record.uic_code
+            logger.warning("Archived UIC is stale, its hot row is inactive", uic_code=archived.uic_code)
+            await self.archive.forget([archived.uic_code], archived_before=now)
+            return None
+
+        after_commit(db, partial(self.archive.forget_later, [archived.uic_code], now))
+        await self._count_request(
+            db, columns["normalized_city_code"], columns["normalized_gender_code"], False, deadline
+        )
+        metrics.increment("archive.promoted")
+        logger.info("Promoted archived UIC", uic_code=archived.uic_code)
+        return archived.uic_code
+
+    async def load_occupancy(self, db: AsyncSession) -> int:
+        """
+        Load every issued UIC code into the occupancy and near-duplicate indexes.
+
+        Called at startup; reads every shard when the registry is sharded,
+        and the archive, whose codes stay issued.
+
+        Args:
+            db: Database session (used when not sharded)
+
+        Returns:
+            Number of codes loaded
+        """
+        loaded = 0
+        if self.shard_router is None:
+            if self.duplicates is not None:
+                await self.duplicates.load(db)
+            loaded += await self.occupancy.load(db)
+        else:
+            for sid in self.shard_router.shard_ids:
+                async with self.shard_router.session_for_shard(sid) as shard_db:
+                    if self.duplicates is not None:
+                        await self.duplicates.load(shard_db)
+                    loaded += await self.occupancy.load(shard_db)
+
+        if self.archive is not None:
+            archived = 0
+            async for codes in self.archive.iter_codes():
+                self.occupancy.update(codes)
+                if self.duplicates is not None:
+                    self.duplicates.update(codes)
+                archived += len(codes)
+            logger.info("Archived codes loaded", codes=archived)
+            loaded += archived
+        return loaded
+
+    async def load_key_versions(self, db: AsyncSession) -> None:
+        """
+        Stop computing lookup hashes for key versions no record uses any more.
+
+        Called at startup. Storage is only scanned while older key
+        versions (or unkeyed hashes) are configured.
+
+        Args:
+            db: Database session (used when not sharded)
+        """
+        if len(self.hasher.lookup_versions) == 1:
+            return
+
+        if self.shard_router is None:
+            versions = set((await db.execute(_KEY_VERSIONS)).scalars())
+        else:
+            versions = set()
+            for sid in self.shard_router.shard_ids:
+                async with self.shard_router.session_for_shard(sid) as shard_db:
+                    versions.update((await shard_db.execute(_KEY_VERSIONS)).scalars())
+        if self.archive is not None:
+            versions.update(await self.archive.key_versions())
+        self.hasher.retain_versions(versions)
+
+    async def _count_request(
+        self,
+        db: AsyncSession,
+        city_code: str,
+        gender_code: str,
+        is_new: bool,
+        deadline: Optional[Deadline] = None
+    ) -> None:
+        """Add a request to the analytics rollups, in the record's transaction or deferred."""
+        if self.rollups is None:
+            return
+        if deadline is None or deadline.allows("analytics"):
+            await self.rollups.record(db, city_code, gender_code, is_new)
+        else:
+            self.rollups.defer(city_code, gender_code, is_new)
+
+    def _duplicate_notes(self, base_code: str) -> Optional[str]:
+        """
+        Describe existing codes that are probably the same person.
+
+        Args:
+            base_code: Base code of the UIC being created
+
+        Returns:
+            Note for the new record, or None if nothing looks similar
+        """
+        if self.duplicates is None:
+            return None
+
+        matches = self.duplicates.find(base_code[:BASE_CODE_LENGTH])
+        if not matches:
+            return None
+
+        metrics.increment("duplicates.flagged")
+        logger.warning(
+            "Possible duplicate registration",
+            base_code=base_code,
+            matches=[code for code, _ in matches]
+        )
+        return "Possible duplicate of " + ", ".join(
+            f"{code} ({reason})" for code, reason in matches
+        )
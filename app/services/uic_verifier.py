@@ -0,0 +1,182 @@
+"""
+UIC Verification for Partner Systems.
+
+Clinic EMRs check that a code a patient presents exists and is active.
+Lookups go through a per-process cache of code -> status, so a code
+verified again (the common case: the same patient at each visit) costs
+no query:
+- Codes missing from the cache are looked up together with one IN query
+  (fanned out to every shard when the registry is sharded, since records
+  are placed by input hash, not by code)
+- Codes not in uic_records are looked up in the cold archive, if any
+- Unknown codes are cached too, and a code registered by this worker is
+  invalidated; entries expire after a TTL, which bounds how stale
+  another worker's cache can be
+"""
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import ReadReplicaRouter
+from app.logging_config import get_logger
+from app.metrics import metrics
+from app.models.uic import UICRecord
+from app.services.cold_storage import ColdArchive
+from app.sharding import ShardRouter
+
+logger = get_logger(__name__)
+
+# Anything else cannot be an issued code and is answered without a lookup
+CODE_PATTERN = re.compile(r"^[A-Z0-9]{1,50}$")
+
+_uic_records = UICRecord.__table__
+
+# Built once, like the message-path lookups in uic_service
+_FIND_BY_CODES = select(
+    _uic_records.c.uic_code, _uic_records.c.is_active, _uic_records.c.created_at
+).where(_uic_records.c.uic_code.in_(bindparam("uic_codes", expanding=True)))
+
+
+@dataclass(frozen=True, slots=True)
+class UICStatus:
+    """What a partner system learns about a code."""
+
+    uic_code: str
+    exists: bool
+    active: bool = False
+    issued_on: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, object]:
+        """JSON body for this code."""
+        return {
+            "uic_code": self.uic_code,
+            "exists": self.exists,
+            "active": self.active,
+            "issued_on": self.issued_on,
+        }
+
+
+def _issue_date(created_at: datetime) -> str:
+    """Registration date as shown to partners (day precision)."""
+    return created_at.date().isoformat()
+
+
+def normalize_code(uic_code: str) -> str:
+    """Canonicalize a submitted code (codes are issued in upper case)."""
+    return uic_code.strip().upper()
+
+
+class UICVerifier:
+    """Batched code lookups behind a per-process LRU + TTL cache."""
+
+    def __init__(
+        self,
+        shard_router: Optional[ShardRouter] = None,
+        read_router: Optional[ReadReplicaRouter] = None,
+        archive: Optional[ColdArchive] = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        """
+        Initialize the verifier.
+
+        Args:
+            shard_router: Router for a sharded registry. If None, records
+                live in the database of the session passed to each call.
+            read_router: Replica router for lookups. Ignored when sharded.
+            archive: Cold storage searched for codes not in uic_records
+            max_entries: Codes kept in memory. If None, uses config value.
+            ttl_seconds: Seconds an entry is trusted. If None, uses config value.
+        """
+        self.shard_router = shard_router
+        self.read_router = read_router if shard_router is None else None
+        self.archive = archive
+        self.max_entries = max_entries or settings.verify_cache_size
+        self.ttl_seconds = ttl_seconds or settings.verify_cache_ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, UICStatus]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def verify(self, db: AsyncSession, uic_codes: Sequence[str]) -> List[UICStatus]:
+        """
+        Look up a batch of codes.
+
+        Args:
+            db: Database session (only used when some codes are not cached)
+            uic_codes: Codes as submitted; duplicates are allowed
+
+        Returns:
+            One status per submitted code, in order, for the normalized code
+        """
+        codes = [normalize_code(code) for code in uic_codes]
+        now = time.monotonic()
+        found: Dict[str, Optional[UICStatus]] = {}
+        missing: List[str] = []
+
+        for code in codes:
+            if code in found:
+                continue
+            if not CODE_PATTERN.match(code):
+                found[code] = UICStatus(code, exists=False)
+                continue
+            entry = self._entries.get(code)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(code)
+                found[code] = entry[1]
+            else:
+                found[code] = None
+                missing.append(code)
+
+        metrics.increment("verify.cache_hit", len(found) - len(missing))
+        if missing:
+            metrics.increment("verify.cache_miss", len(missing))
+            rows = await self._lookup(db, missing)
+            if self.archive is not None and len(rows) < len(missing):
+                rows.update(await self.archive.find_codes([code for code in missing if code not in rows]))
+            for code in missing:
+                row = rows.get(code)
+                status = (
+                    UICStatus(code, exists=True, active=row.is_active, issued_on=_issue_date(row.created_at))
+                    if row is not None else UICStatus(code, exists=False)
+                )
+                found[code] = status
+                self._entries[code] = (now + self.ttl_seconds, status)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return [found[code] for code in codes]
+
+    async def _lookup(self, db: AsyncSession, uic_codes: List[str]) -> Dict[str, object]:
+        """Fetch the records of some codes with one IN query (per shard)."""
+        params = {"uic_codes": uic_codes}
+
+        if self.shard_router is not None:
+            rows = await self.shard_router.fan_out(_FIND_BY_CODES.params(params))
+        else:
+            async def run(session: AsyncSession) -> list:
+                result = await session.execute(_FIND_BY_CODES, params)
+                return list(result.all())
+
+            if self.read_router is not None:
+                rows = await self.read_router.read(db, run)
+            else:
+                rows = await run(db)
+
+        return {row.uic_code: row for row in rows}
+
+    def invalidate(self, uic_code: str) -> None:
+        """
+        Forget a code's cached status, e.g. after it was registered.
+
+        Args:
+            uic_code: UIC code
+        """
+        self._entries.pop(uic_code, None)
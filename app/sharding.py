@@ -0,0 +1,336 @@
+"""
+Sharded UIC registry.
+
+Routes UIC records to one of several databases by the unkeyed digest of
+their normalized inputs (:func:`placement_key`; never stored, so salt
+rotations do not move rows) using a consistent hash ring. Point lookups touch a single shard,
+reporting queries fan out to every shard, and adding a shard only moves
+the rows whose ring segment changed owner.
+
+Conversation sessions are not sharded; they stay on the primary database.
+"""
+import asyncio
+import bisect
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import create_schema, enable_sqlite_transactions, to_async_url
+from app.logging_config import get_logger
+from app.models.uic import UICRecord
+
+logger = get_logger(__name__)
+
+# Only the leading hex digits of the placement key are used for routing
+SHARD_KEY_PREFIX_LENGTH = 16
+
+# Normalized columns, in hashing order
+NORMALIZED_COLUMNS = (
+    "normalized_last_name_code",
+    "normalized_first_name_code",
+    "normalized_birth_year_digit",
+    "normalized_city_code",
+    "normalized_gender_code",
+)
+
+
+def hash_message(fields: Sequence[str]) -> bytes:
+    """Canonical byte string hashed for a person's normalized inputs."""
+    return "|".join(fields).encode("utf-8")
+
+
+def placement_key(fields: Sequence[str]) -> str:
+    """
+    Shard routing key for normalized inputs.
+
+    The unkeyed SHA-256 (what input_hash held before keyed hashing), so
+    placement is stable across salt rotations, and rebalance_shards can
+    compute it from a row's normalized columns.
+    """
+    return hashlib.sha256(hash_message(fields)).hexdigest()
+
+
+def shard_id(index: int) -> str:
+    """
+    Stable ring identity for the shard at a position in the URL list.
+
+    Shard identity is positional rather than URL-based so that
+    credentials or hostnames can change without moving data.
+    """
+    return f"shard-{index}"
+
+
+class ConsistentHashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Each node is placed on the ring ``virtual_nodes`` times so that load
+    spreads evenly and adding a node steals roughly 1/N of the keys.
+    """
+
+    def __init__(self, nodes: Sequence[str], virtual_nodes: int = 64):
+        """
+        Build the ring.
+
+        Args:
+            nodes: Node identifiers (e.g. shard ids)
+            virtual_nodes: Number of ring points per node
+        """
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+
+        self.nodes = list(nodes)
+        self.virtual_nodes = virtual_nodes
+
+        points = sorted(
+            (self._hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(virtual_nodes)
+        )
+        self._positions = [position for position, _ in points]
+        self._owners = [node for _, node in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        """Map a key to a 64-bit ring position."""
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def get_node(self, key: str) -> str:
+        """
+        Get the node owning a key.
+
+        Args:
+            key: Routing key (a placement_key)
+
+        Returns:
+            Identifier of the owning node
+        """
+        position = self._hash(key[:SHARD_KEY_PREFIX_LENGTH])
+        index = bisect.bisect(self._positions, position)
+        if index == len(self._positions):
+            index = 0
+        return self._owners[index]
+
+
+class ShardRouter:
+    """
+    Routes UIC registry access to shard databases.
+
+    Holds one async engine per shard. Point operations use
+    :meth:`session_for`, reporting queries use :meth:`fan_out`.
+    """
+
+    def __init__(self, database_urls: Sequence[str], virtual_nodes: Optional[int] = None):
+        """
+        Initialize the router.
+
+        Args:
+            database_urls: Shard database URLs, in ring order
+            virtual_nodes: Virtual nodes per shard. If None, uses config value.
+        """
+        if not database_urls:
+            raise ValueError("ShardRouter requires at least one database URL")
+
+        self.database_urls = list(database_urls)
+        self.shard_ids = [shard_id(i) for i in range(len(self.database_urls))]
+        self.ring = ConsistentHashRing(
+            self.shard_ids,
+            virtual_nodes or settings.shard_virtual_nodes
+        )
+
+        self.engines = {
+            sid: enable_sqlite_transactions(
+                create_async_engine(to_async_url(url), echo=settings.debug, future=True)
+            )
+            for sid, url in zip(self.shard_ids, self.database_urls)
+        }
+        self._session_factories = {
+            sid: async_sessionmaker(
+                engine,
+                class_=AsyncSession,
+                expire_on_commit=False,
+                autoflush=False,
+            )
+            for sid, engine in self.engines.items()
+        }
+
+        logger.info("ShardRouter initialized", shard_count=len(self.shard_ids))
+
+    def shard_for(self, key: str) -> str:
+        """Get the shard id owning a placement key."""
+        return self.ring.get_node(key)
+
+    @asynccontextmanager
+    async def session_for(self, key: str) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Open a session on the shard owning a placement key.
+
+        The session is committed on success and rolled back on error.
+
+        Args:
+            key: placement_key of the normalized inputs
+
+        Yields:
+            AsyncSession bound to the owning shard
+        """
+        sid = self.shard_for(key)
+        async with self._session_factories[sid]() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    @asynccontextmanager
+    async def session_for_shard(self, sid: str) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Open a read session on a specific shard.
+
+        Args:
+            sid: Shard id from ``shard_ids``
+
+        Yields:
+            AsyncSession bound to that shard
+        """
+        async with self._session_factories[sid]() as session:
+            yield session
+
+    async def _execute_on(self, sid: str, stmt: Any) -> List[Any]:
+        """Run a read statement on one shard and return all rows."""
+        async with self.session_for_shard(sid) as session:
+            result = await session.execute(stmt)
+            return list(result.all())
+
+    async def fan_out(self, stmt: Any) -> List[Any]:
+        """
+        Run a read statement on every shard concurrently.
+
+        Aggregates (counts, sums) come back as one row per shard and must
+        be combined by the caller.
+
+        Args:
+            stmt: SQLAlchemy select statement
+
+        Returns:
+            Rows from all shards, concatenated in shard order
+        """
+        per_shard = await asyncio.gather(
+            *(self._execute_on(sid, stmt) for sid in self.shard_ids)
+        )
+        return [row for rows in per_shard for row in rows]
+
+    async def init_shards(self) -> None:
+        """Create the registry tables on every shard."""
+        for engine in self.engines.values():
+            async with engine.begin() as conn:
+                await conn.run_sync(create_schema)
+
+    async def dispose(self) -> None:
+        """Close all shard connection pools."""
+        for engine in self.engines.values():
+            await engine.dispose()
+
+
+def rebalance_shards(
+    database_urls: Sequence[str],
+    virtual_nodes: Optional[int] = None,
+    batch_size: int = 1000,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """
+    Move UIC records to the shard that owns them on the current ring.
+
+    Intended to run offline after appending shards to the configuration.
+    Rows are copied to their new owner and deleted from the old one in
+    per-batch transactions, so the job can be interrupted and rerun.
+
+    Args:
+        database_urls: Full list of shard URLs (sync form), in ring order
+        virtual_nodes: Virtual nodes per shard. If None, uses config value.
+        batch_size: Rows examined per source batch
+        dry_run: Only count the rows that would move
+
+    Returns:
+        Mapping of shard id to number of rows moved out of it
+    """
+    shard_ids = [shard_id(i) for i in range(len(database_urls))]
+    ring = ConsistentHashRing(shard_ids, virtual_nodes or settings.shard_virtual_nodes)
+    engines = {sid: create_engine(url) for sid, url in zip(shard_ids, database_urls)}
+    table = UICRecord.__table__
+    copy_columns = [column for column in table.columns if column.name != "id"]
+
+    for engine in engines.values():
+        with engine.begin() as conn:
+            create_schema(conn)
+
+    moved: Dict[str, int] = {sid: 0 for sid in shard_ids}
+
+    try:
+        for source_id, source in engines.items():
+            last_id = 0
+            while True:
+                with source.connect() as conn:
+                    rows = conn.execute(
+                        select(table)
+                        .where(table.c.id > last_id)
+                        .order_by(table.c.id)
+                        .limit(batch_size)
+                    ).mappings().all()
+
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+
+                outgoing: Dict[str, List[Dict[str, Any]]] = {}
+                for row in rows:
+                    target_id = ring.get_node(
+                        placement_key([row[name] for name in NORMALIZED_COLUMNS])
+                    )
+                    if target_id != source_id:
+                        outgoing.setdefault(target_id, []).append(dict(row))
+
+                for target_id, records in outgoing.items():
+                    moved[source_id] += len(records)
+                    if dry_run:
+                        continue
+
+                    with engines[target_id].begin() as target_conn:
+                        # Skip rows copied by an interrupted earlier run
+                        already_copied = set(target_conn.execute(
+                            select(table.c.uic_code).where(
+                                table.c.uic_code.in_([r["uic_code"] for r in records])
+                            )
+                        ).scalars())
+                        pending = [r for r in records if r["uic_code"] not in already_copied]
+                        if pending:
+                            target_conn.execute(
+                                insert(table),
+                                [{c.name: r[c.name] for c in copy_columns} for r in pending]
+                            )
+                    with source.begin() as source_conn:
+                        source_conn.execute(
+                            delete(table).where(table.c.id.in_([r["id"] for r in records]))
+                        )
+
+            logger.info(
+                "Shard rebalanced",
+                shard=source_id,
+                rows_moved=moved[source_id],
+                dry_run=dry_run
+            )
+    finally:
+        for engine in engines.values():
+            engine.dispose()
+
+    return moved
+
+
+# Registry-wide router, only when sharding is configured
+shard_router: Optional[ShardRouter] = (
+    ShardRouter(settings.shard_database_urls) if settings.shard_database_urls else None
+)
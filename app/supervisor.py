@@ -0,0 +1,405 @@
+"""
+Multi-process serving.
+
+The supervisor binds the listening socket once and runs one uvicorn
+worker per process on it; the kernel spreads connections between them.
+Workers share nothing, so anything kept per process must either be safe
+to duplicate or live in a shared backend (see check_shared_state).
+
+Schema creation and upgrades run once in the supervisor before any
+worker starts, so concurrent worker startups never race on DDL. Startup
+fails unless every worker slot becomes ready within its attempts.
+
+Signals handled by the supervisor:
+- SIGHUP: rolling restart. Each worker is replaced by a new one, and the
+  old one is only stopped once the new one is ready (server started and
+  database reachable). A replacement that never becomes ready aborts the
+  restart, leaving the remaining old workers serving.
+- SIGTERM / SIGINT: graceful shutdown of every worker.
+
+Workers that die unexpectedly are replaced.
+"""
+import asyncio
+import importlib
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Worker processes start from a fresh interpreter: no inherited event
+# loop, engine pools or threads from the supervisor
+_spawn = multiprocessing.get_context("spawn")
+
+
+def check_shared_state(workers: int) -> None:
+    """
+    Refuse or flag configurations whose process-local state breaks with several workers.
+
+    Args:
+        workers: Number of worker processes
+
+    Raises:
+        ValueError: If conversation state would be split between workers
+    """
+    if workers <= 1:
+        return
+
+    if settings.session_backend == "memory":
+        raise ValueError(
+            "SESSION_BACKEND=memory keeps conversations in one process; "
+            "use SESSION_BACKEND=database or token with WORKERS > 1"
+        )
+
+    if settings.admission_enabled and settings.rate_limit_backend == "memory":
+        logger.warning(
+            "Rate limits are per worker; set RATE_LIMIT_BACKEND=redis to share them",
+            workers=workers
+        )
+
+
+async def prepare_storage() -> None:
+    """
+    Create or upgrade the registry, shard and archive schemas.
+
+    Runs once in the supervisor before workers start; their lifespan
+    then skips it (INIT_SCHEMA_ON_STARTUP=false).
+    """
+    from app.database import engine, init_db
+    from app.services.cold_storage import build_cold_archive
+    from app.sharding import shard_router
+
+    archive = build_cold_archive()
+    try:
+        await init_db()
+        if shard_router is not None:
+            await shard_router.init_shards()
+        if archive is not None:
+            await archive.init()
+    finally:
+        await engine.dispose()
+        if shard_router is not None:
+            await shard_router.dispose()
+        if archive is not None:
+            await archive.dispose()
+    logger.info("Database schema prepared")
+
+
+def _import_from_string(path: str):
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+async def _serve(server, sockets: List[socket.socket], ready: Connection,
+                 readiness_check: Optional[str]) -> None:
+    """Run the server and report readiness once it is able to serve."""
+
+    async def announce() -> None:
+        while not server.started:
+            if server.should_exit:
+                return
+            await asyncio.sleep(0.05)
+        ok = True
+        if readiness_check is not None:
+            ok = await _import_from_string(readiness_check)()
+        ready.send(ok)
+        if not ok:
+            server.should_exit = True
+
+    announcer = asyncio.create_task(announce())
+    try:
+        await server.serve(sockets=sockets)
+    finally:
+        announcer.cancel()
+
+
+def _worker_main(app: str, sockets: List[socket.socket], ready: Connection,
+                 readiness_check: Optional[str], shutdown_timeout: float,
+                 log_level: str, environ: Dict[str, str]) -> None:
+    """Worker process entry point."""
+    # Before the app (and its settings) are imported
+    os.environ.update(environ)
+    import uvicorn
+
+    config = uvicorn.Config(
+        app,
+        log_level=log_level,
+        timeout_graceful_shutdown=int(shutdown_timeout),
+    )
+    server = uvicorn.Server(config)
+    asyncio.run(_serve(server, sockets, ready, readiness_check))
+
+
+@dataclass
+class _Worker:
+    """A worker process and the pipe it reports readiness on."""
+
+    process: multiprocessing.process.BaseProcess
+    ready: Connection
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+
+class Supervisor:
+    """Starts and supervises uvicorn workers sharing one listening socket."""
+
+    def __init__(
+        self,
+        app: str = "app.main:app",
+        workers: Optional[int] = None,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        readiness_check: Optional[str] = "app.database:check_database",
+        ready_timeout: Optional[float] = None,
+        shutdown_timeout: Optional[float] = None,
+        prepare: Optional[str] = "app.supervisor:prepare_storage",
+        start_attempts: Optional[int] = None
+    ):
+        """
+        Initialize supervisor.
+
+        Args:
+            app: ASGI application import string
+            workers: Number of worker processes. If None, uses config value.
+            host: Address to bind
+            port: Port to bind (0 picks a free port)
+            readiness_check: Import string of an async callable returning
+                True when a worker may take traffic, or None to only wait
+                for the server to start
+            ready_timeout: Seconds a new worker has to become ready. If None, uses config value.
+            shutdown_timeout: Seconds a worker has to drain. If None, uses config value.
+            prepare: Import string of an async callable run once by run()
+                before any worker starts (schema creation), or None
+            start_attempts: Spawns per worker slot at startup. If None, uses config value.
+        """
+        self.app = app
+        self.workers = workers or settings.workers
+        self.host = host
+        self.port = port
+        self.readiness_check = readiness_check
+        self.ready_timeout = ready_timeout or settings.worker_ready_timeout_seconds
+        self.shutdown_timeout = shutdown_timeout or settings.worker_shutdown_timeout_seconds
+        self.prepare = prepare
+        self.start_attempts = start_attempts or settings.worker_start_attempts
+
+        self.sock: Optional[socket.socket] = None
+        self._workers: List[_Worker] = []
+        self._wakeup = threading.Event()
+        self._restart_requested = False
+        self._should_exit = False
+        # Settings overrides for worker processes
+        self._environ: Dict[str, str] = {}
+
+    @property
+    def pids(self) -> List[Optional[int]]:
+        """PIDs of the current workers."""
+        return [worker.pid for worker in self._workers]
+
+    def bind(self) -> socket.socket:
+        """Create the listening socket shared by all workers."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        self.port = sock.getsockname()[1]
+        self.sock = sock
+        return sock
+
+    def _spawn(self) -> _Worker:
+        parent_end, child_end = _spawn.Pipe(duplex=False)
+        process = _spawn.Process(
+            target=_worker_main,
+            kwargs=dict(
+                app=self.app,
+                sockets=[self.sock],
+                ready=child_end,
+                readiness_check=self.readiness_check,
+                shutdown_timeout=self.shutdown_timeout,
+                log_level=settings.log_level.lower(),
+                environ=self._environ,
+            ),
+        )
+        process.start()
+        child_end.close()
+        return _Worker(process=process, ready=parent_end)
+
+    def _wait_ready(self, worker: _Worker) -> bool:
+        try:
+            if worker.ready.poll(self.ready_timeout):
+                return bool(worker.ready.recv())
+        except EOFError:
+            pass
+        return False
+
+    def _stop(self, worker: _Worker) -> None:
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(self.shutdown_timeout)
+        if worker.process.is_alive():
+            logger.warning("Worker did not drain in time, killing", pid=worker.pid)
+            worker.process.kill()
+            worker.process.join()
+        worker.ready.close()
+
+    def prepare_storage(self) -> None:
+        """Run the prepare hook once and stop workers from repeating it."""
+        if self.prepare is None:
+            return
+        asyncio.run(_import_from_string(self.prepare)())
+        self._environ["INIT_SCHEMA_ON_STARTUP"] = "false"
+
+    def start_workers(self) -> None:
+        """
+        Start every worker and wait until they are ready.
+
+        A worker that fails readiness is respawned, up to start_attempts
+        times per slot.
+
+        Raises:
+            RuntimeError: If a slot never became ready; started workers are stopped
+        """
+        if self.sock is None:
+            self.bind()
+
+        pending = self.workers
+        for attempt in range(1, self.start_attempts + 1):
+            failed = 0
+            for worker in [self._spawn() for _ in range(pending)]:
+                if self._wait_ready(worker):
+                    self._workers.append(worker)
+                else:
+                    logger.error("Worker failed to become ready", pid=worker.pid, attempt=attempt)
+                    self._stop(worker)
+                    failed += 1
+            pending = failed
+            if not pending:
+                break
+
+        if len(self._workers) < self.workers:
+            missing = self.workers - len(self._workers)
+            self.shutdown()
+            raise RuntimeError(f"{missing} of {self.workers} workers never became ready")
+
+        logger.info("Workers ready", workers=len(self._workers), port=self.port)
+
+    def rolling_restart(self) -> bool:
+        """
+        Replace workers one at a time, gated on readiness.
+
+        Returns:
+            True if every worker was replaced
+        """
+        logger.info("Rolling restart started", workers=len(self._workers))
+
+        for index, old in enumerate(list(self._workers)):
+            new = self._spawn()
+            if not self._wait_ready(new):
+                logger.error("Replacement worker not ready, aborting restart", pid=new.pid)
+                self._stop(new)
+                return False
+
+            self._workers[index] = new
+            self._stop(old)
+            logger.info("Worker replaced", old_pid=old.pid, new_pid=new.pid)
+
+        logger.info("Rolling restart complete")
+        return True
+
+    def reap(self) -> int:
+        """
+        Replace workers that exited unexpectedly.
+
+        Returns:
+            Number of workers replaced
+        """
+        replaced = 0
+        for index, worker in enumerate(self._workers):
+            if worker.process.is_alive():
+                continue
+            logger.warning("Worker exited", pid=worker.pid, exitcode=worker.process.exitcode)
+            worker.ready.close()
+            new = self._spawn()
+            self._workers[index] = new
+            if not self._wait_ready(new):
+                # Stopped so the next pass replaces it again
+                logger.error("Replacement worker not ready", pid=new.pid)
+                self._stop(new)
+            replaced += 1
+        return replaced
+
+    def shutdown(self) -> None:
+        """Stop every worker gracefully and close the socket."""
+        logger.info("Stopping workers", workers=len(self._workers))
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self._workers:
+            self._stop(worker)
+        self._workers = []
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _on_hup(self, signum, frame) -> None:
+        self._restart_requested = True
+        self._wakeup.set()
+
+    def _on_exit(self, signum, frame) -> None:
+        self._should_exit = True
+        self._wakeup.set()
+
+    def run(self) -> None:
+        """Serve until SIGTERM/SIGINT."""
+        check_shared_state(self.workers)
+
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGTERM, self._on_exit)
+        signal.signal(signal.SIGINT, self._on_exit)
+
+        self.prepare_storage()
+        self.start_workers()
+        try:
+            while not self._should_exit:
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                if self._should_exit:
+                    break
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self.rolling_restart()
+                self.reap()
+        finally:
+            self.shutdown()
+
+
+def main() -> None:
+    """Command-line entry point: python -m app.supervisor."""
+    import argparse
+
+    from app.logging_config import configure_logging
+
+    parser = argparse.ArgumentParser(description="Run the app with several worker processes")
+    parser.add_argument("--app", default="app.main:app", help="ASGI app import string")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: WORKERS setting)")
+    args = parser.parse_args()
+
+    configure_logging()
+    Supervisor(app=args.app, workers=args.workers, host=args.host, port=args.port).run()
+
+
+if __name__ == "__main__":
+    main()
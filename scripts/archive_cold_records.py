@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Move cold registry rows to the archive.
+
+Moves deactivated rows and rows not requested for ARCHIVE_AFTER_DAYS
+from uic_records to the ARCHIVE_PATH SQLite file, in small throttled
+transactions, while the application keeps serving. Safe to stop and
+rerun. Reports the hot table's size and input_hash lookup latency
+before and after.
+
+Restart the application after the first run with a new ARCHIVE_PATH so
+it loads the archived codes and starts looking in the archive. The hot
+database reuses the freed pages for new rows; on SQLite, VACUUM shrinks
+the file itself.
+
+Usage:
+    python scripts/archive_cold_records.py [--older-than-days 730] [--chunk-size 500]
+    python scripts/archive_cold_records.py --report-only
+    python scripts/archive_cold_records.py \\
+        --database-url sqlite:///./shard0.db --database-url sqlite:///./shard1.db
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import enable_sqlite_transactions, to_async_url
+from app.logging_config import configure_logging, get_logger
+from app.models.uic import UICRecord
+from app.services.cold_storage import ColdArchive, archive_cold_records
+from app.services.uic_service import _FIND_ACTIVE_BY_HASH
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Archive cold registry rows")
+    parser.add_argument(
+        "--database-url",
+        action="append",
+        help="Database to archive from; repeat for every shard. "
+             "Defaults to SHARD_DATABASE_URLS, or DATABASE_URL"
+    )
+    parser.add_argument("--archive-path", default=settings.archive_path, help="Archive file (default: ARCHIVE_PATH)")
+    parser.add_argument(
+        "--older-than-days",
+        type=int,
+        default=settings.archive_after_days,
+        help=f"Archive rows not requested for this many days (default: {settings.archive_after_days})"
+    )
+    parser.add_argument("--chunk-size", type=int, default=500, help="Rows per transaction (default: 500)")
+    parser.add_argument(
+        "--pause-seconds",
+        type=float,
+        default=0.05,
+        help="Sleep between transactions (default: 0.05)"
+    )
+    parser.add_argument("--max-chunks", type=int, help="Stop after this many chunks per database")
+    parser.add_argument("--samples", type=int, default=500, help="Lookups timed per report (default: 500)")
+    parser.add_argument("--report-only", action="store_true", help="Only report the hot set, move nothing")
+    return parser.parse_args()
+
+
+async def _table_bytes(db: AsyncSession) -> Optional[int]:
+    """On-disk size of uic_records and its indexes, where the database can tell."""
+    dialect = db.bind.dialect.name
+    try:
+        if dialect == "postgresql":
+            return (await db.execute(text("SELECT pg_total_relation_size('uic_records')"))).scalar()
+        if dialect == "sqlite":
+            return (await db.execute(text(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = 'uic_records' "
+                "OR name IN (SELECT name FROM sqlite_master WHERE tbl_name = 'uic_records')"
+            ))).scalar()
+    except Exception:
+        # dbstat is an optional SQLite extension
+        return None
+    return None
+
+
+async def hot_set_report(session_factory: async_sessionmaker, samples: int) -> Dict[str, Optional[float]]:
+    """Measure the hot table: rows, bytes and input_hash lookup latency."""
+    async with session_factory() as db:
+        rows = (await db.execute(select(func.count()).select_from(UICRecord))).scalar_one()
+        active = (await db.execute(
+            select(func.count()).select_from(UICRecord).where(UICRecord.is_active == True)
+        )).scalar_one()
+        table_bytes = await _table_bytes(db)
+        hashes = (await db.execute(
+            select(UICRecord.input_hash).where(UICRecord.is_active == True)
+            .order_by(func.random()).limit(samples)
+        )).scalars().all()
+
+        timings = []
+        for input_hash in hashes:
+            start = time.perf_counter()
+            (await db.execute(_FIND_ACTIVE_BY_HASH, {"input_hashes": [input_hash]})).first()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        "rows": rows,
+        "active_rows": active,
+        "table_bytes": table_bytes,
+        "lookup_p50_ms": statistics.median(timings) if timings else None,
+        "lookup_p95_ms": timings[int(len(timings) * 0.95)] if timings else None,
+    }
+
+
+def print_report(database_url: str, before: Dict, after: Optional[Dict]) -> None:
+    """Print the before/after table."""
+    def fmt(value):
+        if value is None:
+            return "n/a"
+        return f"{value:,.3f}" if isinstance(value, float) else f"{value:,}"
+
+    print()
+    print(f"Hot set: {database_url}")
+    print("=" * 56)
+    print(f"{'':<16}{'before':>18}{'after' if after else '':>18}")
+    for key in before:
+        print(f"{key:<16}{fmt(before[key]):>18}{fmt(after[key]) if after else '':>18}")
+
+
+async def archive_database(
+    database_url: str,
+    archive: Optional[ColdArchive],
+    args: argparse.Namespace
+) -> None:
+    """Archive and report one database."""
+    engine = enable_sqlite_transactions(create_async_engine(to_async_url(database_url)))
+    try:
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        before = await hot_set_report(session_factory, args.samples)
+        after = None
+
+        if archive is not None:
+            counts = await archive_cold_records(
+                session_factory,
+                archive,
+                older_than=datetime.utcnow() - timedelta(days=args.older_than_days),
+                chunk_size=args.chunk_size,
+                pause_seconds=args.pause_seconds,
+                max_chunks=args.max_chunks
+            )
+            logger.info("✅ Database archived", database=database_url, **counts)
+            after = await hot_set_report(session_factory, args.samples)
+
+        print_report(database_url, before, after)
+    finally:
+        await engine.dispose()
+
+
+async def main() -> int:
+    """Archive every configured database."""
+    args = parse_args()
+    database_urls = args.database_url or settings.shard_database_urls or [settings.database_url]
+
+    archive = None
+    if not args.report_only:
+        if not args.archive_path:
+            logger.error("No archive path: set ARCHIVE_PATH or pass --archive-path")
+            return 1
+        archive = ColdArchive(args.archive_path)
+        await archive.init()
+
+    try:
+        for database_url in database_urls:
+            await archive_database(database_url, archive, args)
+        if archive is not None:
+            print(f"\nArchive {args.archive_path}: {await archive.count():,} rows")
+    finally:
+        if archive is not None:
+            await archive.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
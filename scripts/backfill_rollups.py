@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Registration rollup backfill.
+
+Fills registration_rollups with registrations made before write-time
+counting was deployed, for /admin/analytics. Reads uic_records once, in
+keyset pages; safe to rerun (counts are overwritten, not added).
+
+Usage:
+    python scripts/backfill_rollups.py --before 2026-10-19
+    python scripts/backfill_rollups.py --before 2026-10-19 \\
+        --database-url sqlite:///./shard0.db --database-url sqlite:///./shard1.db
+"""
+import argparse
+import asyncio
+import sys
+from datetime import date
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import Base, enable_sqlite_transactions, to_async_url
+from app.logging_config import configure_logging, get_logger
+from app.services.analytics import backfill
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Backfill registration rollups")
+    parser.add_argument(
+        "--before",
+        type=date.fromisoformat,
+        required=True,
+        help="First day (YYYY-MM-DD, UTC) already counted at write time"
+    )
+    parser.add_argument(
+        "--database-url",
+        action="append",
+        help="Database to backfill; repeat for every shard. "
+             "Defaults to SHARD_DATABASE_URLS, or DATABASE_URL"
+    )
+    parser.add_argument("--batch-size", type=int, default=5000, help="Records read per page")
+    return parser.parse_args()
+
+
+async def main() -> int:
+    """Backfill every configured database."""
+    args = parse_args()
+    database_urls = args.database_url or settings.shard_database_urls or [settings.database_url]
+
+    for database_url in database_urls:
+        engine = enable_sqlite_transactions(create_async_engine(to_async_url(database_url)))
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            rows = await backfill(session_factory, args.before, batch_size=args.batch_size)
+        finally:
+            await engine.dispose()
+        logger.info("✅ Rollups backfilled", database=database_url, rollup_rows=rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark near-duplicate lookups at registry scale.
+
+Fills the index with synthetic base codes (skewed name codes, as in
+benchmark_uic_allocation), then queries it with a mix of fresh codes
+and mistyped copies of indexed ones. Reports index memory, lookup
+latency percentiles and the offline clustering time. No database is
+involved.
+
+Usage:
+    python scripts/benchmark_duplicate_index.py --records 1000000
+"""
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.duplicate_index import NearDuplicateIndex, cluster_codes
+
+
+def synthetic_codes(count: int, seed: int):
+    """Yield base codes with realistic name code skew."""
+    rng = random.Random(seed)
+    letters = string.ascii_uppercase
+    name_pool = ["".join(rng.choices(letters, k=3)) for _ in range(3000)]
+    weights = [1.0 / (rank + 1) for rank in range(len(name_pool))]
+    cities = ["".join(rng.choices(letters, k=2)) for _ in range(40)]
+
+    last_names = rng.choices(name_pool, weights=weights, k=count)
+    first_names = rng.choices(name_pool, weights=weights, k=count)
+    for i in range(count):
+        yield (
+            f"{last_names[i]}{first_names[i]}{rng.randrange(10)}"
+            f"{rng.choice(cities)}{rng.randrange(1, 5)}"
+        )
+
+
+def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate detection")
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--cluster-records", type=int, default=200_000,
+                        help="Registry size for the offline clustering run")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Generating {args.records:,} synthetic codes...")
+    codes = list(synthetic_codes(args.records, args.seed))
+    # Half the queries are indexed codes with one character changed
+    rng = random.Random(args.seed + 1)
+    fresh = synthetic_codes(args.queries, args.seed + 1)
+    queries = []
+    for i, code in enumerate(fresh):
+        if i % 2:
+            original = rng.choice(codes)
+            position = rng.randrange(len(original))
+            code = original[:position] + rng.choice(string.ascii_uppercase) + original[position + 1:]
+        queries.append(code)
+
+    index = NearDuplicateIndex(expected_codes=len(codes))
+    start = time.perf_counter()
+    index.update(codes)
+    load_elapsed = time.perf_counter() - start
+    codes_bytes = sys.getsizeof(index._codes) + sum(sys.getsizeof(code) for code in codes)
+
+    latencies = []
+    flagged = 0
+    for query in queries:
+        start = time.perf_counter()
+        matches = index.find(query)
+        latencies.append(time.perf_counter() - start)
+        flagged += bool(matches)
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6
+
+    start = time.perf_counter()
+    clusters = cluster_codes(codes[:args.cluster_records])
+    cluster_elapsed = time.perf_counter() - start
+
+    print()
+    print("Near-duplicate index benchmark")
+    print("=" * 50)
+    print(f"Codes indexed:            {len(index):,}")
+    print(f"Startup load throughput:  {len(codes) / load_elapsed:,.0f} codes/s")
+    print(f"Key table memory:         {index.nbytes / 2**20:.1f} MiB "
+          f"({index.nbytes / len(codes):.0f} B/code)")
+    print(f"Code list memory:         {codes_bytes / 2**20:.1f} MiB "
+          f"({codes_bytes / len(codes):.0f} B/code)")
+    print(f"Lookup latency p50:       {percentile(0.50):.1f} µs")
+    print(f"Lookup latency p99:       {percentile(0.99):.1f} µs")
+    print(f"Lookup latency max:       {latencies[-1] * 1e6:.1f} µs")
+    print(f"Queries flagged:          {flagged / len(queries) * 100:.1f}%")
+    print(f"Clustering {args.cluster_records:,} codes: {cluster_elapsed:.1f} s "
+          f"({len(clusters):,} clusters)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
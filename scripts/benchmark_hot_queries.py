@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-message queries: ORM statements vs the Core fast paths.
+
+Runs each hot statement against a seeded SQLite file, both the way it
+used to be written (ORM entity select / ORM-enabled delete) and as the
+prebuilt Core statement the services now use:
+- session get:    conversation_sessions by phone_number
+- active lookup:  uic_records by input_hash, is_active
+- session delete: conversation_sessions by phone_number
+
+Reports statements per second for each.
+
+Usage:
+    python scripts/benchmark_hot_queries.py --rows 5000 --iterations 5000
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, enable_sqlite_transactions
+from app.models.uic import ConversationSession, UICRecord
+from app.services.session_store import DatabaseSessionStore
+from app.services.uic_service import UICService
+
+
+def _phone(i: int) -> str:
+    return f"+2438{i:08d}"
+
+
+async def seed(factory: async_sessionmaker, rows: int) -> None:
+    """Insert one session and one registry record per row."""
+    now = datetime.utcnow()
+    async with factory() as db:
+        await db.execute(insert(ConversationSession), [
+            dict(phone_number=_phone(i), current_step=2, language="fr", last_name_code="MBE",
+                 first_name_code="IBR", created_at=now, updated_at=now,
+                 expires_at=now + timedelta(hours=1))
+            for i in range(rows)
+        ])
+        await db.execute(insert(UICRecord), [
+            dict(uic_code=f"C{i:09d}", phone_number=_phone(i), normalized_last_name_code="MBE",
+                 normalized_first_name_code="IBR", normalized_birth_year_digit="7",
+                 normalized_city_code="KI", normalized_gender_code="1", input_hash=f"{i:064x}",
+                 hash_key_version=1, created_at=now, last_requested_at=now, is_active=True,
+                 request_count=1)
+            for i in range(rows)
+        ])
+        await db.commit()
+
+
+async def measure(
+    factory: async_sessionmaker,
+    iterations: int,
+    rows: int,
+    statement: Callable[[AsyncSession, int], Awaitable[object]]
+) -> float:
+    """Run a statement once per iteration in one transaction; return statements per second."""
+    async with factory() as db:
+        start = time.perf_counter()
+        for i in range(iterations):
+            await statement(db, i % rows)
+        elapsed = time.perf_counter() - start
+        await db.rollback()
+    return iterations / elapsed
+
+
+async def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark hot queries: ORM vs Core")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    store = DatabaseSessionStore()
+    service = UICService(salt="benchmark_salt_1234567890")
+
+    async def orm_session_get(db, i):
+        result = await db.execute(
+            select(ConversationSession).where(ConversationSession.phone_number == _phone(i))
+        )
+        return result.scalar_one_or_none()
+
+    async def orm_lookup(db, i):
+        result = await db.execute(
+            select(UICRecord).where(
+                UICRecord.input_hash.in_([f"{i:064x}"]), UICRecord.is_active == True
+            ).order_by(UICRecord.id).limit(1)
+        )
+        return result.scalars().first()
+
+    async def orm_delete(db, i):
+        await db.execute(delete(ConversationSession).where(ConversationSession.phone_number == _phone(i)))
+
+    cases = [
+        ("session get", orm_session_get, lambda db, i: store.get(db, _phone(i))),
+        ("active lookup", orm_lookup, lambda db, i: service._find_by_hash(db, [f"{i:064x}"])),
+        ("session delete", orm_delete, lambda db, i: store.delete(db, _phone(i))),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = enable_sqlite_transactions(
+            create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'hot.db'}")
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+        await seed(factory, args.rows)
+
+        results = []
+        for name, orm, core in cases:
+            # Warm up the compiled cache for both forms
+            await measure(factory, 50, args.rows, orm)
+            await measure(factory, 50, args.rows, core)
+            results.append((
+                name,
+                await measure(factory, args.iterations, args.rows, orm),
+                await measure(factory, args.iterations, args.rows, core),
+            ))
+        await engine.dispose()
+
+    print()
+    print(f"Hot query benchmark ({args.rows:,} rows, {args.iterations:,} statements each)")
+    print("=" * 64)
+    print(f"{'':<16}{'ORM':>14}{'Core':>14}{'speedup':>12}")
+    for name, orm_rate, core_rate in results:
+        print(f"{name:<16}{orm_rate:>10,.0f} /s{core_rate:>10,.0f} /s{core_rate / orm_rate:>11.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
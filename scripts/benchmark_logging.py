@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-message logging overhead.
+
+Replays the info events a single mid-flow WhatsApp message produces and
+measures the time spent in logging calls on the calling thread (the
+event loop in production), for each logging pipeline. Output goes to a
+sink that sleeps on every write to mimic a slow disk or container log
+driver.
+
+Usage:
+    python scripts/benchmark_logging.py [--messages 5000] [--write-latency-us 50]
+"""
+import argparse
+import io
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import structlog
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app import logging_config
+
+
+class SlowSink(io.TextIOBase):
+    """Text stream that blocks for a fixed time on every write."""
+
+    def __init__(self, write_latency: float):
+        self.write_latency = write_latency
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.write_latency)
+        self.lines += text.count("\n")
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def one_message(logger) -> None:
+    """The info events logged while handling one mid-flow answer."""
+    logger.info("Received WhatsApp message", phone_number="+243810000000",
+                message_length=3, message_sid="SM0123456789")
+    logger.info("Found existing session", phone_number="+243810000000", step=2)
+    logger.info("Answer stored", phone_number="+243810000000",
+                step="birth_year_digit", answer_length=1)
+
+
+def run_mode(name: str, messages: int, sink: SlowSink, **overrides) -> dict:
+    """Configure one pipeline and time the per-message logging calls."""
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+
+    structlog.reset_defaults()
+    logging.getLogger().handlers = []
+    real_stdout, sys.stdout = sys.stdout, sink
+    try:
+        logging_config.configure_logging()
+        logger = logging_config.get_logger("benchmark")
+
+        timings = []
+        for _ in range(messages):
+            start = time.perf_counter()
+            one_message(logger)
+            timings.append(time.perf_counter() - start)
+
+        logging_config.shutdown_logging()
+        stats = logging_config.get_logging_stats()
+    finally:
+        sys.stdout = real_stdout
+        logging.getLogger().handlers = []
+
+    timings.sort()
+    return {
+        "mode": name,
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99)] * 1e6,
+        "lines": sink.lines,
+        "dropped": stats["queue_full_drops"],
+    }
+
+
+def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark logging overhead")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--write-latency-us", type=float, default=50.0)
+    args = parser.parse_args()
+
+    latency = args.write_latency_us / 1e6
+    sampling = {"Found existing session": 0.1, "Answer stored": 0.1}
+
+    modes = [
+        ("sync console", dict(log_async=False, log_json=False, log_sample_rates={})),
+        ("sync json", dict(log_async=False, log_json=True, log_sample_rates={})),
+        ("async json", dict(log_async=True, log_json=True, log_sample_rates={})),
+        ("async json + sampling", dict(log_async=True, log_json=True, log_sample_rates=sampling)),
+    ]
+
+    results = [
+        run_mode(name, args.messages, SlowSink(latency), log_queue_size=args.messages * 4, **overrides)
+        for name, overrides in modes
+    ]
+
+    print()
+    print(f"Per-message logging overhead ({args.messages:,} messages, "
+          f"{args.write_latency_us:.0f} µs per write)")
+    print("=" * 72)
+    print(f"{'mode':<24}{'mean µs':>10}{'p99 µs':>10}{'lines':>10}{'dropped':>10}")
+    for r in results:
+        print(f"{r['mode']:<24}{r['mean_us']:>10.1f}{r['p99_us']:>10.1f}"
+              f"{r['lines']:>10,}{r['dropped']:>10,}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
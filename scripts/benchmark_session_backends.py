@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark conversation session backends.
+
+Replays the load + save that FlowManager does for every message against:
+- database: the conversation_sessions table (SQLite file), one commit per message
+- token (warm): the signed-token store on the worker that issued the token
+- token (cold): the signed-token store on a worker that must decode it
+
+Reports per-message latency and the memory each live session costs.
+
+Usage:
+    python scripts/benchmark_session_backends.py --sessions 2000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, enable_sqlite_transactions
+from app.services.session_store import (
+    ANSWER_FIELDS,
+    DatabaseSessionStore,
+    SessionState,
+    SessionStore,
+    SignedTokenSessionStore,
+    bind_session_token,
+    issued_session_token,
+)
+
+ANSWERS = ["MBE", "IBR", "7", "KI", "1"]
+
+
+def _phone(i: int) -> str:
+    return f"+2438{i:08d}"
+
+
+async def run_messages(
+    store_for_message: Callable[[int], SessionStore],
+    sessions: int,
+    db_factory=None
+) -> List[float]:
+    """Play the first four answers for every session, returning per-message latencies."""
+    latencies = []
+    tokens = {}
+    for step, answer in enumerate(ANSWERS[:-1]):
+        for i in range(sessions):
+            phone = _phone(i)
+            store = store_for_message(step)
+            start = time.perf_counter()
+
+            bind_session_token(tokens.get(phone))
+            db = db_factory() if db_factory else None
+            state = await store.get(db, phone) or SessionState(phone_number=phone)
+            setattr(state, ANSWER_FIELDS[step], answer)
+            state.current_step += 1
+            await store.save(db, state)
+            if db is not None:
+                await db.commit()
+                await db.close()
+            tokens[phone] = issued_session_token()
+
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{name:<16} mean {statistics.fmean(latencies) * 1e6:8.1f} µs   "
+          f"p50 {latencies[len(latencies) // 2] * 1e6:8.1f} µs   p99 {p99 * 1e6:8.1f} µs")
+
+
+async def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark session backends")
+    parser.add_argument("--sessions", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "sessions.db"
+        engine = enable_sqlite_transactions(create_async_engine(f"sqlite+aiosqlite:///{db_path}"))
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        database = DatabaseSessionStore()
+        db_latencies = await run_messages(lambda step: database, args.sessions, factory)
+        await engine.dispose()
+        db_bytes = db_path.stat().st_size
+
+    secret = "benchmark_token_secret"
+    warm_store = SignedTokenSessionStore(secret=secret, max_entries=args.sessions)
+    warm_latencies = await run_messages(lambda step: warm_store, args.sessions)
+
+    # Alternate between two workers so every message has to decode the token
+    workers = [SignedTokenSessionStore(secret=secret, max_entries=args.sessions) for _ in range(2)]
+    cold_latencies = await run_messages(lambda step: workers[step % 2], args.sessions)
+
+    tracemalloc.start()
+    memory_store = SignedTokenSessionStore(secret=secret, max_entries=args.sessions)
+    await run_messages(lambda step: memory_store, args.sessions)
+    token_map_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    sample_token = next(iter(memory_store._recent.values()))[0]
+
+    print()
+    print(f"Session backend benchmark ({args.sessions:,} sessions, {len(ANSWERS) - 1} messages each)")
+    print("=" * 72)
+    report("database", db_latencies)
+    report("token (warm)", warm_latencies)
+    report("token (cold)", cold_latencies)
+    print()
+    print(f"Token size:                {len(sample_token)} bytes (sent back by Twilio)")
+    print(f"Token map memory:          {token_map_bytes / args.sessions:.0f} B/session "
+          f"(optional cache, bounded by SESSION_TOKEN_CACHE_SIZE)")
+    print(f"SQLite file:               {db_bytes / args.sessions:.0f} B/session (server-side)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark Twilio signature validation.
+
+Compares the cached-key validator used by the webhook middleware with
+the Twilio SDK's RequestValidator on a typical WhatsApp payload.
+
+Usage:
+    python scripts/benchmark_signature.py [--iterations 100000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from twilio.request_validator import RequestValidator
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.middleware import TwilioSignatureValidator
+
+AUTH_TOKEN = "0123456789abcdef0123456789abcdef"
+URL = "https://bot.example.org/whatsapp/webhook"
+PARAMS = {
+    "SmsMessageSid": "SM0123456789abcdef0123456789abcdef",
+    "NumMedia": "0",
+    "ProfileName": "Test User",
+    "SmsSid": "SM0123456789abcdef0123456789abcdef",
+    "WaId": "243810000000",
+    "SmsStatus": "received",
+    "Body": "MUTOMBO",
+    "To": "whatsapp:+14155238886",
+    "NumSegments": "1",
+    "MessageSid": "SM0123456789abcdef0123456789abcdef",
+    "AccountSid": "AC0123456789abcdef0123456789abcdef",
+    "From": "whatsapp:+243810000000",
+    "ApiVersion": "2010-04-01",
+}
+
+
+def bench(name: str, fn, iterations: int) -> float:
+    """Time fn() and print microseconds per call."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{name:<32}{per_call:>10.2f} µs")
+    return per_call
+
+
+def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark Twilio signature validation")
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    sdk = RequestValidator(AUTH_TOKEN)
+    cached = TwilioSignatureValidator(AUTH_TOKEN)
+    signature = sdk.compute_signature(URL, PARAMS)
+    items = list(PARAMS.items())
+
+    assert cached.validate(URL, items, signature)
+
+    print(f"Signature validation ({args.iterations:,} iterations, {len(PARAMS)} params)")
+    print("=" * 42)
+    bench("twilio RequestValidator", lambda: sdk.validate(URL, PARAMS, signature), args.iterations)
+    bench("cached HMAC key", lambda: cached.validate(URL, items, signature), args.iterations)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
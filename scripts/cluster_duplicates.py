@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Offline near-duplicate clustering.
+
+Groups the whole registry into clusters of codes that are probably the
+same person (see app/services/duplicate_index) and writes them to a CSV
+for review: one row per code, with the cluster it belongs to and the
+link that joined it.
+
+Usage:
+    python scripts/cluster_duplicates.py --output duplicates.csv
+    python scripts/cluster_duplicates.py --output duplicates.csv \\
+        --database-url sqlite:///./shard0.db --database-url sqlite:///./shard1.db
+"""
+import argparse
+import asyncio
+import csv
+import sys
+from pathlib import Path
+from typing import List
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import to_async_url
+from app.logging_config import configure_logging, get_logger
+from app.models.uic import UICRecord
+from app.services.duplicate_index import cluster_codes
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Cluster probable duplicate registrations")
+    parser.add_argument("--output", type=Path, required=True, help="Output CSV")
+    parser.add_argument(
+        "--database-url",
+        action="append",
+        help="Database to read; repeat for every shard. Defaults to DATABASE_URL"
+    )
+    parser.add_argument("--batch-size", type=int, default=10000)
+    return parser.parse_args()
+
+
+async def read_codes(database_url: str, batch_size: int) -> List[str]:
+    """Read every issued code from one database, oldest first."""
+    engine = create_async_engine(to_async_url(database_url))
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    codes: List[str] = []
+    try:
+        async with session_factory() as db:
+            stmt = (
+                select(UICRecord.uic_code)
+                .order_by(UICRecord.id)
+                .execution_options(yield_per=batch_size)
+            )
+            result = await db.stream(stmt)
+            async for partition in result.scalars().partitions():
+                codes.extend(partition)
+    finally:
+        await engine.dispose()
+    return codes
+
+
+async def main() -> int:
+    """Cluster the registry."""
+    args = parse_args()
+
+    codes: List[str] = []
+    for database_url in args.database_url or [settings.database_url]:
+        codes.extend(await read_codes(database_url, args.batch_size))
+
+    clusters = cluster_codes(codes)
+
+    with open(args.output, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(["cluster_id", "uic_code", "reason"])
+        for cluster_id, members in enumerate(clusters, start=1):
+            for uic_code, reason in members:
+                writer.writerow([cluster_id, uic_code, reason])
+
+    logger.info(
+        "✅ Duplicate clusters written",
+        path=str(args.output),
+        codes=len(codes),
+        clusters=len(clusters),
+        flagged=sum(len(members) for members in clusters)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
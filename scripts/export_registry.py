@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Registry export script.
+
+Writes a CSV, JSONL or Parquet extract of uic_records in constant
+memory. With --watermark-file, each run only exports records added
+since the previous successful run.
+
+Ids, and so watermarks, are per database. With SHARD_DATABASE_URLS set,
+export each shard separately with --database-url and its own
+--watermark-file. Rows moved to the cold archive (ARCHIVE_PATH) are not
+included.
+
+Usage:
+    python scripts/export_registry.py --format csv --output extract.csv
+    python scripts/export_registry.py --format parquet --output new.parquet \\
+        --watermark-file .export_watermark
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import to_async_url
+from app.logging_config import configure_logging, get_logger
+from app.services.export_service import EXPORT_FORMATS, ExportFilter, RegistryExporter
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Export the UIC registry")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--output", type=Path, required=True, help="Output file path")
+    parser.add_argument("--since-id", type=int, default=0, help="Only export ids above this")
+    parser.add_argument(
+        "--watermark-file",
+        type=Path,
+        help="Read --since-id from this file and store the new watermark after success"
+    )
+    parser.add_argument("--created-from", type=datetime.fromisoformat, help="ISO date/time, inclusive")
+    parser.add_argument("--created-to", type=datetime.fromisoformat, help="ISO date/time, exclusive")
+    parser.add_argument("--city-code", help="Only export this city code")
+    parser.add_argument("--include-phone", action="store_true", help="Include phone numbers")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument(
+        "--database-url",
+        help="Database to export (e.g. one shard). Defaults to DATABASE_URL; "
+             "required when the registry is sharded"
+    )
+    return parser.parse_args()
+
+
+async def main() -> int:
+    """Run the export."""
+    args = parse_args()
+    if args.database_url is None:
+        if settings.shard_database_urls:
+            logger.error(
+                "Registry is sharded: export each shard with --database-url and its own --watermark-file",
+                shards=len(settings.shard_database_urls)
+            )
+            return 1
+        args.database_url = settings.database_url
+
+    since_id = args.since_id
+    if args.watermark_file and args.watermark_file.exists():
+        since_id = int(args.watermark_file.read_text().strip() or 0)
+
+    export_filter = ExportFilter(
+        since_id=since_id,
+        created_from=args.created_from,
+        created_to=args.created_to,
+        city_code=args.city_code,
+        include_phone=args.include_phone
+    )
+    exporter = RegistryExporter(batch_size=args.batch_size)
+
+    engine = create_async_engine(to_async_url(args.database_url))
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            watermark = await exporter.get_watermark(db)
+            mode = "wb" if args.format == "parquet" else "w"
+            encoding = None if args.format == "parquet" else "utf-8"
+
+            # Write to a temporary file so a failed run never leaves a partial extract
+            partial = args.output.with_name(args.output.name + ".partial")
+            with open(partial, mode, encoding=encoding, newline="" if encoding else None) as out:
+                async for chunk in exporter.stream(db, args.format, export_filter, watermark):
+                    out.write(chunk)
+            partial.replace(args.output)
+    except Exception as e:
+        logger.error("Export failed", error=str(e), exc_info=True)
+        return 1
+    finally:
+        await engine.dispose()
+
+    if args.watermark_file:
+        args.watermark_file.write_text(f"{watermark}\n")
+
+    logger.info(
+        "✅ Export written",
+        path=str(args.output),
+        format=args.format,
+        since_id=since_id,
+        watermark=watermark
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Shard rebalancing script.
+
+Moves UIC records to the shard that owns them after shards have been
+appended to SHARD_DATABASE_URLS. Run it with the application stopped
+(or with writes paused); it is safe to rerun if interrupted.
+
+Usage:
+    python scripts/rebalance_shards.py [--dry-run] [--batch-size 1000]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.logging_config import configure_logging, get_logger
+from app.sharding import rebalance_shards
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def main() -> int:
+    """Rebalance the configured shards."""
+    parser = argparse.ArgumentParser(description="Rebalance UIC registry shards")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report how many rows would move"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Rows examined per batch (default: 1000)"
+    )
+    args = parser.parse_args()
+
+    if len(settings.shard_database_urls) < 2:
+        logger.error("Rebalancing needs at least two SHARD_DATABASE_URLS")
+        return 1
+
+    moved = rebalance_shards(
+        settings.shard_database_urls,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run
+    )
+
+    logger.info(
+        "✅ Rebalance finished" if not args.dry_run else "Rebalance dry run finished",
+        rows_moved=sum(moved.values()),
+        per_shard=moved
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Online input hash migration.
+
+Rewrites every registry row's input_hash with the current key version
+(UIC_SALT / UIC_SALT_VERSION), in small throttled transactions, while
+the application keeps serving. Databases created before keyed hashing
+get their hash_key_version column when the app (or this script) starts.
+Safe to stop and rerun.
+
+The cold archive (ARCHIVE_PATH, or --archive-path) is re-hashed too, so
+archived people still match once the old salt is gone.
+
+Rotating the salt:
+1. Move the current salt to UIC_PREVIOUS_SALTS under its version
+2. Set the new UIC_SALT and bump UIC_SALT_VERSION; restart the app
+3. Run this script against the database (every shard) and the archive,
+   and check that it reports nothing skipped or left
+4. Remove the old salt from UIC_PREVIOUS_SALTS (and set
+   UIC_ACCEPT_UNKEYED_HASHES=false after the first migration)
+
+Usage:
+    python scripts/rehash_inputs.py [--chunk-size 500] [--pause-seconds 0.05]
+    python scripts/rehash_inputs.py \\
+        --database-url sqlite:///./shard0.db --database-url sqlite:///./shard1.db
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import Dict
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import create_schema, enable_sqlite_transactions, to_async_url
+from app.logging_config import configure_logging, get_logger
+from app.services.cold_storage import ColdArchive, rehash_archive
+from app.services.input_hashing import InputHasher, rehash_registry
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Re-hash registry inputs with the current key")
+    parser.add_argument(
+        "--database-url",
+        action="append",
+        help="Database to migrate; repeat for every shard. "
+             "Defaults to SHARD_DATABASE_URLS, or DATABASE_URL"
+    )
+    parser.add_argument("--chunk-size", type=int, default=500, help="Rows per transaction (default: 500)")
+    parser.add_argument(
+        "--pause-seconds",
+        type=float,
+        default=0.05,
+        help="Sleep between transactions (default: 0.05)"
+    )
+    parser.add_argument("--max-chunks", type=int, help="Stop after this many chunks per database")
+    parser.add_argument(
+        "--archive-path",
+        default=settings.archive_path,
+        help="Cold archive to re-hash as well (default: ARCHIVE_PATH)"
+    )
+    return parser.parse_args()
+
+
+async def migrate(database_url: str, hasher: InputHasher, args: argparse.Namespace) -> Dict[str, int]:
+    """Re-hash one database."""
+    engine = enable_sqlite_transactions(create_async_engine(to_async_url(database_url)))
+    try:
+        async with engine.begin() as conn:
+            if await conn.run_sync(create_schema):
+                logger.info("Database schema upgraded", database=database_url)
+
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        return await rehash_registry(
+            session_factory,
+            hasher,
+            chunk_size=args.chunk_size,
+            pause_seconds=args.pause_seconds,
+            max_chunks=args.max_chunks
+        )
+    finally:
+        await engine.dispose()
+
+
+async def main() -> int:
+    """Re-hash every configured database."""
+    args = parse_args()
+    hasher = InputHasher.from_settings()
+    database_urls = args.database_url or settings.shard_database_urls or [settings.database_url]
+
+    for database_url in database_urls:
+        counts = await migrate(database_url, hasher, args)
+        logger.info("✅ Database re-hashed", database=database_url, key_version=hasher.current_version, **counts)
+
+    if args.archive_path:
+        archive = ColdArchive(args.archive_path)
+        try:
+            await archive.init()
+            counts = await rehash_archive(
+                archive,
+                hasher,
+                chunk_size=args.chunk_size,
+                pause_seconds=args.pause_seconds,
+                max_chunks=args.max_chunks
+            )
+        finally:
+            await archive.dispose()
+        logger.info("✅ Archive re-hashed", path=args.archive_path, key_version=hasher.current_version, **counts)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Message journal replay.
+
+Sends the traffic recorded in a message journal to a running instance
+(normally a local or staging one) with the original timing, 10x faster,
+or as fast as the instance answers, to test capacity with real traffic
+shapes. Senders and answers are synthetic but derived from the journal,
+so the same journal always produces the same requests.
+
+Requests are signed with TWILIO_AUTH_TOKEN, so the target must use the
+same token (or run with TWILIO_VALIDATE_SIGNATURE=false).
+
+Usage:
+    python scripts/replay_journal.py journal/messages.bin --speed 10
+    python scripts/replay_journal.py journal/messages-*.bin --speed max \\
+        --url http://localhost:8000/whatsapp/webhook --concurrency 64
+
+Requires httpx (installed with the dev extra).
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.logging_config import configure_logging, get_logger
+from app.middleware import TwilioSignatureValidator
+from app.services.message_journal import journal_files, read_journal, synthetic_message
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """Speed factor; "max" (None) sends without waiting."""
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Replay a message journal against an instance")
+    parser.add_argument(
+        "journals",
+        nargs="*",
+        type=Path,
+        help="Journal files (default: MESSAGE_JOURNAL_PATH, per-worker journals next to it, and rotations)"
+    )
+    parser.add_argument("--url", default="http://localhost:8000/whatsapp/webhook", help="Webhook URL")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 10, ... or max (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight at most")
+    parser.add_argument("--limit", type=int, help="Replay only the first N messages")
+    return parser.parse_args()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def replay(args: argparse.Namespace, paths: List[Path]) -> int:
+    """Send every record and report latencies."""
+    import httpx
+
+    signer = TwilioSignatureValidator(settings.twilio_auth_token)
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    recorded: List[float] = []
+    statuses: Counter = Counter()
+    lag = 0.0
+    tasks = set()
+
+    async def send(client: "httpx.AsyncClient", record) -> None:
+        sender, body = synthetic_message(record)
+        params = {"From": sender, "Body": body, "MessageSid": record.message_sid or "SMreplay"}
+        headers = {"X-Twilio-Signature": signer.compute(args.url, sorted(params.items()))}
+        started = time.perf_counter()
+        try:
+            response = await client.post(args.url, data=params, headers=headers)
+            statuses[response.status_code] += 1
+        except httpx.HTTPError as error:
+            statuses[type(error).__name__] += 1
+        finally:
+            latencies.append(time.perf_counter() - started)
+            slots.release()
+
+    first_timestamp = None
+    replay_started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        for count, record in enumerate(read_journal(paths)):
+            if args.limit is not None and count >= args.limit:
+                break
+            if first_timestamp is None:
+                first_timestamp = record.timestamp
+
+            if args.speed is not None:
+                due = replay_started + (record.timestamp - first_timestamp) / args.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    lag = max(lag, -delay)
+
+            await slots.acquire()
+            recorded.append(record.latency_ms / 1000.0)
+            task = asyncio.create_task(send(client, record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - replay_started
+    latencies.sort()
+    recorded.sort()
+    logger.info(
+        "Replay finished",
+        messages=len(latencies),
+        seconds=round(elapsed, 2),
+        messages_per_second=round(len(latencies) / elapsed, 1) if elapsed else 0,
+        max_lag_seconds=round(lag, 3),
+        statuses={str(status): n for status, n in statuses.items()},
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 1),
+        p95_ms=round(percentile(latencies, 0.95) * 1000, 1),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 1),
+        recorded_p50_ms=round(percentile(recorded, 0.50) * 1000, 1),
+        recorded_p95_ms=round(percentile(recorded, 0.95) * 1000, 1),
+    )
+    return 0 if set(statuses) <= {200} else 1
+
+
+def main() -> int:
+    """Replay the journal."""
+    args = parse_args()
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        logger.error("Replay requires httpx: pip install -e '.[dev]'")
+        return 1
+
+    paths = args.journals or journal_files(Path(settings.message_journal_path))
+    if not paths:
+        logger.error("No journal files found")
+        return 1
+
+    logger.info("Replaying journal", files=[str(p) for p in paths], url=args.url,
+                speed=args.speed or "max")
+    return asyncio.run(replay(args, paths))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
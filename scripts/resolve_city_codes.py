@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Batch city code resolution.
+
+Adds city code columns to a CSV whose city column holds free text
+(codes, names, old names or misspellings), e.g. before a bulk import or
+when mapping reports against the gazetteer.
+
+Usage:
+    python scripts/resolve_city_codes.py --input reports.csv --output resolved.csv \\
+        --column city
+"""
+import argparse
+import csv
+import sys
+from collections import Counter
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.logging_config import configure_logging, get_logger
+from app.services.city_codes import CityCodeIndex, get_city_index
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Resolve free-text cities to city codes")
+    parser.add_argument("--input", type=Path, required=True, help="Input CSV")
+    parser.add_argument("--output", type=Path, required=True, help="Output CSV")
+    parser.add_argument("--column", required=True, help="Column holding the city answer")
+    parser.add_argument("--gazetteer", type=Path, help="Gazetteer JSON (default: configured one)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Resolve every row."""
+    args = parse_args()
+    index = CityCodeIndex.from_file(args.gazetteer) if args.gazetteer else get_city_index()
+
+    with open(args.input, newline="", encoding="utf-8") as src:
+        reader = csv.DictReader(src)
+        if args.column not in (reader.fieldnames or []):
+            logger.error("Column not found", column=args.column, columns=reader.fieldnames)
+            return 1
+        rows = list(reader)
+        fieldnames = [*reader.fieldnames, "city_code", "city_match", "city_score"]
+
+    matches = index.resolve_many(row[args.column] for row in rows)
+    outcomes: Counter = Counter()
+
+    with open(args.output, "w", newline="", encoding="utf-8") as dst:
+        writer = csv.DictWriter(dst, fieldnames=fieldnames)
+        writer.writeheader()
+        for row, match in zip(rows, matches):
+            row["city_code"] = match.code if match else ""
+            row["city_match"] = match.matched_by if match else "unresolved"
+            row["city_score"] = match.score if match else ""
+            outcomes[row["city_match"]] += 1
+            writer.writerow(row)
+
+    logger.info("City codes resolved", rows=len(rows), **outcomes)
+    return 0 if not outcomes["unresolved"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
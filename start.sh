@@ -3,5 +3,12 @@ set -euo pipefail
 
 HOST="${HOST:-0.0.0.0}"
 PORT="${PORT:-8001}"
+WORKERS="${WORKERS:-1}"
 
-uvicorn app.main:app --host "$HOST" --port "$PORT"
+# Several workers (one per core): supervisor with readiness-gated
+# rolling restarts on `kill -HUP <pid>`
+if [ "$WORKERS" -gt 1 ]; then
+    exec python -m app.supervisor --host "$HOST" --port "$PORT" --workers "$WORKERS"
+fi
+
+exec uvicorn app.main:app --host "$HOST" --port "$PORT"
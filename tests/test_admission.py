@@ -0,0 +1,116 @@
+"""
+Tests for webhook admission control.
+
+Run with: pytest tests/test_admission.py
+"""
+import asyncio
+
+import pytest
+
+from app.metrics import metrics
+from app.services.admission import AdmissionController, InMemoryRateLimitStore
+
+
+def _controller(**overrides) -> AdmissionController:
+    options = dict(
+        store=InMemoryRateLimitStore(),
+        per_phone_per_minute=60,
+        per_phone_burst=100,
+        max_concurrent=2,
+        max_queued=1,
+        queue_timeout_seconds=0.05,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+class TestInMemoryRateLimitStore:
+    """Test process-local token buckets."""
+
+    @pytest.mark.asyncio
+    async def test_burst_then_limited(self):
+        """Test that a phone gets its burst and is then limited."""
+        store = InMemoryRateLimitStore()
+        results = [await store.take("+243810000000", rate=0.001, burst=3) for _ in range(5)]
+        assert results == [True, True, True, False, False]
+
+    @pytest.mark.asyncio
+    async def test_phones_are_independent(self):
+        """Test that one sender exhausting its bucket does not affect another."""
+        store = InMemoryRateLimitStore()
+        for _ in range(3):
+            await store.take("+243810000000", rate=0.001, burst=1)
+        assert await store.take("+243820000000", rate=0.001, burst=1)
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        """Test that the number of tracked phones stays bounded."""
+        store = InMemoryRateLimitStore(max_keys=10)
+        for i in range(50):
+            await store.take(f"+2438100000{i:02d}", rate=1, burst=1)
+        assert len(store._buckets) == 10
+
+
+class TestAdmissionController:
+    """Test rate limiting and load shedding."""
+
+    def setup_method(self):
+        metrics.reset()
+
+    @pytest.mark.asyncio
+    async def test_admit_and_release(self):
+        """Test that an admitted message holds a slot until released."""
+        admission = _controller()
+        assert await admission.acquire("+243810000000") is None
+        assert admission.in_flight == 1
+        admission.release()
+        assert admission.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_rate_limited(self):
+        """Test that a looping sender is shed with a counted reason."""
+        admission = _controller(per_phone_burst=2)
+        reasons = []
+        for _ in range(4):
+            reason = await admission.acquire("+243810000000")
+            reasons.append(reason)
+            if reason is None:
+                admission.release()
+        assert reasons == [None, None, "rate_limited", "rate_limited"]
+        assert metrics.snapshot()["counters"]["admission.shed.rate_limited"] == 2
+
+    @pytest.mark.asyncio
+    async def test_queue_full_and_timeout(self):
+        """Test that overflow beyond the wait queue is shed immediately."""
+        admission = _controller(max_concurrent=1, max_queued=1)
+        assert await admission.acquire("+243810000001") is None
+
+        waiter = asyncio.create_task(admission.acquire("+243810000002"))
+        await asyncio.sleep(0)
+        assert admission.waiting == 1
+
+        assert await admission.acquire("+243810000003") == "queue_full"
+        assert await waiter == "timeout"
+        assert admission.waiting == 0
+
+        counters = metrics.snapshot()["counters"]
+        assert counters["admission.shed.queue_full"] == 1
+        assert counters["admission.shed.timeout"] == 1
+
+    @pytest.mark.asyncio
+    async def test_waiter_admitted_when_slot_frees(self):
+        """Test that a queued message proceeds once a slot is released."""
+        admission = _controller(max_concurrent=1, queue_timeout_seconds=1.0)
+        assert await admission.acquire("+243810000001") is None
+
+        waiter = asyncio.create_task(admission.acquire("+243810000002"))
+        await asyncio.sleep(0)
+        admission.release()
+
+        assert await waiter is None
+        assert admission.in_flight == 1
+        admission.release()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
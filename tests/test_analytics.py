@@ -0,0 +1,142 @@
+"""
+Tests for registration analytics rollups.
+
+Run with: pytest tests/test_analytics.py
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, enable_sqlite_transactions
+from app.models.analytics import RegistrationRollup
+from app.models.uic import UICRecord
+from app.services.analytics import RegistrationRollups, backfill, default_date_range
+from app.services.uic_service import UICService
+from app.sharding import ShardRouter
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Empty registry database."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'analytics.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _register(session_factory, service: UICService, people) -> None:
+    async with session_factory() as db:
+        for last_name, city_code, gender_code in people:
+            await service.create_uic(db, "+1", last_name, "IBRAHIMA", "1990", city_code, gender_code)
+        await db.commit()
+
+
+class TestWriteTimeRollups:
+    """Test counting through UICService.create_uic."""
+
+    @pytest.mark.asyncio
+    async def test_new_and_returning_counted(self, session_factory):
+        """Test that new UICs and repeat requests land in separate counters."""
+        service = UICService(salt="test_salt_for_testing")
+        await _register(session_factory, service, [
+            ("MBENGUE", "KI", "1"),
+            ("KABILA", "KI", "1"),
+            ("MBENGUE", "KI", "1"),
+            ("TSHIBANGU", "LU", "2"),
+        ])
+
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(RegistrationRollup).order_by(RegistrationRollup.city_code)
+            )).scalars().all()
+
+        assert [(row.city_code, row.gender_code, row.registrations, row.returning_requests) for row in rows] == [
+            ("KI", "1", 2, 1),
+            ("LU", "2", 1, 0),
+        ]
+        assert rows[0].day == datetime.utcnow().date()
+
+    @pytest.mark.asyncio
+    async def test_report_groups_and_filters(self, session_factory):
+        """Test grouping by dimension, filtering and the overall total."""
+        rollups = RegistrationRollups()
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        async with session_factory() as db:
+            await rollups.record(db, "KI", "1", True, when=yesterday)
+            await rollups.record(db, "KI", "2", True)
+            await rollups.record(db, "KI", "2", False)
+            await rollups.record(db, "LU", "1", False)
+            await db.commit()
+
+            by_city = await rollups.report(db, group_by=["city_code"])
+            today_only = await rollups.report(db, group_by=[], date_from=datetime.utcnow().date())
+            kinshasa = await rollups.report(db, group_by=["day"], city_code="ki")
+
+        assert [(b.city_code, b.registrations, b.returning_requests) for b in by_city] == [
+            ("KI", 2, 1),
+            ("LU", 0, 1),
+        ]
+        assert by_city[0].day is None
+        assert (today_only[0].registrations, today_only[0].returning_requests) == (1, 2)
+        assert today_only[0].returning_share == pytest.approx(2 / 3, abs=1e-4)
+        assert [b.day for b in kinshasa] == [yesterday.date(), datetime.utcnow().date()]
+
+    def test_default_date_range(self):
+        """Test that a missing start gives a 30-day window ending on date_to."""
+        assert default_date_range(date_to=date(2026, 3, 30)) == (date(2026, 3, 1), date(2026, 3, 30))
+
+
+class TestShardedRollups:
+    """Test reports across shards."""
+
+    @pytest.mark.asyncio
+    async def test_report_adds_shards(self, tmp_path):
+        """Test that each shard's partial counts are summed per bucket."""
+        router = ShardRouter([f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(3)])
+        await router.init_shards()
+        service = UICService(salt="test_salt_for_testing", shard_router=router)
+
+        try:
+            for last_name in ["AAA", "BBB", "CCC", "DDD", "EEE", "FFF", "AAA"]:
+                await service.create_uic(None, "+1", last_name, "IBR", "7", "KI", "1")
+
+            [bucket] = await service.rollups.report(None, group_by=["city_code"])
+        finally:
+            await router.dispose()
+
+        assert (bucket.registrations, bucket.returning_requests) == (6, 1)
+
+
+class TestBackfill:
+    """Test filling rollups from existing records."""
+
+    @pytest.mark.asyncio
+    async def test_backfill_is_idempotent(self, session_factory):
+        """Test that earlier registrations are counted once, however often it runs."""
+        service = UICService(salt="test_salt_for_testing")
+        await _register(session_factory, service, [("MBENGUE", "KI", "1"), ("KABILA", "KI", "1")])
+
+        old_day = date(2025, 1, 15)
+        async with session_factory() as db:
+            # Registered before rollups existed: nothing was counted
+            await db.execute(update(UICRecord).values(created_at=datetime(2025, 1, 15, 8, 30)))
+            await db.execute(RegistrationRollup.__table__.delete())
+            await db.commit()
+
+        for _ in range(2):
+            await backfill(session_factory, before=date(2025, 6, 1), batch_size=1)
+
+        async with session_factory() as db:
+            [row] = (await db.execute(select(RegistrationRollup))).scalars().all()
+
+        assert (row.day, row.city_code, row.registrations) == (old_day, "KI", 2)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,84 @@
+"""
+Tests for city code resolution.
+
+Run with: pytest tests/test_city_codes.py
+"""
+import pytest
+
+from app.config import settings
+from app.services.city_codes import City, CityCodeIndex, get_city_index
+from app.services.flow_manager import normalize_city_answer, validate_city_code
+
+
+class TestCityCodeIndex:
+    """Test exact and fuzzy lookups on the bundled gazetteer."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.index = get_city_index()
+
+    def test_codes_resolve_to_themselves(self):
+        """Test that a valid code is returned as-is, case-insensitively."""
+        assert self.index.resolve("KI").code == "KI"
+        assert self.index.resolve(" lu ").code == "LU"
+
+    def test_names_and_accents(self):
+        """Test that full names resolve regardless of accents, case and punctuation."""
+        assert self.index.resolve("Kinshasa").code == "KI"
+        assert self.index.resolve("kinshasá").code == "KI"
+        assert self.index.resolve("Mbuji Mayi").code == "MB"
+        assert self.index.resolve("Lubumbashi").matched_by == "name"
+
+    def test_aliases(self):
+        """Test that historical names resolve."""
+        match = self.index.resolve("Léopoldville")
+        assert match.code == "KI"
+        assert match.matched_by == "alias"
+        assert self.index.resolve("Elisabethville").code == "LU"
+
+    def test_fuzzy_typos(self):
+        """Test that misspelled names resolve through the trigram index."""
+        match = self.index.resolve("Kinshsa")
+        assert match.code == "KI"
+        assert match.matched_by == "fuzzy"
+        assert self.index.resolve("Lubumbachi").code == "LU"
+
+    def test_unknown_answers(self):
+        """Test that unrelated answers are not guessed."""
+        assert self.index.resolve("Paris") is None
+        assert self.index.resolve("ZZ") is None
+        assert self.index.resolve("") is None
+
+    def test_resolve_many(self):
+        """Test batch resolution keeps order and handles misses."""
+        matches = self.index.resolve_many(["Goma", "goma", "nowhere", "Bukavu"])
+        assert [m.code if m else None for m in matches] == ["GO", "GO", None, "BU"]
+
+    def test_conflicting_alias_rejected(self):
+        """Test that one alias cannot point to two cities."""
+        with pytest.raises(ValueError):
+            CityCodeIndex([
+                (City("AA", "Alpha"), ["Shared"]),
+                (City("BB", "Beta"), ["Shared"]),
+            ])
+
+
+class TestCityStep:
+    """Test the city question's normalizer and validator."""
+
+    def test_name_answer_becomes_code(self):
+        """Test that a typed city name is stored as its code."""
+        assert normalize_city_answer("Kisangani") == "KS"
+        assert validate_city_code(normalize_city_answer("Kisangani")) == (True, None)
+
+    def test_unknown_code_allowed_unless_strict(self, monkeypatch):
+        """Test that strict mode rejects codes outside the gazetteer."""
+        monkeypatch.setattr(settings, "city_code_strict", False)
+        assert validate_city_code("DA")[0]
+        monkeypatch.setattr(settings, "city_code_strict", True)
+        assert not validate_city_code("DA")[0]
+        assert validate_city_code("KI")[0]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
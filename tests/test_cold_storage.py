@@ -0,0 +1,243 @@
+"""
+Tests for archiving cold registry rows and falling back to the archive.
+
+Run with: pytest tests/test_cold_storage.py
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, enable_sqlite_transactions
+from app.models.uic import UICRecord
+from app.services.cold_storage import ColdArchive, archive_cold_records, rehash_archive
+from app.services.input_hashing import InputHasher
+from app.services.uic_service import UICService
+from app.services.uic_verifier import UICVerifier
+
+PHONE = "+243810000000"
+PERSON = ("MBE", "IBR", "7", "DA", "1")
+
+
+@pytest_asyncio.fixture
+async def factory(tmp_path):
+    """Session factory over an empty SQLite database."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'hot.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def archive(tmp_path):
+    """Empty archive file."""
+    cold = ColdArchive(str(tmp_path / "archive.db"))
+    await cold.init()
+    yield cold
+    await cold.dispose()
+
+
+async def _register(service: UICService, factory, person=PERSON):
+    async with factory() as db:
+        result = await service.create_uic(db, PHONE, *person)
+        await db.commit()
+    return result
+
+
+async def _age(factory, days: int) -> None:
+    """Pretend every row was last requested some days ago."""
+    async with factory() as db:
+        await db.execute(update(UICRecord).values(
+            last_requested_at=datetime.utcnow() - timedelta(days=days)
+        ))
+        await db.commit()
+
+
+async def _archive_all(factory, archive) -> None:
+    await _age(factory, 1000)
+    await archive_cold_records(factory, archive, datetime.utcnow() - timedelta(days=730), pause_seconds=0)
+
+
+async def _hot_rows(factory) -> int:
+    async with factory() as db:
+        return (await db.execute(select(func.count()).select_from(UICRecord))).scalar_one()
+
+
+class TestArchiveCold:
+    """Test moving rows to the archive."""
+
+    @pytest.mark.asyncio
+    async def test_moves_only_cold_rows(self, factory, archive):
+        """Test that old and inactive rows move, recent active rows stay."""
+        service = UICService(salt="test_salt_for_testing", archive=archive)
+        old, _ = await _register(service, factory, ("KAS", "MUK", "2", "KN", "2"))
+        await _age(factory, 1000)
+        inactive, _ = await _register(service, factory, ("LUM", "PAT", "5", "GO", "1"))
+        async with factory() as db:
+            await db.execute(update(UICRecord).where(UICRecord.uic_code == inactive).values(is_active=False))
+            await db.commit()
+        recent, _ = await _register(service, factory)
+
+        counts = await archive_cold_records(
+            factory, archive, datetime.utcnow() - timedelta(days=730), chunk_size=1, pause_seconds=0
+        )
+
+        assert counts == {"examined": 2, "archived": 2, "skipped": 0}
+        assert await _hot_rows(factory) == 1
+        assert await archive.count() == 2
+        archived = await archive.find_codes([old, inactive, recent])
+        assert {code: row.is_active for code, row in archived.items()} == {old: True, inactive: False}
+
+    @pytest.mark.asyncio
+    async def test_rerun_is_noop(self, factory, archive):
+        """Test that a second run finds nothing left to move."""
+        service = UICService(salt="test_salt_for_testing")
+        await _register(service, factory)
+        await _age(factory, 1000)
+        cutoff = datetime.utcnow() - timedelta(days=730)
+
+        await archive_cold_records(factory, archive, cutoff, pause_seconds=0)
+        assert await archive_cold_records(factory, archive, cutoff, pause_seconds=0) == {
+            "examined": 0, "archived": 0, "skipped": 0
+        }
+
+
+class TestArchiveFallback:
+    """Test lookups that miss the hot table."""
+
+    @pytest.mark.asyncio
+    async def test_returning_person_is_promoted(self, factory, archive):
+        """Test that an archived person gets their code back and returns to the hot table."""
+        service = UICService(salt="test_salt_for_testing", archive=archive)
+        code, _ = await _register(service, factory)
+        await _age(factory, 1000)
+        await archive_cold_records(factory, archive, datetime.utcnow() - timedelta(days=730), pause_seconds=0)
+        assert await _hot_rows(factory) == 0
+
+        again, is_new = await _register(service, factory)
+
+        assert (again, is_new) == (code, False)
+        async with factory() as db:
+            record = (await db.execute(select(UICRecord))).scalar_one()
+        assert record.uic_code == code
+        assert record.request_count == 2
+        assert record.phone_number == PHONE
+        assert record.last_requested_at > datetime.utcnow() - timedelta(minutes=1)
+
+        # Now found hot: a third request only touches it
+        assert await _register(service, factory) == (code, False)
+        assert await _hot_rows(factory) == 1
+
+        # The archive copy is deleted after the promotion commits
+        await asyncio.gather(*archive._pending)
+        assert await archive.count() == 0
+
+    @pytest.mark.asyncio
+    async def test_rolled_back_promotion_keeps_archive_copy(self, factory, archive):
+        """Test that the archive copy survives a promotion that was rolled back."""
+        service = UICService(salt="test_salt_for_testing", archive=archive)
+        await _register(service, factory)
+        await _archive_all(factory, archive)
+
+        async with factory() as db:
+            await service.create_uic(db, PHONE, *PERSON)
+            await db.rollback()
+
+        assert not archive._pending
+        assert await archive.count() == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_copy_of_deactivated_code_not_reissued(self, factory, archive, monkeypatch):
+        """Test that an archive copy left behind a deactivated hot row yields a new code."""
+        service = UICService(salt="test_salt_for_testing", archive=archive)
+        code, _ = await _register(service, factory)
+        await _archive_all(factory, archive)
+
+        # Promote, but lose the archive deletion
+        monkeypatch.setattr(archive, "forget_later", lambda *args: None)
+        await _register(service, factory)
+        async with factory() as db:
+            await db.execute(update(UICRecord).values(is_active=False))
+            await db.commit()
+
+        new_code, is_new = await _register(service, factory)
+
+        assert is_new and new_code != code
+        assert await archive.find_codes([code]) == {}
+
+    @pytest.mark.asyncio
+    async def test_archived_codes_stay_issued(self, factory, archive):
+        """Test that a fresh service never reissues an archived code."""
+        code, _ = await _register(UICService(salt="test_salt_for_testing"), factory)
+        async with factory() as db:
+            await db.execute(update(UICRecord).values(is_active=False))
+            await db.commit()
+        await archive_cold_records(factory, archive, datetime.utcnow(), pause_seconds=0)
+
+        service = UICService(salt="test_salt_for_testing", archive=archive)
+        async with factory() as db:
+            await service.load_occupancy(db)
+        assert code in service.occupancy
+
+        # Same person, but the archived record is inactive: a new code
+        new_code, is_new = await _register(service, factory)
+        assert is_new and new_code != code
+
+    @pytest.mark.asyncio
+    async def test_verifier_reads_archive(self, factory, archive):
+        """Test that partner verification still knows archived codes."""
+        code, _ = await _register(UICService(salt="test_salt_for_testing"), factory)
+        await _age(factory, 1000)
+        await archive_cold_records(factory, archive, datetime.utcnow() - timedelta(days=730), pause_seconds=0)
+
+        async with factory() as db:
+            [status] = await UICVerifier(archive=archive, max_entries=10, ttl_seconds=60).verify(db, [code])
+        assert status.exists and status.active
+
+
+class TestArchiveRehash:
+    """Test moving archived hashes to a new key."""
+
+    @pytest.mark.asyncio
+    async def test_archived_person_matches_after_old_salt_removed(self, factory, archive):
+        """Test that a re-hashed archive still finds people once the old key is retired."""
+        old = UICService(salt="test_salt_for_testing", archive=archive)
+        old.hasher = InputHasher({1: "old_salt_for_testing"}, 1)
+        code, _ = await _register(old, factory)
+        await _archive_all(factory, archive)
+
+        counts = await rehash_archive(archive, InputHasher({2: "new_salt_for_testing"}, 2), pause_seconds=0)
+        assert counts == {"examined": 1, "rewritten": 1, "skipped": 0}
+        assert (await rehash_archive(archive, InputHasher({2: "new_salt_for_testing"}, 2)))["examined"] == 0
+
+        new = UICService(salt="test_salt_for_testing", archive=archive)
+        new.hasher = InputHasher({2: "new_salt_for_testing"}, 2)
+        assert await _register(new, factory) == (code, False)
+        async with factory() as db:
+            record = (await db.execute(select(UICRecord))).scalar_one()
+        assert record.hash_key_version == 2
+
+    @pytest.mark.asyncio
+    async def test_archived_versions_keep_old_key_looked_up(self, factory, archive):
+        """Test that an old key stays in the lookup order while only archived rows use it."""
+        old = UICService(salt="test_salt_for_testing", archive=archive)
+        old.hasher = InputHasher({1: "old_salt_for_testing"}, 1)
+        await _register(old, factory)
+        await _archive_all(factory, archive)
+
+        rotated = UICService(salt="test_salt_for_testing", archive=archive)
+        rotated.hasher = InputHasher({1: "old_salt_for_testing", 2: "new_salt_for_testing"}, 2)
+        async with factory() as db:
+            await rotated.load_key_versions(db)
+        assert await archive.key_versions() == {1}
+        assert rotated.hasher.lookup_versions == [2, 1]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,135 @@
+"""
+Tests for per-request deadlines and degraded optional work.
+
+Run with: pytest tests/test_deadline.py
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, LazySession, enable_sqlite_transactions
+from app.deadline import Deadline
+from app.metrics import metrics
+from app.models.analytics import RegistrationRollup
+from app.services.flow_manager import FlowManager
+from app.services.qr_service import QRCodeService
+from app.services.returning_users import ReturningUserIndex
+from app.services.session_store import InMemorySessionStore
+from app.services.uic_service import UICService
+
+
+class FakeClock:
+    """Monotonic clock advanced by hand."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _counter(name: str) -> int:
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+def _exhausted() -> Deadline:
+    """A deadline with less than its reserve left."""
+    clock = FakeClock()
+    deadline = Deadline(budget_seconds=5, reserve_seconds=2, clock=clock)
+    clock.now += 4
+    return deadline
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Empty registry database."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'deadline.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+class TestDeadline:
+    """Test budget accounting."""
+
+    def test_allows_until_reserve(self):
+        """Test that optional work runs until only the reserve is left."""
+        clock = FakeClock()
+        deadline = Deadline(budget_seconds=5, reserve_seconds=2, clock=clock)
+        assert deadline.allows("qr_code")
+
+        clock.now += 3.5
+        assert deadline.remaining() == pytest.approx(1.5)
+        assert not deadline.allows("qr_code")
+        assert deadline.degraded == ["qr_code"]
+
+    def test_degradations_counted(self):
+        """Test that skipped steps are exposed as metrics."""
+        before = _counter("deadline.degraded.analytics")
+        _exhausted().allows("analytics")
+        assert _counter("deadline.degraded.analytics") == before + 1
+
+    def test_finish_counts_miss(self):
+        """Test that replying after the deadline counts a miss."""
+        clock = FakeClock()
+        deadline = Deadline(budget_seconds=1, reserve_seconds=0, clock=clock)
+        before = _counter("deadline.missed")
+
+        deadline.finish()
+        assert _counter("deadline.missed") == before
+
+        clock.now += 2
+        assert deadline.expired and deadline.remaining() == 0
+        deadline.finish()
+        assert _counter("deadline.missed") == before + 1
+
+
+class TestDegradedWork:
+    """Test optional steps skipped under a short budget."""
+
+    @pytest.mark.asyncio
+    async def test_analytics_deferred_then_flushed(self, session_factory):
+        """Test that a deferred count is written with the next request."""
+        service = UICService(salt="test_salt_for_testing")
+
+        async def total() -> int:
+            async with session_factory() as db:
+                return await db.scalar(select(func.coalesce(func.sum(RegistrationRollup.registrations), 0)))
+
+        async with session_factory() as db:
+            await service.create_uic(db, "+1", "MBENGUE", "IBRAHIMA", "1990", "KI", "1", deadline=_exhausted())
+            await db.commit()
+        assert await total() == 0
+
+        async with session_factory() as db:
+            await service.create_uic(db, "+1", "KABILA", "JOSEPH", "1971", "KI", "1", deadline=Deadline(10, 2))
+            await db.commit()
+        assert await total() == 2
+
+    def test_qr_skipped_unless_cached(self, tmp_path):
+        """Test that only new QR renders are skipped."""
+        qr_service = QRCodeService(output_dir=str(tmp_path))
+
+        assert not qr_service.should_attach("MBEIBR7DA1", _exhausted())
+        qr_service.ensure_qr_code("MBEIBR7DA1")
+        assert qr_service.should_attach("MBEIBR7DA1", _exhausted())
+
+    @pytest.mark.asyncio
+    async def test_returning_user_lookup_skipped(self):
+        """Test that a short budget starts the questions instead of the lookup."""
+        async def lookup(db, phone_number, limit):
+            raise AssertionError("lookup should be skipped")
+
+        flow = FlowManager(store=InMemorySessionStore(), returning_users=ReturningUserIndex(lookup))
+        result = await flow.process_message(LazySession(), "+1", "bonjour", deadline=_exhausted())
+
+        assert result.get("resend_uic") is None
+        assert not result["is_complete"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,158 @@
+"""
+Tests for near-duplicate detection.
+
+Run with: pytest tests/test_duplicate_index.py
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, enable_sqlite_transactions
+from app.models.uic import UICRecord
+from app.services.duplicate_index import (
+    NearDuplicateIndex,
+    _IntMultiMap,
+    cluster_codes,
+    match_reason,
+    phonetic_key,
+)
+from app.services.uic_service import UICService
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Empty registry database."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'dup.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+class TestMatchReason:
+    """Test the near-duplicate rules."""
+
+    def test_one_character_typo(self):
+        """Test that a single differing character is a near-duplicate."""
+        assert match_reason("MBEIBR7KI1", "MBEIBR8KI1") == "one_char"
+
+    def test_swapped_names(self):
+        """Test that swapped first and last name codes are a near-duplicate."""
+        assert match_reason("MBEIBR7KI1", "IBRMBE7KI1") == "swapped_names"
+
+    def test_transposed_letters(self):
+        """Test that transposed letters within a name code are a near-duplicate."""
+        assert match_reason("MBEIBR7KI1", "MEBIBR7KI1") == "transposed"
+
+    def test_phonetic_variants(self):
+        """Test that common Congolese spelling variants fold together."""
+        assert phonetic_key("TSHIBANGU") == phonetic_key("TCHIBANGOU")
+        assert phonetic_key("KALALA") == phonetic_key("CARARA")
+        assert match_reason("KALMBE7KI1", "CARMBE7KI1") == "phonetic"
+        assert match_reason("TSHKAB7KI1", "CHUKAB7KI1") is None
+
+    def test_unrelated_codes(self):
+        """Test that different people are not flagged."""
+        assert match_reason("MBEIBR7KI1", "KABJEA3LU2") is None
+        assert match_reason("MBEIBR7KI1", "IBRMBE7KI2") is None
+
+
+class TestNearDuplicateIndex:
+    """Test indexed lookups."""
+
+    def test_find_returns_each_kind_of_match(self):
+        """Test that find returns typo, swapped and suffixed codes but not strangers."""
+        index = NearDuplicateIndex()
+        index.update(["MBEIBR7KI1", "MBEIBR7KI1A", "IBRMBE7KI1", "MBEIBR8KI1", "KABJEA3LU2"])
+
+        found = dict(index.find("MBEIBR7KI1"))
+
+        assert found == {
+            "MBEIBR7KI1": "same_base",
+            "MBEIBR7KI1A": "same_base",
+            "IBRMBE7KI1": "swapped_names",
+            "MBEIBR8KI1": "one_char",
+        }
+
+    def test_find_respects_limit(self):
+        """Test that find stops after limit matches."""
+        index = NearDuplicateIndex()
+        index.update(f"MBEIBR{digit}KI1" for digit in range(10))
+
+        assert len(index.find("MBEIBR0KI1", limit=3)) == 3
+
+    def test_multimap_keeps_values_across_growth(self):
+        """Test that every value stays reachable after the tables grow."""
+        table = _IntMultiMap()
+        for value in range(5000):
+            table.add(value % 50 + 1, value)
+
+        found = set()
+        table.collect(7, found)
+        assert found == {value for value in range(5000) if value % 50 + 1 == 7}
+
+
+class TestClusterCodes:
+    """Test offline clustering."""
+
+    def test_clusters_are_transitive(self):
+        """Test that chained near-duplicates end up in one cluster."""
+        clusters = cluster_codes([
+            "MBEIBR7KI1",
+            "MBEIBR8KI1",   # typo of the first
+            "MBEIBR8KI2",   # typo of the second
+            "KABJEA3LU2",   # unrelated
+        ])
+
+        assert len(clusters) == 1
+        assert dict(clusters[0]) == {
+            "MBEIBR7KI1": "first",
+            "MBEIBR8KI1": "one_char",
+            "MBEIBR8KI2": "one_char",
+        }
+
+
+class TestCreateUICFlagging:
+    """Test flagging through UICService.create_uic."""
+
+    @pytest.mark.asyncio
+    async def test_near_duplicate_is_noted(self, session_factory):
+        """Test that a mistyped registration is created but noted."""
+        service = UICService(salt="test_salt_for_testing")
+
+        async with session_factory() as db:
+            first, _ = await service.create_uic(db, "+1", "MBENGUE", "IBRAHIMA", "1990", "KI", "1")
+            await db.commit()
+            second, is_new = await service.create_uic(db, "+1", "IBRAHIMA", "MBENGUE", "1990", "KI", "1")
+            await db.commit()
+
+            notes = {
+                record.uic_code: record.notes
+                for record in (await db.execute(select(UICRecord))).scalars()
+            }
+
+        assert is_new and second != first
+        assert notes[first] is None
+        assert notes[second] == f"Possible duplicate of {first} (swapped_names)"
+
+    @pytest.mark.asyncio
+    async def test_index_loaded_from_registry(self, session_factory):
+        """Test that a new service instance sees codes issued before it started."""
+        async with session_factory() as db:
+            first, _ = await UICService(salt="test_salt_for_testing").create_uic(
+                db, "+1", "MBENGUE", "IBRAHIMA", "1990", "KI", "1"
+            )
+            await db.commit()
+
+        service = UICService(salt="test_salt_for_testing")
+        async with session_factory() as db:
+            await service.load_occupancy(db)
+
+        assert service.duplicates.find(first[:10])[0][0] == first
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,437 @@
+"""
+Tests for FlowManager session handling and lazy database sessions.
+
+Run with: pytest tests/test_flow_manager.py
+"""
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import Base, LazySession, WriteTrackingSession, enable_sqlite_transactions
+from app.models.uic import ConversationSession
+from app.services.flow_manager import FlowManager
+from app.services.returning_users import ReturningUserIndex
+from app.services.session_store import (
+    DatabaseSessionStore,
+    InMemorySessionStore,
+    SessionState,
+    SignedTokenSessionStore,
+    bind_session_token,
+    issued_session_token,
+)
+from app.services.uic_service import UICService
+
+PHONE = "+243810000000"
+ANSWERS = ["MBE", "IBR", "7", "DA", "1"]
+
+
+class CountingFactory:
+    """Session factory that counts sessions and commits."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.opened = 0
+        self.commits = 0
+
+    def __call__(self):
+        self.opened += 1
+        session = self.factory()
+        original_commit = session.commit
+
+        async def commit():
+            self.commits += 1
+            await original_commit()
+
+        session.commit = commit
+        return session
+
+
+@pytest_asyncio.fixture
+async def factory(tmp_path):
+    """Session factory over an empty SQLite database."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'flow.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield CountingFactory(async_sessionmaker(
+        engine,
+        class_=AsyncSession,
+        sync_session_class=WriteTrackingSession,
+        expire_on_commit=False,
+    ))
+    await engine.dispose()
+
+
+async def _send(flow: FlowManager, factory, message: str) -> dict:
+    db = LazySession(factory)
+    result = await flow.process_message(db, PHONE, message)
+    await db.release()
+    return result
+
+
+class TestLazySession:
+    """Test lazy opening and dirty-only commits."""
+
+    @pytest.mark.asyncio
+    async def test_unused_session_never_opens(self, factory):
+        """Test that releasing an unused proxy opens nothing."""
+        db = LazySession(factory)
+        await db.release()
+        assert factory.opened == 0
+
+    @pytest.mark.asyncio
+    async def test_read_only_work_is_not_committed(self, factory):
+        """Test that a session that only ran SELECTs is rolled back, not committed."""
+        db = LazySession(factory)
+        await db.execute(select(func.count(ConversationSession.id)))
+        assert not db.is_dirty
+        await db.release()
+        assert factory.opened == 1
+        assert factory.commits == 0
+
+    @pytest.mark.asyncio
+    async def test_pending_writes_are_committed(self, factory):
+        """Test that added objects are committed on release."""
+        db = LazySession(factory)
+        await DatabaseSessionStore().get(db, PHONE)
+        db.add(ConversationSession(phone_number=PHONE, expires_at=datetime.utcnow()))
+        assert db.is_dirty
+        await db.release()
+        assert factory.commits == 1
+
+
+class TestFlowManager:
+    """Test the conversation against both session stores."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "store_class", [DatabaseSessionStore, InMemorySessionStore, SignedTokenSessionStore]
+    )
+    async def test_full_conversation(self, factory, store_class):
+        """Test that five valid answers complete the conversation."""
+        flow = FlowManager(store=store_class())
+        for answer in ANSWERS[:-1]:
+            result = await _send(flow, factory, answer)
+            assert not result["is_complete"]
+
+        result = await _send(flow, factory, ANSWERS[-1])
+        assert result["is_complete"]
+        assert result["collected_data"] == {
+            "last_name_code": "MBE",
+            "first_name_code": "IBR",
+            "birth_year_digit": "7",
+            "city_code": "DA",
+            "gender_code": "1",
+        }
+
+    @pytest.mark.asyncio
+    async def test_help_does_not_write(self, factory):
+        """Test that HELP only reads the session (for its language)."""
+        flow = FlowManager(store=DatabaseSessionStore())
+        await _send(flow, factory, "HELP")
+        assert factory.commits == 0
+
+    @pytest.mark.asyncio
+    async def test_memory_store_skips_database(self, factory):
+        """Test that the in-memory store handles a whole conversation without a session."""
+        flow = FlowManager(store=InMemorySessionStore())
+        for message in ["MBE", "123", "RESTART", *ANSWERS]:
+            await _send(flow, factory, message)
+        assert factory.opened == 0
+
+    @pytest.mark.asyncio
+    async def test_validation_failure_is_not_committed(self, factory):
+        """Test that a rejected answer reads the session without committing."""
+        flow = FlowManager(store=DatabaseSessionStore())
+        await _send(flow, factory, "MBE")
+        commits = factory.commits
+
+        result = await _send(flow, factory, "123")
+        assert result["response"].startswith("❌")
+        assert factory.commits == commits
+
+
+class TestSingleUnitOfWork:
+    """Test that each message commits at most once."""
+
+    @pytest.mark.asyncio
+    async def test_one_commit_per_message(self, factory):
+        """Test that every step, including UIC creation, commits exactly once."""
+        flow = FlowManager(store=DatabaseSessionStore())
+        service = UICService(salt="test_salt_for_testing")
+
+        for answer in ANSWERS:
+            before = factory.commits
+            db = LazySession(factory)
+            result = await flow.process_message(db, PHONE, answer)
+            if result["is_complete"]:
+                await service.create_uic(db, PHONE, **result["collected_data"])
+            await db.release()
+            assert factory.commits - before == 1
+
+        db = LazySession(factory)
+        assert await service.count_records(db) == 1
+        assert await flow.store.get(db, PHONE) is None
+        await db.release()
+
+    @pytest.mark.asyncio
+    async def test_expired_session_reset_in_place(self, factory):
+        """Test that an expired session is restarted with an UPDATE of the same row."""
+        flow = FlowManager(store=DatabaseSessionStore())
+        await _send(flow, factory, "MBE")
+        await _send(flow, factory, "IBR")
+
+        db = LazySession(factory)
+        state = await flow.store.get(db, PHONE)
+        state.expires_at = datetime(2000, 1, 1)
+        await flow.store.save(db, state)
+        await db.release()
+
+        result = await _send(flow, factory, "KAB")
+        assert result["response"].startswith("✅")
+
+        db = LazySession(factory)
+        reset = await flow.store.get(db, PHONE)
+        await db.release()
+        assert reset.id == state.id
+        assert reset.current_step == 1
+        assert reset.last_name_code == "KAB"
+        assert reset.first_name_code is None
+
+    @pytest.mark.asyncio
+    async def test_hot_paths_load_no_orm_objects(self, factory):
+        """Test that session reads/writes and returning lookups bypass the identity map."""
+        flow = FlowManager(store=DatabaseSessionStore())
+        service = UICService(salt="test_salt_for_testing")
+        for answer in ANSWERS[:-1]:
+            await _send(flow, factory, answer)
+
+        db = LazySession(factory)
+        loaded = []
+        event.listen(db.sync_session, "loaded_as_persistent", lambda session, obj: loaded.append(obj))
+        state = await flow.store.get(db, PHONE)
+        assert (state.phone_number, state.current_step, state.city_code) == (PHONE, 4, "DA")
+        state.gender_code = ANSWERS[-1]
+        uic_code, _ = await service.create_uic(db, PHONE, **state.collected_data())
+        again, is_new = await service.create_uic(db, PHONE, **state.collected_data())
+        await flow.store.delete(db, PHONE)
+
+        assert (again, is_new) == (uic_code, False)
+        assert loaded == []
+        await db.release()
+
+        db = LazySession(factory)
+        record = await service.check_existing_uic(db, *service.normalize_inputs(*ANSWERS))
+        assert (record.uic_code, record.request_count) == (uic_code, 2)
+        assert await flow.store.get(db, PHONE) is None
+        await db.release()
+
+
+class TestRolledBackRequest:
+    """Test that in-memory conversation state follows the request's outcome."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("make_store", [
+        InMemorySessionStore,
+        lambda: SignedTokenSessionStore(secret="token_secret_for_testing"),
+    ], ids=["memory", "token"])
+    async def test_discarded_request_keeps_answers(self, factory, make_store):
+        """Test that a rolled-back message neither advances nor deletes the session."""
+        flow = FlowManager(store=make_store())
+        bind_session_token(None)
+        for answer in ANSWERS[:4]:
+            await _send(flow, factory, answer)
+            bind_session_token(issued_session_token())
+
+        # The final answer completes (and deletes) the session, then the request fails
+        db = LazySession(factory)
+        result = await flow.process_message(db, PHONE, ANSWERS[4])
+        await db.discard()
+        assert result["is_complete"]
+
+        stored = await flow.store.get(None, PHONE)
+        assert stored.current_step == 4
+        assert stored.collected_data()["city_code"] == "DA"
+
+
+class TestSignedTokenSessionStore:
+    """Test stateless token sessions."""
+
+    SECRET = "token_secret_for_testing"
+
+    def test_round_trip(self):
+        """Test that a decoded token gives back the encoded state."""
+        store = SignedTokenSessionStore(secret=self.SECRET)
+        state = SessionState(phone_number=PHONE, current_step=2, last_name_code="MBE", first_name_code="IBR")
+        state.expires_at = state.expires_at.replace(microsecond=0)
+
+        decoded = store.decode(PHONE, store.encode(state))
+
+        assert decoded.current_step == 2
+        assert decoded.collected_data() == state.collected_data()
+        assert decoded.expires_at == state.expires_at
+
+    def test_forged_or_foreign_tokens_rejected(self):
+        """Test that tampered tokens, other numbers' tokens and other keys are rejected."""
+        store = SignedTokenSessionStore(secret=self.SECRET)
+        token = store.encode(SessionState(phone_number=PHONE, current_step=1, last_name_code="MBE"))
+        payload, mac = token.split(".")
+
+        assert store.decode("+243899999999", token) is None
+        assert store.decode(PHONE, payload[:-2] + "AA." + mac) is None
+        assert store.decode(PHONE, "not-a-token") is None
+        assert SignedTokenSessionStore(secret="another_secret_value").decode(PHONE, token) is None
+
+    def test_expired_token_rejected(self, monkeypatch):
+        """Test that a token issued longer ago than the session timeout is rejected."""
+        store = SignedTokenSessionStore(secret=self.SECRET)
+        token = store.encode(SessionState(phone_number=PHONE, current_step=1, last_name_code="MBE"))
+        assert store.decode(PHONE, token) is not None
+
+        monkeypatch.setattr(settings, "session_timeout_minutes", -1)
+        assert store.decode(PHONE, token) is None
+
+    @pytest.mark.asyncio
+    async def test_replayed_older_token_rejected(self):
+        """Test that an earlier cookie cannot roll the conversation back on this worker."""
+        store = SignedTokenSessionStore(secret=self.SECRET)
+        state = SessionState(phone_number=PHONE, current_step=1, last_name_code="MBE")
+        old_token = store.encode(state)
+
+        state.current_step = 2
+        state.first_name_code = "IBR"
+        state.updated_at += timedelta(seconds=5)
+        db = LazySession()
+        await store.save(db, state)
+        await db.release()
+
+        bind_session_token(old_token)
+        assert await store.get(None, PHONE) is None
+
+    @pytest.mark.asyncio
+    async def test_conversation_moves_between_workers(self, factory):
+        """Test that any worker continues a conversation from the echoed token."""
+        workers = [FlowManager(store=SignedTokenSessionStore(secret=self.SECRET)) for _ in range(2)]
+        token = None
+
+        for i, answer in enumerate(ANSWERS):
+            bind_session_token(token)
+            result = await _send(workers[i % 2], factory, answer)
+            token = issued_session_token()
+
+        assert result["is_complete"]
+        assert result["collected_data"]["city_code"] == "DA"
+        assert token == ""
+        assert factory.opened == 0
+
+    @pytest.mark.asyncio
+    async def test_newer_token_wins_over_stale_map(self, factory):
+        """Test that a worker's cached state is ignored once another worker advanced it."""
+        first = FlowManager(store=SignedTokenSessionStore(secret=self.SECRET))
+        second = FlowManager(store=SignedTokenSessionStore(secret=self.SECRET))
+
+        bind_session_token(None)
+        await _send(first, factory, "MBE")
+        bind_session_token(issued_session_token())
+        await _send(second, factory, "IBR")
+        bind_session_token(issued_session_token())
+
+        result = await _send(first, factory, "7")
+        assert "Question 4" in result["response"]
+
+
+class TestReturningUserShortcut:
+    """Test the resend offer for numbers that already have a UIC."""
+
+    @staticmethod
+    def _flow(service: UICService) -> FlowManager:
+        return FlowManager(
+            store=DatabaseSessionStore(),
+            returning_users=ReturningUserIndex(service.codes_for_phone, max_entries=10, ttl_seconds=60)
+        )
+
+    @pytest.mark.asyncio
+    async def test_unknown_number_gets_questions(self, factory):
+        """Test that a number without codes goes straight into the questions."""
+        flow = self._flow(UICService(salt="test_salt_for_testing"))
+        result = await _send(flow, factory, "MBE")
+        assert result["response"].startswith("✅")
+
+    @pytest.mark.asyncio
+    async def test_known_number_resends_in_one_reply(self, factory):
+        """Test that a registered number is offered its code and gets it on "1"."""
+        service = UICService(salt="test_salt_for_testing")
+        flow = self._flow(service)
+        db = LazySession(factory)
+        code, _ = await service.create_uic(db, PHONE, *ANSWERS)
+        await db.release()
+
+        offer = await _send(flow, factory, "Bonjour")
+        assert "Répondez 1" in offer["response"]
+        commits = factory.commits
+
+        result = await _send(flow, factory, "1")
+        assert result["resend_uic"] == code
+        assert factory.commits == commits
+
+    @pytest.mark.asyncio
+    async def test_shared_number_lists_every_code(self, factory):
+        """Test that a shared phone gets a numbered choice and a new registration invalidates the cache."""
+        service = UICService(salt="test_salt_for_testing")
+        flow = self._flow(service)
+        db = LazySession(factory)
+        first, _ = await service.create_uic(db, PHONE, *ANSWERS)
+        await db.release()
+        assert "1 - " not in (await _send(flow, factory, "Bonjour"))["response"]
+
+        # Register someone else from the same phone
+        result = await _send(flow, factory, "0")
+        assert "Question 1" in result["response"]
+        for answer in ["KAB", "JEA", "3", "LU", "2"]:
+            result = await _send(flow, factory, answer)
+        db = LazySession(factory)
+        second, is_new = await service.create_uic(db, PHONE, **result["collected_data"])
+        await db.release()
+        assert is_new
+        flow.returning_users.invalidate(PHONE)
+
+        offer = await _send(flow, factory, "Bonjour")
+        assert "1 - MBEIBR" in offer["response"] and "2 - KABJEA" in offer["response"]
+        assert (await _send(flow, factory, "2"))["resend_uic"] == second
+
+    @pytest.mark.asyncio
+    async def test_restart_skips_offer(self, factory):
+        """Test that after RESTART the next message answers question 1."""
+        service = UICService(salt="test_salt_for_testing")
+        flow = self._flow(service)
+        db = LazySession(factory)
+        await service.create_uic(db, PHONE, *ANSWERS)
+        await db.release()
+
+        await _send(flow, factory, "RESTART")
+        result = await _send(flow, factory, "KAB")
+        assert result["response"].startswith("✅")
+
+    @pytest.mark.asyncio
+    async def test_cache_evicts_least_recently_used(self):
+        """Test that the cache stays within max_entries."""
+
+        async def lookup(db, phone_number, limit):
+            return [phone_number]
+
+        index = ReturningUserIndex(lookup, max_entries=2, ttl_seconds=60)
+        for phone in ["+1", "+2", "+1", "+3"]:
+            await index.codes_for(None, phone)
+
+        assert len(index) == 2
+        assert set(index._entries) == {"+1", "+3"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
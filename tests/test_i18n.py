@@ -0,0 +1,171 @@
+"""
+Tests for the message catalog and per-user reply languages.
+
+Run with: pytest tests/test_i18n.py
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, LazySession, WriteTrackingSession, enable_sqlite_transactions
+from app.services.flow_manager import FlowManager
+from app.services.i18n import MessageCatalog, get_catalog
+from app.services.session_store import (
+    DatabaseSessionStore,
+    SignedTokenSessionStore,
+    bind_session_token,
+    issued_session_token,
+)
+
+PHONE = "+243810000000"
+
+
+@pytest_asyncio.fixture
+async def factory(tmp_path):
+    """Session factory over an empty SQLite database."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'i18n.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(
+        engine,
+        class_=AsyncSession,
+        sync_session_class=WriteTrackingSession,
+        expire_on_commit=False,
+    )
+    await engine.dispose()
+
+
+async def _send(flow: FlowManager, factory, message: str) -> dict:
+    db = LazySession(factory)
+    result = await flow.process_message(db, PHONE, message)
+    await db.release()
+    return result
+
+
+class TestMessageCatalog:
+    """Test catalog compilation and language recognition."""
+
+    def test_missing_translations_fall_back(self):
+        """Test that untranslated messages and unknown languages use the default."""
+        catalog = MessageCatalog(
+            messages={"welcome": {"fr": "Bienvenue", "en": "Welcome"}, "help": {"fr": "Aide"}},
+            languages={"fr": "Français", "en": "English"},
+            default_language="fr",
+        )
+        assert catalog.text("en", "welcome") == "Welcome"
+        assert catalog.text("en", "help") == "Aide"
+        assert catalog.text("xx", "welcome") == "Bienvenue"
+        assert catalog.text(None, "welcome") == "Bienvenue"
+
+    def test_bundled_catalog_compiles_every_language(self):
+        """Test that every language has the questions, errors and UIC replies."""
+        catalog = get_catalog()
+        assert catalog.languages == ("fr", "en", "ln", "sw")
+        assert catalog.step_keys == tuple(step.key for step in FlowManager.STEPS)
+        for language in catalog.languages:
+            assert catalog.text(language, "start").endswith(
+                catalog.text(language, f"question.{catalog.step_keys[0]}")
+            )
+            for kind in ("new", "existing", "resend"):
+                for key in (f"uic.{kind}.reply", f"uic.{kind}.reply.qr"):
+                    assert "ABCD1234" in catalog.with_code(language, key, "ABCD1234")
+
+    def test_service_replies_translated(self):
+        """Test that the shed, deadline and error replies exist in every language."""
+        catalog = get_catalog()
+        for key in ("service.busy", "service.deadline", "service.error"):
+            texts = {catalog.text(language, key) for language in catalog.languages}
+            assert len(texts) == len(catalog.languages)
+
+    def test_validator_errors_are_in_catalog(self):
+        """Test that every error a validator can return has a compiled reply."""
+        catalog = get_catalog()
+        samples = ["", "1", "12", "A", "AB", "ABC", "9", "0", "A1", "ZZ", "KIN"]
+        for step in FlowManager.STEPS:
+            for sample in samples:
+                is_valid, error_key = step.validate(step.normalize(sample))
+                if not is_valid:
+                    assert catalog.text("sw", f"invalid.{step.key}.{error_key}").startswith("❌ ")
+
+    def test_detect(self):
+        """Test that greetings and language names identify a language."""
+        catalog = get_catalog()
+        assert catalog.detect("Mbote!") == "ln"
+        assert catalog.detect("habari yako") == "sw"
+        assert catalog.detect("Hello there") == "en"
+        assert catalog.detect("Bonjour") == "fr"
+        assert catalog.detect("MBE") is None
+        assert catalog.detect("Swahili") == "sw"
+        # Plausible surnames given as the first answer are not greetings
+        assert all(catalog.detect(name) is None for name in ("SANGO", "SALAMA", "MAMBO", "HI", "GOOD"))
+
+    def test_parse_language_command(self):
+        """Test codes, names and menu numbers as LANG choices."""
+        catalog = get_catalog()
+        assert catalog.parse_language_command("LANG SW") == (True, "sw")
+        assert catalog.parse_language_command("langue english") == (True, "en")
+        assert catalog.parse_language_command("LANG 3") == (True, "ln")
+        assert catalog.parse_language_command("lugha Kiswahili") == (True, "sw")
+        assert catalog.parse_language_command("LANG") == (True, None)
+        assert catalog.parse_language_command("LANG klingon") == (True, None)
+        assert catalog.parse_language_command("MBE") == (False, None)
+
+
+class TestLocalizedFlow:
+    """Test that conversations keep the user's language."""
+
+    @pytest.mark.asyncio
+    async def test_greeting_sets_language(self, factory):
+        """Test that a Lingala greeting starts the questions in Lingala."""
+        catalog = get_catalog()
+        flow = FlowManager(store=DatabaseSessionStore())
+
+        result = await _send(flow, factory, "Mbote")
+        assert result["language"] == "ln"
+        assert result["response"] == catalog.text("ln", "start")
+
+        result = await _send(flow, factory, "12")
+        assert result["response"] == catalog.text("ln", "invalid.last_name_code.error.letters_only")
+
+        result = await _send(flow, factory, "MBE")
+        assert result["response"] == catalog.text("ln", "next.first_name_code")
+
+    @pytest.mark.asyncio
+    async def test_language_command_mid_flow(self, factory):
+        """Test that LANG switches language without losing answers, and RESTART keeps it."""
+        catalog = get_catalog()
+        flow = FlowManager(store=DatabaseSessionStore())
+
+        await _send(flow, factory, "MBE")
+        result = await _send(flow, factory, "LANG SW")
+        assert result["language"] == "sw"
+        assert result["response"] == catalog.text("sw", "language.set.first_name_code")
+
+        result = await _send(flow, factory, "IBR")
+        assert result["response"] == catalog.text("sw", "next.birth_year_digit")
+
+        result = await _send(flow, factory, "RESTART")
+        assert result["response"] == catalog.text("sw", "start")
+
+        result = await _send(flow, factory, "LANG")
+        assert result["response"] == catalog.text("sw", "language.menu")
+
+    @pytest.mark.asyncio
+    async def test_language_travels_in_token(self, factory):
+        """Test that the chosen language survives the signed-token store."""
+        catalog = get_catalog()
+        workers = [FlowManager(store=SignedTokenSessionStore(secret="token_secret_1234567890")) for _ in range(2)]
+
+        bind_session_token(None)
+        await _send(workers[0], factory, "LANG EN")
+        bind_session_token(issued_session_token())
+        result = await _send(workers[1], factory, "MBE")
+
+        assert result["language"] == "en"
+        assert result["response"] == catalog.text("en", "next.first_name_code")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
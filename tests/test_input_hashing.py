@@ -0,0 +1,227 @@
+"""
+Tests for keyed input hashing and the re-hash job.
+
+Run with: pytest tests/test_input_hashing.py
+"""
+import hmac
+import pickle
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, create_schema, enable_sqlite_transactions
+from app.models.uic import UICRecord
+from app.services.input_hashing import (
+    UNKEYED_VERSION,
+    InputHasher,
+    rehash_registry,
+)
+from app.services.uic_service import UICService
+from app.sharding import NORMALIZED_COLUMNS, hash_message, placement_key
+
+PERSON = ("MBENGUE", "IBRAHIMA", "1990", "KI", "1")
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Empty registry database."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'hash.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+def _service(keys: dict, current_version: int) -> UICService:
+    service = UICService(salt="test_salt_for_testing")
+    service.hasher = InputHasher(keys, current_version, accept_unkeyed=True)
+    return service
+
+
+async def _records(session_factory) -> list:
+    async with session_factory() as db:
+        return list((await db.execute(select(UICRecord).order_by(UICRecord.id))).scalars())
+
+
+class TestInputHasher:
+    """Test hashing and lookup order."""
+
+    @pytest.mark.parametrize("key", ["", "short", "k" * 64, "long" * 40])
+    def test_matches_one_shot_hmac(self, key):
+        """Test that hashes from the prepared HMAC equal a fresh hmac.new for any key length."""
+        hasher = InputHasher({1: key}, 1)
+        expected = hmac.new(key.encode("utf-8"), hash_message(PERSON), "sha256").hexdigest()
+        assert hasher.hash(PERSON) == hasher.hash(PERSON) == expected
+
+    def test_keyed_hash_differs_from_unkeyed(self):
+        """Test that the stored hash is not the enumerable unkeyed digest."""
+        hasher = InputHasher({1: "salt"}, 1)
+        assert hasher.hash(PERSON) != placement_key(PERSON)
+        assert hasher.hash(PERSON, UNKEYED_VERSION) == placement_key(PERSON)
+
+    def test_candidates_current_first(self):
+        """Test that lookups try the current key, older keys, then unkeyed."""
+        hasher = InputHasher({1: "a", 3: "c", 2: "b"}, 3, accept_unkeyed=True)
+        candidates = hasher.candidates(PERSON)
+
+        assert [version for version, _ in candidates] == [3, 2, 1, UNKEYED_VERSION]
+        assert all(hasher.hash(PERSON, version) == digest for version, digest in candidates)
+
+    def test_unkeyed_not_accepted_by_default(self):
+        """Test that version 0 is only looked up when enabled."""
+        assert InputHasher({1: "a"}, 1).lookup_versions == [1]
+
+    def test_rejects_missing_current_key(self):
+        """Test that the current version must have a salt."""
+        with pytest.raises(ValueError):
+            InputHasher({1: "a"}, 2)
+
+    def test_pickles(self):
+        """Test that the hasher survives pickling (process pools)."""
+        hasher = InputHasher({1: "a", 2: "b"}, 2, accept_unkeyed=True)
+        copy = pickle.loads(pickle.dumps(hasher))
+        assert copy.candidates(PERSON) == hasher.candidates(PERSON)
+
+
+class TestKeyRotation:
+    """Test lookups across key versions through UICService."""
+
+    @pytest.mark.asyncio
+    async def test_legacy_record_found_and_upgraded(self, session_factory):
+        """Test that an unkeyed record is returned and moved to the current key."""
+        service = _service({1: "old"}, 1)
+        async with session_factory() as db:
+            uic, _ = await service.create_uic(db, "+1", *PERSON)
+            fields = service.normalize_inputs(*PERSON)
+            await db.execute(update(UICRecord).values(
+                input_hash=placement_key(fields), hash_key_version=UNKEYED_VERSION
+            ))
+            await db.commit()
+
+        async with session_factory() as db:
+            again, is_new = await service.create_uic(db, "+1", *PERSON)
+            await db.commit()
+
+        [record] = await _records(session_factory)
+        assert (again, is_new) == (uic, False)
+        assert record.hash_key_version == 1
+        assert record.input_hash == service.hasher.hash(fields)
+
+    @pytest.mark.asyncio
+    async def test_previous_key_still_matches(self, session_factory):
+        """Test that rotating the salt keeps existing people recognized."""
+        async with session_factory() as db:
+            uic, _ = await _service({1: "old"}, 1).create_uic(db, "+1", *PERSON)
+            await db.commit()
+
+        rotated = _service({1: "old", 2: "new"}, 2)
+        async with session_factory() as db:
+            existing = await rotated.check_existing_uic(db, *rotated.normalize_inputs(*PERSON))
+
+        assert existing is not None and existing.uic_code == uic
+
+
+class TestRetainVersions:
+    """Test dropping lookup hashes for key versions nothing uses."""
+
+    def test_unused_versions_dropped(self):
+        """Test that only the current version and versions still stored are looked up."""
+        hasher = InputHasher({1: "a", 2: "b", 3: "c"}, 3, accept_unkeyed=True)
+        hasher.retain_versions({1, 3})
+        assert [version for version, _ in hasher.candidates(PERSON)] == [3, 1]
+
+    @pytest.mark.asyncio
+    async def test_startup_check_after_rehash(self, session_factory):
+        """Test that the legacy candidate is kept while unmigrated rows exist, dropped after."""
+        service = _service({1: "old"}, 1)
+        async with session_factory() as db:
+            await service.create_uic(db, "+1", *PERSON)
+            await db.execute(update(UICRecord).values(hash_key_version=UNKEYED_VERSION))
+            await db.commit()
+
+        async with session_factory() as db:
+            await service.load_key_versions(db)
+        assert service.hasher.lookup_versions == [1, UNKEYED_VERSION]
+
+        await rehash_registry(session_factory, service.hasher, pause_seconds=0)
+        restarted = _service({1: "old"}, 1)
+        async with session_factory() as db:
+            await restarted.load_key_versions(db)
+        assert restarted.hasher.lookup_versions == [1]
+
+
+class TestRehashRegistry:
+    """Test the online re-hash job."""
+
+    @pytest.mark.asyncio
+    async def test_rewrites_old_rows_in_chunks(self, session_factory):
+        """Test that every row ends on the current key and the job is idempotent."""
+        old = _service({1: "old"}, 1)
+        async with session_factory() as db:
+            for year in range(1950, 1960):
+                await old.create_uic(db, "+1", "KABILA", "JOSEPH", str(year), "KI", "1")
+            await db.commit()
+
+        rotated = InputHasher({1: "old", 2: "new"}, 2)
+        counts = await rehash_registry(session_factory, rotated, chunk_size=3, pause_seconds=0)
+        records = await _records(session_factory)
+
+        assert counts == {"examined": 10, "rewritten": 10, "skipped": 0}
+        assert all(record.hash_key_version == 2 for record in records)
+        assert all(
+            record.input_hash == rotated.hash([getattr(record, name) for name in NORMALIZED_COLUMNS])
+            for record in records
+        )
+
+        again = await rehash_registry(session_factory, rotated, chunk_size=3, pause_seconds=0)
+        assert again["examined"] == 0
+
+    @pytest.mark.asyncio
+    async def test_max_chunks_stops_early(self, session_factory):
+        """Test that a bounded run leaves the rest for the next run."""
+        old = _service({1: "old"}, 1)
+        async with session_factory() as db:
+            for year in range(1950, 1955):
+                await old.create_uic(db, "+1", "KABILA", "JOSEPH", str(year), "KI", "1")
+            await db.commit()
+
+        rotated = InputHasher({1: "old", 2: "new"}, 2)
+        first = await rehash_registry(session_factory, rotated, chunk_size=2, pause_seconds=0, max_chunks=1)
+        rest = await rehash_registry(session_factory, rotated, chunk_size=2, pause_seconds=0)
+
+        assert first["rewritten"] == 2
+        assert rest["rewritten"] == 3
+
+
+class TestSchemaUpgrade:
+    """Test upgrading a registry created before keyed hashing."""
+
+    @pytest.mark.asyncio
+    async def test_version_column_added_at_startup(self, tmp_path):
+        """Test that an old database gets hash_key_version and serves registrations."""
+        engine = enable_sqlite_transactions(
+            create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text("ALTER TABLE uic_records DROP COLUMN hash_key_version"))
+
+        async with engine.begin() as conn:
+            assert await conn.run_sync(create_schema) == ["uic_records.hash_key_version"]
+        async with engine.begin() as conn:
+            assert await conn.run_sync(create_schema) == []
+
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as db:
+            _, is_new = await UICService(salt="test_salt_for_testing").create_uic(db, "+1", *PERSON)
+            await db.commit()
+        assert is_new
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
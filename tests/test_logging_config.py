@@ -0,0 +1,48 @@
+"""
+Tests for log sampling.
+
+Run with: pytest tests/test_logging_config.py
+"""
+import pytest
+import structlog
+
+from app.logging_config import EventSampler
+
+
+def _keeps(sampler: EventSampler, event: str, level: str = "info") -> bool:
+    try:
+        sampler(None, level, {"event": event})
+    except structlog.DropEvent:
+        return False
+    return True
+
+
+class TestEventSampler:
+    """Test per-event sampling and rate limits."""
+
+    def test_unlisted_events_pass(self):
+        """Test that events without a rule are always kept."""
+        sampler = EventSampler(sample_rates={"Answer stored": 0.0})
+        assert all(_keeps(sampler, "UIC delivered") for _ in range(100))
+
+    def test_sample_rate_zero_drops_info(self):
+        """Test that a zero rate drops every info event and counts it."""
+        sampler = EventSampler(sample_rates={"Answer stored": 0.0})
+        assert not any(_keeps(sampler, "Answer stored") for _ in range(10))
+        assert sampler.dropped == {"Answer stored": 10}
+
+    def test_warnings_are_never_sampled(self):
+        """Test that warning and error events bypass sampling."""
+        sampler = EventSampler(sample_rates={"Validation failed": 0.0})
+        assert _keeps(sampler, "Validation failed", level="warning")
+        assert _keeps(sampler, "Validation failed", level="error")
+
+    def test_rate_limit_caps_burst(self):
+        """Test that a rate limit lets through about one second's worth of a burst."""
+        sampler = EventSampler(rate_limits={"Received WhatsApp message": 5})
+        kept = sum(_keeps(sampler, "Received WhatsApp message") for _ in range(100))
+        assert 5 <= kept <= 6
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,172 @@
+"""
+Tests for the inbound message journal.
+
+Run with: pytest tests/test_message_journal.py
+"""
+import time
+
+import pytest
+
+from app.services.flow_manager import FlowManager
+from app.services.message_journal import (
+    OUTCOME_DEADLINE,
+    OUTCOME_OK,
+    STEP_COMMAND,
+    JournalRecord,
+    MessageJournal,
+    hash_phone,
+    journal_files,
+    read_journal,
+    read_journal_file,
+    synthetic_message,
+)
+
+
+def _record(timestamp: float, step: int = 0, body_length: int = 7) -> JournalRecord:
+    return JournalRecord(
+        timestamp=timestamp,
+        phone_hash=hash_phone("+243810000001", key="k"),
+        step=step,
+        body_length=body_length,
+        message_sid="SM0123456789abcdef0123456789abcdef",
+        latency_ms=12.5,
+        outcome=OUTCOME_OK,
+    )
+
+
+class TestRecords:
+    """Test the record format."""
+
+    def test_pack_round_trip(self):
+        """Test that a record survives packing."""
+        record = _record(1760000000.25, step=3)
+        assert JournalRecord.unpack(record.pack()) == record
+
+    def test_phone_hash_is_keyed(self):
+        """Test that hashes are stable per key and differ across keys."""
+        assert hash_phone("+243810000001", key="a") == hash_phone("+243810000001", key="a")
+        assert hash_phone("+243810000001", key="a") != hash_phone("+243810000001", key="b")
+        assert len(hash_phone("+243810000001", key="a")) == 8
+
+
+class TestMessageJournal:
+    """Test writing, rotation and reading."""
+
+    def test_write_and_read_back(self, tmp_path):
+        """Test that recorded messages are read back in order after close."""
+        path = tmp_path / "messages.bin"
+        journal = MessageJournal(str(path), max_bytes=1 << 20, backup_count=2, batch_records=2)
+        journal.record("+1", "SMa", 5, 0, 1000.0, 0.010)
+        journal.record("+1", "SMb", 4, 1, 1001.0, 0.020)
+        journal.record("+2", "SMc", 1, STEP_COMMAND, 1002.0, 3.0, OUTCOME_DEADLINE)
+        journal.close()
+
+        records = list(read_journal_file(path))
+        assert [r.message_sid for r in records] == ["SMa", "SMb", "SMc"]
+        assert records[2].step == STEP_COMMAND and records[2].outcome == OUTCOME_DEADLINE
+        assert records[0].phone_hash == records[1].phone_hash != records[2].phone_hash
+        assert records[1].latency_ms == pytest.approx(20.0)
+
+    def test_rotation(self, tmp_path):
+        """Test that full files rotate and are listed oldest first."""
+        path = tmp_path / "messages.bin"
+        journal = MessageJournal(str(path), max_bytes=4096, backup_count=3, batch_records=10)
+        for i in range(200):
+            journal.record("+1", f"SM{i}", 5, 0, 1000.0 + i, 0.01)
+        journal.close()
+
+        files = journal_files(path)
+        assert files[-1] == path and len(files) > 2
+        assert all(f.stat().st_size <= 4096 for f in files)
+        sids = [r.message_sid for r in read_journal(files)]
+        assert sids == sorted(sids, key=lambda sid: int(sid[2:]))
+        assert sids[-1] == "SM199"
+
+    def test_rejects_unknown_files(self, tmp_path):
+        """Test that a file without the journal header is refused."""
+        path = tmp_path / "other.bin"
+        path.write_bytes(b"not a journal at all")
+        with pytest.raises(ValueError):
+            list(read_journal_file(path))
+
+    def test_drops_when_writer_behind(self, tmp_path):
+        """Test that a full queue drops and counts batches instead of blocking."""
+        journal = MessageJournal(str(tmp_path / "messages.bin"), batch_records=1, queue_batches=1)
+        journal.close()  # Writer thread gone: nothing drains the queue
+
+        journal.record("+1", "SMa", 5, 0, 1000.0, 0.01)
+        journal.record("+1", "SMb", 5, 0, 1001.0, 0.01)
+        assert journal.dropped == 1
+
+    def test_partial_batch_written_after_interval(self, tmp_path):
+        """Test that a quiet journal's records reach the file without a full batch or close."""
+        path = tmp_path / "messages.bin"
+        journal = MessageJournal(str(path), batch_records=100, flush_interval_seconds=0.05)
+        journal.record("+1", "SMa", 5, 0, 1000.0, 0.01)
+
+        deadline = time.monotonic() + 5
+        while not (path.exists() and list(read_journal_file(path))) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert [r.message_sid for r in read_journal_file(path)] == ["SMa"]
+        journal.close()
+
+    def test_worker_files_found(self, tmp_path):
+        """Test that per-worker journals and their rotations are listed with the configured one."""
+        path = tmp_path / "messages.bin"
+        for pid in (101, 202):
+            worker = MessageJournal(str(tmp_path / f"messages-{pid}.bin"), max_bytes=4096, batch_records=10)
+            for i in range(100):
+                worker.record("+1", f"SM{pid}-{i}", 5, 0, 1000.0 + i, 0.01)
+            worker.close()
+        (tmp_path / "messages-old.bin").write_bytes(b"")
+        # An exited worker's backup without its current file
+        (tmp_path / "messages-101.bin").rename(tmp_path / "messages-303.bin.1")
+
+        files = journal_files(path)
+        assert [f.name for f in files] == [
+            "messages-101.bin.1", "messages-202.bin.1", "messages-202.bin", "messages-303.bin.1",
+        ]
+        assert len(list(read_journal(files))) == 200
+
+
+class TestReadJournal:
+    """Test merging and reordering."""
+
+    def test_reorders_within_window(self, tmp_path):
+        """Test that records written out of arrival order come out sorted."""
+        journal = MessageJournal(str(tmp_path / "a.bin"), batch_records=100)
+        # A slow request (arrived at 1000) finishes after two faster ones
+        for received_at in (1001.0, 1002.0, 1000.0, 1003.0):
+            journal.record("+1", "SM", 1, 0, received_at, 0.0)
+        journal.close()
+        other = MessageJournal(str(tmp_path / "b.bin"), batch_records=100)
+        other.record("+2", "SM", 1, 0, 1001.5, 0.0)
+        other.close()
+
+        timestamps = [r.timestamp for r in read_journal([tmp_path / "a.bin", tmp_path / "b.bin"])]
+        assert timestamps == [1000.0, 1001.0, 1001.5, 1002.0, 1003.0]
+
+
+class TestSyntheticMessage:
+    """Test replay bodies."""
+
+    def test_deterministic(self):
+        """Test that a record always replays as the same request."""
+        record = _record(1000.0, step=0)
+        assert synthetic_message(record) == synthetic_message(record)
+        assert synthetic_message(record)[0].startswith("whatsapp:+999")
+
+    @pytest.mark.parametrize("step", range(len(FlowManager.STEPS)))
+    def test_valid_answers(self, step):
+        """Test that bodies pass the validation of the recorded step."""
+        question = FlowManager.STEPS[step]
+        _, body = synthetic_message(_record(1000.0, step=step, body_length=6))
+        assert question.validate(question.normalize(body))[0]
+
+    def test_commands_replay_as_help(self):
+        """Test that command messages replay as a reply needing no database."""
+        assert synthetic_message(_record(1000.0, step=STEP_COMMAND))[1] == "HELP"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
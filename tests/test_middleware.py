@@ -0,0 +1,113 @@
+"""
+Tests for Twilio signature validation.
+
+Run with: pytest tests/test_middleware.py
+"""
+import pytest
+from fastapi import FastAPI, Form
+from fastapi.testclient import TestClient
+from twilio.request_validator import RequestValidator
+
+from app.middleware import TwilioSignatureMiddleware, TwilioSignatureValidator
+
+AUTH_TOKEN = "test_auth_token_123"
+URL = "http://testserver/whatsapp/webhook"
+PARAMS = {"From": "whatsapp:+243810000000", "Body": "Hello & bienvenue", "MessageSid": "SM123"}
+
+
+@pytest.fixture
+def client():
+    """App with a signed webhook and an unsigned route."""
+    app = FastAPI()
+    calls = []
+
+    @app.post("/whatsapp/webhook")
+    async def webhook(Body: str = Form(...)):
+        calls.append(Body)
+        return {"body": Body}
+
+    @app.post("/open")
+    async def open_route():
+        return {"ok": True}
+
+    app.add_middleware(
+        TwilioSignatureMiddleware,
+        auth_token=AUTH_TOKEN,
+        paths=["/whatsapp/webhook"],
+    )
+    test_client = TestClient(app)
+    test_client.calls = calls
+    return test_client
+
+
+class TestTwilioSignatureValidator:
+    """Test signature computation."""
+
+    def test_matches_twilio_sdk(self):
+        """Test that signatures match the Twilio SDK's RequestValidator."""
+        validator = TwilioSignatureValidator(AUTH_TOKEN)
+        expected = RequestValidator(AUTH_TOKEN).compute_signature(URL, PARAMS)
+        assert validator.compute(URL, PARAMS.items()) == expected
+
+    def test_rejects_tampered_params(self):
+        """Test that changing a parameter invalidates the signature."""
+        validator = TwilioSignatureValidator(AUTH_TOKEN)
+        signature = validator.compute(URL, PARAMS.items())
+        tampered = dict(PARAMS, Body="RESTART")
+        assert validator.validate(URL, PARAMS.items(), signature)
+        assert not validator.validate(URL, tampered.items(), signature)
+
+    def test_port_variants_accepted(self):
+        """Test that a proxy adding or stripping the default port does not break validation."""
+        validator = TwilioSignatureValidator(AUTH_TOKEN)
+        sdk = RequestValidator(AUTH_TOKEN)
+        bare = "https://bot.example.org/whatsapp/webhook?x=1"
+        with_port = "https://bot.example.org:443/whatsapp/webhook?x=1"
+
+        assert validator.validate(with_port, PARAMS.items(), sdk.compute_signature(bare, PARAMS))
+        assert validator.validate(bare, PARAMS.items(), sdk.compute_signature(with_port, PARAMS))
+        assert not validator.validate(
+            "https://other.example.org/whatsapp/webhook?x=1",
+            PARAMS.items(),
+            sdk.compute_signature(bare, PARAMS),
+        )
+
+    def test_repeated_params_deduplicated(self):
+        """Test that a repeated key/value pair is signed once, as the Twilio SDK does."""
+        validator = TwilioSignatureValidator(AUTH_TOKEN)
+        params = list(PARAMS.items()) + [("MessageSid", "SM123")]
+        assert validator.compute(URL, params) == validator.compute(URL, PARAMS.items())
+
+
+class TestTwilioSignatureMiddleware:
+    """Test request filtering."""
+
+    def test_valid_signature_reaches_endpoint(self, client):
+        """Test that a correctly signed request is passed through with its body."""
+        signature = RequestValidator(AUTH_TOKEN).compute_signature(URL, PARAMS)
+        response = client.post("/whatsapp/webhook", data=PARAMS,
+                               headers={"X-Twilio-Signature": signature})
+        assert response.status_code == 200
+        assert response.json() == {"body": PARAMS["Body"]}
+
+    def test_missing_signature_rejected(self, client):
+        """Test that unsigned requests never reach the endpoint."""
+        response = client.post("/whatsapp/webhook", data=PARAMS)
+        assert response.status_code == 403
+        assert client.calls == []
+
+    def test_forged_signature_rejected(self, client):
+        """Test that a signature made with another token is rejected."""
+        signature = RequestValidator("wrong_token").compute_signature(URL, PARAMS)
+        response = client.post("/whatsapp/webhook", data=PARAMS,
+                               headers={"X-Twilio-Signature": signature})
+        assert response.status_code == 403
+        assert client.calls == []
+
+    def test_other_paths_not_checked(self, client):
+        """Test that routes outside the webhook are unaffected."""
+        assert client.post("/open").status_code == 200
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,111 @@
+"""
+Tests for the sampling profiler and request tracing.
+
+Run with: pytest tests/test_profiling.py
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.profiling import ProfilerBusy, RequestTracer, SamplingProfiler, span, traced
+
+
+def _spin_until(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestSamplingProfiler:
+    """Test collapsed-stack sampling."""
+
+    def test_collapsed_stacks(self):
+        """Test that a busy thread shows up with its call stack and counts."""
+        stop = threading.Event()
+        worker = threading.Thread(target=_spin_until, args=(stop,), name="busy worker")
+        worker.start()
+        try:
+            stacks = SamplingProfiler(max_seconds=5).sample(0.2, interval_seconds=0.002)
+        finally:
+            stop.set()
+            worker.join()
+
+        lines = [line.rsplit(" ", 1) for line in stacks.splitlines()]
+        busy = [(stack, int(count)) for stack, count in lines if stack.startswith("busy_worker;")]
+        assert busy and all(count > 0 for _, count in busy)
+        assert any(stack.endswith("tests/test_profiling.py:_spin_until") for stack, _ in busy)
+
+    def test_one_profile_at_a_time(self):
+        """Test that a second concurrent profile is refused."""
+        profiler = SamplingProfiler(max_seconds=5)
+        first = threading.Thread(target=profiler.sample, args=(0.3,))
+        first.start()
+        time.sleep(0.05)
+        try:
+            with pytest.raises(ProfilerBusy):
+                profiler.sample(0.1)
+        finally:
+            first.join()
+        assert not profiler.running
+
+    def test_duration_capped(self):
+        """Test that the duration is capped at max_seconds."""
+        started = time.perf_counter()
+        SamplingProfiler(max_seconds=0.05).sample(30)
+        assert time.perf_counter() - started < 1
+
+
+class TestRequestTracer:
+    """Test per-request spans."""
+
+    def test_disabled_records_nothing(self):
+        """Test that nothing is kept while tracing is off."""
+        tracer = RequestTracer(enabled=False, keep=5)
+        with tracer.trace("webhook") as request_trace:
+            with span("work"):
+                pass
+        assert request_trace is None
+        assert tracer.slowest() == []
+
+    def test_keeps_slowest(self):
+        """Test that only the slowest requests are kept, slowest first."""
+        tracer = RequestTracer(enabled=True, keep=2)
+        for delay in (0.0, 0.03, 0.01, 0.02):
+            with tracer.trace(f"request-{delay}"):
+                time.sleep(delay)
+
+        assert [t.name for t in tracer.slowest()] == ["request-0.03", "request-0.02"]
+        tracer.clear()
+        assert tracer.slowest() == []
+
+    @pytest.mark.asyncio
+    async def test_spans_and_sql(self, tmp_path):
+        """Test that decorated calls and SQL statements become spans."""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'trace.db'}")
+
+        @traced("lookup")
+        async def lookup() -> int:
+            async with engine.connect() as conn:
+                return (await conn.execute(text("SELECT 42"))).scalar()
+
+        tracer = RequestTracer(enabled=True, keep=5)
+        try:
+            with tracer.trace("webhook"):
+                assert await lookup() == 42
+            await lookup()  # Outside the trace: not recorded
+        finally:
+            await engine.dispose()
+
+        [request_trace] = tracer.slowest()
+        assert [s.name for s in request_trace.spans] == ["lookup", "sql"]
+        lookup_span, sql_span = request_trace.spans
+        assert sql_span.detail == "SELECT 42"
+        assert lookup_span.start_ms <= sql_span.start_ms
+        assert sql_span.start_ms + sql_span.duration_ms <= lookup_span.start_ms + lookup_span.duration_ms
+        assert request_trace.as_dict()["spans"][1]["detail"] == "SELECT 42"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,148 @@
+"""
+Tests for read replica routing.
+
+SQLite file copies stand in for replicas.
+
+Run with: pytest tests/test_read_replicas.py
+"""
+import shutil
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, ReadReplicaRouter, enable_sqlite_transactions
+from app.models.uic import UICRecord
+from app.services.uic_service import UICService
+
+
+@pytest_asyncio.fixture
+async def primary(tmp_path):
+    """Primary database with one registered UIC."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as db:
+        service = UICService(salt="test_salt_for_testing")
+        await service.create_uic(db, "+243000", "MBE", "IBR", "7", "DA", "1")
+        await db.commit()
+
+    yield factory
+    await engine.dispose()
+
+
+def _replicas(tmp_path, count: int) -> list[str]:
+    urls = []
+    for i in range(count):
+        path = tmp_path / f"replica{i}.db"
+        shutil.copy(tmp_path / "primary.db", path)
+        urls.append(f"sqlite:///{path}")
+    return urls
+
+
+async def _lookup(db: AsyncSession, uic_code: str):
+    result = await db.execute(select(UICRecord).where(UICRecord.uic_code == uic_code))
+    return result.scalar_one_or_none()
+
+
+class TestReadReplicaRouter:
+    """Test replica selection and fallbacks."""
+
+    @pytest.mark.asyncio
+    async def test_reads_are_served_by_replicas(self, primary, tmp_path):
+        """Test that lookups found on a replica never touch the primary."""
+        router = ReadReplicaRouter(_replicas(tmp_path, 2), staleness_seconds=0)
+        service = UICService(salt="test_salt_for_testing", read_router=router)
+
+        async with primary() as db:
+            # Remove the row on the primary: only the replicas still have it
+            await db.execute(UICRecord.__table__.delete())
+            await db.commit()
+
+            for _ in range(4):
+                record = await service.check_existing_uic(db, "MBE", "IBR", "7", "DA", "1")
+                assert record is not None
+
+        await router.dispose()
+
+    def test_round_robin(self, tmp_path):
+        """Test that replicas are picked in turn."""
+        router = ReadReplicaRouter(["sqlite:///a.db", "sqlite:///b.db", "sqlite:///c.db"])
+        assert [router._pick_replica() for _ in range(6)] == [0, 1, 2, 0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_miss_rechecked_on_primary_within_staleness_window(self, primary, tmp_path):
+        """Test that a replica miss shortly after a write falls back to the primary."""
+        router = ReadReplicaRouter(_replicas(tmp_path, 1), staleness_seconds=60)
+        service = UICService(salt="test_salt_for_testing", read_router=router)
+
+        async with primary() as db:
+            uic_code, is_new = await service.create_uic(db, "+243001", "KAB", "JEA", "5", "KI", "2")
+            assert is_new
+
+            # Replica copy predates the write, so this is a miss there
+            record = await router.read(db, lambda s: _lookup(s, uic_code))
+            assert record is not None
+
+        await router.dispose()
+
+    @pytest.mark.asyncio
+    async def test_new_phone_codes_read_from_primary(self, primary, tmp_path):
+        """Test that a phone that just registered sees its code despite a lagging replica."""
+        router = ReadReplicaRouter(_replicas(tmp_path, 1), staleness_seconds=60)
+        service = UICService(salt="test_salt_for_testing", read_router=router)
+
+        async with primary() as db:
+            uic_code, _ = await service.create_uic(db, "+243001", "KAB", "JEA", "5", "KI", "2")
+
+            assert await service.codes_for_phone(db, "+243001") == [uic_code]
+
+        await router.dispose()
+
+    @pytest.mark.asyncio
+    async def test_empty_phone_lookup_trusted_after_staleness_window(self, primary, tmp_path):
+        """Test that an empty result is returned as a list once the window has passed."""
+        router = ReadReplicaRouter(_replicas(tmp_path, 1), staleness_seconds=0)
+        service = UICService(salt="test_salt_for_testing", read_router=router)
+
+        async with primary() as db:
+            assert await service.codes_for_phone(db, "+243999") == []
+            assert await service.count_records(db, active_only=True) == 1
+
+        await router.dispose()
+
+    @pytest.mark.asyncio
+    async def test_miss_trusted_after_staleness_window(self, primary, tmp_path):
+        """Test that replica misses are authoritative once the window has passed."""
+        router = ReadReplicaRouter(_replicas(tmp_path, 1), staleness_seconds=0)
+
+        async with primary() as db:
+            record = await router.read(db, lambda s: _lookup(s, "MBEIBR7DA1"))
+            assert record is not None
+            record = await router.read(db, lambda s: _lookup(s, "NOPE"))
+            assert record is None
+
+        await router.dispose()
+
+    @pytest.mark.asyncio
+    async def test_unhealthy_replica_is_skipped(self, primary, tmp_path):
+        """Test that a failing replica falls back to the primary and leaves rotation."""
+        bad_url = f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"
+        router = ReadReplicaRouter([bad_url], staleness_seconds=0)
+
+        async with primary() as db:
+            record = await router.read(db, lambda s: _lookup(s, "MBEIBR7DA1"))
+            assert record is not None
+
+        assert router.healthy_replicas == 0
+        assert await router.check_health() == 0
+        await router.dispose()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
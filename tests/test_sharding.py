@@ -0,0 +1,142 @@
+"""
+Tests for the sharded UIC registry.
+
+Run with: pytest tests/test_sharding.py
+"""
+import hashlib
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.models.uic import UICRecord
+from app.services.uic_service import UICService
+from app.sharding import (
+    NORMALIZED_COLUMNS,
+    ConsistentHashRing,
+    ShardRouter,
+    placement_key,
+    rebalance_shards,
+    shard_id,
+)
+
+
+def _hash(i: int) -> str:
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def _urls(tmp_path, count: int) -> list[str]:
+    return [f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(count)]
+
+
+class TestConsistentHashRing:
+    """Test ring placement."""
+
+    def test_routing_is_deterministic(self):
+        """Test that the same key always maps to the same node."""
+        ring = ConsistentHashRing(["a", "b", "c"])
+        assert all(ring.get_node(_hash(i)) == ring.get_node(_hash(i)) for i in range(100))
+
+    def test_keys_spread_across_nodes(self):
+        """Test that every node receives a reasonable share of keys."""
+        ring = ConsistentHashRing(["a", "b", "c", "d"])
+        counts = {}
+        for i in range(4000):
+            node = ring.get_node(_hash(i))
+            counts[node] = counts.get(node, 0) + 1
+
+        assert set(counts) == {"a", "b", "c", "d"}
+        assert min(counts.values()) > 500
+
+    def test_adding_node_moves_few_keys(self):
+        """Test that adding a node only moves keys onto the new node."""
+        before = ConsistentHashRing(["a", "b", "c"])
+        after = ConsistentHashRing(["a", "b", "c", "d"])
+
+        moved = 0
+        for i in range(4000):
+            old, new = before.get_node(_hash(i)), after.get_node(_hash(i))
+            if old != new:
+                assert new == "d"
+                moved += 1
+
+        assert moved < 4000 * 0.4
+
+
+class TestShardedUICService:
+    """Test UICService on top of a ShardRouter."""
+
+    @pytest.mark.asyncio
+    async def test_create_and_lookup_route_to_one_shard(self, tmp_path):
+        """Test that a record is written to and found on its owning shard."""
+        router = ShardRouter(_urls(tmp_path, 3))
+        await router.init_shards()
+        service = UICService(salt="test_salt_for_testing", shard_router=router)
+
+        try:
+            uic1, is_new1 = await service.create_uic(None, "+243000", "MBE", "IBR", "7", "DA", "1")
+            uic2, is_new2 = await service.create_uic(None, "+243000", "MBE", "IBR", "7", "DA", "1")
+
+            assert (uic1, is_new1) == ("MBEIBR7DA1", True)
+            assert (uic2, is_new2) == ("MBEIBR7DA1", False)
+
+            record = await service.check_existing_uic(None, "MBE", "IBR", "7", "DA", "1")
+            assert record is not None
+            assert record.hash_key_version == service.hasher.current_version
+        finally:
+            await router.dispose()
+
+    @pytest.mark.asyncio
+    async def test_count_fans_out_to_all_shards(self, tmp_path):
+        """Test that reporting counts cover every shard."""
+        router = ShardRouter(_urls(tmp_path, 3))
+        await router.init_shards()
+        service = UICService(salt="test_salt_for_testing", shard_router=router)
+
+        try:
+            for i, last_name in enumerate(["AAA", "BBB", "CCC", "DDD", "EEE", "FFF"]):
+                await service.create_uic(None, f"+24300{i}", last_name, "IBR", "7", "DA", "1")
+
+            assert await service.count_records(None) == 6
+        finally:
+            await router.dispose()
+
+
+class TestRebalance:
+    """Test the offline rebalancing job."""
+
+    @pytest.mark.asyncio
+    async def test_rebalance_moves_rows_to_new_owner(self, tmp_path):
+        """Test that rows land on their owning shard after adding one."""
+        urls = _urls(tmp_path, 3)
+        router = ShardRouter(urls[:2])
+        await router.init_shards()
+        service = UICService(salt="test_salt_for_testing", shard_router=router)
+
+        last_names = [f"{chr(65 + i % 26)}{chr(65 + i // 26)}A" for i in range(60)]
+        try:
+            for i, last_name in enumerate(last_names):
+                await service.create_uic(None, f"+243{i}", last_name, "IBR", "7", "DA", "1")
+        finally:
+            await router.dispose()
+
+        moved = rebalance_shards(urls)
+        assert sum(moved.values()) > 0
+        assert rebalance_shards(urls, dry_run=True) == {shard_id(i): 0 for i in range(3)}
+
+        ring = ConsistentHashRing([shard_id(i) for i in range(3)], 64)
+        total = 0
+        for i, url in enumerate(urls):
+            engine = create_engine(url)
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(*(getattr(UICRecord, name) for name in NORMALIZED_COLUMNS))
+                ).all()
+                total += conn.execute(select(func.count()).select_from(UICRecord)).scalar_one()
+            engine.dispose()
+            assert all(ring.get_node(placement_key(row)) == shard_id(i) for row in rows)
+
+        assert total == len(last_names)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,259 @@
+"""
+Tests for shared-memory cache segments and the caches built on them.
+
+Run with: pytest tests/test_shared_cache.py
+"""
+import multiprocessing
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, ReadReplicaRouter, enable_sqlite_transactions
+from app.models.uic import UICRecord
+from app.services.returning_users import ReturningUserIndex
+from app.services.shared_cache import (
+    HEADER_BYTES,
+    MAX_VALUE_BYTES,
+    SharedHashTable,
+    _SEQ,
+    _digest,
+    shared_cache_stats,
+)
+from app.services.uic_service import UICService
+
+PHONE = "+243810000000"
+PERSON = ("MBE", "IBR", "7", "DA", "1")
+
+
+def _write_from_child(path: str) -> None:
+    table = SharedHashTable(path, slots=64)
+    table.set("from-child", b"hello", ttl_seconds=60)
+    table.close()
+
+
+class TestSharedHashTable:
+    """Test the mmap-backed table."""
+
+    def test_set_get_delete(self, tmp_path):
+        """Test basic operations, expiry and size limits."""
+        table = SharedHashTable(str(tmp_path / "t.bin"), slots=64)
+        table.set("a", b"1", ttl_seconds=60)
+        table.set("a", b"2", ttl_seconds=60)
+        table.set("empty", b"", ttl_seconds=60)
+        table.set("old", b"x", ttl_seconds=-1)
+
+        assert table.get("a") == b"2"
+        assert table.get("empty") == b""
+        assert table.get("old") is None
+        assert table.get("missing") is None
+        assert not table.set("big", b"x" * (MAX_VALUE_BYTES + 1), ttl_seconds=60)
+
+        table.delete("a")
+        assert table.get("a") is None
+        assert table.stats()["occupied"] == 2
+        assert table.stats()["bytes"] == HEADER_BYTES + 64 * 256
+        table.close()
+
+    def test_full_window_evicts(self, tmp_path):
+        """Test that a full table evicts the entry expiring first."""
+        table = SharedHashTable(str(tmp_path / "t.bin"), slots=8)
+        for i in range(8):
+            table.set(f"k{i}", b"v", ttl_seconds=100 + i)
+        table.set("new", b"v", ttl_seconds=1000)
+
+        assert table.get("new") == b"v"
+        assert table.get("k0") is None
+        assert all(table.get(f"k{i}") == b"v" for i in range(1, 8))
+        assert table.stats()["occupied"] == 8
+        table.close()
+
+    def test_shared_between_processes(self, tmp_path):
+        """Test that a value written by another process is read here."""
+        path = str(tmp_path / "t.bin")
+        table = SharedHashTable(path, slots=64)
+        child = multiprocessing.get_context("spawn").Process(target=_write_from_child, args=(path,))
+        child.start()
+        child.join(30)
+
+        assert child.exitcode == 0
+        assert table.get("from-child") == b"hello"
+        assert "t" in shared_cache_stats()
+        table.close()
+
+    def test_torn_slot_reads_as_miss(self, tmp_path):
+        """Test that a slot mid-write (odd sequence) is not returned."""
+        table = SharedHashTable(str(tmp_path / "t.bin"), slots=8)
+        table.set("a", b"1", ttl_seconds=60)
+        offset = next(o for o in table._offsets(_digest("a")) if table._read_slot(o)[0] == _digest("a"))
+
+        seq = _SEQ.unpack_from(table._map, offset)[0]
+        _SEQ.pack_into(table._map, offset, seq + 1)
+        assert table.get("a") is None
+        _SEQ.pack_into(table._map, offset, seq)
+        assert table.get("a") == b"1"
+        table.close()
+
+    def test_layout_change_replaces_file(self, tmp_path):
+        """Test that a different slot count gets a new file, leaving old mappings usable."""
+        path = str(tmp_path / "t.bin")
+        old = SharedHashTable(path, slots=8)
+        old.set("a", b"1", ttl_seconds=60)
+
+        new = SharedHashTable(path, slots=16)
+        assert new.get("a") is None
+        assert old.get("a") == b"1"
+        old.close()
+        new.close()
+
+
+class TestSharedReturningUsers:
+    """Test the returning-user index on a shared segment."""
+
+    @pytest.mark.asyncio
+    async def test_workers_share_entries(self, tmp_path):
+        """Test that one worker's lookup and invalidation serve another worker."""
+        path = str(tmp_path / "returning.bin")
+        calls = []
+
+        async def lookup(db, phone_number, limit):
+            calls.append(phone_number)
+            return ["MBEIBR7DA1", "MBEIBR7DA1X"]
+
+        first = ReturningUserIndex(lookup, ttl_seconds=60, shared=SharedHashTable(path, slots=64))
+        second = ReturningUserIndex(lookup, ttl_seconds=60, shared=SharedHashTable(path, slots=64))
+
+        assert await first.codes_for(None, PHONE) == ("MBEIBR7DA1", "MBEIBR7DA1X")
+        assert await second.codes_for(None, PHONE) == ("MBEIBR7DA1", "MBEIBR7DA1X")
+        assert calls == [PHONE]
+
+        second.invalidate(PHONE)
+        await first.codes_for(None, PHONE)
+        assert calls == [PHONE, PHONE]
+
+
+@pytest_asyncio.fixture
+async def factory(tmp_path):
+    """Session factory over an empty SQLite database, counting registry lookups."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'hot.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    lookups = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "FROM uic_records" in statement:
+            lookups.append(statement)
+
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    session_factory.lookups = lookups
+    yield session_factory
+    await engine.dispose()
+
+
+async def _register(service: UICService, factory):
+    async with factory() as db:
+        result = await service.create_uic(db, PHONE, *PERSON)
+        await db.commit()
+    return result
+
+
+class TestUICHotSet:
+    """Test the shared input_hash -> record hot set."""
+
+    @pytest.mark.asyncio
+    async def test_other_worker_skips_lookup(self, factory, tmp_path):
+        """Test that a record touched by one worker is touched by another without a SELECT."""
+        path = str(tmp_path / "uic_hot_set.bin")
+        first = UICService(salt="test_salt_for_testing", hot_set=SharedHashTable(path, slots=64))
+        second = UICService(salt="test_salt_for_testing", hot_set=SharedHashTable(path, slots=64))
+        first.duplicates = second.duplicates = None
+        first.occupancy.loaded = True
+
+        code, _ = await _register(first, factory)
+        await _register(first, factory)
+        lookups = len(factory.lookups)
+
+        assert await _register(second, factory) == (code, False)
+        assert len(factory.lookups) == lookups
+        async with factory() as db:
+            record = (await db.execute(select(UICRecord))).scalar_one()
+        assert record.request_count == 3
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_falls_back(self, factory, tmp_path):
+        """Test that an entry for a removed record is dropped and the person re-registered."""
+        service = UICService(
+            salt="test_salt_for_testing", hot_set=SharedHashTable(str(tmp_path / "hot.bin"), slots=64)
+        )
+        service.duplicates = None
+        service.occupancy.loaded = True
+        code, _ = await _register(service, factory)
+        await _register(service, factory)
+
+        async with factory() as db:
+            await db.execute(delete(UICRecord))
+            await db.commit()
+
+        new_code, is_new = await _register(service, factory)
+        assert is_new
+        assert service.hot_set.get(service.hasher.candidates(PERSON)[0][1]) is None
+
+    @pytest.mark.asyncio
+    async def test_entry_with_reused_id_falls_back(self, factory, tmp_path):
+        """Test that an entry whose id now belongs to another person's row touches nothing."""
+        service = UICService(
+            salt="test_salt_for_testing", hot_set=SharedHashTable(str(tmp_path / "hot.bin"), slots=64)
+        )
+        service.duplicates = None
+        service.occupancy.loaded = True
+        code, _ = await _register(service, factory)
+        await _register(service, factory)
+
+        # The row moves (e.g. rebalanced) and its old id is reused by someone else
+        async with factory() as db:
+            await db.execute(update(UICRecord).values(id=100))
+            await db.execute(insert(UICRecord).values(
+                id=1, uic_code="KASMUK2KN2", phone_number="+243820000000", input_hash="0" * 64,
+                normalized_last_name_code="KAS", normalized_first_name_code="MUK",
+                normalized_birth_year_digit="2", normalized_city_code="KN", normalized_gender_code="2",
+                request_count=1,
+            ))
+            await db.commit()
+
+        assert await _register(service, factory) == (code, False)
+        async with factory() as db:
+            counts = dict((await db.execute(select(UICRecord.uic_code, UICRecord.request_count))).all())
+        assert counts == {code: 3, "KASMUK2KN2": 1}
+
+    @pytest.mark.asyncio
+    async def test_hot_set_tried_once_with_replicas(self, factory, tmp_path):
+        """Test that a hot set miss is not retried after the replica and primary lookups."""
+        router = ReadReplicaRouter([f"sqlite:///{tmp_path / 'hot.db'}"], staleness_seconds=0)
+        service = UICService(
+            salt="test_salt_for_testing",
+            hot_set=SharedHashTable(str(tmp_path / "hot.bin"), slots=64),
+            read_router=router,
+        )
+        service.duplicates = None
+        service.occupancy.loaded = True
+        touch_hot = service._touch_hot
+        calls = []
+
+        async def counting_touch_hot(*args):
+            calls.append(args)
+            return await touch_hot(*args)
+
+        service._touch_hot = counting_touch_hot
+        await _register(service, factory)
+        await _register(service, factory)
+
+        assert len(calls) == 2
+        await router.dispose()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,188 @@
+"""
+Tests for the multi-process supervisor.
+
+Run with: pytest tests/test_supervisor.py
+"""
+import os
+import urllib.request
+
+import pytest
+
+from app.config import settings
+from app.supervisor import Supervisor, check_shared_state
+
+
+async def pid_app(scope, receive, send):
+    """Minimal ASGI app answering with the worker's PID."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": str(os.getpid()).encode()})
+
+
+async def never_ready() -> bool:
+    """Readiness check that always fails."""
+    return False
+
+
+async def ready_second_time() -> bool:
+    """Readiness check failing for the first worker to run it (marker file in FLAKY_MARKER)."""
+    try:
+        with open(os.environ["FLAKY_MARKER"], "x"):
+            return False
+    except FileExistsError:
+        return True
+
+
+PREPARED = []
+
+
+async def prepare() -> None:
+    """Prepare hook recording that it ran."""
+    PREPARED.append(os.getpid())
+
+
+async def schema_init_skipped() -> bool:
+    """Readiness check passing only when the supervisor disabled schema init."""
+    return os.environ.get("INIT_SCHEMA_ON_STARTUP") == "false"
+
+
+def _get_pid(port: int) -> int:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as response:
+        return int(response.read())
+
+
+class TestCheckSharedState:
+    """Test validation of process-local backends."""
+
+    def test_memory_sessions_rejected_with_workers(self, monkeypatch):
+        """Test that in-memory conversation state cannot be split across workers."""
+        monkeypatch.setattr(settings, "session_backend", "memory")
+        check_shared_state(1)
+        with pytest.raises(ValueError):
+            check_shared_state(4)
+
+    def test_database_sessions_allowed(self, monkeypatch):
+        """Test that the database session store works with several workers."""
+        monkeypatch.setattr(settings, "session_backend", "database")
+        check_shared_state(4)
+
+
+class TestSupervisor:
+    """Test worker lifecycle with real processes."""
+
+    def test_workers_serve_and_rolling_restart(self):
+        """Test that workers serve on the shared socket and are all replaced on restart."""
+        supervisor = Supervisor(
+            app="tests.test_supervisor:pid_app",
+            workers=2,
+            host="127.0.0.1",
+            port=0,
+            readiness_check=None,
+            ready_timeout=20,
+            shutdown_timeout=5,
+        )
+        try:
+            supervisor.start_workers()
+            old_pids = set(supervisor.pids)
+            assert len(old_pids) == 2
+            assert _get_pid(supervisor.port) in old_pids
+
+            assert supervisor.rolling_restart()
+            new_pids = set(supervisor.pids)
+            assert not new_pids & old_pids
+            assert _get_pid(supervisor.port) in new_pids
+        finally:
+            supervisor.shutdown()
+
+    def test_restart_aborted_when_not_ready(self):
+        """Test that workers failing readiness never replace serving ones."""
+        supervisor = Supervisor(
+            app="tests.test_supervisor:pid_app",
+            workers=1,
+            host="127.0.0.1",
+            port=0,
+            readiness_check=None,
+            ready_timeout=20,
+            shutdown_timeout=5,
+        )
+        try:
+            supervisor.start_workers()
+            pids = supervisor.pids
+
+            supervisor.readiness_check = "tests.test_supervisor:never_ready"
+            assert not supervisor.rolling_restart()
+            assert supervisor.pids == pids
+            assert _get_pid(supervisor.port) == pids[0]
+        finally:
+            supervisor.shutdown()
+
+    def test_unready_worker_respawned_at_start(self, tmp_path, monkeypatch):
+        """Test that a worker failing readiness at startup is replaced, not dropped."""
+        monkeypatch.setenv("FLAKY_MARKER", str(tmp_path / "failed-once"))
+        supervisor = Supervisor(
+            app="tests.test_supervisor:pid_app",
+            workers=2,
+            host="127.0.0.1",
+            port=0,
+            readiness_check="tests.test_supervisor:ready_second_time",
+            ready_timeout=20,
+            shutdown_timeout=5,
+            prepare=None,
+        )
+        try:
+            supervisor.start_workers()
+            assert len(supervisor.pids) == 2
+            assert all(worker.process.is_alive() for worker in supervisor._workers)
+        finally:
+            supervisor.shutdown()
+
+    def test_start_fails_when_workers_missing(self):
+        """Test that startup fails instead of serving with fewer workers."""
+        supervisor = Supervisor(
+            app="tests.test_supervisor:pid_app",
+            workers=1,
+            host="127.0.0.1",
+            port=0,
+            readiness_check="tests.test_supervisor:never_ready",
+            ready_timeout=20,
+            shutdown_timeout=5,
+            prepare=None,
+            start_attempts=2,
+        )
+        with pytest.raises(RuntimeError):
+            supervisor.start_workers()
+        assert supervisor.pids == []
+        assert supervisor.sock is None
+
+    def test_schema_prepared_once_before_workers(self):
+        """Test that the prepare hook runs in the supervisor and workers skip schema init."""
+        PREPARED.clear()
+        supervisor = Supervisor(
+            app="tests.test_supervisor:pid_app",
+            workers=2,
+            host="127.0.0.1",
+            port=0,
+            readiness_check="tests.test_supervisor:schema_init_skipped",
+            ready_timeout=20,
+            shutdown_timeout=5,
+            prepare="tests.test_supervisor:prepare",
+            start_attempts=1,
+        )
+        try:
+            supervisor.prepare_storage()
+            supervisor.start_workers()
+            assert PREPARED == [os.getpid()]
+            assert len(supervisor.pids) == 2
+        finally:
+            supervisor.shutdown()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,219 @@
+"""
+Tests for collision-aware UIC allocation.
+
+Run with: pytest tests/test_uic_allocator.py
+"""
+import hashlib
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, enable_sqlite_transactions
+from app.models.uic import UICRecord
+from app.services.uic_allocator import SUFFIX_ALPHABET, OccupancyIndex, _IntHashSet
+from app.services.uic_service import UICService
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Empty registry database."""
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'alloc.db'}")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+class TestOccupancyIndex:
+    """Test in-memory allocation."""
+
+    def test_first_registrant_keeps_base_code(self):
+        """Test that a free base code is issued unchanged."""
+        index = OccupancyIndex()
+        assert index.allocate("MBEIBR7DA1", _hash("a")) == "MBEIBR7DA1"
+        assert "MBEIBR7DA1" in index
+
+    def test_collision_gets_short_suffix(self):
+        """Test that a taken base code gets a one-character suffix."""
+        index = OccupancyIndex()
+        index.allocate("MBEIBR7DA1", _hash("a"))
+        code = index.allocate("MBEIBR7DA1", _hash("b"))
+
+        assert code[:10] == "MBEIBR7DA1"
+        assert len(code) == 11
+        assert code[10] in SUFFIX_ALPHABET
+
+    def test_suffix_order_depends_only_on_hash(self):
+        """Test that the same occupancy and hash always give the same code."""
+        first, second = OccupancyIndex(), OccupancyIndex()
+        for index in (first, second):
+            index.allocate("MBEIBR7DA1", _hash("a"))
+
+        assert first.allocate("MBEIBR7DA1", _hash("b")) == second.allocate("MBEIBR7DA1", _hash("b"))
+
+    def test_two_character_suffix_after_single_ones_run_out(self):
+        """Test that codes stay unique past 33 registrants on one base."""
+        index = OccupancyIndex()
+        codes = {index.allocate("MBEIBR7DA1", _hash(str(i))) for i in range(40)}
+
+        assert len(codes) == 40
+        assert max(len(code) for code in codes) == 12
+
+    def test_hash_set_grows(self):
+        """Test that the slot table grows and keeps its keys."""
+        keys = _IntHashSet()
+        for key in range(1, 5000):
+            keys.add(key * 7919)
+
+        assert len(keys) == 4999
+        assert all(key * 7919 in keys for key in range(1, 5000))
+        assert 3 not in keys
+
+    def test_discard_keeps_probe_runs(self):
+        """Test that removing a key leaves the keys probed past it reachable."""
+        keys = _IntHashSet()
+        mask = keys._mask
+        # Three keys with the same home slot, one with the next home slot
+        run = [mask + 1 + 5, 2 * (mask + 1) + 5, 3 * (mask + 1) + 5, mask + 1 + 6]
+        for key in run:
+            keys.add(key)
+
+        keys.discard(run[0])
+        keys.discard(12345)
+
+        assert len(keys) == 3
+        assert run[0] not in keys
+        assert all(key in keys for key in run[1:])
+
+    def test_release_frees_code(self):
+        """Test that a released code is allocated again to the same person."""
+        index = OccupancyIndex()
+        index.allocate("MBEIBR7DA1", _hash("a"))
+        code = index.allocate("MBEIBR7DA1", _hash("b"))
+
+        index.release(code)
+
+        assert code not in index
+        assert index.allocate("MBEIBR7DA1", _hash("b")) == code
+
+    def test_same_person_shares_reservation(self):
+        """Test that concurrent registrations of one person reserve one code until both settle."""
+        index = OccupancyIndex()
+        first = index.reserve("MBEIBR7DA1", _hash("a"))
+        second = index.reserve("MBEIBR7DA1", _hash("a"))
+        other = index.reserve("MBEIBR7DA1", _hash("b"))
+
+        assert second is first and first.uic_code == "MBEIBR7DA1"
+        assert other.uic_code != first.uic_code
+
+        index.settle(first, committed=False)
+        assert "MBEIBR7DA1" in index
+        index.settle(second, committed=False)
+        assert "MBEIBR7DA1" not in index
+
+        index.settle(other, committed=True)
+        assert other.uic_code in index
+        assert index.reserve("MBEIBR7DA1", _hash("b")) is not other
+
+
+class TestCreateUICCollisions:
+    """Test collision handling through UICService.create_uic."""
+
+    @pytest.mark.asyncio
+    async def test_same_prefix_different_people(self, session_factory):
+        """Test that two people sharing a base code both get a UIC."""
+        service = UICService(salt="test_salt_for_testing")
+
+        async with session_factory() as db:
+            code1, new1 = await service.create_uic(db, "+1", "MBENGUE", "IBRAHIMA", "7", "DA", "1")
+            code2, new2 = await service.create_uic(db, "+2", "MBEKI", "IBRAHIM", "7", "DA", "1")
+            again, new3 = await service.create_uic(db, "+2", "MBEKI", "IBRAHIM", "7", "DA", "1")
+
+        assert new1 and new2 and not new3
+        assert code1 == "MBEIBR7DA1"
+        assert code2.startswith("MBEIBR7DA1") and code2 != code1
+        assert again == code2
+
+    @pytest.mark.asyncio
+    async def test_code_issued_by_another_worker(self, session_factory):
+        """Test recovery when another process issued the code after our index loaded."""
+        ours = UICService(salt="test_salt_for_testing")
+        theirs = UICService(salt="test_salt_for_testing")
+
+        async with session_factory() as db:
+            await ours.load_occupancy(db)
+            their_code, _ = await theirs.create_uic(db, "+1", "MBENGUE", "IBRAHIMA", "7", "DA", "1")
+            await db.commit()
+
+        async with session_factory() as db:
+            our_code, is_new = await ours.create_uic(db, "+2", "MBEKI", "IBRAHIM", "7", "DA", "1")
+            await db.commit()
+
+        assert is_new
+        assert our_code != their_code
+
+    @pytest.mark.asyncio
+    async def test_rolled_back_code_not_kept(self, session_factory):
+        """Test that a rolled-back registration frees its code and notifies no one."""
+        service = UICService(salt="test_salt_for_testing")
+        issued = []
+        service.issue_listeners.append(lambda phone, code: issued.append(code))
+
+        async with session_factory() as db:
+            await service.create_uic(db, "+1", "MBENGUE", "IBRAHIMA", "7", "DA", "1")
+            code, _ = await service.create_uic(db, "+2", "MBEKI", "IBRAHIM", "7", "DA", "1")
+            await db.rollback()
+
+        assert code not in service.occupancy
+        assert issued == []
+
+        async with session_factory() as db:
+            await service.create_uic(db, "+1", "MBENGUE", "IBRAHIMA", "7", "DA", "1")
+            again, is_new = await service.create_uic(db, "+2", "MBEKI", "IBRAHIM", "7", "DA", "1")
+            await db.commit()
+
+        assert (again, is_new) == (code, True)
+        assert issued == ["MBEIBR7DA1", code]
+
+    @pytest.mark.asyncio
+    async def test_person_registered_concurrently_is_touched(self, session_factory):
+        """Test that losing the insert race to the same person counts the request."""
+        ours = UICService(salt="test_salt_for_testing")
+        theirs = UICService(salt="test_salt_for_testing")
+
+        async with session_factory() as db:
+            await ours.load_occupancy(db)
+            their_code, _ = await theirs.create_uic(db, "+1", "MBENGUE", "IBRAHIMA", "7", "DA", "1")
+            await db.commit()
+
+        # Our lookup ran just before their row was committed
+        find_by_hash = ours._find_by_hash
+        misses = iter([True])
+
+        async def racing_find(db, input_hashes):
+            if next(misses, False):
+                return None
+            return await find_by_hash(db, input_hashes)
+
+        ours._find_by_hash = racing_find
+        async with session_factory() as db:
+            our_code, is_new = await ours.create_uic(db, "+1", "MBENGUE", "IBRAHIMA", "7", "DA", "1")
+            await db.commit()
+            record = (await db.execute(select(UICRecord))).scalar_one()
+
+        assert (our_code, is_new) == (their_code, False)
+        assert record.request_count == 2
+        assert their_code in ours.occupancy
+        assert ours.occupancy._pending == {}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -3,9 +3,19 @@ Tests for UICService.
 
 Run with: pytest tests/test_uic_service.py
 """
+import random
+
 import pytest
 
-from app.services.uic_service import UICService
+from app.services.uic_service import UICService, normalize_column
+
+# Values exercising every normalization branch: accents, punctuation,
+# whitespace, non-Latin letters, empty and non-string values
+TRICKY_VALUES = [
+    "Gédéon", "N'Djamena", "  mbe ", "KaBiLa", "Ngoy-Kasongo", "ÉLÉONORE",
+    "Łukasz", "Straße", "Ñ", "", None, 0, 7, 1.0, True, "1997", "k i", "çà",
+    "İlker", "ǅ", "ＫＩ", "mbé\t", "x" * 40,
+]
 
 
 class TestUICServiceNormalization:
@@ -214,5 +224,74 @@ class TestCollisionPrevention:
         assert uic2 == "MOBMAR3KI2"
 
 
+class TestBatchGeneration:
+    """Test that the batch API matches the scalar path row by row."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.service = UICService(salt="test_salt_for_testing")
+
+    def _scalar(self, row):
+        normalized = self.service.normalize_inputs(*row)
+        return (
+            normalized,
+            self.service._calculate_input_hash(*normalized),
+            self.service._generate_uic_code(*normalized),
+        )
+
+    def test_normalize_column_matches_scalar(self):
+        """Test that every tricky value normalizes exactly as _normalize_text does."""
+        assert normalize_column(TRICKY_VALUES) == [
+            self.service._normalize_text(value) for value in TRICKY_VALUES
+        ]
+
+    def test_generate_batch_matches_scalar(self):
+        """Test that normalized inputs, hashes and codes are identical to the scalar path."""
+        rng = random.Random(7)
+        rows = [tuple(rng.choice(TRICKY_VALUES) for _ in range(5)) for _ in range(500)]
+        rows += [("Mbengue", "Ibrahima", "1997", "Dakar", "1"), ("MOB", "MAR", "3", "KI", "2")]
+        columns = list(zip(*rows))
+
+        batch = self.service.generate_batch(*columns)
+
+        assert len(batch) == len(rows)
+        for i, row in enumerate(rows):
+            normalized, input_hash, uic_code = self._scalar(row)
+            assert (
+                batch.last_name_codes[i], batch.first_name_codes[i], batch.birth_year_digits[i],
+                batch.city_codes[i], batch.gender_codes[i]
+            ) == normalized
+            assert batch.input_hashes[i] == input_hash
+            assert batch.uic_codes[i] == uic_code
+
+    def test_normalize_batch_matches_normalize_inputs(self):
+        """Test the normalize-only batch API."""
+        rows = [("Gédéon", "Jean-Marie", "1987", "Kinshasa", "2"), ("mbe", "ibr", "7", "da", "1")]
+        columns = self.service.normalize_batch(*zip(*rows))
+        assert list(zip(*columns)) == [self.service.normalize_inputs(*row) for row in rows]
+
+    def test_arrow_columns(self):
+        """Test that Arrow string arrays (with nulls) are accepted."""
+        pa = pytest.importorskip("pyarrow")
+        rows = [("Gédéon", "Jean", "1987", "KI", "2"), ("MBE", None, "7", "DA", "1")]
+        columns = [pa.array(column) for column in zip(*rows)]
+
+        batch = self.service.generate_batch(*columns)
+        assert batch.input_hashes == [self._scalar(row)[1] for row in rows]
+
+    def test_process_pool_matches_in_process(self):
+        """Test that chunked process-pool output equals the in-process result."""
+        rows = [("MBE", f"N{i}", str(i % 10), "KI", "1") for i in range(300)]
+        columns = list(zip(*rows))
+
+        pooled = self.service.generate_batch(*columns, processes=2, chunk_size=100)
+        assert pooled == self.service.generate_batch(*columns)
+
+    def test_mismatched_lengths_rejected(self):
+        """Test that columns of different lengths raise ValueError."""
+        with pytest.raises(ValueError):
+            self.service.generate_batch(["MBE"], ["IBR"], ["7"], ["KI"], [])
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
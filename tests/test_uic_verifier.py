@@ -0,0 +1,195 @@
+"""
+Tests for partner code verification and its API.
+
+Run with: pytest tests/test_uic_verifier.py
+"""
+import json
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import app.api.partner as partner_api
+from app.config import settings
+from app.database import Base, LazySession, enable_sqlite_transactions, get_db
+from app.models.uic import UICRecord
+from app.services.uic_verifier import UICVerifier
+
+API_KEY = "partner_key_1234567890"
+CREATED_AT = datetime(2026, 3, 14, 9, 30)
+
+
+def _seed(db_path) -> None:
+    """Create the schema with one active and one deactivated record."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UICRecord), [
+            dict(uic_code=code, phone_number="+243810000000", normalized_last_name_code="MBE",
+                 normalized_first_name_code="IBR", normalized_birth_year_digit="7",
+                 normalized_city_code="DA", normalized_gender_code="1", input_hash=f"{i:064x}",
+                 hash_key_version=1, created_at=CREATED_AT, last_requested_at=CREATED_AT,
+                 is_active=active, request_count=1)
+            for i, (code, active) in enumerate([("MBEIBR7DA1", True), ("KASMUK2KN2", False)])
+        ])
+    engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def factory(tmp_path):
+    """Session factory over a seeded SQLite database, counting statements."""
+    _seed(tmp_path / "verify.db")
+    engine = enable_sqlite_transactions(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'verify.db'}")
+    )
+    statements = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    session_factory.statements = statements
+    yield session_factory
+    await engine.dispose()
+
+
+async def _verify(verifier: UICVerifier, factory, codes):
+    db = LazySession(factory)
+    try:
+        return await verifier.verify(db, codes)
+    finally:
+        await db.discard()
+
+
+class TestUICVerifier:
+    """Test batched lookups and the status cache."""
+
+    @pytest.mark.asyncio
+    async def test_batch_is_one_query(self, factory):
+        """Test that a batch costs one IN query and keeps request order."""
+        verifier = UICVerifier(max_entries=100, ttl_seconds=60)
+        statuses = await _verify(verifier, factory, ["kasmuk2kn2", "MBEIBR7DA1", "NOPE000000", "MBEIBR7DA1"])
+
+        assert len(factory.statements) == 1
+        assert [s.uic_code for s in statuses] == ["KASMUK2KN2", "MBEIBR7DA1", "NOPE000000", "MBEIBR7DA1"]
+        assert [(s.exists, s.active) for s in statuses] == [(True, False), (True, True), (False, False), (True, True)]
+        assert statuses[1].issued_on == "2026-03-14"
+
+    @pytest.mark.asyncio
+    async def test_cached_codes_skip_database(self, factory):
+        """Test that known and unknown codes are served from cache the second time."""
+        verifier = UICVerifier(max_entries=100, ttl_seconds=60)
+        await _verify(verifier, factory, ["MBEIBR7DA1", "NOPE000000"])
+        await _verify(verifier, factory, ["NOPE000000", "MBEIBR7DA1", "not a code!"])
+        assert len(factory.statements) == 1
+
+        verifier.invalidate("NOPE000000")
+        await _verify(verifier, factory, ["NOPE000000", "MBEIBR7DA1"])
+        assert len(factory.statements) == 2
+        assert factory.statements[-1].count("?") == 1
+
+    @pytest.mark.asyncio
+    async def test_cache_bounded(self, factory):
+        """Test that the least recently verified codes are evicted."""
+        verifier = UICVerifier(max_entries=2, ttl_seconds=60)
+        await _verify(verifier, factory, ["AAA", "BBB", "CCC"])
+        assert len(verifier) == 2
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Partner API over a seeded database, with one configured key."""
+    _seed(tmp_path / "verify.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'verify.db'}", poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    monkeypatch.setattr(settings, "partner_api_keys", {"clinic-emr": API_KEY})
+    monkeypatch.setattr(settings, "verify_batch_max", 2)
+    monkeypatch.setattr(partner_api, "verifier", UICVerifier(max_entries=100, ttl_seconds=60))
+    monkeypatch.setattr(partner_api, "AsyncSessionLocal", session_factory)
+
+    app = FastAPI()
+    app.include_router(partner_api.router)
+
+    async def db():
+        session = LazySession(session_factory)
+        yield session
+        await session.discard()
+
+    app.dependency_overrides[get_db] = db
+    return TestClient(app, headers={"X-API-Key": API_KEY})
+
+
+class TestPartnerAPI:
+    """Test authentication, revalidation and streaming."""
+
+    def test_requires_key(self, client, monkeypatch):
+        """Test that a bad key is rejected and no keys disables the API."""
+        assert client.get("/api/v1/uic/verify/MBEIBR7DA1", headers={"X-API-Key": "wrong"}).status_code == 401
+        monkeypatch.setattr(settings, "partner_api_keys", {})
+        assert client.get("/api/v1/uic/verify/MBEIBR7DA1").status_code == 404
+
+    def test_etag_revalidation(self, client):
+        """Test that a matching If-None-Match gets an empty 304."""
+        response = client.get("/api/v1/uic/verify/mbeibr7da1")
+        assert response.status_code == 200
+        assert response.json() == {
+            "uic_code": "MBEIBR7DA1", "exists": True, "active": True, "issued_on": "2026-03-14"
+        }
+        assert response.headers["Cache-Control"] == f"private, max-age={settings.verify_max_age_seconds}"
+
+        etag = response.headers["ETag"]
+        again = client.get("/api/v1/uic/verify/MBEIBR7DA1", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        other = client.get("/api/v1/uic/verify/KASMUK2KN2", headers={"If-None-Match": etag})
+        assert other.status_code == 200
+
+    def test_batch(self, client):
+        """Test the batch summary and the batch size limit."""
+        response = client.post("/api/v1/uic/verify", json={"codes": ["MBEIBR7DA1", "KASMUK2KN2"]})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["count"] == 2 and body["active"] == 1
+        assert [r["exists"] for r in body["results"]] == [True, True]
+        assert "ETag" in response.headers
+
+        too_many = client.post("/api/v1/uic/verify", json={"codes": ["A", "B", "C"]})
+        assert too_many.status_code == 413
+
+    def test_stream(self, client):
+        """Test that the NDJSON stream answers every line, past the batch size."""
+        lines = 'MBEIBR7DA1\n"KASMUK2KN2"\n{"uic_code": "NOPE000000"}\n\nmbeibr7da1\n'
+        response = client.post("/api/v1/uic/verify/stream", content=lines)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        results = response.text.splitlines()
+        assert len(results) == 4
+        assert [json.loads(r)["exists"] for r in results] == [True, True, False, True]
+
+        assert client.post("/api/v1/uic/verify/stream", content='{"code": "MBEIBR7DA1"}\n').status_code == 400
+
+    def test_stream_read_in_chunks(self, client, monkeypatch):
+        """Test that lines split across body chunks are joined and the limit counts codes."""
+        def chunks():
+            yield b"MBEIBR"
+            yield b"7DA1\r\nKASM"
+            yield b"UK2KN2"
+
+        response = client.post("/api/v1/uic/verify/stream", content=chunks())
+        assert [json.loads(r)["uic_code"] for r in response.text.splitlines()] == ["MBEIBR7DA1", "KASMUK2KN2"]
+
+        monkeypatch.setattr(settings, "verify_stream_max_codes", 2)
+        assert client.post("/api/v1/uic/verify/stream", content="A\nB\nC\n").status_code == 413
+        assert client.post("/api/v1/uic/verify/stream", content="A" * 5000).status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])